@@ -3,6 +3,11 @@ import logging
 from flask import Flask
 from flask_cors import CORS
 from route.router import router
+from utils.json_provider import FastJSONProvider
+from utils.aws_clients import prewarm_clients
+from utils.cognito_auth import init_auth
+from utils.export_utils import EXPORT_BINARY_CONTENT_TYPES
+from db.db_connection import db
 import awsgi
 
 # logger settings
@@ -10,12 +15,21 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
+# Authorizationヘッダーのアクセストークンをローカルで検証する（COGNITO_AUTH_MODE）
+init_auth(app)
 app.register_blueprint(router)
 
+# AWS_CLIENT_PREWARMで指定されたAWSクライアントを初期化フェーズで作成する
+prewarm_clients()
+# 接続プールモードではDB_POOL_MIN_SIZE分の接続を最初のリクエストより前に作成する
+db.prewarm_pool()
+
 def lambda_handler(event, context):
     try:
-        return awsgi.response(app, event, context)
+        # エクスポート（CSV / NDJSON、gzip）はBase64エンコードして返す
+        return awsgi.response(app, event, context, base64_content_types=EXPORT_BINARY_CONTENT_TYPES)
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         return {
@@ -0,0 +1,75 @@
+"""
+Cold start benchmark: time and peak RSS to import app.py in a fresh process.
+
+Each sample runs a new interpreter that imports the application and serves
+one request to /dashb/hello_world, which needs neither the database nor AWS.
+It reports the median import time, the median time to the first response,
+peak RSS and whether botocore was loaded.
+
+Usage:
+    python benchmarks/bench_cold_start.py [repository_path]
+
+repository_path defaults to this repository. Pointing it at a checkout of an
+older commit gives the "before" numbers.
+"""
+import os
+import sys
+import json
+import statistics
+import subprocess
+
+SAMPLES = 15
+
+PROBE = """
+import sys, time, json, resource
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get('/dashb/hello_world')
+assert response.status_code == 200
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_response_ms': (served - started) * 1000,
+    'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'botocore_loaded': 'botocore' in sys.modules,
+    'modules': len(sys.modules),
+}))
+"""
+
+ENV = {
+    'END_POINT': 'localhost',
+    'USER_NAME': 'bench',
+    'PASSWORD': 'bench',
+    'DB_NAME': 'bench',
+    'PORT': '3306',
+    'COGNITO_USER_POOL_ID': 'ap-northeast-1_bench',
+    'COGNITO_CLIENT_ID': 'bench',
+    'COGNITO_CLIENT_SECRET': 'bench',
+    'AWS_DEFAULT_REGION': 'ap-northeast-1',
+}
+
+def sample(repository):
+    env = dict(os.environ, **ENV)
+    env['PYTHONPATH'] = repository
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=repository, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    repository = os.path.abspath(sys.argv[1] if len(sys.argv) > 1 else
+                                 os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    # 1回目はバイトコードのキャッシュ作成などを含むため捨てる
+    sample(repository)
+    results = [sample(repository) for _ in range(SAMPLES)]
+
+    print(f"repository:         {repository}")
+    print(f"import app (ms):    {statistics.median(r['import_ms'] for r in results):.1f}")
+    print(f"first response (ms):{statistics.median(r['first_response_ms'] for r in results):.1f}")
+    print(f"peak RSS (MB):      {statistics.median(r['rss_kb'] for r in results) / 1024:.1f}")
+    print(f"modules loaded:     {results[-1]['modules']}")
+    print(f"botocore loaded:    {results[-1]['botocore_loaded']}")
+
+if __name__ == '__main__':
+    main()
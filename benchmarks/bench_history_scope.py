@@ -0,0 +1,249 @@
+"""
+Regression benchmark for permission-scoped charge/unpaid history queries.
+
+Seeds a scratch MySQL schema with 10, 1k and 10k powersupplies, then compares
+the legacy two-step implementation (fetch powersupply_ids, send them back as
+an IN list) with the current endpoints, checking that both return identical
+rows in identical order.
+
+Usage:
+    END_POINT=... USER_NAME=... PASSWORD=... PORT=3306 \
+    BENCH_DB_NAME=ev_bench python benchmarks/bench_history_scope.py
+
+BENCH_DB_NAME must point to a disposable schema: its tables are dropped and
+recreated on every run.
+"""
+import os
+import sys
+import time
+import random
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_DB_NAME = os.environ['BENCH_DB_NAME']
+if BENCH_DB_NAME == os.environ.get('DB_NAME'):
+    raise SystemExit("BENCH_DB_NAME must differ from DB_NAME")
+os.environ['DB_NAME'] = BENCH_DB_NAME
+os.environ.setdefault('DB_CONNECTION_MODE', 'reuse')
+
+import pymysql
+from flask import Flask
+from db.db_connection import db
+from response.response_base import create_success_response
+from utils.user_identity import identity_cache
+from utils.json_provider import FastJSONProvider
+from route.dashb.agency.get_charge_history_router import get_charge_history_router
+from route.dashb.agency.get_unpaid_history_router import get_unpaid_history_router
+
+SIZES = [10, 1000, 10000]
+CHARGES_PER_POWERSUPPLY = 3
+REPEAT = 20
+APP_USER_NUMBER = '0000000001'
+USER_PERMISSION = 5
+START_PERIOD = '2024-01-01 00:00:00'
+END_PERIOD = '2024-12-31 23:59:59'
+
+SCHEMA = [
+    "DROP TABLE IF EXISTS t_charge_payment, t_charge_history, t_charge, m_powersupply, "
+    "m_location, m_user_corporate, m_user_agency, m_user",
+    """CREATE TABLE m_user (
+        user_id INT AUTO_INCREMENT PRIMARY KEY, app_user_number VARCHAR(10) UNIQUE,
+        lastname VARCHAR(50), firstname VARCHAR(50), user_category INT, status INT)""",
+    "CREATE TABLE m_user_agency (user_id INT PRIMARY KEY, agency_id INT, permission INT)",
+    "CREATE TABLE m_user_corporate (user_id INT PRIMARY KEY, corporate_id INT, permission INT)",
+    """CREATE TABLE m_location (
+        location_id INT AUTO_INCREMENT PRIMARY KEY, agency_id INT, station_name VARCHAR(100),
+        KEY idx_agency (agency_id))""",
+    """CREATE TABLE m_powersupply (
+        powersupply_id INT AUTO_INCREMENT PRIMARY KEY, location_id INT,
+        app_powersupply_number VARCHAR(12), powersupply_name VARCHAR(100), permission INT,
+        KEY idx_location (location_id))""",
+    """CREATE TABLE t_charge (
+        transaction_id INT AUTO_INCREMENT PRIMARY KEY, powersupply_id INT, user_id INT,
+        KEY idx_powersupply (powersupply_id))""",
+    """CREATE TABLE t_charge_history (
+        transaction_id INT PRIMARY KEY, charging_start DATETIME, charging_end DATETIME,
+        charging_time INT, charging_rate INT, charged_amount DECIMAL(10, 2),
+        billing_amount INT, KEY idx_start (charging_start))""",
+    "CREATE TABLE t_charge_payment (transaction_id INT PRIMARY KEY, payment_status INT)",
+]
+
+LEGACY_CHARGE_QUERY = """
+SELECT
+    t_charge.transaction_id, t_charge.powersupply_id,
+    t_charge_history.charging_start, t_charge_history.charging_end,
+    t_charge_history.charged_amount, t_charge_history.billing_amount,
+    m_user.app_user_number, m_location.station_name,
+    m_powersupply.app_powersupply_number, m_powersupply.powersupply_name
+FROM t_charge
+JOIN t_charge_history ON t_charge.transaction_id = t_charge_history.transaction_id
+JOIN m_user ON t_charge.user_id = m_user.user_id
+JOIN m_powersupply ON t_charge.powersupply_id = m_powersupply.powersupply_id
+JOIN m_location ON m_powersupply.location_id = m_location.location_id
+WHERE t_charge.powersupply_id IN ({placeholders})
+AND t_charge_history.charging_start BETWEEN %s AND %s
+ORDER BY t_charge_history.charging_start ASC
+"""
+
+LEGACY_UNPAID_QUERY = """
+SELECT
+    t.transaction_id, l.station_name, ps.app_powersupply_number,
+    h.charging_start, h.charging_time, h.charging_rate, h.charged_amount,
+    h.billing_amount, u.app_user_number, u.lastname, u.firstname
+FROM t_charge t
+JOIN t_charge_payment p ON t.transaction_id = p.transaction_id
+JOIN t_charge_history h ON t.transaction_id = h.transaction_id
+JOIN m_powersupply ps ON t.powersupply_id = ps.powersupply_id
+JOIN m_location l ON ps.location_id = l.location_id
+JOIN m_user u ON t.user_id = u.user_id
+WHERE t.powersupply_id IN ({placeholders})
+AND p.payment_status = 0
+ORDER BY h.charging_start DESC
+"""
+
+def seed(cursor, powersupply_count):
+    """対象企業にpowersupply_count件の充電器と充電履歴を作成する"""
+    rng = random.Random(powersupply_count)
+    for statement in SCHEMA:
+        cursor.execute(statement)
+
+    cursor.execute(
+        "INSERT INTO m_user (app_user_number, lastname, firstname, user_category, status) "
+        "VALUES (%s, 'Bench', 'User', 4, 1)", (APP_USER_NUMBER,))
+    user_id = cursor.lastrowid
+    cursor.execute("INSERT INTO m_user_agency VALUES (%s, 1, %s)", (user_id, USER_PERMISSION))
+
+    # 対象企業(1)とノイズとなる他企業(2)の拠点
+    locations = max(1, powersupply_count // 10)
+    cursor.executemany(
+        "INSERT INTO m_location (agency_id, station_name) VALUES (%s, %s)",
+        [(agency_id, f"station-{agency_id}-{i}") for agency_id in (1, 2) for i in range(locations)])
+    cursor.execute("SELECT location_id, agency_id FROM m_location")
+    location_ids = {1: [], 2: []}
+    for location_id, agency_id in cursor.fetchall():
+        location_ids[agency_id].append(location_id)
+
+    cursor.executemany(
+        "INSERT INTO m_powersupply (location_id, app_powersupply_number, powersupply_name, permission) "
+        "VALUES (%s, %s, %s, %s)",
+        [(rng.choice(location_ids[agency_id]), f"{agency_id}{i:011d}", f"ps-{i}", rng.randint(1, 7))
+         for agency_id in (1, 2) for i in range(powersupply_count)])
+    cursor.execute("SELECT powersupply_id FROM m_powersupply")
+    powersupply_ids = [row[0] for row in cursor.fetchall()]
+
+    charges = []
+    for powersupply_id in powersupply_ids:
+        for _ in range(CHARGES_PER_POWERSUPPLY):
+            charges.append((powersupply_id, user_id))
+    cursor.executemany("INSERT INTO t_charge (powersupply_id, user_id) VALUES (%s, %s)", charges)
+    cursor.execute("SELECT transaction_id FROM t_charge")
+    transaction_ids = [row[0] for row in cursor.fetchall()]
+
+    history = []
+    for transaction_id in transaction_ids:
+        start = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{transaction_id % 60:02d}"
+        history.append((transaction_id, start, start, 60, 50, rng.randint(1, 5000) / 100, rng.randint(100, 5000)))
+    cursor.executemany("INSERT INTO t_charge_history VALUES (%s, %s, %s, %s, %s, %s, %s)", history)
+    cursor.executemany(
+        "INSERT INTO t_charge_payment VALUES (%s, %s)",
+        [(transaction_id, rng.choice((0, 1))) for transaction_id in transaction_ids])
+
+def legacy_scoped_ids(cursor):
+    """従来実装: ユーザー・権限を順に取得し、権限範囲のpowersupply_idを取得する"""
+    cursor.execute("SELECT user_id FROM m_user WHERE app_user_number = %s", (APP_USER_NUMBER,))
+    user_id = cursor.fetchone()['user_id']
+    cursor.execute("SELECT permission, agency_id FROM m_user_agency WHERE user_id = %s", (user_id,))
+    agency = cursor.fetchone()
+    permissions = list(range(1, agency['permission'] + 1))
+    cursor.execute(
+        f"""SELECT DISTINCT p.powersupply_id FROM m_powersupply p
+        JOIN m_location l ON p.location_id = l.location_id
+        WHERE l.agency_id = %s AND p.permission IN ({', '.join(['%s'] * len(permissions))})""",
+        [agency['agency_id']] + permissions)
+    return [row['powersupply_id'] for row in cursor.fetchall()]
+
+def legacy_charge_history(cursor):
+    ids = legacy_scoped_ids(cursor)
+    cursor.execute(LEGACY_CHARGE_QUERY.format(placeholders=', '.join(['%s'] * len(ids))),
+                   ids + [START_PERIOD, END_PERIOD])
+    return cursor.fetchall()
+
+def legacy_unpaid_history(cursor):
+    ids = legacy_scoped_ids(cursor)
+    cursor.execute(LEGACY_UNPAID_QUERY.format(placeholders=', '.join(['%s'] * len(ids))), ids)
+    return cursor.fetchall()
+
+def normalize(rows):
+    """比較のためにエンドポイントと同じ形式に揃える"""
+    normalized = []
+    for row in rows:
+        row = dict(row)
+        for key in ('charging_start', 'charging_end'):
+            if key in row and row[key] is not None:
+                row[key] = row[key].isoformat()
+        if 'charged_amount' in row:
+            row['charged_amount'] = str(row['charged_amount'])
+        normalized.append(row)
+    return normalized
+
+def same_result(legacy_rows, current_rows):
+    """行の集合と並び順(charging_start)が一致するかを確認する"""
+    def key(row):
+        return row['transaction_id']
+    return (sorted(legacy_rows, key=key) == sorted(current_rows, key=key)
+            and [row['charging_start'] for row in legacy_rows] == [row['charging_start'] for row in current_rows])
+
+def measure(func):
+    timings = []
+    result = None
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+def main():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    app.register_blueprint(get_charge_history_router, url_prefix='/dashb/agency')
+    app.register_blueprint(get_unpaid_history_router, url_prefix='/dashb/agency')
+    client = app.test_client()
+
+    print(f"{'powersupplies':>13} {'endpoint':>20} {'legacy ms':>10} {'current ms':>11} {'rows':>7}")
+    for size in SIZES:
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                seed(cursor, size)
+        identity_cache.clear()
+
+        cases = [
+            ('get_charge_history', legacy_charge_history,
+             {'app_user_number': APP_USER_NUMBER, 'start_period': START_PERIOD, 'end_period': END_PERIOD}),
+            ('get_unpaid_history', legacy_unpaid_history,
+             {'app_user_number': APP_USER_NUMBER}),
+        ]
+        for name, legacy, body in cases:
+            def run_legacy():
+                with db.get_connection() as conn:
+                    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                        rows = normalize(legacy(cursor))
+                # エンドポイントと同様にJSONへの変換まで計測する
+                with app.app_context():
+                    app.json.dumps(create_success_response("", rows))
+                return rows
+
+            def run_current():
+                # 識別情報キャッシュの効果を除き、クエリ構成の差だけを比較する
+                identity_cache.clear()
+                response = client.post(f'/dashb/agency/{name}', json=body)
+                return response.get_json()['data'] or []
+
+            legacy_ms, legacy_rows = measure(run_legacy)
+            current_ms, current_rows = measure(run_current)
+            if not same_result(legacy_rows, current_rows):
+                raise SystemExit(f"{name}: results differ at {size} powersupplies")
+            print(f"{size:>13} {name:>20} {legacy_ms:>10.2f} {current_ms:>11.2f} {len(current_rows):>7}")
+
+if __name__ == '__main__':
+    main()
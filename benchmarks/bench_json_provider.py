@@ -0,0 +1,103 @@
+"""
+Throughput benchmark for the JSON provider on large history payloads.
+
+Compares the previous response paths with FastJSONProvider:
+
+- loop:   convert datetimes row by row, then jsonify with Flask's default
+          provider (get_charge_history / download_history)
+- double: json.loads(json.dumps(rows, default=...)) before jsonify
+          (get_powersupplies)
+- fast:   jsonify the raw rows with FastJSONProvider
+
+No database is needed; rows are generated in memory.
+
+Usage:
+    python benchmarks/bench_json_provider.py
+"""
+import os
+import sys
+import json
+import time
+import decimal
+import datetime
+import statistics
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+from utils.json_provider import FastJSONProvider
+
+SIZES = [1000, 10000, 100000]
+REPEAT = 7
+
+def make_rows(count):
+    start = datetime.datetime(2024, 1, 1, 0, 0, 0)
+    return [
+        {
+            'transaction_id': i,
+            'powersupply_id': i % 500,
+            'charging_start': start + datetime.timedelta(minutes=i),
+            'charging_end': start + datetime.timedelta(minutes=i + 45),
+            'charged_amount': decimal.Decimal('12.34'),
+            'billing_amount': 1200,
+            'app_user_number': f"{i:010d}",
+            'station_name': f"ステーション{i % 100}",
+            'app_powersupply_number': f"{i:012d}",
+            'powersupply_name': f"充電器{i % 500}",
+        }
+        for i in range(count)
+    ]
+
+def legacy_datetime_handler(x):
+    if isinstance(x, (datetime.datetime, datetime.date, datetime.time)):
+        return x.isoformat()
+    if isinstance(x, datetime.timedelta):
+        return x.total_seconds()
+    raise TypeError("Unknown type")
+
+def measure(app, func, setup):
+    timings = []
+    size = 0
+    for _ in range(REPEAT):
+        # ルーターは取得した行を直接書き換えるため、毎回新しい行を用意する（計測対象外）
+        rows = setup()
+        with app.test_request_context():
+            started = time.perf_counter()
+            response = func(rows)
+            size = len(response.get_data())
+            timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), size
+
+def main():
+    default_app = Flask('default')
+    fast_app = Flask('fast')
+    fast_app.json = FastJSONProvider(fast_app)
+
+    print(f"{'rows':>7} {'loop ms':>9} {'double ms':>10} {'fast ms':>8} {'speedup':>8} {'rows/s (fast)':>14}")
+    for size in SIZES:
+        base_rows = make_rows(size)
+        # json.dumpsのdefaultはDecimalを扱えないため、旧実装の経路は文字列に変換済みの行で計測する
+        legacy_rows = [dict(row, charged_amount=str(row['charged_amount'])) for row in base_rows]
+
+        def loop(rows):
+            for record in rows:
+                record['charging_start'] = record['charging_start'].isoformat() if record['charging_start'] else None
+                record['charging_end'] = record['charging_end'].isoformat() if record['charging_end'] else None
+            return jsonify({'resultCode': 'success', 'data': rows})
+
+        def double(rows):
+            rows = json.loads(json.dumps(rows, default=legacy_datetime_handler))
+            return jsonify({'resultCode': 'success', 'data': rows})
+
+        def fast(rows):
+            return jsonify({'resultCode': 'success', 'data': rows})
+
+        loop_ms, _ = measure(default_app, loop, lambda: [dict(row) for row in base_rows])
+        double_ms, _ = measure(default_app, double, lambda: legacy_rows)
+        fast_ms, _ = measure(fast_app, fast, lambda: base_rows)
+
+        print(f"{size:>7} {loop_ms:>9.1f} {double_ms:>10.1f} {fast_ms:>8.1f} "
+              f"{loop_ms / fast_ms:>7.1f}x {size / fast_ms * 1000:>14,.0f}")
+
+if __name__ == '__main__':
+    main()
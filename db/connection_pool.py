@@ -0,0 +1,213 @@
+import time
+import logging
+import threading
+from collections import deque
+
+# logger settings
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+class PoolTimeoutError(Exception):
+    """接続プールから時間内に接続を取得できなかった場合の例外"""
+    pass
+
+class PooledConnection:
+    """プールが管理する接続と、その作成・利用時刻"""
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+
+class ConnectionPool:
+    """
+    スレッドセーフな上限付きの接続プール。
+
+    Args:
+        connect (callable): 新しい接続を作成する関数
+        min_size (int): prefill()で事前に作成し、アイドル接続の削除後も維持する最小接続数
+        max_size (int): 同時に保持する最大接続数
+        timeout (float): 接続の取得を待機する最大秒数
+        idle_timeout (float): アイドル接続を削除するまでの秒数
+        max_lifetime (float): 接続を作り直すまでの最大秒数
+        ping_interval (float): 払い出し時に死活確認を行うアイドル秒数
+    """
+    def __init__(self, connect, min_size=1, max_size=10, timeout=10.0,
+                 idle_timeout=300.0, max_lifetime=3600.0, ping_interval=30.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"不正なプールサイズです: min_size={min_size}, max_size={max_size}")
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'closed': 0,
+            'idle_evictions': 0,
+            'lifetime_recycles': 0,
+            'peak_in_use': 0,
+            'wait_seconds': 0.0,
+        }
+
+    def acquire(self):
+        """プールから接続を取得する。上限に達している場合は空きを待機する"""
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeoutError("接続プールは終了しています")
+
+                self._evict_locked()
+                if self._idle:
+                    pooled = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    pooled = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f"{self.timeout}秒以内に接続を取得できませんでした (max_size={self.max_size})"
+                    )
+                if not waited:
+                    waited = True
+                    self._stats['waits'] += 1
+                wait_started = time.monotonic()
+                self._cond.wait(remaining)
+                self._stats['wait_seconds'] += time.monotonic() - wait_started
+
+            self._stats['checkouts'] += 1
+            in_use = self._size - len(self._idle)
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], in_use)
+
+        if pooled is not None:
+            pooled = self._validate(pooled)
+            if pooled is not None:
+                return pooled
+        return self._create()
+
+    def prefill(self):
+        """
+        接続数がmin_sizeに達するまで接続を作成し、アイドル接続として保持する。
+
+        起動直後の最初のリクエストが接続の確立を待たないようにするために使用する。
+        接続に失敗した場合はログに記録して中断し、以降は通常どおり取得時に作成する。
+
+        Returns:
+            int: 作成した接続数
+        """
+        created = 0
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return created
+                self._size += 1
+            try:
+                pooled = self._create()
+            except Exception as e:
+                logger.warning(f"接続プールの事前作成に失敗しました: {str(e)}")
+                return created
+            created += 1
+            self.release(pooled)
+
+    def release(self, pooled, discard=False):
+        """接続をプールに返却する。discardがTrueの場合は破棄する"""
+        now = time.monotonic()
+        with self._cond:
+            expired = now - pooled.created_at >= self.max_lifetime
+            if discard or expired or self._closed:
+                if expired and not discard:
+                    self._stats['lifetime_recycles'] += 1
+                self._close_locked(pooled)
+            else:
+                pooled.last_used_at = now
+                self._idle.append(pooled)
+            self._cond.notify()
+
+    def close(self):
+        """全てのアイドル接続を閉じ、以降の取得を拒否する"""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._close_locked(self._idle.popleft())
+            self._cond.notify_all()
+
+    def stats(self):
+        """プールの利用状況を返す"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.max_size,
+                'saturation': (self._size - len(self._idle)) / self.max_size,
+            })
+            return stats
+
+    def _create(self):
+        """空き枠を確保済みの状態で新しい接続を作成する"""
+        try:
+            connection = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['created'] += 1
+        return PooledConnection(connection)
+
+    def _validate(self, pooled):
+        """しばらく使われていない接続の死活確認を行う。無効な場合はNoneを返す"""
+        if time.monotonic() - pooled.last_used_at < self.ping_interval:
+            return pooled
+        try:
+            pooled.connection.ping(reconnect=False)
+            return pooled
+        except Exception as e:
+            logger.warning(f"プール内の接続が無効のため破棄します: {str(e)}")
+            with self._cond:
+                self._close_locked(pooled)
+                # 作り直す分の枠を確保する
+                self._size += 1
+            return None
+
+    def _evict_locked(self):
+        """アイドル時間・寿命を超えた接続を最小接続数まで削除する"""
+        now = time.monotonic()
+        kept = deque()
+        while self._idle:
+            pooled = self._idle.popleft()
+            if now - pooled.created_at >= self.max_lifetime:
+                self._stats['lifetime_recycles'] += 1
+                self._close_locked(pooled)
+            elif now - pooled.last_used_at >= self.idle_timeout and self._size > self.min_size:
+                self._stats['idle_evictions'] += 1
+                self._close_locked(pooled)
+            else:
+                kept.append(pooled)
+        self._idle = kept
+
+    def _close_locked(self, pooled):
+        self._size -= 1
+        self._stats['closed'] += 1
+        try:
+            pooled.connection.close()
+        except Exception:
+            pass
@@ -1,12 +1,29 @@
 import os
 import logging
+import threading
 import pymysql
 from contextlib import contextmanager
+from db.connection_pool import ConnectionPool
 
 # logger settings
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# 接続モード
+# per_request: リクエストごとに接続を作成・切断する（従来の動作）
+# reuse: ウォーム状態のLambdaで接続を使い回す
+# pool: スレッド化されたサーバー向けに接続プールを利用する
+CONNECTION_MODE_PER_REQUEST = 'per_request'
+CONNECTION_MODE_REUSE = 'reuse'
+CONNECTION_MODE_POOL = 'pool'
+CONNECTION_MODES = (CONNECTION_MODE_PER_REQUEST, CONNECTION_MODE_REUSE, CONNECTION_MODE_POOL)
+
+def default_connection_mode():
+    """Lambda上では接続の再利用、それ以外では接続プールを既定とする"""
+    if os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+        return CONNECTION_MODE_REUSE
+    return CONNECTION_MODE_POOL
+
 class DBConnection:
     def __init__(self):
         self.host = os.environ['END_POINT']
@@ -14,6 +31,21 @@ class DBConnection:
         self.password = os.environ['PASSWORD']
         self.db = os.environ['DB_NAME']
         self.port = int(os.environ['PORT'])
+        self.mode = os.environ.get('DB_CONNECTION_MODE', default_connection_mode())
+        if self.mode not in CONNECTION_MODES:
+            raise ValueError(f"不正なDB_CONNECTION_MODEです: {self.mode}")
+        self._pool = None
+
+        # 再利用モードで保持する接続
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_in_use = False
+        self._stats = {
+            'connects': 0,
+            'hits': 0,
+            'reconnects': 0,
+            'failures': 0,
+        }
 
     def connect(self):
         """データベース接続を作成する"""
@@ -26,15 +58,108 @@ class DBConnection:
                 port=self.port,
                 connect_timeout=60
             )
+            self._count('connects')
             logger.info("データベースへの接続に成功しました")
             return connection
         except Exception as e:
+            self._count('failures')
             logger.error(f"データベース接続中にエラーが発生しました: {str(e)}")
             raise
 
+    def stats(self):
+        """接続の再利用状況を返す"""
+        with self._lock:
+            stats = dict(self._stats)
+        if self._pool is not None:
+            stats['pool'] = self._pool.stats()
+        return stats
+
+    def get_pool(self):
+        """接続プールを取得する。初回呼び出し時に環境変数の設定で作成する"""
+        with self._lock:
+            if self._pool is not None:
+                return self._pool
+            self._pool = ConnectionPool(
+                self.connect,
+                min_size=int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+                max_size=int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+                timeout=float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+                idle_timeout=float(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300)),
+                max_lifetime=float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600))
+            )
+            pool = self._pool
+        # connect()がロックを取得するため、最小接続数の作成はロックの外で行う
+        pool.prefill()
+        return pool
+
+    def prewarm_pool(self):
+        """接続プールモードの場合、最初のリクエストより前に最小接続数の接続を作成する"""
+        if self.mode == CONNECTION_MODE_POOL:
+            self.get_pool()
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _acquire_reusable(self):
+        """保持している接続を検証して払い出す。使用中の場合はNoneを返す"""
+        with self._lock:
+            if self._connection_in_use:
+                return None
+            self._connection_in_use = True
+            conn = self._connection
+
+        try:
+            if conn is not None:
+                try:
+                    # 軽量な死活確認。切断されていれば作り直す
+                    conn.ping(reconnect=False)
+                    # 前回リクエストのトランザクション状態を持ち越さない
+                    conn.rollback()
+                    self._count('hits')
+                    return conn
+                except Exception as e:
+                    logger.warning(f"保持している接続が無効のため再接続します: {str(e)}")
+                    self._discard(conn)
+                    self._count('reconnects')
+
+            conn = self.connect()
+            with self._lock:
+                self._connection = conn
+            return conn
+        except Exception:
+            self._release_reusable(None)
+            raise
+
+    def _release_reusable(self, conn):
+        with self._lock:
+            if conn is None:
+                self._connection = None
+            self._connection_in_use = False
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
     @contextmanager
     def get_connection(self):
         """コンテキストマネージャーとしてデータベース接続を提供する"""
+        if self.mode == CONNECTION_MODE_POOL:
+            with self._pooled_connection() as conn:
+                yield conn
+            return
+
+        if self.mode == CONNECTION_MODE_REUSE:
+            conn = self._acquire_reusable()
+            if conn is not None:
+                with self._reused_connection(conn) as reused:
+                    yield reused
+                return
+            # 同一プロセス内で接続が使用中の場合は従来どおり個別に接続する
+
         conn = None
         try:
             conn = self.connect()
@@ -49,5 +174,51 @@ class DBConnection:
                 conn.close()
                 logger.info("データベース接続を終了しました")
 
+    @contextmanager
+    def _reused_connection(self, conn):
+        """再利用する接続でのコミット・ロールバックを行う"""
+        healthy = True
+        try:
+            yield conn
+            conn.commit()
+        except BaseException as e:
+            # GeneratorExitなどで中断された場合もトランザクションを持ち越さない
+            try:
+                conn.rollback()
+            except Exception:
+                # ロールバックできない接続は次回に持ち越さない
+                healthy = False
+            if isinstance(e, pymysql.err.OperationalError):
+                healthy = False
+            raise
+        finally:
+            if not healthy:
+                self._discard(conn)
+                self._count('failures')
+                logger.info("データベース接続を破棄しました")
+            self._release_reusable(conn if healthy else None)
+
+    @contextmanager
+    def _pooled_connection(self):
+        """接続プールから取得した接続でのコミット・ロールバックを行う"""
+        pool = self.get_pool()
+        pooled = pool.acquire()
+        conn = pooled.connection
+        healthy = True
+        try:
+            yield conn
+            conn.commit()
+        except BaseException as e:
+            # GeneratorExitなどで中断された場合もトランザクションを持ち越さない
+            try:
+                conn.rollback()
+            except Exception:
+                healthy = False
+            if isinstance(e, pymysql.err.OperationalError):
+                healthy = False
+            raise
+        finally:
+            pool.release(pooled, discard=not healthy)
+
 # シングルトンインスタンスを作成
-db = DBConnection()
\ No newline at end of file
+db = DBConnection()
@@ -0,0 +1,27 @@
+-- 充電履歴の日次集計（充電器ごと・日ごと）
+CREATE TABLE IF NOT EXISTS t_charge_daily_summary (
+    powersupply_id INT NOT NULL,
+    summary_date DATE NOT NULL,
+    session_count INT NOT NULL DEFAULT 0,
+    charged_amount DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    billing_amount BIGINT NOT NULL DEFAULT 0,
+    updated_at DATETIME NOT NULL,
+    PRIMARY KEY (powersupply_id, summary_date),
+    KEY idx_summary_date (summary_date)
+);
+
+-- 充電履歴の行ごとの最終変更日時（追加時と、どの処理からの更新でもMySQLが設定する）。
+-- 日次集計の差分更新で、追加された履歴に加えて修正された履歴の日付も再集計するために使用する
+ALTER TABLE t_charge_history
+    ADD COLUMN row_updated_at TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6),
+    ADD KEY idx_row_updated_at (row_updated_at);
+
+-- 差分更新の進捗（どの変更日時まで集計に反映したか）
+CREATE TABLE IF NOT EXISTS t_charge_summary_state (
+    summary_name VARCHAR(64) NOT NULL PRIMARY KEY,
+    last_changed_at TIMESTAMP(6) NULL,
+    refreshed_at DATETIME NULL
+);
+
+INSERT IGNORE INTO t_charge_summary_state (summary_name, last_changed_at)
+VALUES ('charge_daily_summary', NULL);
@@ -0,0 +1,6 @@
+-- 一意の番号（app_user_number等）の採番カウンター
+-- sequence_nameは「テーブル名.カラム名」、next_valueは次に予約する範囲の先頭
+CREATE TABLE IF NOT EXISTS m_id_sequence (
+    sequence_name VARCHAR(128) NOT NULL PRIMARY KEY,
+    next_value BIGINT NOT NULL DEFAULT 0
+);
@@ -0,0 +1,16 @@
+-- 代理店ごとのapp_location_numberの採番カウンター
+-- last_numberは最後に払い出した代理店内の連番（app_location_numberの代理店ID以降の部分）
+CREATE TABLE IF NOT EXISTS m_location_sequence (
+    agency_id INT NOT NULL PRIMARY KEY,
+    last_number INT NOT NULL DEFAULT 0
+);
+
+-- すべての代理店のカウンターを、登録済みのステーションから求めた初期値で作成する
+-- 実行時にm_locationから初期値を求める必要をなくし、最初の採番でのロックの競合（デッドロック）を避ける
+-- 以降に登録する代理店の行は agency_register で作成する
+INSERT INTO m_location_sequence (agency_id, last_number)
+SELECT a.agency_id, COALESCE(MAX(CAST(SUBSTRING(l.app_location_number, LENGTH(a.agency_id) + 1) AS UNSIGNED)), 0)
+FROM m_agency a
+LEFT JOIN m_location l ON l.agency_id = a.agency_id
+GROUP BY a.agency_id
+ON DUPLICATE KEY UPDATE last_number = GREATEST(last_number, VALUES(last_number));
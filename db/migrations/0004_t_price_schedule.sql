@@ -0,0 +1,19 @@
+-- 充電器・ステーションの料金変更の予約
+-- powersupply_idまたはlocation_idのいずれか一方を指定する（location_idの場合はステーションの全充電器が対象）
+-- status: 0=未適用 1=適用済み 2=同じ対象のより新しい予約と同時に適用時刻を迎えたため適用しなかった
+CREATE TABLE IF NOT EXISTS t_price_schedule (
+    schedule_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    powersupply_id INT NULL,
+    location_id INT NULL,
+    price INT NOT NULL,
+    effective_from DATETIME NOT NULL,
+    status TINYINT NOT NULL DEFAULT 0,
+    applied_at DATETIME NULL,
+    create_date DATETIME NOT NULL,
+    create_user VARCHAR(64) NOT NULL,
+    update_date DATETIME NOT NULL,
+    update_user VARCHAR(64) NOT NULL,
+    KEY idx_status_effective_from (status, effective_from, schedule_id),
+    KEY idx_powersupply_id (powersupply_id),
+    KEY idx_location_id (location_id)
+);
@@ -0,0 +1,16 @@
+-- ダッシュボードユーザー登録の進捗（仮登録 → Cognitoへの登録 → 有効化）
+-- status: pending=Cognitoへの登録待ち completed=完了 compensated=取り消し済み
+-- pendingのまま残った登録は jobs.user_registration_recovery が完了または取り消す
+CREATE TABLE IF NOT EXISTS t_user_registration (
+    registration_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    user_category INT NOT NULL,
+    cognito_username VARCHAR(128) NOT NULL,
+    status VARCHAR(16) NOT NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    error VARCHAR(1000) NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    KEY idx_status_updated_at (status, updated_at),
+    KEY idx_user_id (user_id)
+);
@@ -0,0 +1,18 @@
+-- データベースの変更に続けて行うCognitoの操作（アウトボックス）
+-- 変更と同じトランザクションで登録し、jobs.cognito_outbox_worker が処理する
+-- operation: delete_user=ユーザーの削除（m_user.status = 3）
+-- status: pending=未処理（next_attempt_at以降に再試行） done=完了 failed=失敗 canceled=処理前にユーザーが有効に戻された
+CREATE TABLE IF NOT EXISTS t_cognito_outbox (
+    outbox_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    operation VARCHAR(32) NOT NULL,
+    user_id INT NOT NULL,
+    email VARCHAR(255) NULL,
+    status VARCHAR(16) NOT NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at DATETIME NOT NULL,
+    last_error VARCHAR(1000) NULL,
+    created_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    KEY idx_status_next_attempt_at (status, next_attempt_at),
+    KEY idx_user_id (user_id)
+);
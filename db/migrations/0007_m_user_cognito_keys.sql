@@ -0,0 +1,8 @@
+-- Cognitoのユーザーを直接指定するためのキー（ユーザー名・sub）
+-- 登録時に設定し、既存のユーザーは jobs.cognito_user_backfill で custom:ech_nav_code をもとに設定する
+-- 未設定（NULL）のユーザーは、メールアドレスで検索する従来の処理で扱う
+ALTER TABLE m_user
+    ADD COLUMN cognito_username VARCHAR(128) NULL,
+    ADD COLUMN cognito_sub VARCHAR(64) NULL,
+    ADD UNIQUE KEY uk_cognito_sub (cognito_sub),
+    ADD KEY idx_cognito_username (cognito_username);
@@ -0,0 +1,35 @@
+"""
+Scheduled refresh of the daily charge rollup (t_charge_daily_summary).
+
+Without arguments only the days that changed since the previous run are
+rebuilt. A date range rebuilds every day in it, e.g. after a correction to
+old charge history:
+
+    python -m jobs.charge_summary_refresh [start_date end_date]
+"""
+import sys
+import datetime
+import logging
+from db.db_connection import db
+from utils.charge_summary import refresh_charge_summary
+
+# logger settings
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def _parse_date(value):
+    return datetime.date.fromisoformat(value) if value else None
+
+def handler(event, context):
+    event = event or {}
+    with db.get_connection() as conn:
+        return refresh_charge_summary(
+            conn,
+            start_date=_parse_date(event.get('start_date')),
+            end_date=_parse_date(event.get('end_date'))
+        )
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    args = sys.argv[1:]
+    print(handler(dict(zip(('start_date', 'end_date'), args)), None))
@@ -0,0 +1,31 @@
+"""
+Worker for the Cognito outbox (t_cognito_outbox).
+
+Runs on a schedule and processes every entry that is due, retrying failed
+ones with backoff:
+
+    python -m jobs.cognito_outbox_worker
+"""
+import os
+import logging
+from db.db_connection import db
+from utils.aws_clients import get_cognito_client
+from utils.cognito_outbox import process_cognito_outbox
+
+# logger settings
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def handler(event, context):
+    event = event or {}
+    with db.get_connection() as conn:
+        return process_cognito_outbox(
+            conn,
+            get_cognito_client(),
+            os.environ['COGNITO_USER_POOL_ID'],
+            limit=int(event.get('limit', 100))
+        )
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    print(handler({}, None))
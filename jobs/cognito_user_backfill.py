@@ -0,0 +1,38 @@
+"""
+Backfill of m_user.cognito_username / cognito_sub from the Cognito user pool.
+
+Run once after applying db/migrations/0007_m_user_cognito_keys.sql. It is
+idempotent and can be resumed from the pagination token it prints:
+
+    python -m jobs.cognito_user_backfill [max_pages] [pagination_token]
+"""
+import os
+import sys
+import logging
+from db.db_connection import db
+from utils.aws_clients import get_cognito_client
+from utils.cognito_users import backfill_cognito_users
+
+# logger settings
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def handler(event, context):
+    event = event or {}
+    with db.get_connection() as conn:
+        return backfill_cognito_users(
+            conn,
+            get_cognito_client(),
+            os.environ['COGNITO_USER_POOL_ID'],
+            pagination_token=event.get('pagination_token'),
+            max_pages=int(event['max_pages']) if event.get('max_pages') else None
+        )
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    event = {}
+    if len(sys.argv) > 1:
+        event['max_pages'] = sys.argv[1]
+    if len(sys.argv) > 2:
+        event['pagination_token'] = sys.argv[2]
+    print(handler(event, None))
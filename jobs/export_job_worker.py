@@ -0,0 +1,28 @@
+"""
+Worker entry point that runs a queued export job.
+
+Invoked asynchronously by the export_job_submit endpoint, or from the command
+line for a job that has to be re-run:
+
+    python -m jobs.export_job_worker <job_id>
+"""
+import sys
+import logging
+from utils.export_jobs import run_export_job
+
+# logger settings
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def handler(event, context):
+    job_id = event['export_job_id']
+    job = run_export_job(job_id)
+    return {
+        'job_id': job_id,
+        'status': job['status'] if job else None
+    }
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    job = run_export_job(sys.argv[1])
+    print(job['status'] if job else 'not found')
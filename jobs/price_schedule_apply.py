@@ -0,0 +1,27 @@
+"""
+Scheduled application of future-dated charge fees (t_price_schedule).
+
+Every schedule whose effective_from has passed is applied to
+m_powersupply.price in batches. A date-time argument applies the schedules
+due at that time instead of now:
+
+    python -m jobs.price_schedule_apply ["YYYY-MM-DD HH:MM:SS"]
+"""
+import sys
+import logging
+from db.db_connection import db
+from utils.charge_fee import apply_due_price_schedules
+
+# logger settings
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def handler(event, context):
+    event = event or {}
+    with db.get_connection() as conn:
+        return apply_due_price_schedules(conn, now=event.get('now'))
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    args = sys.argv[1:]
+    print(handler({'now': args[0]} if args else {}, None))
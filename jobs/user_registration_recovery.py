@@ -0,0 +1,31 @@
+"""
+Scheduled recovery of dashboard user registrations left pending.
+
+A registration that stayed pending longer than REGISTRATION_PENDING_TIMEOUT
+seconds is completed when its Cognito user exists, and rolled back otherwise:
+
+    python -m jobs.user_registration_recovery
+"""
+import os
+import logging
+from db.db_connection import db
+from utils.aws_clients import get_cognito_client
+from utils.user_registration import recover_registrations
+
+# logger settings
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def handler(event, context):
+    event = event or {}
+    with db.get_connection() as conn:
+        return recover_registrations(
+            conn,
+            get_cognito_client(),
+            os.environ['COGNITO_USER_POOL_ID'],
+            timeout=event.get('timeout')
+        )
+
+if __name__ == '__main__':
+    logging.basicConfig()
+    print(handler({}, None))
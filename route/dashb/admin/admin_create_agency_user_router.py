@@ -3,6 +3,7 @@ import logging
 import pymysql
 from response.response_base import create_success_response, create_error_response
 from db.db_connection import db
+from utils.user_identity import resolve_user_identity, invalidate_user_identity
 
 # logger settings
 logger = logging.getLogger()
@@ -29,24 +30,18 @@ def admin_create_agency_user():
     try:
         with db.get_connection() as conn:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                # app_user_numberからuser_idを取得
-                user_id_query = "SELECT user_id FROM m_user WHERE app_user_number = %s"
-                cursor.execute(user_id_query, (app_user_number,))
-                result = cursor.fetchone()
+                # app_user_numberからユーザーの識別情報を取得
+                identity = resolve_user_identity(cursor, app_user_number)
                 
-                if not result:
+                if not identity:
                     return jsonify(create_error_response(
                         "指定されたapp_user_numberに対応するユーザーが見つかりません",
                         None
                     )), 404
-                user_id = result['user_id']
+                user_id = identity['user_id']
                 
                 # レコードの存在確認
-                check_query = "SELECT * FROM m_user_agency WHERE user_id = %s"
-                cursor.execute(check_query, (user_id,))
-                existing_record = cursor.fetchone()
-
-                if existing_record:
+                if identity['has_agency']:
                     # レコードが存在する場合はUPDATE
                     update_query = """
                     UPDATE m_user_agency
@@ -64,6 +59,9 @@ def admin_create_agency_user():
                     cursor.execute(insert_query, (user_id, agency_id, 7, 'admin_user'))
                     logger.info(f"Inserted new record TO m_user_agency")
 
+                conn.commit()
+                invalidate_user_identity(app_user_number)
+
                 return jsonify(create_success_response(
                     "User agency information updated successfully.",
                     {"app_user_number": app_user_number, "agency_id": agency_id}
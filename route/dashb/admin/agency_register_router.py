@@ -53,7 +53,13 @@ def agency_register():
                 if not result:
                     raise ValueError("Failed to retrieve the inserted agency_id")
                 agency_id = result['agency_id']
-                
+
+                # app_location_numberの採番カウンターを同じトランザクションで作成する
+                cursor.execute(
+                    "INSERT IGNORE INTO m_location_sequence (agency_id, last_number) VALUES (%s, 0);",
+                    (agency_id,)
+                )
+
                 logger.info("Agency data was successfully registered in the database.")
                 return jsonify(create_success_response(
                     "Agency data was successfully registered in the database.",
@@ -0,0 +1,105 @@
+from flask import Blueprint, jsonify, request
+import logging
+import os
+from botocore.exceptions import ClientError
+from response.response_base import create_success_response, create_error_response
+from utils.utils import calculate_secret_hash
+from utils.aws_clients import get_cognito_client
+from utils.app_user_token import read_app_user_token
+from utils.cognito_auth import get_verifier, AuthenticationError
+
+# Logger settings
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+agency_token_refresh_router = Blueprint('agency_token_refresh', __name__)
+
+@agency_token_refresh_router.route('/agency_token_refresh', methods=['POST'])
+def agency_token_refresh():
+    """
+    リフレッシュトークンでアクセストークンを更新します。
+
+    ログイン時に返したappUserTokenからapp_user_numberを取り出すため、
+    Cognitoのユーザー属性の取得やデータベースの参照は行いません。
+    """
+    try:
+        # リクエストボディから情報を取得
+        body = request.get_json(silent=True)
+        if not body or not body.get('refreshToken') or not body.get('appUserToken'):
+            return jsonify(create_error_response(
+                "refreshTokenとappUserTokenは必須です",
+                None
+            )), 400
+
+        client_id = os.environ['COGNITO_CLIENT_ID']
+        client_secret = os.environ['COGNITO_CLIENT_SECRET']
+        cognito_client = get_cognito_client()
+
+    except Exception as e:
+        logger.error(f"パラメータまたは環境変数の取得に失敗しました: {str(e)}")
+        return jsonify(create_error_response("パラメータまたは環境変数の取得に失敗しました", str(e))), 500
+
+    try:
+        app_user = read_app_user_token(body['appUserToken'], 4)
+    except ValueError as e:
+        logger.info(f"appUserTokenが無効です: {str(e)}")
+        return jsonify(create_error_response(
+            "再度ログインしてください[E003]",
+            str(e)
+        )), 401
+
+    try:
+        auth_response = cognito_client.initiate_auth(
+            AuthFlow='REFRESH_TOKEN_AUTH',
+            AuthParameters={
+                'REFRESH_TOKEN': body['refreshToken'],
+                'SECRET_HASH': calculate_secret_hash(app_user['username'], client_id, client_secret)
+            },
+            ClientId=client_id
+        )
+        authentication_result = auth_response['AuthenticationResult']
+
+        # appUserTokenが別のユーザーのリフレッシュトークンと組み合わされていないことを確認する
+        claims = get_verifier().verify(authentication_result['AccessToken'])
+        if claims.get('username') != app_user['username']:
+            raise AuthenticationError("appUserTokenとリフレッシュトークンのユーザーが一致しません")
+
+    except cognito_client.exceptions.NotAuthorizedException:
+        logger.info("リフレッシュトークンが無効です")
+        return jsonify(create_error_response(
+            "再度ログインしてください[E003]",
+            None
+        )), 401
+
+    except AuthenticationError as e:
+        logger.warning(f"更新したアクセストークンの検証に失敗しました: {str(e)}")
+        return jsonify(create_error_response(
+            "再度ログインしてください[E003]",
+            str(e)
+        )), 401
+
+    except ClientError as e:
+        logger.error(f"Cognito エラー: {str(e)}")
+        return jsonify(create_error_response(
+            "トークンの更新中にエラーが発生しました",
+            str(e)
+        )), 500
+
+    except Exception as e:
+        logger.error(f"トークンの更新中にエラーが発生しました: {str(e)}")
+        return jsonify(create_error_response(
+            "トークンの更新中にエラーが発生しました",
+            str(e)
+        )), 500
+
+    logger.info("アクセストークンを更新しました")
+    return jsonify(create_success_response(
+        "アクセストークンを更新しました",
+        {
+            "app_user_number": app_user['app_user_number'],
+            "accessToken": authentication_result['AccessToken'],
+            # リフレッシュトークンのローテーションが有効な場合のみ新しいトークンが返される
+            "refreshToken": authentication_result.get('RefreshToken', body['refreshToken']),
+            "expiresIn": authentication_result.get('ExpiresIn')
+        }
+    )), 200
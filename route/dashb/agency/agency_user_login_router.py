@@ -3,7 +3,6 @@ import json
 import logging
 import pymysql
 import os
-import boto3
 from botocore.exceptions import ClientError
 import re
 import hmac
@@ -12,16 +11,39 @@ import hashlib
 from response.response_base import create_success_response, create_error_response
 from db.db_connection import db
 from utils.utils import format_phone_number, calculate_secret_hash
+from utils.aws_clients import get_cognito_client
+from utils.concurrency import run_in_background, discard
+from utils.app_user_token import issue_app_user_token
 
 # Logger settings
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Cognito client
-cognito_client = boto3.client('cognito-idp')
-
 agency_user_login_router = Blueprint('agency_user_login', __name__)
 
+def find_app_user_number(ech_nav_code):
+    """
+    echナビコードから代理店ユーザーのapp_user_numberを取得します。
+    Cognitoの認証と並行して実行するため、リクエストコンテキストに依存しません。
+
+    Args:
+        ech_nav_code (str): echナビコード
+
+    Returns:
+        str: app_user_number。該当するユーザーがいない場合はNone
+    """
+    with db.get_connection() as conn:
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+            user_query = """
+            SELECT app_user_number 
+            FROM m_user
+            WHERE echnavicode = %s
+            AND user_category = 4;
+            """
+            cursor.execute(user_query, (ech_nav_code,))
+            result = cursor.fetchone()
+            return result['app_user_number'] if result else None
+
 @agency_user_login_router.route('/agency_user_login', methods=['POST'])
 def agency_user_login():
     try:
@@ -41,6 +63,7 @@ def agency_user_login():
         user_pool_id = os.environ['COGNITO_USER_POOL_ID']
         client_id = os.environ['COGNITO_CLIENT_ID']
         client_secret = os.environ['COGNITO_CLIENT_SECRET']
+        cognito_client = get_cognito_client()
 
     except Exception as e:
         logger.error(f"パラメータまたは環境変数の取得に失敗しました: {str(e)}")
@@ -69,52 +92,35 @@ def agency_user_login():
                     None
                 )), 200
 
+            # echナビコードの取得
+            ech_nav_code = attributes.get('custom:ech_nav_code')
+            logger.info(f"Ech nav code: {ech_nav_code}")
+
+            # 認証と並行してapp_user_numberを取得する
+            user_future = run_in_background(find_app_user_number, ech_nav_code) if ech_nav_code else None
+
             # 電話番号が認証済みの場合、認証を試行
-            auth_response = cognito_client.initiate_auth(
-                AuthFlow='USER_PASSWORD_AUTH',
-                AuthParameters={
-                    'USERNAME': formatted_phone,
-                    'PASSWORD': password,
-                    'SECRET_HASH': secret_hash
-                },
-                ClientId=client_id
-            )
+            try:
+                auth_response = cognito_client.initiate_auth(
+                    AuthFlow='USER_PASSWORD_AUTH',
+                    AuthParameters={
+                        'USERNAME': formatted_phone,
+                        'PASSWORD': password,
+                        'SECRET_HASH': secret_hash
+                    },
+                    ClientId=client_id
+                )
+            except Exception:
+                # 認証に失敗した場合、データベースの結果は使用しない
+                discard(user_future)
+                raise
             logger.info("認証に成功しました")
 
-            # echナビコードの取得
-            ech_nav_code = next((attr['Value'] for attr in user_info['UserAttributes'] if attr['Name'] == 'custom:ech_nav_code'), None)
-            logger.info(f"Ech nav code: {ech_nav_code}")
-            
             if not ech_nav_code:
                 raise ValueError("custom:ech_nav_code not found in user attributes")
 
-            # MySQLに接続して処理を続行
             try:
-                with db.get_connection() as conn:
-                    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                        user_query = """
-                        SELECT app_user_number 
-                        FROM m_user
-                        WHERE echnavicode = %s
-                        AND user_category = 4;
-                        """
-                        cursor.execute(user_query, (ech_nav_code,))
-                        result = cursor.fetchone()
-                        
-                        if result:
-                            return jsonify(create_success_response(
-                                "ログインに成功しました",
-                                {
-                                    "app_user_number": result['app_user_number'],
-                                    "accessToken": auth_response['AuthenticationResult']['AccessToken']
-                                }
-                            )), 200
-                        else:
-                            return jsonify(create_error_response(
-                                "ユーザーが見つかりません[E002]",
-                                None
-                            )), 404
-
+                app_user_number = user_future.result()
             except Exception as db_error:
                 logger.error(f"データベースエラー: {str(db_error)}")
                 return jsonify(create_error_response(
@@ -122,6 +128,25 @@ def agency_user_login():
                     str(db_error)
                 )), 500
 
+            if app_user_number is None:
+                return jsonify(create_error_response(
+                    "ユーザーが見つかりません[E002]",
+                    None
+                )), 404
+
+            # アクセストークンの更新（agency_token_refresh）でDBを参照せずに済むよう、
+            # app_user_numberを署名付きトークンとして返す
+            authentication_result = auth_response['AuthenticationResult']
+            return jsonify(create_success_response(
+                "ログインに成功しました",
+                {
+                    "app_user_number": app_user_number,
+                    "accessToken": authentication_result['AccessToken'],
+                    "refreshToken": authentication_result.get('RefreshToken'),
+                    "appUserToken": issue_app_user_token(user_info['Username'], app_user_number, 4)
+                }
+            )), 200
+
         except cognito_client.exceptions.NotAuthorizedException:
             logger.info("電話番号またはパスワードが無効です[E001]")
             return jsonify(create_error_response(
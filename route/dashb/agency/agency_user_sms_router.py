@@ -3,10 +3,10 @@ import logging
 import pymysql
 import os
 from response.response_base import create_success_response, create_error_response
-import boto3
 from botocore.exceptions import ClientError
 from db.db_connection import db
 from utils.utils import format_phone_number, calculate_secret_hash
+from utils.aws_clients import get_cognito_client
 
 # Logger settings
 logger = logging.getLogger()
@@ -96,8 +96,8 @@ def agency_user_sms():
         client_id = os.environ['COGNITO_CLIENT_ID']
         client_secret = os.environ['COGNITO_CLIENT_SECRET']
 
-        # Cognitoクライアントの作成
-        cognito_client = boto3.client('cognito-idp')
+        # Cognitoクライアントの取得（プロセス内で共有）
+        cognito_client = get_cognito_client()
 
         try:
             if function_type == 0:
@@ -0,0 +1,238 @@
+from flask import Blueprint, jsonify, request
+import logging
+import pymysql
+from response.response_base import create_success_response, create_error_response
+from db.db_connection import db
+from utils.user_identity import resolve_user_identity
+from utils.bulk_import import read_bulk_rows, validate_row, row_error
+from utils.utils import get_jst_now
+from utils.charge_fee import build_fee_update, insert_price_schedules, parse_effective_from, max_fee_rows
+
+# ロガー設定
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+TARGET_FIELDS = ('powersupply_id', 'location_id')
+
+def validate_fees(rows):
+    """
+    料金変更の各行を検証し、行のインデックスをキーとしたエラーメッセージを返します。
+
+    各行はpriceと、powersupply_idまたはlocation_idのいずれか一方を指定します。
+    同じ対象を複数の行で指定した場合はエラーとします。
+    """
+    errors = {}
+    seen = {}
+    for index, row in enumerate(rows):
+        row_errors = validate_row(row, ['price'], integer_fields=('price',) + TARGET_FIELDS)
+        targets = [field for field in TARGET_FIELDS if row.get(field) not in (None, '')]
+        if len(targets) != 1:
+            row_errors.append("powersupply_idまたはlocation_idのいずれか一方を指定してください")
+        if not row_errors and int(row['price']) < 0:
+            row_errors.append(f"priceは0以上で指定してください: {row['price']}")
+        if not row_errors:
+            target = (targets[0], int(row[targets[0]]))
+            if target in seen:
+                row_errors.append(f"{target[0]} {target[1]} は{seen[target] + 1}行目と重複しています")
+            else:
+                seen[target] = index
+        if row_errors:
+            errors[index] = row_errors
+    return errors
+
+def lock_target_rows(cursor, powersupply_ids, location_ids, agency_id=None, for_update=True):
+    """
+    更新対象の充電器の行をロックし（for_update=Falseの場合はロックしない）、
+    powersupply_id、location_id、現在の料金を取得します。
+    対象ごとの件数の集計に使用します。
+    """
+    conditions = []
+    params = []
+    for column, ids in (('powersupply_id', powersupply_ids), ('location_id', location_ids)):
+        if ids:
+            conditions.append(f"p.{column} IN ({', '.join(['%s'] * len(ids))})")
+            params += ids
+    query = f"""
+    SELECT p.powersupply_id, p.location_id, p.price
+    FROM m_powersupply p
+    {'JOIN m_location l ON l.location_id = p.location_id' if agency_id is not None else ''}
+    WHERE ({' OR '.join(conditions)})
+    """
+    if agency_id is not None:
+        query += "AND l.agency_id = %s\n"
+        params.append(agency_id)
+    cursor.execute(query + ("FOR UPDATE" if for_update else ""), params)
+    return cursor.fetchall()
+
+def schedule_fees(conn, cursor, rows, powersupply_fees, location_fees, effective_from, agency_id=None):
+    """
+    料金の変更を予約します。操作できる充電器がない対象を含む場合は予約せずに行ごとのエラーを返します。
+    """
+    found = set()
+    for row in lock_target_rows(cursor, list(powersupply_fees), list(location_fees), agency_id, for_update=False):
+        found.add(('powersupply_id', row['powersupply_id']))
+        found.add(('location_id', row['location_id']))
+
+    targets = []
+    errors = []
+    for index, row in enumerate(rows):
+        field = 'powersupply_id' if row.get('powersupply_id') not in (None, '') else 'location_id'
+        targets.append((field, int(row[field])))
+        if targets[-1] not in found:
+            errors.append(row_error(index, [f"{field} {targets[-1][1]} の操作できる充電器が見つかりません"]))
+    if errors:
+        return jsonify(create_error_response("入力内容にエラーがあるため予約しませんでした", errors)), 400
+
+    try:
+        insert_price_schedules(cursor, [
+            (target_id, None, powersupply_fees[target_id]) if field == 'powersupply_id'
+            else (None, target_id, location_fees[target_id])
+            for field, target_id in targets
+        ], effective_from, get_jst_now())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    logger.info(f"料金の変更を予約しました: {len(rows)}件 適用日時={effective_from}")
+    return jsonify(create_success_response(
+        "料金情報の変更を予約しました",
+        {
+            "count": len(rows),
+            "effective_from": effective_from,
+            "results": [
+                {"row": index + 1, field: target_id, "price": int(row['price']), "status": "scheduled"}
+                for index, (row, (field, target_id)) in enumerate(zip(rows, targets))
+            ]
+        }
+    )), 200
+
+charge_fee_bulk_update_router = Blueprint('charge_fee_bulk_update', __name__)
+
+@charge_fee_bulk_update_router.route('/charge_fee_bulk_update', methods=['POST'])
+def charge_fee_bulk_update():
+    """
+    複数の充電器・ステーションの料金を一括で変更します。
+
+    JSONの配列、fees（とapp_user_number）を含むオブジェクト、またはCSVを受け付けます。
+    各行はpriceと、powersupply_idまたはlocation_idのいずれか一方を指定します（最大CHARGE_FEE_MAX_ROWS行）。
+    すべての行を先に検証し、1件でもエラーがある場合は変更せずに行ごとのエラーを返します。
+    エラーがない場合は、1つのトランザクションで1回のUPDATEにより変更し、対象ごとの件数を返します。
+    effective_fromを指定した場合は、その日時に適用されるように料金の変更を予約します
+    （jobs.price_schedule_applyが適用します）。
+    """
+    try:
+        rows, options = read_bulk_rows(request, 'fees')
+    except ValueError as e:
+        return jsonify(create_error_response(str(e), None)), 400
+    if len(rows) > max_fee_rows():
+        return jsonify(create_error_response(
+            f"1回に変更できるのは{max_fee_rows()}件までです: {len(rows)}件",
+            None
+        )), 400
+
+    # 入力値の検証
+    errors = validate_fees(rows)
+    if errors:
+        logger.info(f"料金の一括変更の入力にエラーがあります: {len(errors)}件")
+        return jsonify(create_error_response(
+            "入力内容にエラーがあるため変更しませんでした",
+            [row_error(index, errors[index]) for index in sorted(errors)]
+        )), 400
+
+    effective_from = None
+    if options.get('effective_from'):
+        try:
+            effective_from = parse_effective_from(options['effective_from'], get_jst_now())
+        except ValueError as e:
+            return jsonify(create_error_response(str(e), None)), 400
+
+    powersupply_fees = {}
+    location_fees = {}
+    for row in rows:
+        if row.get('powersupply_id') not in (None, ''):
+            powersupply_fees[int(row['powersupply_id'])] = int(row['price'])
+        else:
+            location_fees[int(row['location_id'])] = int(row['price'])
+
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                agency_id = None
+                app_user_number = options.get('app_user_number')
+                if app_user_number:
+                    identity = resolve_user_identity(cursor, app_user_number)
+                    if not identity or not identity['has_agency']:
+                        return jsonify(create_error_response(
+                            "指定されたapp_user_numberに対応する代理店ユーザーが見つかりません",
+                            None
+                        )), 404
+                    agency_id = identity['agency_id']
+
+                if effective_from:
+                    return schedule_fees(conn, cursor, rows, powersupply_fees, location_fees,
+                                         effective_from, agency_id)
+
+                try:
+                    # 対象の行をロックして、対象ごとの件数を集計する
+                    matched = {}
+                    updated = {}
+                    for row in lock_target_rows(cursor, list(powersupply_fees), list(location_fees), agency_id):
+                        if row['powersupply_id'] in powersupply_fees:
+                            target = ('powersupply_id', row['powersupply_id'])
+                            price = powersupply_fees[row['powersupply_id']]
+                        else:
+                            target = ('location_id', row['location_id'])
+                            price = location_fees[row['location_id']]
+                        matched[target] = matched.get(target, 0) + 1
+                        if row['price'] != price:
+                            updated[target] = updated.get(target, 0) + 1
+
+                    total = sum(updated.values())
+                    if total:
+                        query, params = build_fee_update(
+                            list(powersupply_fees.items()), list(location_fees.items()),
+                            get_jst_now(), 'Dashboard', agency_id
+                        )
+                        cursor.execute(query, params)
+                        if cursor.rowcount != total:
+                            # 集計後に追加された充電器などがあった場合。更新自体は有効なため件数だけ記録する
+                            logger.warning(f"更新件数が集計と異なります: 集計={total}件 実際={cursor.rowcount}件")
+                            total = cursor.rowcount
+                        conn.commit()
+                    else:
+                        # 変更がない場合はロックだけを解放する
+                        conn.rollback()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+                results = []
+                for index, row in enumerate(rows):
+                    field = 'powersupply_id' if row.get('powersupply_id') not in (None, '') else 'location_id'
+                    target = (field, int(row[field]))
+                    results.append({
+                        "row": index + 1,
+                        field: target[1],
+                        "price": int(row['price']),
+                        "matched": matched.get(target, 0),
+                        "updated": updated.get(target, 0)
+                    })
+
+                logger.info(f"料金の一括変更に成功しました: 対象={len(rows)}件 更新={total}件")
+                return jsonify(create_success_response(
+                    "料金情報の一括変更に成功しました",
+                    {
+                        "count": len(rows),
+                        "updated": total,
+                        "not_found": sum(1 for result in results if result['matched'] == 0),
+                        "results": results
+                    }
+                )), 200
+
+    except Exception as e:
+        logger.error(f"エラーが発生しました: {str(e)}")
+        return jsonify(create_error_response(
+            "データ更新中にエラーが発生しました",
+            str(e)
+        )), 500
@@ -1,14 +1,35 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
+import itertools
 import logging
 import pymysql
 import os
 from response.response_base import create_success_response, create_error_response
 from db.db_connection import db
+from utils.history_queries import build_download_history_query
+from utils.export_utils import (
+    EXPORT_FORMATS, cursor_columns, gzip_chunks, iter_export_chunks, iter_rows
+)
 
 # logger settings
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+def stream_download_history(query, params, export_format, compress):
+    """
+    サーバーサイドカーソルで履歴を読み込みながらエクスポート形式のチャンクを返す。
+    WSGIサーバーでは逐次送信されるが、Lambda（aws-wsgi）ではレスポンス全体がバッファーされるため、
+    大量の履歴はエクスポートジョブ（export_job）を使用する
+    """
+    with db.get_connection() as conn:
+        with conn.cursor(pymysql.cursors.SSDictCursor) as cursor:
+            cursor.execute(query, params)
+            chunks = iter_export_chunks(iter_rows(cursor), cursor_columns(cursor), export_format)
+            if compress:
+                chunks = gzip_chunks(chunks)
+            for chunk in chunks:
+                yield chunk
+    logger.info("エクスポートの出力が完了しました")
+
 download_history_router = Blueprint('download_history', __name__)
 
 @download_history_router.route('/download_history', methods=['POST'])
@@ -21,9 +42,11 @@ def download_history():
                 "リクエストボディが空です",
                 None
             )), 400
-        
+
         location_id = data.get('location_id')
         powersupply_id = data.get('powersupply_id')
+        export_format = data.get('format')
+        compress = bool(data.get('gzip'))
 
         if not location_id and not powersupply_id:
             return jsonify(create_error_response(
@@ -31,38 +54,38 @@ def download_history():
                 None
             )), 400
 
+        if export_format is not None and export_format not in EXPORT_FORMATS:
+            return jsonify(create_error_response(
+                f"formatには{', '.join(EXPORT_FORMATS)}のいずれかを指定してください",
+                None
+            )), 400
+
+        query, params = build_download_history_query(location_id, powersupply_id)
+
+        # ストリーミング出力（CSV / NDJSON）
+        if export_format:
+            chunks = stream_download_history(query, params, export_format, compress)
+            # クエリのエラーをレスポンス送信前に検出するため、先頭のチャンクを取得しておく
+            first_chunk = next(chunks, b'')
+            headers = {
+                'Content-Disposition': f'attachment; filename="download_history.{export_format}"'
+            }
+            if compress:
+                headers['Content-Encoding'] = 'gzip'
+            return Response(
+                itertools.chain([first_chunk], chunks),
+                status=200,
+                mimetype=None,
+                content_type=EXPORT_FORMATS[export_format],
+                headers=headers
+            )
+
         with db.get_connection() as conn:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                query = """
-                SELECT
-                    t_charge.transaction_id,
-                    t_charge_history.charging_start,
-                    t_charge_history.charging_end,
-                    t_charge_history.charged_amount,
-                    t_charge_history.billing_amount,
-                    m_user.app_user_number,
-                    m_location.station_name,
-                    m_powersupply.app_powersupply_number,
-                    m_powersupply.powersupply_name
-                FROM
-                    t_charge
-                JOIN t_charge_history ON t_charge.transaction_id = t_charge_history.transaction_id
-                JOIN m_user ON t_charge.user_id = m_user.user_id
-                JOIN m_powersupply ON t_charge.powersupply_id = m_powersupply.powersupply_id
-                JOIN m_location ON m_powersupply.location_id = m_location.location_id
-                WHERE {condition} = %s
-                ORDER BY t_charge_history.charging_start DESC;
-                """.format(condition = 'm_location.location_id' if location_id else 't_charge.powersupply_id')
-                
-                cursor.execute(query, (location_id or powersupply_id,))
+                cursor.execute(query, params)
                 result = cursor.fetchall()
                 logger.info("クエリの実行に成功しました")
 
-                # datetimeオブジェクトを文字列に変換
-                for record in result:
-                    record['charging_start'] = record['charging_start'].isoformat() if record['charging_start'] else None
-                    record['charging_end'] = record['charging_end'].isoformat() if record['charging_end'] else None
-
                 return jsonify(create_success_response(
                     "データを取得しました。" if result else "データが存在しません。",
                     result
@@ -73,4 +96,4 @@ def download_history():
         return jsonify(create_error_response(
             "データ取得中にエラーが発生しました",
             str(e)
-        )), 500 
\ No newline at end of file
+        )), 500
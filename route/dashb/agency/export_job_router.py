@@ -0,0 +1,146 @@
+from flask import Blueprint, jsonify, request
+import logging
+import pymysql
+from response.response_base import create_success_response, create_error_response
+from db.db_connection import db
+from utils.user_identity import resolve_user_identity
+from utils.export_utils import EXPORT_FORMATS
+from utils.export_jobs import EXPORT_JOB_TYPES, create_export_job, dispatch_export_job, get_export_job
+
+# logger settings
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+def resolve_owner(app_user_number):
+    """
+    ジョブの所有者とする企業のユーザー情報を取得する。
+
+    Returns:
+        tuple: (identity, エラーレスポンス)。エラーの場合はidentityがNone
+    """
+    if not app_user_number:
+        return None, (jsonify(create_error_response("app_user_numberは必須です", None)), 400)
+    with db.get_connection() as conn:
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+            identity = resolve_user_identity(cursor, app_user_number)
+    if not identity:
+        return None, (jsonify(create_error_response(
+            "指定されたapp_user_numberに対応するユーザーが見つかりません",
+            None
+        )), 404)
+    if not identity['has_agency']:
+        return None, (jsonify(create_error_response(
+            f"ユーザーID {app_user_number} の権限が見つかりません",
+            None
+        )), 404)
+    return identity, None
+
+export_job_router = Blueprint('export_job', __name__)
+
+@export_job_router.route('/export_job_submit', methods=['POST'])
+def export_job_submit():
+    try:
+        # リクエストボディから情報を取得
+        data = request.get_json()
+        if not data:
+            return jsonify(create_error_response(
+                "リクエストボディが空です",
+                None
+            )), 400
+
+        job_type = data.get('job_type')
+        export_format = data.get('format', 'csv')
+        compress = bool(data.get('gzip'))
+
+        if job_type not in EXPORT_JOB_TYPES:
+            return jsonify(create_error_response(
+                f"job_typeには{', '.join(EXPORT_JOB_TYPES)}のいずれかを指定してください",
+                None
+            )), 400
+
+        if export_format not in EXPORT_FORMATS:
+            return jsonify(create_error_response(
+                f"formatには{', '.join(EXPORT_FORMATS)}のいずれかを指定してください",
+                None
+            )), 400
+
+        # ジョブは登録した企業のものとして保存し、状態の取得時に照合する
+        identity, error = resolve_owner(data.get('app_user_number'))
+        if error:
+            return error
+
+        if job_type == 'download_history':
+            location_id = data.get('location_id')
+            powersupply_id = data.get('powersupply_id')
+            if not location_id and not powersupply_id:
+                return jsonify(create_error_response(
+                    "location_id または powersupply_id は必須です",
+                    None
+                )), 400
+            params = {"location_id": location_id, "powersupply_id": powersupply_id}
+        else:
+            if 'start_period' not in data or 'end_period' not in data:
+                return jsonify(create_error_response(
+                    "start_periodとend_periodは必須です",
+                    None
+                )), 400
+
+            params = {"start_period": data['start_period'], "end_period": data['end_period']}
+            powersupply_ids = data.get('powersupply_ids')
+
+            if powersupply_ids:
+                params['powersupply_ids'] = powersupply_ids
+
+        # 指定したIDに関わらず、登録した企業の権限の範囲に絞り込む（範囲は登録時点のものをジョブに保存する）
+        params['agency_id'] = identity['agency_id']
+        params['permission'] = identity['agency_permission']
+
+        job = create_export_job(job_type, params, export_format, compress, agency_id=identity['agency_id'])
+        dispatch_export_job(job['job_id'])
+
+        return jsonify(create_success_response(
+            "エクスポートを受け付けました。",
+            {"job_id": job['job_id'], "status": job['status']}
+        )), 202
+
+    except Exception as e:
+        logger.error(f"エラーが発生しました: {str(e)}")
+        return jsonify(create_error_response(
+            "エクスポートの登録中にエラーが発生しました",
+            str(e)
+        )), 500
+
+@export_job_router.route('/export_job_status', methods=['POST'])
+def export_job_status():
+    try:
+        # リクエストボディから情報を取得
+        data = request.get_json()
+        if not data or not data.get('job_id'):
+            return jsonify(create_error_response(
+                "job_idは必須です",
+                None
+            )), 400
+
+        identity, error = resolve_owner(data.get('app_user_number'))
+        if error:
+            return error
+
+        # 他の企業のジョブは存在しないものとして扱う
+        job = get_export_job(data['job_id'], agency_id=identity['agency_id'])
+        if job is None:
+            return jsonify(create_error_response(
+                "指定されたjob_idのエクスポートが見つかりません",
+                None
+            )), 404
+
+        return jsonify(create_success_response(
+            "エクスポートの状態を取得しました。",
+            job
+        )), 200
+
+    except Exception as e:
+        logger.error(f"エラーが発生しました: {str(e)}")
+        return jsonify(create_error_response(
+            "エクスポートの状態取得中にエラーが発生しました",
+            str(e)
+        )), 500
@@ -4,6 +4,11 @@ import pymysql
 import os
 from response.response_base import create_success_response, create_error_response
 from db.db_connection import db
+from utils.user_identity import resolve_user_identity
+from utils.pagination import (
+    encode_cursor, decode_cursor, parse_limit, max_unpaged_rows, CURSOR_DATETIME, CURSOR_INT
+)
+from utils.history_queries import CHARGE_HISTORY_SELECT, charge_history_base_query, charge_history_scope
 
 # logger settings
 logger = logging.getLogger()
@@ -34,98 +39,127 @@ def get_charge_history():
         app_user_number = data.get('app_user_number')
         powersupply_ids = data.get('powersupply_ids')
 
+        # ページング指定（limitまたはcursorが指定された場合のみ有効）
+        paginate = 'limit' in data or 'cursor' in data
+        include_total = bool(data.get('include_total'))
+        unpaged_limit = max_unpaged_rows()
+        try:
+            limit = parse_limit(data.get('limit', 100)) if paginate else None
+            after = decode_cursor(data['cursor'], 2, [CURSOR_DATETIME, CURSOR_INT]) if data.get('cursor') else None
+        except ValueError as e:
+            return jsonify(create_error_response(
+                str(e),
+                None
+            )), 400
+
         with db.get_connection() as conn:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
                 
-                # app_user_numberが存在し、powersupply_idsが未指定の場合にのみクエリを実行
+                # app_user_numberが存在し、powersupply_idsが未指定の場合は権限の範囲で絞り込む
                 if app_user_number and not powersupply_ids:
-                    # app_user_numberからuser_idを取得
-                    user_id_query = "SELECT user_id FROM m_user WHERE app_user_number = %s"
-                    cursor.execute(user_id_query, (app_user_number,))
-                    result = cursor.fetchone()
-                    if not result:
+                    # app_user_numberからユーザーの識別情報を取得
+                    identity = resolve_user_identity(cursor, app_user_number)
+                    if not identity:
                         return jsonify(create_error_response(
                             "指定されたapp_user_numberに対応するユーザーが見つかりません",
                         None
                     )), 404
-                    user_id = result['user_id']
-                    
-                    # まずユーザーの権限レベルを取得
-                    permission_query = """
-                    SELECT permission 
-                    FROM m_user_agency 
-                    WHERE user_id = %s
-                    """
-                    cursor.execute(permission_query, (user_id,))
-                    permission_result = cursor.fetchone()
-                    
-                    if not permission_result:
+
+                    # ユーザーの権限レベルを確認
+                    if not identity['has_agency']:
                         return jsonify(create_error_response(
                             f"ユーザーID {app_user_number} の権限が見つかりません",
                             None
                         )), 404
-                    
-                    user_permission = permission_result['permission']
-                    permissions = list(range(1, user_permission + 1))
-                    permission_placeholders = ', '.join(['%s'] * len(permissions))
-
-                    # 権限に基づいてpowersupply_idを取得
-                    queryUserId = f"""
-                    SELECT c.powersupply_id
-                    FROM m_user_agency a
-                    JOIN m_location b ON a.agency_id = b.agency_id
-                    JOIN m_powersupply c ON b.location_id = c.location_id
-                    WHERE a.user_id = %s
-                    AND c.permission IN ({permission_placeholders})
-                    """
-                    cursor.execute(queryUserId, (user_id,) + tuple(permissions))
-                    resultUserId = cursor.fetchall()
 
-                    # powersupply_idsを抽出
-                    powersupply_ids = [item['powersupply_id'] for item in resultUserId]
+                    # 企業と権限に基づく絞り込みをメインクエリで行う
+                    scope_condition, scope_params = charge_history_scope(
+                        agency_id=identity['agency_id'],
+                        permission=identity['agency_permission']
+                    )
+                else:
+                    if not powersupply_ids:
+                        return jsonify(create_success_response(
+                            "利用履歴が存在しません。[E001]",
+                            None
+                        )), 200
 
-                if not powersupply_ids:
-                    return jsonify(create_success_response(
-                        "利用履歴が存在しません。[E001]",
-                        None
-                    )), 200
+                    # powersupply_idsをクエリのパラメータとして使用
+                    scope_condition, scope_params = charge_history_scope(powersupply_ids=powersupply_ids)
+
+                base_query = charge_history_base_query(scope_condition)
+                base_params = scope_params + [start_period, end_period]
 
-                # powersupply_idsをクエリのパラメータとして使用
-                placeholders = ', '.join(['%s'] * len(powersupply_ids))
                 query = f"""
-                SELECT
-                    t_charge.transaction_id,
-                    t_charge.powersupply_id,
-                    t_charge_history.charging_start,
-                    t_charge_history.charging_end,
-                    t_charge_history.charged_amount,
-                    t_charge_history.billing_amount,
-                    m_user.app_user_number,
-                    m_location.station_name,
-                    m_powersupply.app_powersupply_number,
-                    m_powersupply.powersupply_name
-                FROM
-                    t_charge
-                JOIN t_charge_history ON t_charge.transaction_id = t_charge_history.transaction_id
-                JOIN m_user ON t_charge.user_id = m_user.user_id
-                JOIN m_powersupply ON t_charge.powersupply_id = m_powersupply.powersupply_id
-                JOIN m_location ON m_powersupply.location_id = m_location.location_id
-                WHERE 
-                    t_charge.powersupply_id IN ({placeholders})
-                AND 
-                    t_charge_history.charging_start BETWEEN %s AND %s
+                {CHARGE_HISTORY_SELECT}
+                {base_query}
+                """
+                query_params = list(base_params)
+
+                if paginate:
+                    # t_charge_historyの(charging_start, transaction_id)をキーに前ページの続きから取得する。
+                    # キーの比較と並び順をどちらも同じテーブルの列の行コンストラクタにすることで、
+                    # t_charge_historyのインデックス(charging_start, transaction_id)で開始位置から読み進め、
+                    # ソートせずにlimit件で打ち切る（ページの深さに関わらず一定のコスト）
+                    if after:
+                        query += """
+                AND (t_charge_history.charging_start, t_charge_history.transaction_id) > (%s, %s)
+                        """
+                        query_params += [after[0], after[1]]
+                    query += """
+                ORDER BY
+                    t_charge_history.charging_start ASC,
+                    t_charge_history.transaction_id ASC
+                LIMIT %s;
+                    """
+                    query_params.append(limit + 1)
+                else:
+                    query += """
                 ORDER BY
-                    t_charge_history.charging_start ASC;
-                """                
-                query_params = powersupply_ids + [start_period, end_period]
+                    t_charge_history.charging_start ASC
+                    """
+                    # MAX_UNPAGED_ROWSを設定した場合のみ、ページングを指定しないリクエストの件数に上限を設ける
+                    if unpaged_limit is not None:
+                        query += """
+                LIMIT %s
+                        """
+                        query_params.append(unpaged_limit + 1)
+
                 cursor.execute(query, query_params)
                 result = cursor.fetchall()
                 logger.info("クエリの実行に成功しました")
 
-                # datetimeオブジェクトを文字列に変換
-                for record in result:
-                    record['charging_start'] = record['charging_start'].isoformat() if record['charging_start'] else None
-                    record['charging_end'] = record['charging_end'].isoformat() if record['charging_end'] else None
+                if not paginate and unpaged_limit is not None and len(result) > unpaged_limit:
+                    return jsonify(create_error_response(
+                        f"利用履歴が{unpaged_limit}件を超えるため、limitとcursorを指定してください",
+                        None
+                    )), 400
+
+                next_cursor = None
+                if paginate and len(result) > limit:
+                    result = result[:limit]
+                    last = result[-1]
+                    next_cursor = encode_cursor([
+                        last['charging_start'].isoformat(sep=' '),
+                        last['transaction_id']
+                    ])
+
+                total_count = None
+                if paginate and include_total:
+                    cursor.execute(f"SELECT COUNT(*) AS total_count {base_query}", base_params)
+                    total_count = cursor.fetchone()['total_count']
+
+                if paginate:
+                    page = {
+                        "items": result,
+                        "next_cursor": next_cursor
+                    }
+                    if include_total:
+                        page["total_count"] = total_count
+                    return jsonify(create_success_response(
+                        "利用履歴を取得しました。" if result else "利用履歴が存在しません。[E001]",
+                        page
+                    )), 200
 
                 return jsonify(create_success_response(
                     "利用履歴を取得しました。" if result else "利用履歴が存在しません。[E001]",
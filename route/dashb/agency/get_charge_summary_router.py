@@ -0,0 +1,107 @@
+from flask import Blueprint, jsonify, request
+import logging
+import pymysql
+from response.response_base import create_success_response, create_error_response
+from db.db_connection import db
+from utils.user_identity import resolve_user_identity
+from utils.charge_summary import build_charge_summary_query, summary_period
+
+# logger settings
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+get_charge_summary_router = Blueprint('get_charge_summary', __name__)
+
+@get_charge_summary_router.route('/get_charge_summary', methods=['POST'])
+def get_charge_summary():
+    try:
+        # リクエストボディから情報を取得
+        data = request.get_json()
+        if not data:
+            return jsonify(create_error_response(
+                "リクエストボディが空です",
+                None
+            )), 400
+
+        # 必須パラメータの確認
+        if 'app_user_number' not in data or 'year' not in data:
+            return jsonify(create_error_response(
+                "app_user_numberとyearは必須です",
+                None
+            )), 400
+
+        app_user_number = data['app_user_number']
+        month = data.get('month')
+        group_by = data.get('group_by', 'powersupply')
+        # 月指定の場合は日ごと、年指定の場合は月ごとに集計する
+        interval = data.get('interval', 'day' if month is not None else 'month')
+
+        try:
+            start, end = summary_period(data['year'], month)
+        except ValueError as e:
+            return jsonify(create_error_response(
+                str(e),
+                None
+            )), 400
+
+        with db.get_connection() as conn:
+            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+
+                # app_user_numberからユーザーの識別情報を取得
+                identity = resolve_user_identity(cursor, app_user_number)
+                if not identity:
+                    return jsonify(create_error_response(
+                        "指定されたapp_user_numberに対応するユーザーが見つかりません",
+                        None
+                    )), 404
+
+                if not identity['has_agency']:
+                    return jsonify(create_error_response(
+                        f"ユーザーID {app_user_number} の権限が見つかりません",
+                        None
+                    )), 404
+
+                try:
+                    query, params = build_charge_summary_query(
+                        identity['agency_id'],
+                        identity['agency_permission'],
+                        start,
+                        end,
+                        group_by=group_by,
+                        interval=interval
+                    )
+                except ValueError as e:
+                    return jsonify(create_error_response(
+                        str(e),
+                        None
+                    )), 400
+
+                cursor.execute(query, params)
+                result = cursor.fetchall()
+                logger.info("クエリの実行に成功しました")
+
+                totals = {"session_count": 0, "charged_amount": 0, "billing_amount": 0}
+                for record in result:
+                    record['session_count'] = int(record['session_count'])
+                    record['billing_amount'] = int(record['billing_amount'])
+                    totals['session_count'] += record['session_count']
+                    totals['charged_amount'] += record['charged_amount']
+                    totals['billing_amount'] += record['billing_amount']
+
+                return jsonify(create_success_response(
+                    "集計を取得しました。" if result else "集計対象の利用履歴が存在しません。",
+                    {
+                        "period": {"year": start.year, "month": start.month if month is not None else None},
+                        "group_by": group_by,
+                        "interval": interval,
+                        "items": result,
+                        "totals": totals
+                    }
+                )), 200
+
+    except Exception as e:
+        logger.error(f"エラーが発生しました: {str(e)}")
+        return jsonify(create_error_response(
+            "データ取得中にエラーが発生しました",
+            str(e)
+        )), 500
@@ -2,26 +2,14 @@ from flask import Blueprint, jsonify, request
 import logging
 import pymysql
 import os
-import datetime
-import json
 from response.response_base import create_success_response, create_error_response
 from db.db_connection import db
+from utils.user_identity import resolve_user_identity
 
 # logger settings
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-def datetime_handler(x):
-    if isinstance(x, datetime.datetime):
-        return x.isoformat()
-    elif isinstance(x, datetime.date):
-        return x.isoformat()
-    elif isinstance(x, datetime.timedelta):
-        return x.total_seconds()
-    elif isinstance(x, datetime.time):
-        return x.isoformat()  
-    raise TypeError("Unknown type")
-
 get_powersupplies_router = Blueprint('get_powersupplies', __name__)
 
 @get_powersupplies_router.route('/get_powersupplies', methods=['POST'])
@@ -48,29 +36,22 @@ def get_powersupplies():
 
         with db.get_connection() as conn:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                # app_user_numberからuser_idを取得
-                user_id_query = "SELECT user_id FROM m_user WHERE app_user_number = %s"
-                cursor.execute(user_id_query, (app_user_number,))
-                result = cursor.fetchone()
-                if not result:
+                # app_user_numberからユーザーの識別情報を取得
+                identity = resolve_user_identity(cursor, app_user_number)
+                if not identity:
                     return jsonify(create_error_response(
                         "指定されたapp_user_numberに対応するユーザーが見つかりません",
                         None
                     )), 404
-                user_id = result['user_id']
-                
-                # ユーザー権限の取得
-                user_permission_query = "SELECT permission FROM m_user_agency WHERE user_id = %s"
-                cursor.execute(user_permission_query, (user_id,))
-                user_permission_result = cursor.fetchone()
                 
-                if not user_permission_result:
+                # ユーザー権限の確認
+                if not identity['has_agency']:
                     return jsonify(create_error_response(
                         f"ユーザーID {app_user_number} の権限が見つかりません",
                         None
                     )), 404
                 
-                user_permission = user_permission_result['permission']
+                user_permission = identity['agency_permission']
                 # 権限リストの生成
                 permissions = list(range(1, user_permission + 1))
                 
@@ -107,9 +88,6 @@ def get_powersupplies():
                 results = cursor.fetchall()
                 logger.info("クエリの実行に成功しました")
 
-                # datetime オブジェクトを ISO フォーマットの文字列に変換
-                results = json.loads(json.dumps(results, default=datetime_handler))
-                
                 return jsonify(create_success_response(
                     "充電器情報を取得しました。" if results else "充電器情報が存在しません。[E001]",
                     results if results else None
@@ -4,6 +4,7 @@ import pymysql
 import os
 from response.response_base import create_success_response, create_error_response
 from db.db_connection import db
+from utils.user_identity import resolve_user_identity
 
 # logger settings
 logger = logging.getLogger()
@@ -34,59 +35,26 @@ def get_unpaid_history():
 
         with db.get_connection() as conn:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                # app_user_numberからuser_idを取得
-                user_id_query = "SELECT user_id FROM m_user WHERE app_user_number = %s"
-                cursor.execute(user_id_query, (app_user_number,))
-                result = cursor.fetchone()
-                if not result:
+                # app_user_numberからユーザーの識別情報を取得
+                identity = resolve_user_identity(cursor, app_user_number)
+                if not identity:
                     return jsonify(create_error_response(
                         "指定されたapp_user_numberに対応するユーザーが見つかりません",
                         None
                     )), 404
-                user_id = result['user_id']
                 
-                # ユーザーの権限レベルを取得
-                permission_query = """
-                SELECT a.permission, a.agency_id
-                FROM m_user_agency a
-                WHERE a.user_id = %s
-                """
-                cursor.execute(permission_query, (user_id,))
-                permission_result = cursor.fetchone()
-                
-                if not permission_result:
+                # ユーザーの権限レベルを確認
+                if not identity['has_agency']:
                     return jsonify(create_error_response(
                         f"app_user_number {app_user_number} の権限が見つかりません",
                         None
                     )), 404
                 
-                user_permission = permission_result['permission']
-                agency_id = permission_result['agency_id']
-                permissions = list(range(1, user_permission + 1))
-                permission_placeholders = ', '.join(['%s'] * len(permissions))
-
-                # 権限とagency_idに基づいてpowersupply_idを取得
-                powersupply_query = f"""
-                SELECT DISTINCT p.powersupply_id
-                FROM m_powersupply p
-                JOIN m_location l ON p.location_id = l.location_id
-                WHERE l.agency_id = %s
-                AND p.permission IN ({permission_placeholders})
-                """
-                cursor.execute(powersupply_query, (agency_id,) + tuple(permissions))
-                powersupply_results = cursor.fetchall()
-                
-                if not powersupply_results:
-                    return jsonify(create_success_response(
-                        "未払い取引が存在しません。[E001]",
-                        None
-                    )), 200
-
-                powersupply_ids = [item['powersupply_id'] for item in powersupply_results]
-                placeholders = ', '.join(['%s'] * len(powersupply_ids))
+                user_permission = identity['agency_permission']
+                agency_id = identity['agency_id']
 
-                # 未払い取引を取得
-                unpaid_query = f"""
+                # 権限とagency_idの範囲で未払い取引を取得
+                unpaid_query = """
                 SELECT 
                     t.transaction_id,
                     l.station_name,
@@ -105,18 +73,15 @@ def get_unpaid_history():
                 JOIN m_powersupply ps ON t.powersupply_id = ps.powersupply_id
                 JOIN m_location l ON ps.location_id = l.location_id
                 JOIN m_user u ON t.user_id = u.user_id
-                WHERE t.powersupply_id IN ({placeholders})
+                WHERE l.agency_id = %s
+                AND ps.permission BETWEEN 1 AND %s
                 AND p.payment_status = 0
                 ORDER BY h.charging_start DESC
                 """
                 
-                cursor.execute(unpaid_query, tuple(powersupply_ids))
+                cursor.execute(unpaid_query, (agency_id, user_permission))
                 results = cursor.fetchall()
                 logger.info("クエリの実行に成功しました")
-                
-                # datetimeオブジェクトを文字列に変換
-                for record in results:
-                    record['charging_start'] = record['charging_start'].isoformat() if record['charging_start'] else None
 
                 return jsonify(create_success_response(
                     "未払い取引を取得しました。" if results else "未払い取引が存在しません。[E001]",
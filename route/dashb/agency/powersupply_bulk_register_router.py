@@ -0,0 +1,166 @@
+from flask import Blueprint, jsonify, request
+import logging
+import pymysql
+from response.response_base import create_success_response, create_error_response
+from db.db_connection import db
+from utils.db_utils import get_id_allocator
+from utils.user_identity import resolve_user_identity
+from utils.bulk_import import read_bulk_rows, validate_row, row_error, INT_MAX
+from utils.utils import get_jst_now
+
+# ロガー設定
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+REQUIRED_FIELDS = [
+    'location_id', 'powersupply_name', 'type', 'wat', 'price',
+    'quick_power', 'nomal_power', 'maintenance', 'online',
+    'charge_segment', 'permission'
+]
+
+# 整数で登録する項目と、その範囲（登録前に検証し、不正な行は行ごとのエラーとして返す）
+INTEGER_RANGES = {
+    'location_id': (1, INT_MAX),
+    'type': (0, INT_MAX),
+    'wat': (0, INT_MAX),
+    'price': (0, INT_MAX),
+    'quick_power': (0, INT_MAX),
+    'nomal_power': (0, INT_MAX),
+    'maintenance': (0, INT_MAX),
+    'online': (0, INT_MAX),
+    'charge_segment': (0, INT_MAX),
+    'permission': (1, INT_MAX),
+}
+STRING_FIELDS = ['powersupply_name']
+
+INSERT_QUERY = """
+INSERT INTO m_powersupply (
+    location_id, app_powersupply_number, powersupply_name,
+    type, wat, price, quick_power, nomal_power,
+    maintenance, online, charge_segment, permission,
+    create_date, create_user, update_date, update_user, status
+) VALUES (
+    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
+    %s, %s, %s, %s, %s
+)
+"""
+
+def validate_locations(cursor, rows, errors, agency_id=None):
+    """
+    行のlocation_idが存在するか（agency_idを指定した場合は代理店のステーションか）を1回のクエリで確認し、
+    エラーをerrorsに追加します。
+
+    Args:
+        cursor: データベースカーソル（DictCursor）
+        rows (list): 行のリスト
+        errors (dict): 行のインデックスをキーとしたエラーメッセージのリスト
+        agency_id (int): 呼び出し元の代理店ID
+    """
+    location_ids = sorted({int(row['location_id']) for index, row in enumerate(rows) if index not in errors})
+    if not location_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(location_ids))
+    cursor.execute(
+        f"SELECT location_id, agency_id FROM m_location WHERE location_id IN ({placeholders})",
+        location_ids
+    )
+    agencies = {row['location_id']: row['agency_id'] for row in cursor.fetchall()}
+
+    for index, row in enumerate(rows):
+        if index in errors:
+            continue
+        location_id = int(row['location_id'])
+        if location_id not in agencies:
+            errors[index] = [f"location_id {location_id} のステーションが見つかりません"]
+        elif agency_id is not None and agencies[location_id] != agency_id:
+            errors[index] = [f"location_id {location_id} は操作できないステーションです"]
+
+powersupply_bulk_register_router = Blueprint('powersupply_bulk_register', __name__)
+
+@powersupply_bulk_register_router.route('/powersupply_bulk_register', methods=['POST'])
+def powersupply_bulk_register():
+    """
+    充電器を一括登録します。
+
+    JSONの配列、powersupplies（とapp_user_number）を含むオブジェクト、またはCSVを受け付けます。
+    すべての行を先に検証し、1件でもエラーがある場合は登録せずに行ごとのエラーを返します。
+    エラーがない場合は、app_powersupply_numberをまとめて採番し、1つのトランザクションで登録します。
+    """
+    try:
+        rows, options = read_bulk_rows(request, 'powersupplies')
+    except ValueError as e:
+        return jsonify(create_error_response(str(e), None)), 400
+
+    # 入力値の検証
+    errors = {}
+    for index, row in enumerate(rows):
+        row_errors = validate_row(row, REQUIRED_FIELDS, integer_fields=list(INTEGER_RANGES),
+                                  ranges=INTEGER_RANGES, string_fields=STRING_FIELDS)
+        if row_errors:
+            errors[index] = row_errors
+
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                agency_id = None
+                app_user_number = options.get('app_user_number')
+                if app_user_number:
+                    identity = resolve_user_identity(cursor, app_user_number)
+                    if not identity or not identity['has_agency']:
+                        return jsonify(create_error_response(
+                            "指定されたapp_user_numberに対応する代理店ユーザーが見つかりません",
+                            None
+                        )), 404
+                    agency_id = identity['agency_id']
+
+                validate_locations(cursor, rows, errors, agency_id)
+                if errors:
+                    logger.info(f"一括登録の入力にエラーがあります: {len(errors)}件")
+                    return jsonify(create_error_response(
+                        "入力内容にエラーがあるため登録しませんでした",
+                        [row_error(index, errors[index]) for index in sorted(errors)]
+                    )), 400
+
+                now = get_jst_now()
+                numbers = get_id_allocator('m_powersupply', 'app_powersupply_number', 12).allocate_many(
+                    cursor, len(rows))
+
+                try:
+                    cursor.executemany(INSERT_QUERY, [
+                        (
+                            row['location_id'], number, row['powersupply_name'],
+                            row['type'], row['wat'], row['price'], row['quick_power'],
+                            row['nomal_power'], row['maintenance'], row['online'],
+                            row['charge_segment'], row['permission'],
+                            now, 'Dashboard', now, 'Dashboard', 1
+                        )
+                        for row, number in zip(rows, numbers)
+                    ])
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+                logger.info(f"充電器情報の一括登録に成功しました: {len(rows)}件")
+                return jsonify(create_success_response(
+                    "充電器情報の一括登録に成功しました",
+                    {
+                        "count": len(rows),
+                        "results": [
+                            {
+                                "row": index + 1,
+                                "status": "created",
+                                "powersupply_name": row['powersupply_name'],
+                                "app_powersupply_number": number
+                            }
+                            for index, (row, number) in enumerate(zip(rows, numbers))
+                        ]
+                    }
+                )), 200
+
+    except Exception as e:
+        logger.error(f"エラーが発生しました: {str(e)}")
+        return jsonify(create_error_response(
+            "データ登録中にエラーが発生しました",
+            str(e)
+        )), 500
@@ -0,0 +1,206 @@
+from flask import Blueprint, jsonify, request
+import os
+import re
+import logging
+import pymysql
+from response.response_base import create_success_response, create_error_response
+from db.db_connection import db
+from utils.db_utils import generate_app_location_numbers
+from utils.user_identity import resolve_user_identity
+from utils.bulk_import import read_bulk_rows, validate_row, row_error, is_true
+from utils.utils import get_jst_now
+
+# logger settings
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+REQUIRED_FIELDS = [
+    'station_name', 'zip_code', 'prefecture',
+    'city', 'address', 'open_time', 'end_time', 'open_day'
+]
+
+# 文字列で指定する項目と最大文字数
+STRING_FIELDS = REQUIRED_FIELDS + ['building']
+MAX_LENGTHS = {
+    'station_name': 100,
+    'prefecture': 10,
+    'city': 100,
+    'address': 255,
+    'building': 255,
+}
+
+# 時刻（HH:MMまたはHH:MM:SS。24:00は終日営業の終了時刻）
+TIME_PATTERN = re.compile(r'(?:[01]\d|2[0-3]):[0-5]\d(?::[0-5]\d)?|24:00(?::00)?')
+FORMATS = {
+    'zip_code': (re.compile(r'\d{3}-?\d{4}'), "7桁の郵便番号"),
+    'open_time': (TIME_PATTERN, "HH:MM形式の時刻"),
+    'end_time': (TIME_PATTERN, "HH:MM形式の時刻"),
+    'open_day': (re.compile(r'(?!.*(.).*\1)[月火水木金土日祝]{1,8}'), "重複のない曜日（月火水木金土日祝）"),
+}
+
+INSERT_QUERY = """
+INSERT INTO m_location (
+    agency_id, app_location_number, station_name,
+    zip_code, prefecture, city, address, building,
+    open_time, end_time, open_day,
+    create_date, create_user, update_date, update_user, status
+) VALUES (
+    %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
+    %s, %s, %s, %s, %s
+)
+"""
+
+# トランザクション全体がロールバックされるエラー（デッドロック、ロック待ちのタイムアウト）。
+# セーブポイントも失われているため、1行ずつの登録には切り替えずに例外を送出する
+TRANSACTION_ABORTED_ERRORS = (1213, 1205)
+
+def is_transaction_aborted(error):
+    """トランザクションがロールバックされたエラーの場合はTrue"""
+    return bool(error.args) and error.args[0] in TRANSACTION_ABORTED_ERRORS
+
+def insert_batch_size():
+    """1回のINSERTでまとめて登録する行数を返します（環境変数BULK_INSERT_BATCH_SIZE、既定値: 500）。"""
+    return int(os.environ.get('BULK_INSERT_BATCH_SIZE', 500))
+
+def insert_stations(cursor, entries):
+    """
+    ステーションをまとめて登録します。
+
+    entriesをBULK_INSERT_BATCH_SIZE件ずつ複数行のINSERTで登録し、失敗したまとまりは
+    セーブポイントまで戻して1行ずつ登録し直すことで、失敗した行だけを特定します。
+    デッドロックとロック待ちのタイムアウトは、呼び出し元でトランザクションをやり直す必要があるため送出します。
+
+    Args:
+        cursor: データベースカーソル
+        entries (list): (行のインデックス, INSERTのパラメータ)のリスト
+
+    Returns:
+        dict: 登録に失敗した行のインデックスをキーとしたエラーメッセージ
+    """
+    failures = {}
+    batch_size = insert_batch_size()
+    for start in range(0, len(entries), batch_size):
+        batch = entries[start:start + batch_size]
+        cursor.execute("SAVEPOINT station_batch")
+        try:
+            cursor.executemany(INSERT_QUERY, [params for _, params in batch])
+            continue
+        except pymysql.MySQLError as e:
+            if is_transaction_aborted(e):
+                raise
+            logger.warning(f"まとめての登録に失敗したため1行ずつ登録します: {str(e)}")
+            cursor.execute("ROLLBACK TO SAVEPOINT station_batch")
+
+        for index, params in batch:
+            cursor.execute("SAVEPOINT station_row")
+            try:
+                cursor.execute(INSERT_QUERY, params)
+            except pymysql.MySQLError as e:
+                if is_transaction_aborted(e):
+                    raise
+                cursor.execute("ROLLBACK TO SAVEPOINT station_row")
+                failures[index] = [f"登録に失敗しました: {str(e)}"]
+    return failures
+
+station_bulk_register_router = Blueprint('station_bulk_register', __name__)
+
+@station_bulk_register_router.route('/station_bulk_register', methods=['POST'])
+def station_bulk_register():
+    """
+    ステーションを一括登録します。
+
+    JSONの配列、stations（とapp_user_number、dry_run）を含むオブジェクト、またはCSVを受け付けます。
+    入力に誤りがある行や登録に失敗した行は行ごとのエラーとして返し、それ以外の行は登録します。
+    dry_runを指定した場合は検証のみ行い、データベースへの書き込みは行いません。
+    """
+    try:
+        rows, options = read_bulk_rows(request, 'stations')
+    except ValueError as e:
+        return jsonify(create_error_response(str(e), None)), 400
+
+    app_user_number = options.get('app_user_number')
+    if not app_user_number:
+        return jsonify(create_error_response("app_user_numberは必須です", None)), 400
+    dry_run = is_true(options.get('dry_run', False))
+
+    # 入力値の検証（採番する前に、登録に失敗する行を除外する）
+    errors = {}
+    for index, row in enumerate(rows):
+        row_errors = validate_row(row, REQUIRED_FIELDS, string_fields=STRING_FIELDS,
+                                  max_lengths=MAX_LENGTHS, formats=FORMATS)
+        if row_errors:
+            errors[index] = row_errors
+    valid_indexes = [index for index in range(len(rows)) if index not in errors]
+
+    try:
+        with db.get_connection() as conn:
+            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                # 呼び出し元の代理店を1回だけ取得する
+                identity = resolve_user_identity(cursor, app_user_number)
+                if not identity:
+                    return jsonify(create_error_response(
+                        "指定されたapp_user_numberに対応するユーザーが見つかりません",
+                        None
+                    )), 404
+                if not identity['has_agency']:
+                    return jsonify(create_error_response(
+                        f"ユーザーID {app_user_number} に対応する企業IDが見つかりません",
+                        None
+                    )), 404
+                agency_id = identity['agency_id']
+
+                numbers = {}
+                if not dry_run and valid_indexes:
+                    # 有効な行の件数分のapp_location_numberを連続して採番する
+                    now = get_jst_now()
+                    numbers = dict(zip(valid_indexes,
+                                       generate_app_location_numbers(cursor, agency_id, len(valid_indexes))))
+                    try:
+                        errors.update(insert_stations(cursor, [
+                            (index, (
+                                agency_id, numbers[index], rows[index]['station_name'],
+                                rows[index]['zip_code'], rows[index]['prefecture'], rows[index]['city'],
+                                rows[index]['address'], rows[index].get('building'),
+                                rows[index]['open_time'], rows[index]['end_time'], rows[index]['open_day'],
+                                now, 'Dashboard', now, 'Dashboard', 1
+                            ))
+                            for index in valid_indexes
+                        ]))
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+
+    except Exception as e:
+        logger.error(f"エラーが発生しました: {str(e)}")
+        return jsonify(create_error_response(
+            "データ登録中にエラーが発生しました",
+            str(e)
+        )), 500
+
+    results = []
+    for index, row in enumerate(rows):
+        if index in errors:
+            results.append(row_error(index, errors[index]))
+        elif dry_run:
+            results.append({"row": index + 1, "status": "valid", "station_name": row['station_name']})
+        else:
+            results.append({
+                "row": index + 1,
+                "status": "created",
+                "station_name": row['station_name'],
+                "app_location_number": numbers[index]
+            })
+
+    succeeded = len(rows) - len(errors)
+    logger.info(f"ステーションの一括登録: 成功={succeeded}件 エラー={len(errors)}件 dry_run={dry_run}")
+    return jsonify(create_success_response(
+        "ステーション情報の検証が完了しました" if dry_run else "ステーション情報の一括登録が完了しました",
+        {
+            "dry_run": dry_run,
+            "agency_id": agency_id,
+            "succeeded": succeeded,
+            "failed": len(errors),
+            "results": results
+        }
+    )), 200
@@ -5,44 +5,14 @@ import os
 import datetime
 from response.response_base import create_success_response, create_error_response
 from db.db_connection import db
+from utils.user_identity import resolve_user_identity
 from utils.utils import get_jst_now
+from utils.db_utils import generate_app_location_number
 
 # logger settings
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-def generate_app_location_number(cursor, agency_id):
-    # 最新のapp_location_numberを取得
-    query = """
-    SELECT app_location_number 
-    FROM m_location 
-    WHERE agency_id = %s 
-    ORDER BY app_location_number DESC 
-    LIMIT 1
-    """
-    cursor.execute(query, (agency_id,))
-    result = cursor.fetchone()
-
-    if result:
-        # 既存のapp_location_numberがある場合、1を加算
-        last_number = int(result['app_location_number'])
-        app_location_number = last_number + 1
-    else:
-        # 新規の場合、1から開始
-        new_number = 1
-
-        # agency_idの桁数を取得
-        agency_id_length = len(str(agency_id))
-
-        # 4桁になるようにゼロパディング
-        padding_length = 4 - agency_id_length
-        padded_number = str(new_number).zfill(padding_length)
-
-        # agency_id と padded_number を結合
-        app_location_number = f"{agency_id}{padded_number}"
-
-    return app_location_number
-
 station_register_router = Blueprint('station_register', __name__)
 
 @station_register_router.route('/station_register', methods=['POST'])
@@ -83,29 +53,22 @@ def station_register():
 
         with db.get_connection() as conn:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                # app_user_numberからuser_idを取得
-                user_id_query = "SELECT user_id FROM m_user WHERE app_user_number = %s"
-                cursor.execute(user_id_query, (app_user_number,))
-                result = cursor.fetchone()
-                if not result:
+                # app_user_numberからユーザーの識別情報を取得
+                identity = resolve_user_identity(cursor, app_user_number)
+                if not identity:
                     return jsonify(create_error_response(
                         "指定されたapp_user_numberに対応するユーザーが見つかりません",
                         None
                     )), 404
-                user_id = result['user_id']
-                
-                # ユーザーに対応する企業IDを取得
-                user_query = 'SELECT agency_id FROM m_user_agency WHERE user_id = %s'
-                cursor.execute(user_query, (user_id,))
-                result = cursor.fetchone()
                 
-                if not result:
+                # ユーザーに対応する企業IDを確認
+                if not identity['has_agency']:
                     return jsonify(create_error_response(
                         f"ユーザーID {app_user_number} に対応する企業IDが見つかりません",
                         None
                     )), 404
 
-                agency_id = result['agency_id']
+                agency_id = identity['agency_id']
 
                 # app_location_numberを生成
                 app_location_number = generate_app_location_number(cursor, agency_id)
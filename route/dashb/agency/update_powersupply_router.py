@@ -6,11 +6,29 @@ import datetime
 from response.response_base import create_success_response, create_error_response
 from db.db_connection import db
 from utils.utils import get_jst_now
+from utils.partial_update import apply_partial_update, UPDATE_APPLIED, UPDATE_NOT_FOUND, UPDATE_CONFLICT
 
 # logger settings
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# 更新できる項目（リクエストに含まれる項目だけを更新する）
+UPDATABLE_COLUMNS = [
+    'location_id',
+    'powersupply_name',
+    'plan',
+    'type',
+    'wat',
+    'price',
+    'quick_power',
+    'nomal_power',
+    'maintenance',
+    'online',
+    'charge_segment',
+    'permission',
+    'status'
+]
+
 update_powersupply_router = Blueprint('update_powersupply', __name__)
 
 @update_powersupply_router.route('/update_powersupply', methods=['POST'])
@@ -31,71 +49,50 @@ def update_powersupply():
                 None
             )), 400
 
-        # パラメータの取得
         powersupply_id = data['powersupply_id']
-        location_id = data.get('location_id')
-        powersupply_name = data.get('powersupply_name')
-        plan = data.get('plan')
-        type = data.get('type')
-        wat = data.get('wat')
-        price = data.get('price')
-        quick_power = data.get('quick_power')
-        nomal_power = data.get('nomal_power')
-        maintenance = data.get('maintenance')
-        online = data.get('online')
-        charge_segment = data.get('charge_segment')
-        permission = data.get('permission')
-        status = data.get('status')
-
-        logger.info(f"更新パラメータ: powersupply_name={powersupply_name}")
+        logger.info(f"更新項目: {[field for field in UPDATABLE_COLUMNS if field in data]}")
 
         with db.get_connection() as conn:
-            with conn.cursor() as cursor:
+            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
                 # 現在時刻を取得
                 now = get_jst_now()
-                
-                # 実行クエリ
-                update_query = """
-                UPDATE m_powersupply
-                SET location_id = %s,
-                    powersupply_name = %s,
-                    plan = %s,
-                    type = %s,
-                    wat = %s,
-                    price = %s,
-                    quick_power = %s,
-                    nomal_power = %s,
-                    maintenance = %s,
-                    online = %s,
-                    charge_segment = %s,
-                    permission = %s,
-                    status = %s,
-                    update_date = %s,
-                    update_user = 'Dashboard'
-                WHERE powersupply_id = %s;
-                """
-                cursor.execute(update_query, (
-                    location_id, powersupply_name, plan, type, wat,
-                    price, quick_power, nomal_power, maintenance,
-                    online, charge_segment, permission, status,
-                    now, powersupply_id
-                ))
 
-                # 更新された行数を確認
-                if cursor.rowcount == 0:
+                # リクエストに含まれる項目だけを更新する
+                try:
+                    result = apply_partial_update(
+                        cursor, 'm_powersupply', 'powersupply_id', powersupply_id, data, UPDATABLE_COLUMNS, now,
+                        expected_update_date=data.get('update_date')
+                    )
+                except ValueError as e:
+                    return jsonify(create_error_response(str(e), None)), 400
+
+                if result['status'] == UPDATE_NOT_FOUND:
                     return jsonify(create_error_response(
                         "更新対象のデータが見つかりません",
                         None
                     )), 404
 
-                conn.commit()
-                logger.info("充電器情報の更新に成功しました")
+                if result['status'] == UPDATE_CONFLICT:
+                    return jsonify(create_error_response(
+                        "他の操作により更新されています。最新の情報を取得してから再度更新してください",
+                        {"update_date": result['update_date']}
+                    )), 409
+
+                changed = result['status'] == UPDATE_APPLIED
+                if changed:
+                    conn.commit()
+                    logger.info("充電器情報の更新に成功しました")
+                else:
+                    logger.info("充電器情報に変更がないため更新しませんでした")
 
                 return jsonify(create_success_response(
-                    "充電器情報の更新に成功しました",
+                    "充電器情報の更新に成功しました" if changed else "充電器情報に変更はありません",
                     {
                         "powersupply_id": powersupply_id,
-                        "powersupply_name": powersupply_name
+                        "powersupply_name": data.get('powersupply_name'),
+                        "changed": changed,
+                        "updated_fields": result['fields'] if changed else [],
+                        "update_date": result['update_date']
                     }
                 )), 200
 
@@ -6,11 +6,26 @@ import datetime
 from response.response_base import create_success_response, create_error_response
 from db.db_connection import db
 from utils.utils import get_jst_now
+from utils.partial_update import apply_partial_update, UPDATE_APPLIED, UPDATE_NOT_FOUND, UPDATE_CONFLICT
 
 # logger settings
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# 更新できる項目（リクエストに含まれる項目だけを更新する）
+UPDATABLE_COLUMNS = [
+    'station_name',
+    'zip_code',
+    'prefecture',
+    'city',
+    'address',
+    'building',
+    'open_time',
+    'end_time',
+    'open_day',
+    'status'
+]
+
 update_station_router = Blueprint('update_station', __name__)
 
 @update_station_router.route('/update_station', methods=['POST'])
@@ -31,64 +46,50 @@ def update_station():
                 None
             )), 400
 
-        # パラメータの取得
         location_id = data['location_id']
-        station_name = data.get('station_name')
-        zip_code = data.get('zip_code')
-        prefecture = data.get('prefecture')
-        city = data.get('city')
-        address = data.get('address')
-        building = data.get('building')
-        open_time = data.get('open_time')
-        end_time = data.get('end_time')
-        open_day = data.get('open_day')
-        status = data.get('status', 1)  # デフォルト値1
-
-        logger.info(f"更新パラメータ: station_name={station_name}")
+        logger.info(f"更新項目: {[field for field in UPDATABLE_COLUMNS if field in data]}")
 
         with db.get_connection() as conn:
-            with conn.cursor() as cursor:
+            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
                 # 現在時刻を取得
                 now = get_jst_now()
-                
-                # 実行クエリ
-                update_query = """
-                UPDATE m_location
-                SET station_name = %s,
-                    zip_code = %s,
-                    prefecture = %s,
-                    city = %s,
-                    address = %s,
-                    building = %s,
-                    open_time = %s,
-                    end_time = %s,
-                    open_day = %s,
-                    status = %s,
-                    update_date = %s,
-                    update_user = %s
-                WHERE location_id = %s;
-                """
-                cursor.execute(update_query, (
-                    station_name, zip_code, prefecture, city,
-                    address, building, open_time, end_time,
-                    open_day, status, now, 'Dashboard', location_id
-                ))
 
-                # 更新された行数を確認
-                if cursor.rowcount == 0:
+                # リクエストに含まれる項目だけを更新する
+                try:
+                    result = apply_partial_update(
+                        cursor, 'm_location', 'location_id', location_id, data, UPDATABLE_COLUMNS, now,
+                        expected_update_date=data.get('update_date')
+                    )
+                except ValueError as e:
+                    return jsonify(create_error_response(str(e), None)), 400
+
+                if result['status'] == UPDATE_NOT_FOUND:
                     return jsonify(create_error_response(
                         "更新対象のデータが見つかりません",
                         None
                     )), 404
 
-                conn.commit()
-                logger.info("ステーション情報の更新に成功しました")
+                if result['status'] == UPDATE_CONFLICT:
+                    return jsonify(create_error_response(
+                        "他の操作により更新されています。最新の情報を取得してから再度更新してください",
+                        {"update_date": result['update_date']}
+                    )), 409
+
+                changed = result['status'] == UPDATE_APPLIED
+                if changed:
+                    conn.commit()
+                    logger.info("ステーション情報の更新に成功しました")
+                else:
+                    logger.info("ステーション情報に変更がないため更新しませんでした")
 
                 return jsonify(create_success_response(
-                    "ステーション情報の更新に成功しました",
+                    "ステーション情報の更新に成功しました" if changed else "ステーション情報に変更はありません",
                     {
                         "location_id": location_id,
-                        "station_name": station_name
+                        "station_name": data.get('station_name'),
+                        "changed": changed,
+                        "updated_fields": result['fields'] if changed else [],
+                        "update_date": result['update_date']
                     }
                 )), 200
 
@@ -4,6 +4,7 @@ import pymysql
 import os
 from response.response_base import create_success_response, create_error_response
 from db.db_connection import db
+from utils.user_identity import resolve_user_identity
 
 # logger settings
 logger = logging.getLogger()
@@ -29,16 +30,14 @@ def agency_get_users():
 
         with db.get_connection() as conn:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                # app_user_numberからuser_idを取得
-                user_id_query = "SELECT user_id FROM m_user WHERE app_user_number = %s"
-                cursor.execute(user_id_query, (app_user_number,))
-                result = cursor.fetchone()
-                if not result:
+                # app_user_numberからユーザーの識別情報を取得
+                identity = resolve_user_identity(cursor, app_user_number)
+                if not identity:
                     return jsonify(create_error_response(
                         "指定されたapp_user_numberに対応するユーザーが見つかりません",
                         None
                     )), 404
-                user_id = result['user_id']
+                user_id = identity['user_id']
                 
                 if get_all_flg == 1:
                     # getAllFlgが1の場合のクエリ
@@ -48,7 +47,7 @@ def agency_get_users():
                     INNER JOIN m_user_agency b ON a.user_id = b.user_id
                     INNER JOIN m_agency c ON b.agency_id = c.agency_id
                     WHERE a.user_category = 4 
-                    AND a.status <> 3
+                    AND a.status NOT IN (3, 9)
                     ORDER BY b.agency_id, a.user_id;
                     """
                     cursor.execute(user_query)
@@ -58,15 +57,11 @@ def agency_get_users():
                     SELECT a.app_user_number, a.lastname, a.firstname, a.status, b.permission 
                     FROM m_user a
                     INNER JOIN m_user_agency b ON a.user_id = b.user_id
-                    WHERE b.agency_id = (
-                        SELECT agency_id 
-                        FROM m_user_agency 
-                        WHERE user_id = %s
-                    )   
+                    WHERE b.agency_id = %s
                     AND a.user_category = 4
-                    AND a.status <> 3;
+                    AND a.status NOT IN (3, 9);
                     """
-                    cursor.execute(user_query, (user_id,))
+                    cursor.execute(user_query, (identity['agency_id'],))
                 else:
                     # getCompanyUsersFlgが1以外、かつgetAllFlgが1以外の場合のクエリ
                     user_query = """
@@ -75,7 +70,7 @@ def agency_get_users():
                     INNER JOIN m_user_agency b ON a.user_id = b.user_id
                     INNER JOIN m_permission c ON b.permission = c.permission_id
                     WHERE a.user_id = %s
-                    AND a.status <> 3;
+                    AND a.status NOT IN (3, 9);
                     """
                     cursor.execute(user_query, (user_id,))
 
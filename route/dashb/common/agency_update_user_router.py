@@ -4,9 +4,11 @@ import pymysql
 import os
 from response.response_base import create_success_response, create_error_response
 from db.db_connection import db
-import boto3
+from utils.user_identity import resolve_user_identity, invalidate_user_identity
 import datetime
 from utils.utils import get_jst_now
+from utils.cognito_outbox import enqueue_cognito_user_deletion
+from utils.user_registration import lock_user_status, USER_STATUS_PENDING
 
 # logger settings
 logger = logging.getLogger()
@@ -43,16 +45,28 @@ def agency_update_user():
 
         with db.get_connection() as conn:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                # app_user_numberからuser_idを取得
-                user_id_query = "SELECT user_id FROM m_user WHERE app_user_number = %s"
-                cursor.execute(user_id_query, (app_user_number,))
-                result = cursor.fetchone()
-                if not result:
+                # app_user_numberからユーザーの識別情報を取得
+                identity = resolve_user_identity(cursor, app_user_number)
+                if not identity:
                     return jsonify(create_error_response(
                         "指定されたapp_user_numberに対応するユーザーが見つかりません",
                         None
                     )), 404
-                user_id = result['user_id']
+                user_id = identity['user_id']
+
+                # 仮登録のユーザーはCognitoへの登録が完了するまで変更しない（complete_registrationが有効にする）
+                user_status = lock_user_status(cursor, user_id)
+                if user_status is None or user_status == USER_STATUS_PENDING:
+                    conn.rollback()
+                    if user_status is None:
+                        return jsonify(create_error_response(
+                            "指定されたapp_user_numberに対応するユーザーが見つかりません",
+                            None
+                        )), 404
+                    return jsonify(create_error_response(
+                        "登録処理中のユーザーは更新できません",
+                        None
+                    )), 409
                 
                 # 現在時刻を取得
                 now = get_jst_now()
@@ -77,51 +91,28 @@ def agency_update_user():
                 """
                 cursor.execute(update_user_agency_query, (permission, user_id))
 
-                # statusが3の場合、Cognitoのアカウントを削除
+                # statusが3の場合、Cognitoのアカウントの削除を予約
                 if status == 3:
-                    # m_userからemailを取得
-                    select_query = "SELECT mail FROM m_user WHERE user_id = %s"
+                    # Cognitoのユーザー名を取得（未設定の移行前のユーザーはメールアドレスで削除する）
+                    select_query = "SELECT mail, cognito_username FROM m_user WHERE user_id = %s"
                     cursor.execute(select_query, (user_id,))
                     result = cursor.fetchone()
 
-                    if not result or not result['mail']:
+                    if not result or not (result['cognito_username'] or result['mail']):
+                        # 更新を取り消す（変更していないためキャッシュは無効化しない）
+                        conn.rollback()
                         return jsonify(create_error_response(
-                            "指定されたユーザーのメールアドレスが見つかりません",
+                            "指定されたユーザーのCognitoのユーザー名とメールアドレスが見つかりません",
                             None
                         )), 404
 
-                    email = result['mail']
-                    cognito_client = boto3.client('cognito-idp')
-                    user_pool_id = os.environ['COGNITO_USER_POOL_ID']
-
-                    try:
-                        # Cognitoからユーザー情報を取得
-                        list_users_response = cognito_client.list_users(
-                            UserPoolId=user_pool_id,
-                            Filter=f'email = \"{email}\"'
-                        )
-
-                        users = list_users_response.get('Users', [])
-                        if not users:
-                            logger.warning(f"Cognitoにユーザーが見つかりません: {email}")
-                        elif len(users) > 1:
-                            logger.warning(f"複数のCognitoユーザーが見つかりました: {email}")
-                        else:
-                            cognito_username = users[0]['Username']
-                            # Cognitoのユーザーを削除
-                            cognito_client.admin_delete_user(
-                                UserPoolId=user_pool_id,
-                                Username=cognito_username
-                            )
-                            logger.info(f"Cognitoユーザーの削除に成功しました: {cognito_username}")
-
-                    except Exception as e:
-                        logger.error(f"Cognito処理中にエラーが発生しました: {str(e)}")
-                        # Cognito処理のエラーはDBの更新には影響を与えない
-                        pass
+                    # Cognitoのアカウントの削除は、ステータスの更新と同じトランザクションで
+                    # アウトボックスに登録し、jobs.cognito_outbox_workerが非同期に実行する
+                    enqueue_cognito_user_deletion(cursor, user_id, result['mail'], now)
 
                 # 変更をコミット
                 conn.commit()
+                invalidate_user_identity(app_user_number)
                 logger.info("ユーザー情報の更新に成功しました")
 
                 return jsonify(create_success_response(
@@ -4,6 +4,7 @@ import pymysql
 import os
 from response.response_base import create_success_response, create_error_response
 from db.db_connection import db
+from utils.user_identity import resolve_user_identity
 
 # logger settings
 logger = logging.getLogger()
@@ -43,36 +44,29 @@ def corporate_get_users():
                     INNER JOIN m_user_corporate b ON a.user_id = b.user_id
                     INNER JOIN m_corporate c ON b.corporate_id = c.corporate_id
                     WHERE a.user_category = 2
-                    AND a.status <> 3
+                    AND a.status NOT IN (3, 9)
                     ORDER BY b.corporate_id, a.user_id;
                     """
                     cursor.execute(user_query)
                 else:
-                    # app_user_numberからuser_idを取得
-                    user_id_query = "SELECT user_id FROM m_user WHERE app_user_number = %s"
-                    cursor.execute(user_id_query, (app_user_number,))
-                    result = cursor.fetchone()
-                    if not result:
+                    # app_user_numberからユーザーの識別情報を取得
+                    identity = resolve_user_identity(cursor, app_user_number)
+                    if not identity:
                         return jsonify(create_error_response(
                             "指定されたapp_user_numberに対応するユーザーが見つかりません",
                             None
                         )), 404
-                    user_id = result['user_id']
                     
                     # getAllFlgが1以外の場合、ユーザーIDに基づいて取得
                     user_query = """
                     SELECT a.app_user_number, a.lastname, a.firstname, a.status, b.permission 
                     FROM m_user a
                     INNER JOIN m_user_corporate b ON a.user_id = b.user_id
-                    WHERE b.corporate_id = (
-                        SELECT corporate_id 
-                        FROM m_user_corporate 
-                        WHERE user_id = %s
-                    )   
+                    WHERE b.corporate_id = %s
                     AND a.user_category = 2
-                    AND a.status <> 3;
+                    AND a.status NOT IN (3, 9);
                     """
-                    cursor.execute(user_query, (user_id,))
+                    cursor.execute(user_query, (identity['corporate_id'],))
 
                 result = cursor.fetchall()
                 logger.info("クエリの実行に成功しました")
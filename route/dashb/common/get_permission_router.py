@@ -4,6 +4,7 @@ import pymysql
 import os
 from response.response_base import create_success_response, create_error_response
 from db.db_connection import db
+from utils.user_identity import resolve_user_identity
 
 # logger settings
 logger = logging.getLogger()
@@ -36,24 +37,16 @@ def get_permission():
                 if user_category == 4:
                     where_clause = "WHERE permission_id BETWEEN 2 AND 7"
                 elif app_user_number:
-                    # user_idが指定されている場合、m_user_agencyからpermissionを取得
-                    user_id_query = "SELECT user_id FROM m_user WHERE app_user_number = %s"
-                    cursor.execute(user_id_query, (app_user_number,))
-                    result = cursor.fetchone()
-                    if not result:
+                    # user_idが指定されている場合、m_user_agencyのpermissionを使用
+                    identity = resolve_user_identity(cursor, app_user_number)
+                    if not identity:
                         return jsonify(create_error_response(
                             "指定されたapp_user_numberに対応するユーザーが見つかりません",
                             None
                         )), 404
-                    user_id = result['user_id']
-                    user_permission_query = """
-                    SELECT permission FROM m_user_agency WHERE user_id = %s;
-                    """
-                    cursor.execute(user_permission_query, (user_id,))
-                    user_permission = cursor.fetchone()
 
-                    if user_permission:
-                        permission = user_permission['permission']
+                    if identity['has_agency']:
+                        permission = identity['agency_permission']
                         where_clause = f"WHERE permission_id <= {permission} AND permission_id != 1"
                     else:
                         where_clause = "WHERE permission_id != 1"
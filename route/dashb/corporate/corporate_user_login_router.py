@@ -4,19 +4,52 @@ import pymysql
 import os
 from response.response_base import create_success_response, create_error_response
 from db.db_connection import db
-import boto3
 from botocore.exceptions import ClientError
 from utils.utils import format_phone_number, calculate_secret_hash
+from utils.aws_clients import get_cognito_client
+from utils.concurrency import run_in_background, discard
 
 # Logger settings
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Cognito client
-cognito_client = boto3.client('cognito-idp')
-
 corporate_user_login_router = Blueprint('corporate_user_login', __name__)
 
+def find_corporate_user(cognito_client, user_pool_id, username):
+    """
+    Cognitoのユーザー属性と、echナビコードに対応する法人ユーザーのapp_user_numberを取得します。
+    パスワード認証と並行して実行するため、リクエストコンテキストに依存しません。
+
+    Args:
+        cognito_client: Cognitoクライアント
+        user_pool_id (str): ユーザープールID
+        username (str): Cognitoのユーザー名（E.164形式の電話番号）
+
+    Returns:
+        tuple: (ユーザー属性のdict, app_user_number)。echナビコードがない場合や
+            該当するユーザーがいない場合、app_user_numberはNone
+    """
+    user_info = cognito_client.admin_get_user(
+        UserPoolId=user_pool_id,
+        Username=username
+    )
+    attributes = {attr['Name']: attr['Value'] for attr in user_info['UserAttributes']}
+    ech_nav_code = attributes.get('custom:ech_nav_code')
+    if not ech_nav_code:
+        return attributes, None
+
+    with db.get_connection() as conn:
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+            user_query = """
+            SELECT app_user_number 
+            FROM m_user
+            WHERE echnavicode = %s
+            AND user_category = 2;
+            """
+            cursor.execute(user_query, (ech_nav_code,))
+            result = cursor.fetchone()
+            return attributes, result['app_user_number'] if result else None
+
 @corporate_user_login_router.route('/corporate_user_login', methods=['POST'])
 def corporate_user_login():
     try:
@@ -42,28 +75,35 @@ def corporate_user_login():
         user_pool_id = os.environ['COGNITO_USER_POOL_ID']
         client_id = os.environ['COGNITO_CLIENT_ID']
         client_secret = os.environ['COGNITO_CLIENT_SECRET']
+        cognito_client = get_cognito_client()
 
         # Cognitoでの認証
         try:
             formatted_phone = format_phone_number(phone_number)
             secret_hash = calculate_secret_hash(formatted_phone, client_id, client_secret)
 
-            auth_response = cognito_client.initiate_auth(
-                AuthFlow='USER_PASSWORD_AUTH',
-                AuthParameters={
-                    'USERNAME': formatted_phone,
-                    'PASSWORD': password,
-                    'SECRET_HASH': secret_hash
-                },
-                ClientId=client_id
-            )
+            # ユーザー属性とapp_user_numberの取得を、パスワード認証と並行して行う
+            user_future = run_in_background(find_corporate_user, cognito_client, user_pool_id, formatted_phone)
+
+            try:
+                cognito_client.initiate_auth(
+                    AuthFlow='USER_PASSWORD_AUTH',
+                    AuthParameters={
+                        'USERNAME': formatted_phone,
+                        'PASSWORD': password,
+                        'SECRET_HASH': secret_hash
+                    },
+                    ClientId=client_id
+                )
+            except Exception:
+                # 認証に失敗した場合、並行して取得した結果は使用しない
+                discard(user_future)
+                raise
             logger.info("認証に成功しました")
 
-            user_info = cognito_client.get_user(
-                AccessToken=auth_response['AuthenticationResult']['AccessToken']
-            )
-            
-            ech_nav_code = next((attr['Value'] for attr in user_info['UserAttributes'] if attr['Name'] == 'custom:ech_nav_code'), None)
+            attributes, app_user_number = user_future.result()
+
+            ech_nav_code = attributes.get('custom:ech_nav_code')
             logger.info(f"取得したEchNaviコード: {ech_nav_code}")
             
             if not ech_nav_code:
@@ -73,7 +113,7 @@ def corporate_user_login():
                 )), 400
 
             # 電話番号の認証状態を確認
-            phone_verified = next((attr['Value'] for attr in user_info['UserAttributes'] if attr['Name'] == 'phone_number_verified'), 'false')
+            phone_verified = attributes.get('phone_number_verified', 'false')
             if phone_verified != 'true':
                 return jsonify(create_error_response(
                     "電話番号が未認証です。スマホアプリのechナビから認証を行ってください。",
@@ -92,27 +132,16 @@ def corporate_user_login():
                 str(e)
             )), 500
 
-        with db.get_connection() as conn:
-            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
-                user_query = """
-                SELECT app_user_number 
-                FROM m_user
-                WHERE echnavicode = %s
-                AND user_category = 2;
-                """
-                cursor.execute(user_query, (ech_nav_code,))
-                result = cursor.fetchone()
-                
-                if result:
-                    return jsonify(create_success_response(
-                        "ログインに成功しました",
-                        {"app_user_number": result['app_user_number']}
-                    )), 200
-                else:
-                    return jsonify(create_error_response(
-                        "ユーザーが見つかりません[E002]",
-                        None
-                    )), 404
+        if app_user_number is not None:
+            return jsonify(create_success_response(
+                "ログインに成功しました",
+                {"app_user_number": app_user_number}
+            )), 200
+        else:
+            return jsonify(create_error_response(
+                "ユーザーが見つかりません[E002]",
+                None
+            )), 404
 
     except Exception as e:
         logger.error(f"エラーが発生しました: {str(e)}")
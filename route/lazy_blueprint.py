@@ -0,0 +1,90 @@
+"""
+Lazy route registration: URL rules are registered up front, but the router
+module behind each rule (and the AWS clients it creates) is imported on the
+first request that dispatches to it.
+"""
+import logging
+import importlib
+import threading
+from flask import Blueprint
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+class _RuleRecorder:
+    """Blueprintに登録されたURLルールとビュー関数を収集する"""
+
+    def __init__(self):
+        self.view_functions = {}
+
+    def add_url_rule(self, rule, endpoint=None, view_func=None, **options):
+        self.view_functions[rule] = view_func
+
+class LazyView:
+    """
+    初回呼び出し時にルーターモジュールを読み込み、元のビュー関数に処理を委譲するビューです。
+    """
+
+    def __init__(self, module_name, blueprint_name, rule):
+        self.module_name = module_name
+        self.blueprint_name = blueprint_name
+        self.rule = rule
+        self.__name__ = rule.strip('/').replace('/', '_')
+        self._view = None
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        """
+        ルーターモジュールを読み込み、ビュー関数を返します。
+
+        Returns:
+            callable: ルーターモジュールのBlueprintに登録されたビュー関数
+
+        Raises:
+            LookupError: Blueprintに対象のURLルールが存在しない場合
+        """
+        if self._view is None:
+            with self._lock:
+                if self._view is None:
+                    module = importlib.import_module(self.module_name)
+                    blueprint = getattr(module, self.blueprint_name)
+                    recorder = _RuleRecorder()
+                    for deferred in blueprint.deferred_functions:
+                        deferred(recorder)
+                    if self.rule not in recorder.view_functions:
+                        raise LookupError(f"{self.module_name}.{self.blueprint_name} に {self.rule} がありません")
+                    self._view = recorder.view_functions[self.rule]
+                    logger.info(f"ルーターを読み込みました: {self.module_name}")
+        return self._view
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+class LazyBlueprint(Blueprint):
+    """
+    ルーターモジュールを遅延読み込みするBlueprintです。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_views = []
+
+    def add_lazy_route(self, url_prefix, rule, module_name, blueprint_name, methods=('POST',)):
+        """
+        ルーターモジュールを読み込まずにURLルールを登録します。
+
+        Args:
+            url_prefix (str): URLのプレフィックス（例: '/dashb/agency'）
+            rule (str): ルーターモジュールのBlueprintに登録されているURLルール
+            module_name (str): ルーターモジュール名
+            blueprint_name (str): ルーターモジュール内のBlueprintの変数名
+            methods (tuple): HTTPメソッド
+        """
+        view = LazyView(module_name, blueprint_name, rule)
+        self.lazy_views.append((url_prefix, view))
+        self.add_url_rule(url_prefix + rule, endpoint=view.__name__, view_func=view, methods=list(methods))
+
+    def load_all(self):
+        """すべてのルーターモジュールを読み込みます（起動時に読み込みたい場合やテスト用）。"""
+        for _, view in self.lazy_views:
+            view.resolve()
@@ -1,88 +1,59 @@
-from flask import Blueprint
-
-# [test]
-from .dashb.hello_world import hello_world_router
-
-# [admin]
-from .dashb.admin.admin_create_agency_user_router import admin_create_agency_user_router
-from .dashb.admin.admin_user_login_router import admin_user_login_router
-from .dashb.admin.agency_get_companies_router import agency_get_companies_router
-from .dashb.admin.agency_register_router import agency_register_router
-from .dashb.admin.agency_update_company_router import agency_update_company_router
-from .dashb.admin.corporate_get_companies_router import corporate_get_companies_router
-from .dashb.admin.corporate_register_router import corporate_register_router
-from .dashb.admin.corporate_update_company_router import corporate_update_company_router
-from .dashb.admin.individual_get_users_router import individual_get_users_router
-from .dashb.admin.individual_update_user_router import individual_update_user_router
-
-# [agency]
-from .dashb.agency.agency_user_login_router import agency_user_login_router
-from .dashb.agency.agency_user_sms_router import agency_user_sms_router
-from .dashb.agency.download_history_router import download_history_router
-from .dashb.agency.get_charge_history_router import get_charge_history_router
-from .dashb.agency.get_powersupplies_router import get_powersupplies_router
-from .dashb.agency.get_stations_router import get_stations_router
-from .dashb.agency.get_unpaid_history_router import get_unpaid_history_router
-from .dashb.agency.powersupply_register_router import powersupply_register_router
-from .dashb.agency.qr_powersupply_info_router import qr_powersupply_info_router
-from .dashb.agency.station_register_router import station_register_router
-from .dashb.agency.update_charge_fee_router import update_charge_fee_router
-from .dashb.agency.update_powersupply_router import update_powersupply_router
-from .dashb.agency.update_station_router import update_station_router
-
-# [corporate]
-from .dashb.corporate.corporate_user_login_router import corporate_user_login_router
-
-# [common]
-from .dashb.common.corporate_get_users_router import corporate_get_users_router
-from .dashb.common.corporate_update_user_router import corporate_update_user_router
-from .dashb.common.corporate_user_register_router import corporate_user_register_router
-from .dashb.common.get_permission_router import get_permission_router
-from .dashb.common.agency_user_register_router import agency_user_register_router
-from .dashb.common.agency_get_users_router import agency_get_users_router
-from .dashb.common.agency_update_user_router import agency_update_user_router
+import os
+from .lazy_blueprint import LazyBlueprint
 
 # 統合されたBlueprintの作成
-router = Blueprint('router', __name__)
+# URLルールは起動時に登録し、各ルーターモジュールは初回のリクエスト時に読み込む
+router = LazyBlueprint('router', __name__)
 
 # [test]
-router.register_blueprint(hello_world_router, url_prefix='/dashb')
+router.add_lazy_route('/dashb', '/hello_world', 'route.dashb.hello_world', 'hello_world_router', methods=('GET',))
 
 # [admin]
-router.register_blueprint(admin_create_agency_user_router, url_prefix='/dashb/admin')
-router.register_blueprint(admin_user_login_router, url_prefix='/dashb/admin')
-router.register_blueprint(agency_get_companies_router, url_prefix='/dashb/admin')
-router.register_blueprint(agency_register_router, url_prefix='/dashb/admin')
-router.register_blueprint(agency_update_company_router, url_prefix='/dashb/admin')
-router.register_blueprint(corporate_get_companies_router, url_prefix='/dashb/admin')
-router.register_blueprint(corporate_register_router, url_prefix='/dashb/admin')
-router.register_blueprint(corporate_update_company_router, url_prefix='/dashb/admin')
-router.register_blueprint(individual_get_users_router, url_prefix='/dashb/admin')
-router.register_blueprint(individual_update_user_router, url_prefix='/dashb/admin')
+router.add_lazy_route('/dashb/admin', '/admin_create_agency_user', 'route.dashb.admin.admin_create_agency_user_router', 'admin_create_agency_user_router')
+router.add_lazy_route('/dashb/admin', '/admin_user_login', 'route.dashb.admin.admin_user_login_router', 'admin_user_login_router')
+router.add_lazy_route('/dashb/admin', '/agency_get_companies', 'route.dashb.admin.agency_get_companies_router', 'agency_get_companies_router')
+router.add_lazy_route('/dashb/admin', '/agency_register', 'route.dashb.admin.agency_register_router', 'agency_register_router')
+router.add_lazy_route('/dashb/admin', '/agency_update_company', 'route.dashb.admin.agency_update_company_router', 'agency_update_company_router')
+router.add_lazy_route('/dashb/admin', '/corporate_get_companies', 'route.dashb.admin.corporate_get_companies_router', 'corporate_get_companies_router')
+router.add_lazy_route('/dashb/admin', '/corporate_register', 'route.dashb.admin.corporate_register_router', 'corporate_register_router')
+router.add_lazy_route('/dashb/admin', '/corporate_update_company', 'route.dashb.admin.corporate_update_company_router', 'corporate_update_company_router')
+router.add_lazy_route('/dashb/admin', '/individual_get_users', 'route.dashb.admin.individual_get_users_router', 'individual_get_users_router')
+router.add_lazy_route('/dashb/admin', '/individual_update_user', 'route.dashb.admin.individual_update_user_router', 'individual_update_user_router')
 
 # [agency]
-router.register_blueprint(agency_user_login_router, url_prefix='/dashb/agency')
-router.register_blueprint(agency_user_sms_router, url_prefix='/dashb/agency')
-router.register_blueprint(download_history_router, url_prefix='/dashb/agency')
-router.register_blueprint(get_charge_history_router, url_prefix='/dashb/agency')
-router.register_blueprint(get_powersupplies_router, url_prefix='/dashb/agency')
-router.register_blueprint(get_stations_router, url_prefix='/dashb/agency')
-router.register_blueprint(get_unpaid_history_router, url_prefix='/dashb/agency')
-router.register_blueprint(powersupply_register_router, url_prefix='/dashb/agency')
-router.register_blueprint(qr_powersupply_info_router, url_prefix='/dashb/agency')
-router.register_blueprint(station_register_router, url_prefix='/dashb/agency')
-router.register_blueprint(update_charge_fee_router, url_prefix='/dashb/agency')
-router.register_blueprint(update_powersupply_router, url_prefix='/dashb/agency')
-router.register_blueprint(update_station_router, url_prefix='/dashb/agency')
+router.add_lazy_route('/dashb/agency', '/agency_user_login', 'route.dashb.agency.agency_user_login_router', 'agency_user_login_router')
+router.add_lazy_route('/dashb/agency', '/agency_token_refresh', 'route.dashb.agency.agency_token_refresh_router', 'agency_token_refresh_router')
+router.add_lazy_route('/dashb/agency', '/agency_user_sms', 'route.dashb.agency.agency_user_sms_router', 'agency_user_sms_router')
+router.add_lazy_route('/dashb/agency', '/charge_fee_bulk_update', 'route.dashb.agency.charge_fee_bulk_update_router', 'charge_fee_bulk_update_router')
+router.add_lazy_route('/dashb/agency', '/download_history', 'route.dashb.agency.download_history_router', 'download_history_router')
+router.add_lazy_route('/dashb/agency', '/export_job_submit', 'route.dashb.agency.export_job_router', 'export_job_router')
+router.add_lazy_route('/dashb/agency', '/export_job_status', 'route.dashb.agency.export_job_router', 'export_job_router')
+router.add_lazy_route('/dashb/agency', '/get_charge_history', 'route.dashb.agency.get_charge_history_router', 'get_charge_history_router')
+router.add_lazy_route('/dashb/agency', '/get_charge_summary', 'route.dashb.agency.get_charge_summary_router', 'get_charge_summary_router')
+router.add_lazy_route('/dashb/agency', '/get_powersupplies', 'route.dashb.agency.get_powersupplies_router', 'get_powersupplies_router')
+router.add_lazy_route('/dashb/agency', '/get_stations', 'route.dashb.agency.get_stations_router', 'get_stations_router')
+router.add_lazy_route('/dashb/agency', '/get_unpaid_history', 'route.dashb.agency.get_unpaid_history_router', 'get_unpaid_history_router')
+router.add_lazy_route('/dashb/agency', '/powersupply_bulk_register', 'route.dashb.agency.powersupply_bulk_register_router', 'powersupply_bulk_register_router')
+router.add_lazy_route('/dashb/agency', '/powersupply_register', 'route.dashb.agency.powersupply_register_router', 'powersupply_register_router')
+router.add_lazy_route('/dashb/agency', '/qr_powersupply_info', 'route.dashb.agency.qr_powersupply_info_router', 'qr_powersupply_info_router')
+router.add_lazy_route('/dashb/agency', '/station_bulk_register', 'route.dashb.agency.station_bulk_register_router', 'station_bulk_register_router')
+router.add_lazy_route('/dashb/agency', '/station_register', 'route.dashb.agency.station_register_router', 'station_register_router')
+router.add_lazy_route('/dashb/agency', '/update_charge_fee', 'route.dashb.agency.update_charge_fee_router', 'update_charge_fee_router')
+router.add_lazy_route('/dashb/agency', '/update_powersupply', 'route.dashb.agency.update_powersupply_router', 'update_powersupply_router')
+router.add_lazy_route('/dashb/agency', '/update_station', 'route.dashb.agency.update_station_router', 'update_station_router')
 
 # [corporate]
-router.register_blueprint(corporate_user_login_router, url_prefix='/dashb/corporate')
+router.add_lazy_route('/dashb/corporate', '/corporate_user_login', 'route.dashb.corporate.corporate_user_login_router', 'corporate_user_login_router')
 
 # [common]
-router.register_blueprint(corporate_get_users_router, url_prefix='/dashb/common')
-router.register_blueprint(corporate_update_user_router, url_prefix='/dashb/common')
-router.register_blueprint(corporate_user_register_router, url_prefix='/dashb/common')
-router.register_blueprint(get_permission_router, url_prefix='/dashb/common')
-router.register_blueprint(agency_user_register_router, url_prefix='/dashb/common')
-router.register_blueprint(agency_get_users_router, url_prefix='/dashb/common')
-router.register_blueprint(agency_update_user_router, url_prefix='/dashb/common')
+router.add_lazy_route('/dashb/common', '/corporate_get_users', 'route.dashb.common.corporate_get_users_router', 'corporate_get_users_router')
+router.add_lazy_route('/dashb/common', '/corporate_update_user', 'route.dashb.common.corporate_update_user_router', 'corporate_update_user_router')
+router.add_lazy_route('/dashb/common', '/corporate_user_register', 'route.dashb.common.corporate_user_register_router', 'corporate_user_register_router')
+router.add_lazy_route('/dashb/common', '/get_permission', 'route.dashb.common.get_permission_router', 'get_permission_router')
+router.add_lazy_route('/dashb/common', '/agency_user_register', 'route.dashb.common.agency_user_register_router', 'agency_user_register_router')
+router.add_lazy_route('/dashb/common', '/agency_get_users', 'route.dashb.common.agency_get_users_router', 'agency_get_users_router')
+router.add_lazy_route('/dashb/common', '/agency_update_user', 'route.dashb.common.agency_update_user_router', 'agency_update_user_router')
+
+# ROUTER_EAGER_LOADが設定されている場合は起動時にすべてのルーターを読み込む
+if os.environ.get('ROUTER_EAGER_LOAD'):
+    router.load_all()
@@ -0,0 +1,68 @@
+import os
+import sys
+import threading
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+os.environ.setdefault('AWS_DEFAULT_REGION', 'ap-northeast-1')
+import pytest
+from utils import aws_clients
+from utils.aws_clients import get_client, get_cognito_client, prewarm_clients, reset_clients
+
+@pytest.fixture(autouse=True)
+def clean_clients():
+    reset_clients()
+    yield
+    reset_clients()
+
+def test_cognito_client_is_shared():
+    assert get_cognito_client() is get_cognito_client()
+    assert get_cognito_client() is get_client('cognito-idp')
+    assert get_client('s3') is not get_cognito_client()
+
+def test_client_config_from_environment(monkeypatch):
+    monkeypatch.setenv('AWS_MAX_POOL_CONNECTIONS', '25')
+    monkeypatch.setenv('AWS_CONNECT_TIMEOUT', '1.5')
+    monkeypatch.setenv('AWS_READ_TIMEOUT', '4')
+    monkeypatch.setenv('AWS_MAX_ATTEMPTS', '5')
+
+    config = get_cognito_client().meta.config
+    assert config.max_pool_connections == 25
+    assert config.connect_timeout == 1.5
+    assert config.read_timeout == 4
+    assert config.retries == {'mode': 'adaptive', 'total_max_attempts': 5}
+    assert config.tcp_keepalive is True
+
+def test_concurrent_first_use_creates_one_client(monkeypatch):
+    created = []
+    original = aws_clients.client_config
+
+    def counting_config():
+        created.append(threading.get_ident())
+        return original()
+
+    monkeypatch.setattr(aws_clients, 'client_config', counting_config)
+    barrier = threading.Barrier(8)
+    clients = []
+
+    def worker():
+        barrier.wait()
+        clients.append(get_cognito_client())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert all(client is clients[0] for client in clients)
+
+def test_prewarm_creates_listed_clients(monkeypatch):
+    monkeypatch.setenv('AWS_CLIENT_PREWARM', 'cognito-idp, s3')
+    prewarm_clients()
+    assert set(aws_clients._clients) == {'cognito-idp', 's3'}
+
+def test_prewarm_ignores_unknown_services(monkeypatch):
+    monkeypatch.setenv('AWS_CLIENT_PREWARM', 'no-such-service')
+    prewarm_clients()
+    assert aws_clients._clients == {}
@@ -0,0 +1,200 @@
+import os
+import sys
+from contextlib import contextmanager
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+for key, value in {'END_POINT': 'localhost', 'USER_NAME': 'test', 'PASSWORD': 'test',
+                   'DB_NAME': 'test', 'PORT': '3306'}.items():
+    os.environ.setdefault(key, value)
+import pytest
+from flask import Flask
+from route.dashb.agency import charge_fee_bulk_update_router as fee_module
+
+class FakeCursor:
+    """m_powersupplyの代わり。UPDATEは派生テーブルのパラメータを読み取って適用する"""
+
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        self.db.statements.append((query, list(params)))
+        params = list(params)
+        agency_id = params.pop() if 'l.agency_id = %s' in query else None
+        in_agency = [row for row in self.db.powersupplies.values()
+                     if agency_id is None or self.db.locations[row['location_id']] == agency_id]
+
+        if query.lstrip().startswith('SELECT'):
+            ids = set(params)
+            self.rows = [dict(row) for row in in_agency
+                         if ('p.powersupply_id IN' in query and row['powersupply_id'] in ids)
+                         or ('p.location_id IN' in query and row['location_id'] in ids)]
+            return
+
+        fees = {}
+        for alias, column in (('ps', 'powersupply_id'), ('lf', 'location_id')):
+            segment = query.split(f') {alias} ON', 1)[0].rsplit('LEFT JOIN (', 1)[-1] \
+                if f') {alias} ON' in query else ''
+            count = segment.count('%s')
+            values, params = params[:count], params[count:]
+            fees[column] = dict(zip(values[0::2], values[1::2]))
+        now, user = params
+        self.rowcount = 0
+        for row in in_agency:
+            price = fees['powersupply_id'].get(row['powersupply_id'], fees['location_id'].get(row['location_id']))
+            if price is not None and row['price'] != price:
+                row.update({'price': price, 'update_date': now, 'update_user': user})
+                self.rowcount += 1
+
+    def executemany(self, query, params):
+        self.db.schedules.extend(params)
+
+    def fetchall(self):
+        return self.rows
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    @contextmanager
+    def cursor(self, cursor_class=None):
+        yield FakeCursor(self.db)
+
+    def commit(self):
+        self.db.commits += 1
+
+    def rollback(self):
+        self.db.rollbacks += 1
+
+class FakeDB:
+    def __init__(self):
+        # location_id -> agency_id
+        self.locations = {10: 1, 11: 1, 20: 2}
+        self.powersupplies = {
+            powersupply_id: {'powersupply_id': powersupply_id, 'location_id': location_id, 'price': 100}
+            for powersupply_id, location_id in ((1, 10), (2, 10), (3, 10), (4, 11), (5, 20))
+        }
+        self.statements = []
+        self.schedules = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    @contextmanager
+    def get_connection(self):
+        yield FakeConnection(self)
+
+@pytest.fixture
+def client(monkeypatch):
+    def setup(fake_db):
+        monkeypatch.setattr(fee_module, 'db', fake_db)
+        monkeypatch.setattr(fee_module, 'get_jst_now', lambda: '2024-04-01 00:00:00')
+        monkeypatch.setattr(fee_module, 'resolve_user_identity',
+                            lambda cursor, app_user_number: {'has_agency': True, 'agency_id': int(app_user_number)})
+        app = Flask(__name__)
+        app.register_blueprint(fee_module.charge_fee_bulk_update_router)
+        return app.test_client()
+    return setup
+
+def test_build_fee_update_is_one_statement():
+    query, params = fee_module.build_fee_update([(1, 120), (2, 130)], [(10, 150)], 'now', 'Dashboard', 7)
+    assert query.count('UPDATE') == 1
+    assert query.count('UNION ALL') == 1
+    assert 'COALESCE(ps.price, lf.price)' in query
+    assert 'NOT (p.price <=> COALESCE(ps.price, lf.price))' in query
+    assert params == [1, 120, 2, 130, 10, 150, 'now', 'Dashboard', 7]
+
+def test_location_and_powersupply_targets_in_one_transaction(client):
+    fake_db = FakeDB()
+    response = client(fake_db).post('/charge_fee_bulk_update', json={'fees': [
+        {'location_id': 10, 'price': 150},
+        {'powersupply_id': 2, 'price': 200},
+        {'powersupply_id': 4, 'price': 100},
+        {'powersupply_id': 99, 'price': 100},
+    ]})
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['updated'] == 3
+    assert data['not_found'] == 1
+    assert [(result['matched'], result['updated']) for result in data['results']] == [(2, 2), (1, 1), (1, 0), (0, 0)]
+    # 充電器の個別指定はステーションの指定より優先する
+    assert [fake_db.powersupplies[i]['price'] for i in (1, 2, 3, 4)] == [150, 200, 150, 100]
+    updates = [query for query, _ in fake_db.statements if query.lstrip().startswith('UPDATE')]
+    assert len(updates) == 1
+    assert fake_db.commits == 1
+
+def test_agency_scope(client):
+    fake_db = FakeDB()
+    response = client(fake_db).post('/charge_fee_bulk_update', json={
+        'app_user_number': '1', 'fees': [{'location_id': 20, 'price': 300}, {'location_id': 11, 'price': 300}]})
+    assert response.status_code == 200
+    results = response.get_json()['data']['results']
+    assert [result['matched'] for result in results] == [0, 1]
+    assert fake_db.powersupplies[5]['price'] == 100
+    assert fake_db.powersupplies[4]['price'] == 300
+
+def test_no_change_skips_update(client):
+    fake_db = FakeDB()
+    response = client(fake_db).post('/charge_fee_bulk_update', json=[{'location_id': 10, 'price': 100}])
+    assert response.status_code == 200
+    assert response.get_json()['data']['updated'] == 0
+    assert len(fake_db.statements) == 1
+    assert fake_db.commits == 0
+
+def test_invalid_rows_are_reported(client):
+    fake_db = FakeDB()
+    response = client(fake_db).post('/charge_fee_bulk_update', json=[
+        {'location_id': 10, 'price': 100},
+        {'location_id': 10, 'powersupply_id': 1, 'price': 100},
+        {'powersupply_id': 1},
+        {'powersupply_id': 1, 'price': -1},
+        {'location_id': '10', 'price': '120'},
+    ])
+    assert response.status_code == 400
+    errors = response.get_json()['data']['error']
+    assert [error['row'] for error in errors] == [2, 3, 4, 5]
+    assert fake_db.statements == []
+
+def test_rows_are_capped(client, monkeypatch):
+    monkeypatch.setenv('CHARGE_FEE_MAX_ROWS', '2')
+    fake_db = FakeDB()
+    response = client(fake_db).post('/charge_fee_bulk_update', json=[
+        {'location_id': 10, 'price': 150}, {'location_id': 11, 'price': 150}, {'powersupply_id': 5, 'price': 150}])
+    assert response.status_code == 400
+    assert fake_db.statements == []
+
+def test_csv(client):
+    fake_db = FakeDB()
+    response = client(fake_db).post('/charge_fee_bulk_update', data='powersupply_id,location_id,price\n1,,110\n,11,90\n',
+                                    content_type='text/csv')
+    assert response.status_code == 200
+    assert response.get_json()['data']['updated'] == 2
+    assert fake_db.powersupplies[1]['price'] == 110
+    assert fake_db.powersupplies[4]['price'] == 90
+
+def test_effective_from_schedules_instead_of_updating(client):
+    fake_db = FakeDB()
+    response = client(fake_db).post('/charge_fee_bulk_update', json={
+        'effective_from': '2024-05-01T00:00:00',
+        'fees': [{'location_id': 10, 'price': 150}, {'powersupply_id': 4, 'price': 200}]})
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['effective_from'] == '2024-05-01 00:00:00'
+    assert [result['status'] for result in data['results']] == ['scheduled', 'scheduled']
+    assert [schedule[:4] for schedule in fake_db.schedules] == [
+        (None, 10, 150, '2024-05-01 00:00:00'), (4, None, 200, '2024-05-01 00:00:00')]
+    assert not any(query.lstrip().startswith('UPDATE') for query, _ in fake_db.statements)
+    assert fake_db.commits == 1
+
+def test_effective_from_rejects_past_and_unknown_targets(client):
+    fake_db = FakeDB()
+    test_client = client(fake_db)
+    past = test_client.post('/charge_fee_bulk_update', json={
+        'effective_from': '2024-03-01 00:00:00', 'fees': [{'location_id': 10, 'price': 150}]})
+    assert past.status_code == 400
+    unknown = test_client.post('/charge_fee_bulk_update', json={
+        'app_user_number': '1', 'effective_from': '2024-05-01 00:00:00',
+        'fees': [{'location_id': 10, 'price': 150}, {'location_id': 20, 'price': 150}]})
+    assert unknown.status_code == 400
+    assert [error['row'] for error in unknown.get_json()['data']['error']] == [2]
+    assert fake_db.schedules == []
@@ -0,0 +1,140 @@
+import os
+import sys
+import datetime
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+import pytest
+from utils.charge_summary import (
+    refresh_charge_summary, summary_period, build_charge_summary_query, REFRESH_LOOKBACK_DAYS
+)
+
+# テスト用の疑似カーソル（クエリの内容に応じて結果を返す）
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = []
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.conn.executed.append((' '.join(query.split()), params))
+        self.rowcount = 0
+        if 'GET_LOCK' in query:
+            self.result = [{'acquired': 1 if self.conn.lock_available else 0}]
+        elif 'FROM t_charge_summary_state' in query:
+            self.result = [{'last_changed_at': self.conn.last_changed_at}]
+        elif 'NOW(6)' in query:
+            self.result = [{'high': self.conn.high_changed_at}]
+        elif 'SELECT DISTINCT DATE(charging_start)' in query:
+            self.result = [{'summary_date': d} for d in self.conn.changed_dates]
+        elif query.lstrip().startswith('INSERT INTO t_charge_daily_summary'):
+            self.rowcount = 3
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+LAST = datetime.datetime(2024, 1, 31, 23, 0)
+HIGH = datetime.datetime(2024, 2, 1, 0, 55)
+
+class FakeConnection:
+    def __init__(self, last_changed_at=LAST, high_changed_at=HIGH, changed_dates=(), lock_available=True):
+        self.last_changed_at = last_changed_at
+        self.high_changed_at = high_changed_at
+        self.changed_dates = list(changed_dates)
+        self.lock_available = lock_available
+        self.executed = []
+        self.commits = 0
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def statements(self, prefix):
+        return [params for query, params in self.executed if query.startswith(prefix)]
+
+def test_incremental_refresh_rebuilds_changed_and_recent_days():
+    conn = FakeConnection(changed_dates=[datetime.date(2024, 1, 5)])
+    today = datetime.date(2024, 2, 1)
+
+    result = refresh_charge_summary(conn, today=today)
+
+    recent = [today - datetime.timedelta(days=i) for i in range(REFRESH_LOOKBACK_DAYS + 1)]
+    expected = sorted({datetime.date(2024, 1, 5)} | set(recent))
+    assert result['dates'] == [d.isoformat() for d in expected]
+    assert result['rows'] == 3 * len(expected)
+    assert result['last_changed_at'] == str(HIGH)
+
+    # 前回の集計以降に追加・修正された範囲だけを差分として検索する
+    assert conn.statements('SELECT DISTINCT DATE(charging_start)') == [(LAST, HIGH)]
+    # 日ごとに削除・再作成してコミットする
+    assert [params[0] for params in conn.statements('DELETE FROM t_charge_daily_summary')] == expected
+    assert conn.commits == len(expected) + 1
+    state = conn.statements('INSERT INTO t_charge_summary_state')
+    assert len(state) == 1 and state[0][1] == HIGH
+    assert conn.executed[-1][0].startswith('SELECT RELEASE_LOCK')
+
+def test_range_refresh_rebuilds_every_day_without_moving_watermark():
+    conn = FakeConnection()
+
+    result = refresh_charge_summary(conn, datetime.date(2024, 1, 30), datetime.date(2024, 2, 2))
+
+    assert result['dates'] == ['2024-01-30', '2024-01-31', '2024-02-01', '2024-02-02']
+    rebuilt = conn.statements('INSERT INTO t_charge_daily_summary')
+    assert [(params[1], params[2]) for params in rebuilt][0] == (datetime.date(2024, 1, 30), datetime.date(2024, 1, 31))
+    assert conn.statements('INSERT INTO t_charge_summary_state') == []
+    assert conn.statements('SELECT DISTINCT DATE(charging_start)') == []
+
+def test_first_refresh_scans_all_history():
+    conn = FakeConnection(last_changed_at=None)
+    refresh_charge_summary(conn, today=datetime.date(2024, 2, 1))
+    assert conn.statements('SELECT DISTINCT DATE(charging_start)')[0][0] == '1970-01-01 00:00:01'
+
+def test_refresh_rejects_half_open_range():
+    conn = FakeConnection()
+    with pytest.raises(ValueError):
+        refresh_charge_summary(conn, start_date=datetime.date(2024, 1, 1))
+    with pytest.raises(ValueError):
+        refresh_charge_summary(conn, end_date=datetime.date(2024, 1, 1))
+    assert conn.executed == []
+
+def test_refresh_skips_when_another_refresh_holds_the_lock():
+    conn = FakeConnection(lock_available=False)
+
+    result = refresh_charge_summary(conn, today=datetime.date(2024, 2, 1))
+
+    assert result['skipped'] is True
+    assert conn.statements('DELETE') == []
+    assert conn.commits == 0
+
+def test_summary_period():
+    assert summary_period(2024) == (datetime.date(2024, 1, 1), datetime.date(2025, 1, 1))
+    assert summary_period('2024', '2') == (datetime.date(2024, 2, 1), datetime.date(2024, 3, 1))
+    assert summary_period(2024, 12) == (datetime.date(2024, 12, 1), datetime.date(2025, 1, 1))
+    for year, month in (('abc', None), (2024, 13), (2024, 0)):
+        with pytest.raises(ValueError):
+            summary_period(year, month)
+
+def test_build_charge_summary_query():
+    start, end = summary_period(2024, 2)
+    query, params = build_charge_summary_query(1, 3, start, end, group_by='station', interval='month')
+    assert params == [1, 3, start, end]
+    assert "DATE_FORMAT(s.summary_date, '%%Y-%%m') AS period" in query
+    assert 'm_powersupply.powersupply_id,' not in query
+
+    query, _ = build_charge_summary_query(1, 3, start, end, interval='total')
+    assert 'AS period' not in query
+
+    with pytest.raises(ValueError):
+        build_charge_summary_query(1, 3, start, end, group_by='user')
+    with pytest.raises(ValueError):
+        build_charge_summary_query(1, 3, start, end, interval='hour')
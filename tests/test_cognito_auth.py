@@ -0,0 +1,216 @@
+import os
+import sys
+import time
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+import jwt
+import pytest
+from jwt.algorithms import RSAAlgorithm
+from cryptography.hazmat.primitives.asymmetric import rsa
+from flask import Flask, Blueprint, g, jsonify
+from utils.cognito_auth import (AccessTokenVerifier, AuthenticationError, JWKSCache, init_auth,
+                                reset_verifier)
+from utils import cognito_auth
+
+ISSUER = 'https://cognito-idp.ap-northeast-1.amazonaws.com/ap-northeast-1_test'
+CLIENT_ID = 'client-123'
+
+def generate_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+POOL_KEY = generate_key()
+OTHER_KEY = generate_key()
+
+def jwk(private_key, kid):
+    value = RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+    value.update({'kid': kid, 'alg': 'RS256', 'use': 'sig'})
+    return value
+
+class FakeJWKSEndpoint:
+    """ユーザープールのJWKSエンドポイントの代わり"""
+
+    def __init__(self, *keys):
+        self.keys = list(keys)
+        self.calls = 0
+
+    def __call__(self, url):
+        self.calls += 1
+        return {'keys': self.keys}
+
+def make_token(private_key=POOL_KEY, kid='key-1', **overrides):
+    now = int(time.time())
+    claims = {
+        'sub': 'sub-0001',
+        'iss': ISSUER,
+        'client_id': CLIENT_ID,
+        'token_use': 'access',
+        'iat': now,
+        'exp': now + 3600,
+        'custom:ech_nav_code': 'ECH001',
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': kid})
+
+@pytest.fixture
+def endpoint():
+    return FakeJWKSEndpoint(jwk(POOL_KEY, 'key-1'))
+
+@pytest.fixture
+def verifier(endpoint):
+    return AccessTokenVerifier(ISSUER, CLIENT_ID, JWKSCache('https://example/jwks.json', fetch=endpoint))
+
+def test_valid_token(verifier):
+    claims = verifier.verify(make_token())
+    assert claims['sub'] == 'sub-0001'
+    assert claims['custom:ech_nav_code'] == 'ECH001'
+
+@pytest.mark.parametrize('token', [
+    make_token(exp=int(time.time()) - 10),
+    make_token(client_id='other-client'),
+    make_token(token_use='id'),
+    make_token(iss='https://cognito-idp.ap-northeast-1.amazonaws.com/other'),
+    make_token(private_key=OTHER_KEY),
+    make_token(kid='unknown'),
+    'not-a-token',
+])
+def test_invalid_tokens(verifier, token):
+    with pytest.raises(AuthenticationError):
+        verifier.verify(token)
+
+def test_missing_client_id_claim(verifier):
+    now = int(time.time())
+    token = jwt.encode({'sub': 's', 'iss': ISSUER, 'token_use': 'access', 'exp': now + 60},
+                       POOL_KEY, algorithm='RS256', headers={'kid': 'key-1'})
+    with pytest.raises(AuthenticationError):
+        verifier.verify(token)
+
+def test_rejects_symmetric_algorithm(verifier):
+    token = jwt.encode({'sub': 's'}, 'secret', algorithm='HS256', headers={'kid': 'key-1'})
+    with pytest.raises(AuthenticationError):
+        verifier.verify(token)
+
+def test_jwks_is_fetched_once(verifier, endpoint):
+    token = make_token()
+    for _ in range(100):
+        verifier.verify(token)
+    assert endpoint.calls == 1
+
+def test_verification_is_local_and_fast(verifier):
+    token = make_token()
+    verifier.verify(token)
+    start = time.perf_counter()
+    for _ in range(200):
+        verifier.verify(token)
+    per_call = (time.perf_counter() - start) / 200
+    # ネットワーク往復（数十ミリ秒）を伴わないこと
+    assert per_call < 0.005
+
+def test_unknown_kid_refreshes_jwks(endpoint):
+    jwks = JWKSCache('https://example/jwks.json', min_refresh_interval=0, fetch=endpoint)
+    verifier = AccessTokenVerifier(ISSUER, CLIENT_ID, jwks)
+    verifier.verify(make_token())
+
+    # 鍵のローテーション
+    endpoint.keys.append(jwk(OTHER_KEY, 'key-2'))
+    assert verifier.verify(make_token(private_key=OTHER_KEY, kid='key-2'))['sub'] == 'sub-0001'
+    assert endpoint.calls == 2
+
+def test_unknown_kid_refresh_is_rate_limited(endpoint):
+    jwks = JWKSCache('https://example/jwks.json', min_refresh_interval=60, fetch=endpoint)
+    jwks.get_key('key-1')
+    for _ in range(10):
+        with pytest.raises(AuthenticationError):
+            jwks.get_key('forged')
+    assert endpoint.calls == 1
+
+def test_expired_jwks_is_refetched(endpoint):
+    jwks = JWKSCache('https://example/jwks.json', ttl=0.05, fetch=endpoint)
+    jwks.get_key('key-1')
+    time.sleep(0.06)
+    jwks.get_key('key-1')
+    assert endpoint.calls == 2
+
+def test_fetch_failure_keeps_previous_keys(endpoint):
+    jwks = JWKSCache('https://example/jwks.json', ttl=0, fetch=endpoint)
+    jwks.get_key('key-1')
+
+    def failing(url):
+        raise OSError('network down')
+
+    jwks._fetch = failing
+    assert jwks.get_key('key-1') is not None
+    assert jwks.stats()['refresh_failures'] == 1
+
+def test_fetch_failure_without_keys():
+    def failing(url):
+        raise OSError('network down')
+
+    with pytest.raises(AuthenticationError):
+        JWKSCache('https://example/jwks.json', fetch=failing).get_key('key-1')
+
+@pytest.fixture
+def app(monkeypatch, verifier):
+    monkeypatch.setattr(cognito_auth, '_verifier', verifier)
+    app = Flask(__name__)
+    init_auth(app)
+    bp = Blueprint('router', __name__)
+
+    @bp.route('/private', methods=['POST'])
+    def private():
+        return jsonify({'sub': g.cognito_sub, 'ech_nav_code': g.ech_nav_code})
+
+    @bp.route('/agency_user_login', methods=['POST'])
+    def agency_user_login():
+        return jsonify({'sub': g.cognito_sub})
+
+    app.register_blueprint(bp)
+    yield app
+    reset_verifier()
+
+def test_middleware_sets_claims_on_g(app, monkeypatch):
+    monkeypatch.setenv('COGNITO_AUTH_MODE', 'optional')
+    response = app.test_client().post('/private', headers={'Authorization': f'Bearer {make_token()}'})
+    assert response.status_code == 200
+    assert response.get_json() == {'sub': 'sub-0001', 'ech_nav_code': 'ECH001'}
+
+def test_middleware_is_off_by_default(app, monkeypatch):
+    monkeypatch.delenv('COGNITO_AUTH_MODE', raising=False)
+    response = app.test_client().post('/private', headers={'Authorization': f'Bearer {make_token()}'})
+    assert response.status_code == 200
+    assert response.get_json() == {'sub': None, 'ech_nav_code': None}
+
+def test_middleware_optional_mode(app, monkeypatch):
+    monkeypatch.setenv('COGNITO_AUTH_MODE', 'optional')
+    client = app.test_client()
+    assert client.post('/private').get_json() == {'sub': None, 'ech_nav_code': None}
+    assert client.post('/private', headers={'Authorization': f'Bearer {make_token()}'}).get_json()['sub'] == 'sub-0001'
+    # 期限切れ・不正なトークンはログに記録し、未認証として続行する
+    for header in (f'Bearer {make_token(client_id="x")}', 'Basic abc'):
+        response = client.post('/private', headers={'Authorization': header})
+        assert response.status_code == 200
+        assert response.get_json() == {'sub': None, 'ech_nav_code': None}
+
+@pytest.mark.parametrize('mode, status_code', [('optional', 200), ('required', 500)])
+def test_middleware_missing_configuration(app, monkeypatch, mode, status_code):
+    monkeypatch.setenv('COGNITO_AUTH_MODE', mode)
+    monkeypatch.setattr(cognito_auth, '_verifier', None)
+    monkeypatch.delenv('COGNITO_CLIENT_ID', raising=False)
+    monkeypatch.setenv('COGNITO_USER_POOL_ID', 'ap-northeast-1_pool')
+    response = app.test_client().post('/private', headers={'Authorization': f'Bearer {make_token()}'})
+    assert response.status_code == status_code
+
+def test_middleware_required_mode(app, monkeypatch):
+    monkeypatch.setenv('COGNITO_AUTH_MODE', 'required')
+    client = app.test_client()
+    assert client.post('/private').status_code == 401
+    assert client.post('/private', headers={'Authorization': 'Basic abc'}).status_code == 401
+    # ログイン前のエンドポイントはトークンなし、または期限切れのトークンでも呼び出せる
+    assert client.post('/agency_user_login').status_code == 200
+    expired = make_token(exp=int(time.time()) - 10)
+    response = client.post('/agency_user_login', headers={'Authorization': f'Bearer {expired}'})
+    assert response.status_code == 200
+
+def test_middleware_off_mode(app, monkeypatch):
+    monkeypatch.setenv('COGNITO_AUTH_MODE', 'off')
+    response = app.test_client().post('/private', headers={'Authorization': 'Bearer garbage'})
+    assert response.status_code == 200
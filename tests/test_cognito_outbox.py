@@ -0,0 +1,222 @@
+import os
+import sys
+from contextlib import contextmanager
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+for key, value in {'END_POINT': 'localhost', 'USER_NAME': 'test', 'PASSWORD': 'test',
+                   'DB_NAME': 'test', 'PORT': '3306'}.items():
+    os.environ.setdefault(key, value)
+import pytest
+from flask import Flask
+from botocore.exceptions import ClientError
+from utils.cognito_outbox import (
+    process_cognito_outbox, retry_delay, OUTBOX_PENDING, OUTBOX_DONE, OUTBOX_FAILED, OUTBOX_CANCELED
+)
+from route.dashb.common import agency_update_user_router as agency_module
+
+class FakeCursor:
+    """t_cognito_outboxとm_userへのクエリを再現する"""
+
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+
+    def execute(self, query, params=None):
+        query = ' '.join(query.split())
+        self.db.executed.append((query, params))
+        if 'GET_LOCK' in query:
+            self.result = [{'acquired': 1}]
+        elif query.startswith('SELECT o.outbox_id'):
+            status, now, limit = params
+            self.result = [
+                {'outbox_id': outbox_id, **entry, 'user_status': self.db.user_status.get(entry['user_id']),
+                 'cognito_username': self.db.cognito_usernames.get(entry['user_id'])}
+                for outbox_id, entry in sorted(self.db.outbox.items())
+                if entry['status'] == status and entry['next_attempt_at'] <= now
+            ][:limit]
+        elif query.startswith('UPDATE t_cognito_outbox SET status = %s, attempts'):
+            status, attempts, next_attempt_at, error, _, outbox_id = params
+            self.db.outbox[outbox_id].update(
+                {'status': status, 'attempts': attempts, 'next_attempt_at': next_attempt_at, 'error': error})
+        elif query.startswith('UPDATE t_cognito_outbox'):
+            status, error, _, outbox_id = params
+            self.db.outbox[outbox_id].update({'status': status, 'error': error})
+        elif query.startswith('INSERT INTO t_cognito_outbox'):
+            operation, user_id, email, status, next_attempt_at = params[:5]
+            self.db.outbox[len(self.db.outbox) + 1] = {
+                'operation': operation, 'user_id': user_id, 'email': email, 'status': status,
+                'attempts': 0, 'next_attempt_at': next_attempt_at}
+        elif query.startswith('SELECT status AS user_status'):
+            user_id = params[0]
+            self.result = [{'user_status': self.db.user_status[user_id],
+                            'cognito_username': self.db.cognito_usernames.get(user_id)}] \
+                if user_id in self.db.user_status else []
+        elif query.startswith('SELECT status FROM m_user'):
+            self.result = [{'status': self.db.user_status.get(params[0], 1)}]
+        elif query.startswith('SELECT mail, cognito_username FROM m_user'):
+            self.result = [{'mail': self.db.mail, 'cognito_username': self.db.cognito_usernames.get(params[0])}]
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    @contextmanager
+    def cursor(self, cursor_class=None):
+        yield FakeCursor(self.db)
+
+    def commit(self):
+        self.db.commits += 1
+
+    def rollback(self):
+        self.db.rollbacks += 1
+
+class FakeDB:
+    def __init__(self, outbox=None, user_status=None, cognito_usernames=None):
+        self.outbox = outbox or {}
+        self.user_status = user_status or {}
+        self.cognito_usernames = cognito_usernames or {}
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.mail = 'user@example.com'
+
+    @contextmanager
+    def get_connection(self):
+        yield FakeConnection(self)
+
+class FakeCognito:
+    def __init__(self, users_by_email=None, error=None, on_delete=None):
+        self.users_by_email = users_by_email or {}
+        self.error = error
+        self.on_delete = on_delete
+        self.deleted = []
+        self.calls = 0
+
+    def list_users(self, UserPoolId, Filter):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        email = Filter.split('"')[1]
+        return {'Users': [{'Username': username} for username in self.users_by_email.get(email, [])]}
+
+    def admin_delete_user(self, UserPoolId, Username):
+        if Username == 'missing':
+            raise ClientError({'Error': {'Code': 'UserNotFoundException', 'Message': ''}}, 'AdminDeleteUser')
+        self.deleted.append(Username)
+        if self.on_delete:
+            self.on_delete(Username)
+
+def entry(user_id, email, next_attempt_at='2024-01-01 00:00:00', attempts=0):
+    return {'operation': 'delete_user', 'user_id': user_id, 'email': email, 'status': OUTBOX_PENDING,
+            'attempts': attempts, 'next_attempt_at': next_attempt_at}
+
+NOW = '2024-01-01 01:00:00'
+
+def test_processes_due_entries():
+    fake_db = FakeDB(
+        outbox={1: entry(1, 'a@example.com'), 2: entry(2, 'b@example.com'), 3: entry(3, 'c@example.com'),
+                4: entry(4, 'd@example.com'), 5: entry(5, 'e@example.com', next_attempt_at='2024-01-01 02:00:00')},
+        user_status={1: 3, 2: 3, 3: 1, 4: 3, 5: 3})
+    cognito = FakeCognito({'a@example.com': ['user-a'], 'd@example.com': ['user-d1', 'user-d2']})
+    with fake_db.get_connection() as conn:
+        result = process_cognito_outbox(conn, cognito, 'pool', now=NOW)
+    assert result == {'skipped': False, OUTBOX_DONE: 2, OUTBOX_CANCELED: 1, OUTBOX_FAILED: 1, 'retry': 0}
+    assert cognito.deleted == ['user-a']
+    assert [fake_db.outbox[i]['status'] for i in (1, 2, 3, 4, 5)] == [
+        OUTBOX_DONE, OUTBOX_DONE, OUTBOX_CANCELED, OUTBOX_FAILED, OUTBOX_PENDING]
+    assert fake_db.executed[-1][0].startswith('SELECT RELEASE_LOCK')
+
+def test_user_reactivated_after_batch_read_is_not_deleted():
+    fake_db = FakeDB(outbox={1: entry(1, 'a@example.com'), 2: entry(2, 'b@example.com')},
+                     user_status={1: 3, 2: 3}, cognito_usernames={1: '+8190000001', 2: '+8190000002'})
+    # 1件目の処理中（一覧の取得後）に2件目のユーザーが有効に戻された場合
+    cognito = FakeCognito(on_delete=lambda username: fake_db.user_status.update({2: 1}))
+    with fake_db.get_connection() as conn:
+        result = process_cognito_outbox(conn, cognito, 'pool', now=NOW)
+    assert result[OUTBOX_DONE] == 1 and result[OUTBOX_CANCELED] == 1
+    assert cognito.deleted == ['+8190000001']
+    assert fake_db.outbox[2]['status'] == OUTBOX_CANCELED
+    assert any(query.endswith('FOR UPDATE') and params == (2,) for query, params in fake_db.executed)
+
+def test_deletes_by_stored_username_without_searching():
+    fake_db = FakeDB(outbox={1: entry(1, 'a@example.com'), 2: entry(2, 'b@example.com')},
+                     user_status={1: 3, 2: 3}, cognito_usernames={1: '+8190000001', 2: 'missing'})
+    cognito = FakeCognito({'a@example.com': ['other']})
+    with fake_db.get_connection() as conn:
+        result = process_cognito_outbox(conn, cognito, 'pool', now=NOW)
+    assert result[OUTBOX_DONE] == 2
+    assert cognito.deleted == ['+8190000001']
+    # メールアドレスでの検索（list_users）は行わない
+    assert cognito.calls == 0
+
+def test_retries_with_backoff_then_fails(monkeypatch):
+    monkeypatch.setenv('COGNITO_OUTBOX_MAX_ATTEMPTS', '3')
+    fake_db = FakeDB(outbox={1: entry(1, 'a@example.com')}, user_status={1: 3})
+    cognito = FakeCognito(error=ClientError({'Error': {'Code': 'TooManyRequestsException', 'Message': ''}}, 'ListUsers'))
+    with fake_db.get_connection() as conn:
+        assert process_cognito_outbox(conn, cognito, 'pool', now=NOW)['retry'] == 1
+        assert fake_db.outbox[1]['next_attempt_at'] == '2024-01-01 01:00:30'
+        # 次の試行時刻までは処理しない
+        process_cognito_outbox(conn, cognito, 'pool', now='2024-01-01 01:00:10')
+        assert cognito.calls == 1
+        process_cognito_outbox(conn, cognito, 'pool', now='2024-01-01 01:00:30')
+        assert fake_db.outbox[1]['next_attempt_at'] == '2024-01-01 01:01:30'
+        result = process_cognito_outbox(conn, cognito, 'pool', now='2024-01-01 01:01:30')
+    assert result[OUTBOX_FAILED] == 1
+    assert fake_db.outbox[1]['status'] == OUTBOX_FAILED
+    assert fake_db.outbox[1]['attempts'] == 3
+
+def test_retry_delay_is_capped(monkeypatch):
+    assert [retry_delay(n) for n in (1, 2, 3)] == [30, 60, 120]
+    assert retry_delay(20) == 3600
+
+def test_update_user_enqueues_instead_of_calling_cognito(monkeypatch):
+    fake_db = FakeDB()
+    monkeypatch.setattr(agency_module, 'db', fake_db)
+    monkeypatch.setattr(agency_module, 'resolve_user_identity', lambda cursor, app_user_number: {'user_id': 7})
+    monkeypatch.setattr(agency_module, 'invalidate_user_identity', lambda app_user_number: None)
+    app = Flask(__name__)
+    app.register_blueprint(agency_module.agency_update_user_router)
+    response = app.test_client().post('/agency_update_user', json={
+        'app_user_number': '0000000001', 'lastname': '山田', 'firstname': '太郎', 'status': 3, 'permission': 1})
+    assert response.status_code == 200
+    assert [(e['user_id'], e['email'], e['status']) for e in fake_db.outbox.values()] == \
+        [(7, 'user@example.com', OUTBOX_PENDING)]
+    assert fake_db.commits == 1
+
+def test_update_user_with_cognito_username_does_not_need_mail(monkeypatch):
+    fake_db = FakeDB(cognito_usernames={7: '+8190000007'})
+    fake_db.mail = None
+    monkeypatch.setattr(agency_module, 'db', fake_db)
+    monkeypatch.setattr(agency_module, 'resolve_user_identity', lambda cursor, app_user_number: {'user_id': 7})
+    monkeypatch.setattr(agency_module, 'invalidate_user_identity', lambda app_user_number: None)
+    app = Flask(__name__)
+    app.register_blueprint(agency_module.agency_update_user_router)
+    response = app.test_client().post('/agency_update_user', json={
+        'app_user_number': '0000000001', 'lastname': '山田', 'firstname': '太郎', 'status': 3, 'permission': 1})
+    assert response.status_code == 200
+    assert [(e['user_id'], e['email']) for e in fake_db.outbox.values()] == [(7, None)]
+    assert fake_db.commits == 1
+
+def test_update_user_without_mail_rolls_back_and_keeps_cache(monkeypatch):
+    fake_db = FakeDB()
+    fake_db.mail = None
+    invalidated = []
+    monkeypatch.setattr(agency_module, 'db', fake_db)
+    monkeypatch.setattr(agency_module, 'resolve_user_identity', lambda cursor, app_user_number: {'user_id': 7})
+    monkeypatch.setattr(agency_module, 'invalidate_user_identity', invalidated.append)
+    app = Flask(__name__)
+    app.register_blueprint(agency_module.agency_update_user_router)
+    response = app.test_client().post('/agency_update_user', json={
+        'app_user_number': '0000000001', 'lastname': '山田', 'firstname': '太郎', 'status': 3, 'permission': 1})
+    assert response.status_code == 404
+    assert fake_db.rollbacks == 1 and fake_db.commits == 0
+    # キャッシュの無効化はコミットの後にだけ行う
+    assert invalidated == []
+    assert fake_db.outbox == {}
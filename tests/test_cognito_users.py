@@ -0,0 +1,116 @@
+import os
+import sys
+from contextlib import contextmanager
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+for key, value in {'END_POINT': 'localhost', 'USER_NAME': 'test', 'PASSWORD': 'test',
+                   'DB_NAME': 'test', 'PORT': '3306'}.items():
+    os.environ.setdefault(key, value)
+from utils.cognito_users import backfill_cognito_users, build_cognito_key_update
+
+class FakeCursor:
+    """m_userへのcognito_username・cognito_subの一括更新を再現する"""
+
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+        self.rowcount = 0
+
+    def execute(self, query, params=None):
+        query = ' '.join(query.split())
+        self.db.executed.append(query)
+        if 'GET_LOCK' in query:
+            self.result = [{'acquired': int(not self.db.locked)}]
+        elif query.startswith('UPDATE m_user u JOIN'):
+            self.rowcount = 0
+            values = params[:-2]
+            for i in range(0, len(values), 3):
+                echnavicode, username, sub = values[i:i + 3]
+                user = self.db.users.get(echnavicode)
+                if user is not None and user['cognito_username'] is None:
+                    user.update({'cognito_username': username, 'cognito_sub': sub})
+                    self.rowcount += 1
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    @contextmanager
+    def cursor(self, cursor_class=None):
+        yield FakeCursor(self.db)
+
+    def commit(self):
+        self.db.commits += 1
+
+class FakeDB:
+    def __init__(self, users, locked=False):
+        self.users = {code: {'cognito_username': None, 'cognito_sub': None} for code in users}
+        self.locked = locked
+        self.executed = []
+        self.commits = 0
+
+class FakeCognito:
+    """1ページ2件でユーザーを返す"""
+
+    def __init__(self, users):
+        self.users = users
+        self.requests = []
+
+    def list_users(self, UserPoolId, Limit, PaginationToken=None):
+        self.requests.append(PaginationToken)
+        start = int(PaginationToken or 0)
+        page = self.users[start:start + 2]
+        response = {'Users': [{'Username': username, 'Attributes': attributes} for username, attributes in page]}
+        if start + 2 < len(self.users):
+            response['PaginationToken'] = str(start + 2)
+        return response
+
+def cognito_user(username, echnavicode=None):
+    attributes = [{'Name': 'sub', 'Value': f'sub-{username}'}]
+    if echnavicode:
+        attributes.append({'Name': 'custom:ech_nav_code', 'Value': echnavicode})
+    return (username, attributes)
+
+COGNITO_USERS = [cognito_user('+8190000001', 'EchNaviAGE1'), cognito_user('+8190000002', 'EchNaviAGE2'),
+                 cognito_user('+8190000003'), cognito_user('+8190000004', 'EchNaviAGE4'),
+                 cognito_user('+8190000005', 'EchNaviAGE5')]
+
+def test_build_update_is_one_statement_per_page():
+    query, params = build_cognito_key_update([('E1', 'u1', 's1'), ('E2', 'u2', 's2')], '2024-01-01 00:00:00')
+    assert query.count('UNION ALL') == 1
+    assert 'WHERE u.cognito_username IS NULL' in query
+    assert params == ['E1', 'u1', 's1', 'E2', 'u2', 's2', '2024-01-01 00:00:00', 'Backfill']
+
+def test_backfills_every_page_once():
+    fake_db = FakeDB(['EchNaviAGE1', 'EchNaviAGE2', 'EchNaviAGE4'])
+    cognito = FakeCognito(COGNITO_USERS)
+    result = backfill_cognito_users(FakeConnection(fake_db), cognito, 'pool')
+    assert result == {'skipped': False, 'pages': 3, 'users': 5, 'without_ech_nav_code': 1, 'updated': 3,
+                      'pagination_token': None}
+    assert fake_db.users['EchNaviAGE4'] == {'cognito_username': '+8190000004', 'cognito_sub': 'sub-+8190000004'}
+    assert len([q for q in fake_db.executed if q.startswith('UPDATE m_user')]) == 3
+    assert fake_db.executed[-1].startswith('SELECT RELEASE_LOCK')
+
+    # 設定済みの行は変更しないため、再実行しても更新されない
+    assert backfill_cognito_users(FakeConnection(fake_db), FakeCognito(COGNITO_USERS), 'pool')['updated'] == 0
+
+def test_resumes_from_pagination_token():
+    fake_db = FakeDB(['EchNaviAGE1', 'EchNaviAGE5'])
+    first = backfill_cognito_users(FakeConnection(fake_db), FakeCognito(COGNITO_USERS), 'pool', max_pages=1)
+    assert (first['pages'], first['updated'], first['pagination_token']) == (1, 1, '2')
+    cognito = FakeCognito(COGNITO_USERS)
+    second = backfill_cognito_users(FakeConnection(fake_db), cognito, 'pool',
+                                    pagination_token=first['pagination_token'])
+    assert cognito.requests == ['2', '4']
+    assert (second['updated'], second['pagination_token']) == (1, None)
+    assert fake_db.users['EchNaviAGE5']['cognito_username'] == '+8190000005'
+
+def test_skips_when_locked():
+    fake_db = FakeDB(['EchNaviAGE1'], locked=True)
+    cognito = FakeCognito(COGNITO_USERS)
+    result = backfill_cognito_users(FakeConnection(fake_db), cognito, 'pool', pagination_token='2')
+    assert result['skipped'] is True and result['pagination_token'] == '2'
+    assert cognito.requests == []
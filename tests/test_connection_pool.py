@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+import threading
+import pytest
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+from db.connection_pool import ConnectionPool, PoolTimeoutError
+
+# テスト用の疑似接続
+class FakeConnection:
+    def __init__(self):
+        self.open = True
+
+    def ping(self, reconnect=False):
+        if not self.open:
+            raise Exception('closed')
+
+    def close(self):
+        self.open = False
+
+def test_reuse_idle_connection():
+    pool = ConnectionPool(FakeConnection, max_size=2)
+
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+
+    assert first is second
+    assert pool.stats()['created'] == 1
+
+def test_timeout_when_saturated():
+    pool = ConnectionPool(FakeConnection, max_size=1, timeout=0.05)
+
+    held = pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+
+    stats = pool.stats()
+    assert stats['timeouts'] == 1
+    assert stats['saturation'] == 1.0
+    pool.release(held)
+
+def test_waiter_receives_released_connection():
+    pool = ConnectionPool(FakeConnection, max_size=1, timeout=2)
+    held = pool.acquire()
+    acquired = []
+
+    def worker():
+        acquired.append(pool.acquire())
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    time.sleep(0.05)
+    pool.release(held)
+    thread.join()
+
+    assert acquired == [held]
+    assert pool.stats()['waits'] == 1
+
+def test_concurrency_is_bounded():
+    pool = ConnectionPool(FakeConnection, max_size=3, timeout=5)
+
+    def worker():
+        for _ in range(20):
+            pooled = pool.acquire()
+            time.sleep(0.001)
+            pool.release(pooled)
+
+    threads = [threading.Thread(target=worker) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = pool.stats()
+    assert stats['peak_in_use'] <= 3
+    assert stats['created'] <= 3
+    assert stats['checkouts'] == 200
+
+def test_idle_eviction_keeps_min_size():
+    pool = ConnectionPool(FakeConnection, min_size=1, max_size=3, idle_timeout=0)
+    connections = [pool.acquire() for _ in range(3)]
+    for pooled in connections:
+        pool.release(pooled)
+
+    pool.acquire()
+
+    stats = pool.stats()
+    assert stats['size'] == 1
+    assert stats['idle_evictions'] == 2
+
+def test_recycle_after_max_lifetime():
+    pool = ConnectionPool(FakeConnection, max_size=1, max_lifetime=0)
+
+    first = pool.acquire()
+    pool.release(first)
+    second = pool.acquire()
+
+    assert first is not second
+    assert not first.connection.open
+    assert pool.stats()['lifetime_recycles'] == 1
+
+def test_discard_broken_connection():
+    pool = ConnectionPool(FakeConnection, max_size=1)
+
+    first = pool.acquire()
+    pool.release(first, discard=True)
+    second = pool.acquire()
+
+    assert first is not second
+    assert pool.stats()['size'] == 1
+
+def test_prefill_opens_min_size_connections():
+    pool = ConnectionPool(FakeConnection, min_size=2, max_size=3)
+
+    assert pool.prefill() == 2
+    first = pool.acquire()
+
+    stats = pool.stats()
+    assert stats['created'] == 2
+    assert stats['idle'] == 1
+    assert first.connection.open
+
+def test_prefill_stops_on_connect_failure():
+    def connect():
+        raise Exception('unreachable')
+
+    pool = ConnectionPool(connect, min_size=2, max_size=3)
+
+    assert pool.prefill() == 0
+    assert pool.stats()['size'] == 0
@@ -0,0 +1,122 @@
+import os
+import sys
+import pymysql
+import pytest
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+for key, value in {'END_POINT': 'localhost', 'USER_NAME': 'test', 'PASSWORD': 'test',
+                   'DB_NAME': 'test', 'PORT': '3306'}.items():
+    os.environ.setdefault(key, value)
+from db.db_connection import DBConnection, CONNECTION_MODE_REUSE, CONNECTION_MODE_POOL
+
+# テスト用の疑似接続
+class FakeConnection:
+    def __init__(self):
+        self.open = True
+        self.commits = 0
+        self.rollbacks = 0
+        self.alive = True
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise pymysql.err.OperationalError(2006, 'MySQL server has gone away')
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.open = False
+
+def create_db(monkeypatch):
+    monkeypatch.setenv('DB_CONNECTION_MODE', CONNECTION_MODE_REUSE)
+    database = DBConnection()
+    created = []
+
+    def fake_pymysql_connect(**kwargs):
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+
+    monkeypatch.setattr(pymysql, 'connect', fake_pymysql_connect)
+    return database, created
+
+def test_reuse_connection_between_requests(monkeypatch):
+    database, created = create_db(monkeypatch)
+
+    with database.get_connection() as first:
+        pass
+    with database.get_connection() as second:
+        pass
+
+    assert first is second
+    assert len(created) == 1
+    assert first.open
+    assert first.commits == 2
+    assert database.stats()['hits'] == 1
+
+def test_reconnect_when_ping_fails(monkeypatch):
+    database, created = create_db(monkeypatch)
+
+    with database.get_connection() as first:
+        pass
+    first.alive = False
+    with database.get_connection() as second:
+        pass
+
+    assert first is not second
+    assert not first.open
+    assert database.stats()['reconnects'] == 1
+
+def test_rollback_and_discard_on_operational_error(monkeypatch):
+    database, created = create_db(monkeypatch)
+
+    with pytest.raises(pymysql.err.OperationalError):
+        with database.get_connection() as conn:
+            raise pymysql.err.OperationalError(2013, 'Lost connection')
+
+    assert conn.rollbacks == 1
+    assert not conn.open
+    assert database.stats()['failures'] == 1
+
+    with database.get_connection() as new_conn:
+        pass
+    assert new_conn is not conn
+
+def test_nested_use_opens_separate_connection(monkeypatch):
+    database, created = create_db(monkeypatch)
+
+    with database.get_connection() as outer:
+        with database.get_connection() as inner:
+            pass
+        assert inner is not outer
+        assert not inner.open
+    assert outer.open
+
+def test_pool_mode_returns_connection_to_pool(monkeypatch):
+    monkeypatch.setenv('DB_CONNECTION_MODE', CONNECTION_MODE_POOL)
+    monkeypatch.setenv('DB_POOL_MAX_SIZE', '2')
+    database = DBConnection()
+    monkeypatch.setattr(pymysql, 'connect', lambda **kwargs: FakeConnection())
+
+    with database.get_connection() as first:
+        pass
+    with database.get_connection() as second:
+        pass
+
+    assert first is second
+    assert first.commits == 2
+    assert database.stats()['pool']['checkouts'] == 2
+
+def test_prewarm_pool_opens_min_size_connections(monkeypatch):
+    monkeypatch.setenv('DB_CONNECTION_MODE', CONNECTION_MODE_POOL)
+    monkeypatch.setenv('DB_POOL_MIN_SIZE', '2')
+    database = DBConnection()
+    monkeypatch.setattr(pymysql, 'connect', lambda **kwargs: FakeConnection())
+
+    database.prewarm_pool()
+
+    assert database.stats()['connects'] == 2
+    assert database.stats()['pool']['idle'] == 2
@@ -0,0 +1,280 @@
+import os
+import sys
+import gzip
+import decimal
+import datetime
+import contextlib
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+for key, value in {'END_POINT': 'localhost', 'USER_NAME': 'test', 'PASSWORD': 'test',
+                   'DB_NAME': 'test', 'PORT': '3306'}.items():
+    os.environ.setdefault(key, value)
+from utils import export_jobs
+from utils.object_storage import LocalObjectStorage, S3ObjectStorage
+
+ROWS = [
+    {
+        'transaction_id': i,
+        'charging_start': datetime.datetime(2024, 1, 1, 10, 0, 0) + datetime.timedelta(minutes=i),
+        'charged_amount': decimal.Decimal('12.50'),
+    }
+    for i in range(2500)
+]
+
+# テスト用の疑似カーソル（件数取得と結果取得の両方に対応）
+class FakeCursor:
+    def __init__(self, rows, fail=False):
+        self.rows = list(rows)
+        self.fail = fail
+        self.description = None
+        self.result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        if self.fail:
+            raise RuntimeError("query failed")
+        if 'COUNT(*)' in query:
+            self.result = {'total_count': len(self.rows)}
+        else:
+            self.description = [(name,) for name in self.rows[0]]
+
+    def fetchone(self):
+        return self.result
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        return batch
+
+class FakeConnection:
+    def __init__(self, rows, fail):
+        self.rows = rows
+        self.fail = fail
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self.rows, self.fail)
+
+class FakeDB:
+    def __init__(self, rows, fail=False):
+        self.rows = rows
+        self.fail = fail
+
+    @contextlib.contextmanager
+    def get_connection(self):
+        yield FakeConnection(self.rows, self.fail)
+
+# テスト用の疑似S3クライアント
+class FakeS3Client:
+    def __init__(self):
+        self.objects = {}
+        self.parts = {}
+        self.calls = []
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.calls.append('put_object')
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.calls.append('create_multipart_upload')
+        self.parts[Key] = []
+        return {'UploadId': 'upload-1'}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.calls.append('upload_part')
+        self.parts[Key].append(Body)
+        return {'ETag': f'etag-{PartNumber}'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.calls.append('complete_multipart_upload')
+        assert [part['PartNumber'] for part in MultipartUpload['Parts']] == list(range(1, len(self.parts[Key]) + 1))
+        self.objects[Key] = b''.join(self.parts[Key])
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.calls.append('abort_multipart_upload')
+
+def test_local_storage_round_trip(tmp_path):
+    storage = LocalObjectStorage(str(tmp_path))
+    assert storage.put_stream('a/b.csv', [b'x,y\n', b'1,2\n']) == 8
+    assert storage.get_bytes('a/b.csv') == b'x,y\n1,2\n'
+    assert storage.get_bytes('a/missing.csv') is None
+    assert storage.download_handle('a/b.csv')['path'] == str(tmp_path / 'a' / 'b.csv')
+
+def test_local_storage_rejects_keys_outside_base(tmp_path):
+    storage = LocalObjectStorage(str(tmp_path))
+    try:
+        storage.put_bytes('../escape.json', b'{}')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("ValueError was not raised")
+
+def test_s3_storage_small_object_uses_single_put():
+    client = FakeS3Client()
+    storage = S3ObjectStorage('bucket', 'exports/', client=client, part_size=10)
+    storage.put_stream('a.csv', [b'abc', b'def'])
+    assert client.calls == ['put_object']
+    assert client.objects['exports/a.csv'] == b'abcdef'
+
+def test_s3_storage_large_object_uses_multipart_upload():
+    client = FakeS3Client()
+    storage = S3ObjectStorage('bucket', client=client, part_size=10)
+    body = [bytes([i]) * 4 for i in range(7)]
+    assert storage.put_stream('a.csv', body) == 28
+    assert client.calls.count('upload_part') == 3
+    assert client.calls[-1] == 'complete_multipart_upload'
+    assert client.objects['a.csv'] == b''.join(body)
+
+def test_s3_storage_aborts_multipart_upload_on_error():
+    client = FakeS3Client()
+    storage = S3ObjectStorage('bucket', client=client, part_size=4)
+
+    def chunks():
+        yield b'12345'
+        raise RuntimeError("source failed")
+
+    try:
+        storage.put_stream('a.csv', chunks())
+    except RuntimeError:
+        pass
+    assert client.calls[-1] == 'abort_multipart_upload'
+    assert 'a.csv' not in client.objects
+
+def test_run_export_job_writes_result_and_status(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_jobs, 'db', FakeDB(ROWS))
+    storage = LocalObjectStorage(str(tmp_path))
+
+    job = export_jobs.create_export_job(
+        'charge_history',
+        {'start_period': '2024-01-01', 'end_period': '2024-12-31', 'agency_id': 1, 'permission': 3},
+        'csv', compress=True, storage=storage)
+    assert export_jobs.get_export_job(job['job_id'], storage)['status'] == 'queued'
+
+    finished = export_jobs.run_export_job(job['job_id'], storage)
+    assert finished['status'] == 'completed'
+
+    status = export_jobs.get_export_job(job['job_id'], storage)
+    assert status['status'] == 'completed'
+    assert status['progress'] == 100
+    assert status['total_rows'] == status['rows_written'] == len(ROWS)
+    assert 'params' not in status
+
+    body = gzip.decompress(storage.get_bytes(status['result_key'])).decode('utf-8')
+    lines = body.splitlines()
+    assert lines[0] == 'transaction_id,charging_start,charged_amount'
+    assert lines[1] == '0,2024-01-01T10:00:00,12.50'
+    assert len(lines) == len(ROWS) + 1
+    assert status['download']['path'].endswith('charge_history.csv.gz')
+
+def test_run_export_job_records_failure(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_jobs, 'db', FakeDB(ROWS, fail=True))
+    storage = LocalObjectStorage(str(tmp_path))
+    job = export_jobs.create_export_job('download_history', {'location_id': 1}, 'ndjson', storage=storage)
+
+    export_jobs.run_export_job(job['job_id'], storage)
+
+    status = export_jobs.get_export_job(job['job_id'], storage)
+    assert status['status'] == 'failed'
+    assert status['error'] == 'query failed'
+    assert 'download' not in status
+
+def test_run_export_job_skips_completed_job(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_jobs, 'db', FakeDB(ROWS))
+    storage = LocalObjectStorage(str(tmp_path))
+    job = export_jobs.create_export_job('download_history', {'location_id': 1}, 'ndjson', storage=storage)
+    export_jobs.run_export_job(job['job_id'], storage)
+
+    monkeypatch.setattr(export_jobs, 'db', FakeDB(ROWS, fail=True))
+    assert export_jobs.run_export_job(job['job_id'], storage)['status'] == 'completed'
+
+def test_get_export_job_rejects_unknown_ids(tmp_path):
+    storage = LocalObjectStorage(str(tmp_path))
+    assert export_jobs.get_export_job('../../etc/passwd', storage) is None
+    assert export_jobs.get_export_job('0' * 32, storage) is None
+
+def test_get_export_job_checks_owner(tmp_path):
+    storage = LocalObjectStorage(str(tmp_path))
+    job = export_jobs.create_export_job('download_history', {'location_id': 1}, 'csv',
+                                        storage=storage, agency_id=3)
+    assert export_jobs.get_export_job(job['job_id'], storage, agency_id=3)['status'] == 'queued'
+    assert export_jobs.get_export_job(job['job_id'], storage, agency_id=4) is None
+    assert export_jobs.get_export_job(job['job_id'], storage) is None
+
+def test_stale_running_job_fails_and_can_rerun(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_jobs, 'db', FakeDB(ROWS))
+    storage = LocalObjectStorage(str(tmp_path))
+    job = export_jobs.create_export_job('download_history', {'location_id': 1}, 'csv', storage=storage)
+    job.update({'status': 'running', 'started_at': '2024-01-01 00:00:00'})
+    storage.put_json(export_jobs.status_key(job['job_id']), job)
+
+    monkeypatch.setattr(export_jobs, 'get_jst_now', lambda: '2024-01-01 00:10:00')
+    # タイムアウト前は実行中として扱い、重複して実行しない
+    assert export_jobs.run_export_job(job['job_id'], storage)['rows_written'] == 0
+    assert export_jobs.get_export_job(job['job_id'], storage)['status'] == 'running'
+
+    monkeypatch.setattr(export_jobs, 'get_jst_now', lambda: '2024-01-01 00:20:00')
+    status = export_jobs.get_export_job(job['job_id'], storage)
+    assert status['status'] == 'failed'
+    assert export_jobs.run_export_job(job['job_id'], storage)['status'] == 'completed'
+
+def test_export_query_is_scoped_to_agency():
+    query, params = export_jobs.build_export_query({'job_type': 'download_history', 'params': {
+        'location_id': 9, 'agency_id': 3, 'permission': 2}})
+    assert 'm_location.agency_id = %s' in query
+    assert params == (9, 3, 2)
+
+    query, params = export_jobs.build_export_query({'job_type': 'charge_history', 'params': {
+        'start_period': '2024-01-01', 'end_period': '2024-12-31', 'powersupply_ids': [5, 6],
+        'agency_id': 3, 'permission': 2}})
+    assert 't_charge.powersupply_id IN (%s, %s)' in query and 'm_location.agency_id = %s' in query
+    assert params == [5, 6, 3, 2, '2024-01-01', '2024-12-31']
+
+def test_submit_stores_owner_scope(tmp_path, monkeypatch):
+    from flask import Flask
+    from route.dashb.agency import export_job_router as export_module
+    storage = LocalObjectStorage(str(tmp_path))
+    monkeypatch.setattr(export_jobs, 'get_object_storage', lambda: storage)
+    monkeypatch.setattr(export_module, 'db', FakeDB(ROWS))
+    monkeypatch.setattr(export_module, 'dispatch_export_job', lambda job_id: None)
+    monkeypatch.setattr(export_module, 'resolve_user_identity', lambda cursor, app_user_number: {
+        'has_agency': True, 'agency_id': 3, 'agency_permission': 2})
+    app = Flask(__name__)
+    app.register_blueprint(export_module.export_job_router)
+    client = app.test_client()
+
+    for body in ({'job_type': 'download_history', 'location_id': 1},
+                 {'job_type': 'charge_history', 'start_period': '2024-01-01', 'end_period': '2024-12-31',
+                  'powersupply_ids': [5]}):
+        response = client.post('/export_job_submit', json={**body, 'app_user_number': '0000000001'})
+        assert response.status_code == 202
+        job = storage.get_json(export_jobs.status_key(response.get_json()['data']['job_id']))
+        assert (job['params']['agency_id'], job['params']['permission']) == (3, 2)
+
+def test_status_endpoint_rejects_other_agency(tmp_path, monkeypatch):
+    from flask import Flask
+    from route.dashb.agency import export_job_router as export_module
+    storage = LocalObjectStorage(str(tmp_path))
+    monkeypatch.setattr(export_jobs, 'get_object_storage', lambda: storage)
+    monkeypatch.setattr(export_module, 'db', FakeDB(ROWS))
+    monkeypatch.setattr(export_module, 'dispatch_export_job', lambda job_id: None)
+    agencies = {'0000000001': 3, '0000000002': 4}
+    monkeypatch.setattr(export_module, 'resolve_user_identity', lambda cursor, app_user_number: {
+        'has_agency': True, 'agency_id': agencies[app_user_number], 'agency_permission': 2})
+    app = Flask(__name__)
+    app.register_blueprint(export_module.export_job_router)
+    client = app.test_client()
+
+    response = client.post('/export_job_submit', json={
+        'job_type': 'download_history', 'location_id': 1, 'app_user_number': '0000000001'})
+    assert response.status_code == 202
+    job_id = response.get_json()['data']['job_id']
+
+    assert client.post('/export_job_status', json={'job_id': job_id}).status_code == 400
+    assert client.post('/export_job_status', json={
+        'job_id': job_id, 'app_user_number': '0000000002'}).status_code == 404
+    response = client.post('/export_job_status', json={'job_id': job_id, 'app_user_number': '0000000001'})
+    assert response.status_code == 200
+    assert response.get_json()['data']['status'] == 'queued'
@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import gzip
+import base64
+import decimal
+import datetime
+from contextlib import contextmanager
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+from utils.export_utils import (
+    iter_rows, iter_csv_chunks, iter_ndjson_chunks, gzip_chunks
+)
+
+COLUMNS = ['transaction_id', 'charging_start', 'charged_amount', 'station_name']
+
+def make_rows(count):
+    for i in range(count):
+        yield {
+            'transaction_id': i,
+            'charging_start': datetime.datetime(2024, 1, 1, 10, 0, 0) + datetime.timedelta(minutes=i),
+            'charged_amount': decimal.Decimal('12.50'),
+            'station_name': None if i % 2 else 'ステーション,A',
+        }
+
+# テスト用の疑似カーソル
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.batches = []
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        self.batches.append(len(batch))
+        return batch
+
+def test_iter_rows_fetches_in_batches():
+    cursor = FakeCursor(make_rows(5))
+
+    rows = list(iter_rows(cursor, batch_size=2))
+
+    assert len(rows) == 5
+    assert cursor.batches == [2, 2, 1, 0]
+
+def test_csv_chunks():
+    body = b''.join(iter_csv_chunks(make_rows(2), COLUMNS)).decode('utf-8')
+
+    assert body.splitlines() == [
+        'transaction_id,charging_start,charged_amount,station_name',
+        '0,2024-01-01T10:00:00,12.50,"ステーション,A"',
+        '1,2024-01-01T10:01:00,12.50,',
+    ]
+
+def test_ndjson_chunks():
+    lines = b''.join(iter_ndjson_chunks(make_rows(2), COLUMNS)).decode('utf-8').splitlines()
+
+    assert json.loads(lines[0]) == {
+        'transaction_id': 0, 'charging_start': '2024-01-01T10:00:00',
+        'charged_amount': '12.50', 'station_name': 'ステーション,A',
+    }
+    assert json.loads(lines[1])['station_name'] is None
+
+def test_large_export_is_chunked_and_gzip_round_trips():
+    chunks = list(iter_csv_chunks(make_rows(20000), COLUMNS))
+    compressed = b''.join(gzip_chunks(iter(chunks)))
+
+    assert len(chunks) > 2
+    assert gzip.decompress(compressed) == b''.join(chunks)
+
+class FakeStreamingDB:
+    """download_historyのサーバーサイドカーソルを再現する"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    @contextmanager
+    def get_connection(self):
+        rows = self.rows
+
+        class Cursor:
+            description = [(column,) for column in COLUMNS]
+
+            def execute(self, query, params=None):
+                self.remaining = list(rows)
+
+            def fetchmany(self, size):
+                batch, self.remaining = self.remaining[:size], self.remaining[size:]
+                return batch
+
+        class Connection:
+            @contextmanager
+            def cursor(self, cursor_class=None):
+                yield Cursor()
+
+        yield Connection()
+
+def test_gzip_export_through_lambda_handler(monkeypatch):
+    for key, value in {'END_POINT': 'localhost', 'USER_NAME': 'test', 'PASSWORD': 'test',
+                       'DB_NAME': 'test', 'PORT': '3306', 'AWS_DEFAULT_REGION': 'ap-northeast-1',
+                       'COGNITO_USER_POOL_ID': 'ap-northeast-1_test'}.items():
+        monkeypatch.setenv(key, value)
+    monkeypatch.setenv('COGNITO_AUTH_MODE', 'off')
+    import app
+    from route.dashb.agency import download_history_router as download_module
+    monkeypatch.setattr(download_module, 'db', FakeStreamingDB(list(make_rows(3))))
+
+    response = app.lambda_handler({
+        'httpMethod': 'POST',
+        'path': '/dashb/agency/download_history',
+        'headers': {'Content-Type': 'application/json'},
+        'queryStringParameters': None,
+        'body': json.dumps({'location_id': 1, 'format': 'csv', 'gzip': True}),
+    }, None)
+
+    assert int(response['statusCode']) == 200
+    assert response['isBase64Encoded'] is True
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    body = gzip.decompress(base64.b64decode(response['body'])).decode('utf-8')
+    assert body.splitlines()[0] == ','.join(COLUMNS)
+    assert len(body.splitlines()) == 4
@@ -0,0 +1,178 @@
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+import pytest
+import pymysql
+from utils.db_utils import FeistelPermutation, IdAllocator, SequenceConnection
+
+class FakeSequenceStore:
+    """m_id_sequenceと採番先のテーブルの代わり。予約の文は排他的に実行される"""
+
+    def __init__(self, existing=()):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.existing = set(existing)
+        self.reservations = 0
+        self.connects = 0
+        self.fail_next = False
+
+    def connect(self):
+        self.connects += 1
+        return FakeConnection(self)
+
+class FakeCursor:
+    def __init__(self, store):
+        self.store = store
+        self.last_insert_id = None
+        self.rows = []
+
+    def execute(self, query, params=None):
+        if self.store.fail_next:
+            self.store.fail_next = False
+            raise pymysql.err.OperationalError(2013, 'Lost connection to MySQL server during query')
+        if 'm_id_sequence' in query:
+            name, initial, size = params
+            with self.store.lock:
+                value = self.store.counters.get(name, 0) + size
+                self.store.counters[name] = value
+                self.store.reservations += 1
+            self.last_insert_id = value
+        elif 'LAST_INSERT_ID()' in query:
+            self.rows = [{'end_value': self.last_insert_id}]
+        else:
+            self.rows = [{'number': number} for number in params if number in self.store.existing]
+
+    def fetchone(self):
+        return self.rows[0]
+
+    def fetchall(self):
+        return self.rows
+
+class FakeConnection:
+    def __init__(self, store):
+        self.cursor_instance = FakeCursor(store)
+        self.autocommit_mode = False
+        self.closed = False
+
+    def autocommit(self, value):
+        self.autocommit_mode = value
+
+    def close(self):
+        self.closed = True
+
+    @contextmanager
+    def cursor(self, cursor_class=None):
+        yield self.cursor_instance
+
+def make_allocator(store, length=10, block_size=32):
+    return IdAllocator('m_user', 'app_user_number', length, block_size=block_size, key=b'test',
+                       sequence=SequenceConnection(store.connect))
+
+@pytest.mark.parametrize('length', [3, 4])
+def test_permutation_is_a_bijection(length):
+    permutation = FeistelPermutation(length, b'test')
+    values = {permutation.permute(value) for value in range(10 ** length)}
+    assert values == set(range(10 ** length))
+
+def test_permutation_depends_on_key():
+    a = [FeistelPermutation(10, b'a').permute(value) for value in range(10)]
+    b = [FeistelPermutation(10, b'b').permute(value) for value in range(10)]
+    assert a != b
+
+def test_numbers_keep_fixed_length_and_look_random():
+    store = FakeSequenceStore()
+    numbers = make_allocator(store, length=12).allocate_many(FakeCursor(store), 100)
+    assert all(len(number) == 12 and number.isdigit() for number in numbers)
+    # 連番にならないこと
+    assert sorted(numbers) != numbers
+
+def test_one_reservation_per_block():
+    store = FakeSequenceStore()
+    allocator = make_allocator(store, block_size=50)
+    cursor = FakeCursor(store)
+    for _ in range(500):
+        allocator.allocate(cursor)
+    assert store.reservations == 10
+
+def test_existing_numbers_are_skipped():
+    store = FakeSequenceStore()
+    first = make_allocator(store).allocate_many(FakeCursor(store), 10)
+
+    # 同じ範囲を払い出した場合でも、登録済みの番号は除外される
+    store = FakeSequenceStore(existing=first[:5])
+    numbers = make_allocator(store).allocate_many(FakeCursor(store), 10)
+    assert not set(first[:5]) & set(numbers)
+    assert len(numbers) == 10
+
+def test_exhaustion_raises():
+    store = FakeSequenceStore()
+    allocator = make_allocator(store, length=3, block_size=1)
+    cursor = FakeCursor(store)
+    numbers = {allocator.allocate(cursor) for _ in range(1000)}
+    assert len(numbers) == 1000
+    with pytest.raises(ValueError):
+        allocator.allocate(cursor)
+
+def test_concurrent_allocators_never_collide():
+    # 複数のプロセス（採番器）と、それぞれの中の複数のスレッドから同時に採番する
+    store = FakeSequenceStore()
+    allocators = [make_allocator(store, block_size=7) for _ in range(8)]
+    results = []
+    results_lock = threading.Lock()
+    barrier = threading.Barrier(32)
+
+    def worker(allocator):
+        cursor = FakeCursor(store)
+        barrier.wait()
+        numbers = [allocator.allocate(cursor) for _ in range(300)]
+        numbers += allocator.allocate_many(cursor, 20)
+        with results_lock:
+            results.extend(numbers)
+
+    threads = [threading.Thread(target=worker, args=(allocators[i % 8],)) for i in range(32)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 32 * 320
+    assert len(set(results)) == len(results)
+    assert all(len(number) == 10 for number in results)
+
+def test_missing_key_fails_closed(monkeypatch):
+    monkeypatch.delenv('ID_ALLOCATOR_KEY', raising=False)
+    with pytest.raises(ValueError):
+        IdAllocator('m_user', 'app_user_number', 10, sequence=SequenceConnection(FakeSequenceStore().connect))
+
+    monkeypatch.setenv('ID_ALLOCATOR_KEY', 'secret')
+    store = FakeSequenceStore()
+    allocator = IdAllocator('m_user', 'app_user_number', 10, sequence=SequenceConnection(store.connect))
+    assert len(allocator.allocate(FakeCursor(store))) == 10
+
+def test_reservations_share_one_autocommit_connection():
+    store = FakeSequenceStore()
+    sequence = SequenceConnection(store.connect)
+    allocator = make_allocator(store, length=4, block_size=1)
+    allocator._sequence = sequence
+    cursor = FakeCursor(store)
+    for _ in range(20):
+        allocator.allocate(cursor)
+    assert store.reservations == 20
+    assert store.connects == 1
+    assert sequence._conn.autocommit_mode is True
+
+def test_reservation_reconnects_once_after_lost_connection():
+    store = FakeSequenceStore()
+    sequence = SequenceConnection(store.connect)
+    allocator = make_allocator(store, block_size=1)
+    allocator._sequence = sequence
+    cursor = FakeCursor(store)
+    first = allocator.allocate(cursor)
+    lost = sequence._conn
+    store.fail_next = True
+    second = allocator.allocate(cursor)
+    assert first != second
+    assert lost.closed and store.connects == 2
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import decimal
+import datetime
+from flask import Flask, jsonify
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+from utils import json_provider
+from utils.json_provider import FastJSONProvider, format_timedelta
+
+ROW = {
+    'transaction_id': 1,
+    'charging_start': datetime.datetime(2024, 1, 2, 10, 30, 15),
+    'charging_end': None,
+    'open_day': datetime.date(2024, 1, 2),
+    'open_time': datetime.timedelta(hours=9),
+    'end_time': datetime.timedelta(hours=21, minutes=30, seconds=5),
+    'close_time': datetime.time(22, 0),
+    'charged_amount': decimal.Decimal('12.50'),
+    'station_name': 'ステーションA',
+}
+
+EXPECTED = {
+    'transaction_id': 1,
+    'charging_start': '2024-01-02T10:30:15',
+    'charging_end': None,
+    'open_day': '2024-01-02',
+    'open_time': '09:00',
+    'end_time': '21:30',
+    'close_time': '22:00',
+    'charged_amount': '12.50',
+    'station_name': 'ステーションA',
+}
+
+def create_app():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+
+    @app.route('/rows')
+    def rows():
+        return jsonify({'resultCode': 'success', 'data': [ROW, ROW]}), 200
+
+    return app
+
+def test_format_timedelta():
+    assert format_timedelta(datetime.timedelta(hours=9)) == '09:00'
+    assert format_timedelta(datetime.timedelta(hours=9, minutes=5, seconds=7)) == '09:05'
+    assert format_timedelta(datetime.timedelta(hours=30)) == '30:00'
+    assert format_timedelta(-datetime.timedelta(minutes=90)) == '-01:30'
+
+def baseline_format_time(time_value):
+    """get_stationsが以前行っていたTIME型の変換"""
+    if isinstance(time_value, datetime.time):
+        return time_value.strftime("%H:%M")
+    total_minutes = int(time_value.total_seconds() / 60)
+    hours, minutes = divmod(total_minutes, 60)
+    return f"{hours:02d}:{minutes:02d}"
+
+def test_time_values_match_baseline_format():
+    values = [datetime.timedelta(0), datetime.timedelta(hours=9), datetime.timedelta(hours=9, seconds=59),
+              datetime.timedelta(hours=21, minutes=30, seconds=5), datetime.timedelta(hours=23, minutes=59, seconds=59),
+              datetime.timedelta(hours=30), datetime.time(8, 15, 30), datetime.time(22, 0, 0, 500)]
+    app = create_app()
+    encoded = json.loads(app.json.dumps_bytes({'times': values}))['times']
+    assert encoded == [baseline_format_time(value) for value in values]
+
+def test_jsonify_encodes_database_values():
+    response = create_app().test_client().get('/rows')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/json'
+    assert response.get_json()['data'] == [EXPECTED, EXPECTED]
+
+def test_dumps_and_loads_round_trip():
+    app = create_app()
+    with app.app_context():
+        encoded = app.json.dumps({1: ROW})
+        assert isinstance(encoded, str)
+        assert app.json.loads(encoded) == {'1': EXPECTED}
+
+def test_fallback_without_orjson_produces_same_output(monkeypatch):
+    app = create_app()
+    fast = app.json.dumps_bytes([ROW])
+    monkeypatch.setattr(json_provider, 'orjson', None)
+    fallback = app.json.dumps_bytes([ROW])
+    assert json.loads(fast) == json.loads(fallback) == [EXPECTED]
+
+def test_unsupported_type_raises_type_error():
+    app = create_app()
+    try:
+        app.json.dumps({'value': object()})
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("TypeError was not raised")
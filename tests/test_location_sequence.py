@@ -0,0 +1,173 @@
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+for key, value in {'END_POINT': 'localhost', 'USER_NAME': 'test', 'PASSWORD': 'test',
+                   'DB_NAME': 'test', 'PORT': '3306'}.items():
+    os.environ.setdefault(key, value)
+import pytest
+from flask import Flask
+from utils.db_utils import format_app_location_number, generate_app_location_numbers
+from route.dashb.agency import station_register_router as station_module
+
+class FakeLocationStore:
+    """
+    m_location_sequenceとm_locationの代わり。
+    更新した代理店の行はコミットまたはロールバックまでロックされる（InnoDBの行ロック相当）。
+    """
+
+    def __init__(self, legacy=None):
+        self.mutex = threading.Lock()
+        self.row_locks = {}
+        self.locations = [(agency_id, number) for agency_id, numbers in (legacy or {}).items()
+                          for number in numbers]
+        # 登録済みのステーションのある代理店のカウンターはマイグレーションで作成済み
+        self.counters = {agency_id: max(int(number[len(str(agency_id)):]) for number in numbers)
+                         for agency_id, numbers in (legacy or {}).items()}
+
+    def row_lock(self, agency_id):
+        with self.mutex:
+            return self.row_locks.setdefault(agency_id, threading.Lock())
+
+    @contextmanager
+    def get_connection(self):
+        conn = FakeConnection(self)
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.store = conn.store
+        self.rowcount = 0
+        self.row = None
+
+    def execute(self, query, params=None):
+        conn, store = self.conn, self.store
+        if query.lstrip().startswith('UPDATE m_location_sequence'):
+            count, agency_id = params
+            conn.lock(agency_id)
+            current = conn.counters.get(agency_id, store.counters.get(agency_id))
+            if current is None:
+                self.rowcount = 0
+                return
+            conn.counters[agency_id] = conn.last_insert_id = current + count
+            self.rowcount = 1
+        elif query.lstrip().startswith('INSERT INTO m_location_sequence'):
+            # 最初の採番ではm_locationを参照しない（ロックの競合を避ける）
+            assert 'm_location ' not in query and 'FROM' not in query
+            agency_id, initial, count = params
+            conn.lock(agency_id)
+            current = conn.counters.get(agency_id, store.counters.get(agency_id))
+            conn.counters[agency_id] = conn.last_insert_id = initial if current is None else current + count
+        elif 'LAST_INSERT_ID()' in query:
+            self.row = {'last_number': conn.last_insert_id}
+        elif query.lstrip().startswith('INSERT INTO m_location'):
+            if params[2] == 'fail':
+                raise RuntimeError('insert failed')
+            conn.locations.append((params[0], params[1]))
+        else:
+            raise AssertionError(query)
+
+    def fetchone(self):
+        return self.row
+
+class FakeConnection:
+    def __init__(self, store):
+        self.store = store
+        self.held = []
+        self.counters = {}
+        self.locations = []
+        self.last_insert_id = None
+
+    def lock(self, agency_id):
+        row_lock = self.store.row_lock(agency_id)
+        if row_lock not in self.held:
+            row_lock.acquire()
+            self.held.append(row_lock)
+
+    @contextmanager
+    def cursor(self, cursor_class=None):
+        yield FakeCursor(self)
+
+    def commit(self):
+        with self.store.mutex:
+            self.store.counters.update(self.counters)
+            self.store.locations.extend(self.locations)
+        self.rollback()
+
+    def rollback(self):
+        self.counters, self.locations = {}, []
+        while self.held:
+            self.held.pop().release()
+
+@pytest.fixture
+def register(monkeypatch):
+    def setup(store):
+        monkeypatch.setattr(station_module, 'db', store)
+        monkeypatch.setattr(station_module, 'resolve_user_identity',
+                            lambda cursor, app_user_number: {'has_agency': True, 'agency_id': int(app_user_number)})
+        app = Flask(__name__)
+        app.register_blueprint(station_module.station_register_router)
+
+        def post(agency_id, station_name='station'):
+            return app.test_client().post('/station_register', json={
+                'app_user_number': str(agency_id), 'station_name': station_name, 'zip_code': '1000001',
+                'prefecture': '東京都', 'city': '千代田区', 'address': '1-1',
+                'open_time': '09:00', 'end_time': '18:00', 'open_day': '月火水木金',
+            })
+        return post
+    return setup
+
+def test_format_keeps_zero_padding():
+    assert format_app_location_number(5, 1) == '5001'
+    assert format_app_location_number(12, 3) == '1203'
+    assert format_app_location_number(123, 9) == '1239'
+    assert format_app_location_number(5, 1000) == '51000'
+
+def test_first_number_continues_from_existing_stations():
+    store = FakeLocationStore(legacy={5: ['5001', '5007']})
+    with store.get_connection() as conn:
+        with conn.cursor() as cursor:
+            assert generate_app_location_numbers(cursor, 5, 2) == ['5008', '5009']
+            assert generate_app_location_numbers(cursor, 5, 1) == ['5010']
+            assert generate_app_location_numbers(cursor, 6, 1) == ['6001']
+        conn.commit()
+
+def test_rolled_back_registration_releases_number(register):
+    post = register(FakeLocationStore())
+    assert post(7).get_json()['data'] == {'app_location_number': '7001'}
+    assert post(7, station_name='fail').status_code == 500
+    assert post(7).get_json()['data'] == {'app_location_number': '7002'}
+
+def test_parallel_registrations_get_unique_numbers(register):
+    store = FakeLocationStore(legacy={12: ['1201']})
+    post = register(store)
+    agencies = [7, 12]
+    numbers = []
+    numbers_lock = threading.Lock()
+    barrier = threading.Barrier(16)
+
+    def worker(index):
+        barrier.wait()
+        for i in range(25):
+            response = post(agencies[(index + i) % 2])
+            assert response.status_code == 200
+            with numbers_lock:
+                numbers.append(response.get_json()['data']['app_location_number'])
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(numbers) == 400
+    assert len(set(numbers)) == 400
+    assert set(numbers) == ({format_app_location_number(7, n) for n in range(1, 201)} |
+                            {format_app_location_number(12, n) for n in range(2, 202)})
+    assert sorted(number for _, number in store.locations) == sorted(numbers + ['1201'])
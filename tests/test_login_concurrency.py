@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+for key, value in {'END_POINT': 'localhost', 'USER_NAME': 'test', 'PASSWORD': 'test',
+                   'DB_NAME': 'test', 'PORT': '3306', 'AWS_DEFAULT_REGION': 'ap-northeast-1'}.items():
+    os.environ.setdefault(key, value)
+import pytest
+from flask import Flask
+from botocore.exceptions import ClientError
+from route.dashb.agency import agency_user_login_router as agency_login
+from route.dashb.corporate import corporate_user_login_router as corporate_login
+
+AUTH_DELAY = 0.2
+DB_DELAY = 0.2
+
+def client_error(name):
+    return type(name, (ClientError,), {})
+
+class FakeExceptions:
+    NotAuthorizedException = client_error('NotAuthorizedException')
+    UserNotFoundException = client_error('UserNotFoundException')
+
+class FakeCognitoClient:
+    exceptions = FakeExceptions
+
+    def __init__(self, auth_error=None, verified='true', ech_nav_code='ECH001'):
+        self.auth_error = auth_error
+        self.verified = verified
+        self.ech_nav_code = ech_nav_code
+        self.calls = []
+
+    def admin_get_user(self, UserPoolId, Username):
+        self.calls.append('admin_get_user')
+        attributes = [{'Name': 'phone_number_verified', 'Value': self.verified}]
+        if self.ech_nav_code:
+            attributes.append({'Name': 'custom:ech_nav_code', 'Value': self.ech_nav_code})
+        return {'Username': Username, 'UserAttributes': attributes}
+
+    def initiate_auth(self, AuthFlow, AuthParameters, ClientId):
+        self.calls.append('initiate_auth')
+        time.sleep(AUTH_DELAY)
+        if self.auth_error:
+            error_class = getattr(FakeExceptions, self.auth_error)
+            raise error_class({'Error': {'Code': self.auth_error, 'Message': 'error'}}, 'InitiateAuth')
+        return {'AuthenticationResult': {'AccessToken': 'access-token', 'RefreshToken': 'refresh-token'}}
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, query, params):
+        self.db.queries.append(params)
+        time.sleep(DB_DELAY)
+        if self.db.error:
+            raise self.db.error
+
+    def fetchone(self):
+        return {'app_user_number': self.db.app_user_number} if self.db.app_user_number else None
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    @contextmanager
+    def cursor(self, cursor_class=None):
+        yield FakeCursor(self.db)
+
+class FakeDB:
+    def __init__(self, app_user_number='U0001', error=None):
+        self.app_user_number = app_user_number
+        self.error = error
+        self.queries = []
+        self.threads = set()
+
+    @contextmanager
+    def get_connection(self):
+        self.threads.add(threading.get_ident())
+        yield FakeConnection(self)
+
+@pytest.fixture(autouse=True)
+def cognito_env(monkeypatch):
+    monkeypatch.setenv('COGNITO_USER_POOL_ID', 'pool')
+    monkeypatch.setenv('COGNITO_CLIENT_ID', 'client')
+    monkeypatch.setenv('COGNITO_CLIENT_SECRET', 'secret')
+
+def post(module, blueprint, path, cognito, fake_db, monkeypatch):
+    monkeypatch.setattr(module, 'get_cognito_client', lambda: cognito)
+    monkeypatch.setattr(module, 'db', fake_db)
+    app = Flask(__name__)
+    app.register_blueprint(blueprint)
+    start = time.perf_counter()
+    response = app.test_client().post(path, json={'phoneNumber': '09012345678', 'password': 'pw'})
+    return response, time.perf_counter() - start
+
+def agency_post(cognito, fake_db, monkeypatch):
+    return post(agency_login, agency_login.agency_user_login_router, '/agency_user_login',
+                cognito, fake_db, monkeypatch)
+
+def corporate_post(cognito, fake_db, monkeypatch):
+    return post(corporate_login, corporate_login.corporate_user_login_router, '/corporate_user_login',
+                cognito, fake_db, monkeypatch)
+
+def test_agency_login_overlaps_auth_and_db(monkeypatch):
+    fake_db = FakeDB()
+    response, elapsed = agency_post(FakeCognitoClient(), fake_db, monkeypatch)
+
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['app_user_number'] == 'U0001'
+    assert data['accessToken'] == 'access-token'
+    assert data['refreshToken'] == 'refresh-token'
+    assert data['appUserToken']
+    assert fake_db.queries == [('ECH001',)]
+    assert threading.get_ident() not in fake_db.threads
+    # 直列実行なら認証とDBの合計時間がかかる
+    assert elapsed < AUTH_DELAY + DB_DELAY - 0.05
+
+def test_agency_login_not_authorized(monkeypatch):
+    response, _ = agency_post(FakeCognitoClient(auth_error='NotAuthorizedException'), FakeDB(), monkeypatch)
+    assert response.status_code == 401
+    assert response.get_json()['message'] == "電話番号またはパスワードが間違っています[E001]"
+
+def test_agency_login_user_not_found(monkeypatch):
+    response, _ = agency_post(FakeCognitoClient(auth_error='UserNotFoundException'), FakeDB(), monkeypatch)
+    assert response.status_code == 404
+    assert response.get_json()['message'] == "ユーザーが見つかりません"
+
+def test_agency_login_auth_error_wins_over_db_error(monkeypatch):
+    fake_db = FakeDB(error=RuntimeError('db down'))
+    response, _ = agency_post(FakeCognitoClient(auth_error='NotAuthorizedException'), fake_db, monkeypatch)
+    assert response.status_code == 401
+
+def test_agency_login_db_error(monkeypatch):
+    response, _ = agency_post(FakeCognitoClient(), FakeDB(error=RuntimeError('db down')), monkeypatch)
+    assert response.status_code == 500
+    assert response.get_json()['message'] == "データベース処理中にエラーが発生しました"
+
+def test_agency_login_unknown_user_number(monkeypatch):
+    response, _ = agency_post(FakeCognitoClient(), FakeDB(app_user_number=None), monkeypatch)
+    assert response.status_code == 404
+    assert response.get_json()['message'] == "ユーザーが見つかりません[E002]"
+
+def test_agency_login_unverified_phone_skips_auth_and_db(monkeypatch):
+    cognito = FakeCognitoClient(verified='false')
+    fake_db = FakeDB()
+    response, _ = agency_post(cognito, fake_db, monkeypatch)
+    assert response.status_code == 200
+    assert cognito.calls == ['admin_get_user']
+    assert fake_db.queries == []
+
+def test_corporate_login_overlaps_auth_and_lookup(monkeypatch):
+    response, elapsed = corporate_post(FakeCognitoClient(), FakeDB(), monkeypatch)
+    assert response.status_code == 200
+    assert response.get_json()['data'] == {'app_user_number': 'U0001'}
+    assert elapsed < AUTH_DELAY + DB_DELAY - 0.05
+
+def test_corporate_login_not_authorized(monkeypatch):
+    fake_db = FakeDB(error=RuntimeError('db down'))
+    response, _ = corporate_post(FakeCognitoClient(auth_error='NotAuthorizedException'), fake_db, monkeypatch)
+    assert response.status_code == 401
+    assert response.get_json()['message'] == "電話番号またはパスワードが正しくありません"
+
+def test_corporate_login_checks_attributes_after_auth(monkeypatch):
+    response, _ = corporate_post(FakeCognitoClient(ech_nav_code=None), FakeDB(), monkeypatch)
+    assert response.status_code == 400
+    response, _ = corporate_post(FakeCognitoClient(verified='false'), FakeDB(), monkeypatch)
+    assert response.status_code == 400
+
+def test_sequential_mode_runs_inline(monkeypatch):
+    monkeypatch.setenv('CONCURRENT_IO_WORKERS', '0')
+    fake_db = FakeDB()
+    response, elapsed = agency_post(FakeCognitoClient(), fake_db, monkeypatch)
+    assert response.status_code == 200
+    assert fake_db.threads == {threading.get_ident()}
+    assert elapsed >= AUTH_DELAY + DB_DELAY
@@ -0,0 +1,128 @@
+import os
+import sys
+import datetime
+from contextlib import contextmanager
+import pytest
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+for key, value in {'END_POINT': 'localhost', 'USER_NAME': 'test', 'PASSWORD': 'test',
+                   'DB_NAME': 'test', 'PORT': '3306'}.items():
+    os.environ.setdefault(key, value)
+from flask import Flask
+from utils.pagination import (
+    encode_cursor, decode_cursor, parse_limit, MAX_PAGE_LIMIT, CURSOR_DATETIME, CURSOR_INT
+)
+from route.dashb.agency import get_charge_history_router as charge_module
+
+def test_cursor_round_trip():
+    values = ['2024-04-01 10:15:00', 12345]
+    cursor = encode_cursor(values)
+
+    assert '=' not in cursor
+    assert decode_cursor(cursor, 2) == values
+
+@pytest.mark.parametrize('cursor', ['not-base64!!', encode_cursor({'a': 1}), encode_cursor([1])])
+def test_invalid_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 2)
+
+@pytest.mark.parametrize('value', [0, MAX_PAGE_LIMIT + 1, 'abc', None, True])
+def test_invalid_limit(value):
+    with pytest.raises(ValueError):
+        parse_limit(value)
+
+def test_valid_limit():
+    assert parse_limit('50') == 50
+
+KINDS = [CURSOR_DATETIME, CURSOR_INT]
+
+def test_cursor_values_are_validated():
+    assert decode_cursor(encode_cursor(['2024-04-01T10:15:00', 5]), 2, KINDS) == ['2024-04-01 10:15:00', 5]
+
+@pytest.mark.parametrize('values', [
+    ['2024-04-01 10:15:00', '5'], ['2024-04-01 10:15:00', -1], ['2024-04-01 10:15:00', True],
+    ['not-a-date', 5], [1, 5], ['2024-04-01T10:15:00+09:00', 5], [None, None]])
+def test_tampered_cursor_values(values):
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor(values), 2, KINDS)
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.result = []
+
+    def execute(self, query, params=None):
+        self.db.executed.append((' '.join(query.split()), params))
+        self.result = self.db.rows[:params[-1]] if 'LIMIT' in query else list(self.db.rows)
+
+    def fetchall(self):
+        return self.result
+
+class FakeDB:
+    def __init__(self, count):
+        start = datetime.datetime(2024, 4, 1)
+        self.rows = [{'transaction_id': i, 'charging_start': start + datetime.timedelta(minutes=i),
+                      'charging_end': None}
+                     for i in range(1, count + 1)]
+        self.executed = []
+
+    @contextmanager
+    def get_connection(self):
+        class Connection:
+            @contextmanager
+            def cursor(_, cursor_class=None):
+                yield FakeCursor(self)
+        yield Connection()
+
+IDENTITY = {'user_id': 1, 'has_agency': True, 'agency_id': 3, 'agency_permission': 2}
+
+@pytest.fixture
+def client(monkeypatch):
+    def create(module, fake_db):
+        monkeypatch.setattr(module, 'db', fake_db)
+        monkeypatch.setattr(module, 'resolve_user_identity', lambda cursor, app_user_number: IDENTITY)
+        app = Flask(__name__)
+        app.register_blueprint(module.get_charge_history_router)
+        return app.test_client()
+    return create
+
+CHARGE_BODY = {'app_user_number': '0000000001', 'start_period': '2024-04-01', 'end_period': '2024-04-30'}
+
+def test_endpoint_rejects_tampered_cursor(client):
+    fake_db = FakeDB(3)
+    response = client(charge_module, fake_db).post('/get_charge_history', json={
+        **CHARGE_BODY, 'cursor': encode_cursor(["1' OR '1'='1", 'x'])})
+    assert response.status_code == 400
+    assert fake_db.executed == []
+
+def test_unpaginated_requests_are_unbounded_by_default(client, monkeypatch):
+    monkeypatch.delenv('MAX_UNPAGED_ROWS', raising=False)
+    fake_db = FakeDB(3)
+    response = client(charge_module, fake_db).post('/get_charge_history', json=CHARGE_BODY)
+    assert response.status_code == 200
+    assert len(response.get_json()['data']) == 3
+    assert 'LIMIT' not in fake_db.executed[-1][0]
+
+def test_unpaginated_cap_is_opt_in(client, monkeypatch):
+    monkeypatch.setenv('MAX_UNPAGED_ROWS', '3')
+    fake_db = FakeDB(3)
+    response = client(charge_module, fake_db).post('/get_charge_history', json=CHARGE_BODY)
+    assert response.status_code == 200
+    assert fake_db.executed[-1][1][-1] == 4
+
+    response = client(charge_module, FakeDB(4)).post('/get_charge_history', json=CHARGE_BODY)
+    assert response.status_code == 400
+
+def test_next_page_seeks_with_row_constructor(client):
+    fake_db = FakeDB(3)
+    response = client(charge_module, fake_db).post('/get_charge_history', json={**CHARGE_BODY, 'limit': 2})
+    data = response.get_json()['data']
+    assert len(data['items']) == 2
+    assert decode_cursor(data['next_cursor'], 2, KINDS) == ['2024-04-01 00:02:00', 2]
+
+    client(charge_module, fake_db).post('/get_charge_history', json={
+        **CHARGE_BODY, 'limit': 2, 'cursor': data['next_cursor']})
+    query, params = fake_db.executed[-1]
+    assert '(t_charge_history.charging_start, t_charge_history.transaction_id) > (%s, %s)' in query
+    assert 'ORDER BY t_charge_history.charging_start ASC, t_charge_history.transaction_id ASC' in query
+    assert params[-3:] == ['2024-04-01 00:02:00', 2, 3]
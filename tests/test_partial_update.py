@@ -0,0 +1,145 @@
+import os
+import sys
+import datetime
+from contextlib import contextmanager
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+for key, value in {'END_POINT': 'localhost', 'USER_NAME': 'test', 'PASSWORD': 'test',
+                   'DB_NAME': 'test', 'PORT': '3306'}.items():
+    os.environ.setdefault(key, value)
+import pytest
+from flask import Flask
+from utils.partial_update import build_partial_update
+from route.dashb.agency import update_powersupply_router as powersupply_module
+from route.dashb.agency import update_station_router as station_module
+
+class FakeTable:
+    """主キーごとの行を保持し、build_partial_updateが作成する条件を再現する"""
+
+    def __init__(self, key_column, rows):
+        self.key_column = key_column
+        self.rows = rows
+        self.statements = []
+        self.commits = 0
+
+    @contextmanager
+    def get_connection(self):
+        yield self
+
+    @contextmanager
+    def cursor(self, cursor_class=None):
+        yield FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+class FakeCursor:
+    def __init__(self, table):
+        self.table = table
+        self.rowcount = 0
+        self.row = None
+
+    def execute(self, query, params):
+        self.table.statements.append((query, list(params)))
+        if query.lstrip().startswith('SELECT'):
+            row = self.table.rows.get(params[0])
+            self.row = {'update_date': row['update_date']} if row else None
+            return
+
+        set_clause = query.split('SET', 1)[1].split('WHERE', 1)[0]
+        columns = [part.split('=')[0].strip() for part in set_clause.split(',')][:-2]
+        values = params[:len(columns)]
+        now, user, key = params[len(columns):len(columns) + 3]
+        expected = params[len(columns) * 2 + 3] if 'AND update_date' in query else None
+
+        row = self.table.rows.get(key)
+        if (row is None or all(row.get(c) == v for c, v in zip(columns, values))
+                or (expected is not None and str(row['update_date']) != expected)):
+            self.rowcount = 0
+            return
+        row.update(zip(columns, values))
+        row.update({'update_date': now, 'update_user': user})
+        self.rowcount = 1
+
+    def fetchone(self):
+        return self.row
+
+def test_build_partial_update_only_touches_supplied_columns():
+    query, params = build_partial_update('m_location', 'location_id', 5, {'city': 'A', 'building': None},
+                                         '2024-01-01 00:00:00', 'Dashboard', '2023-12-31 00:00:00')
+    assert 'SET city = %s, building = %s, update_date = %s, update_user = %s' in query
+    assert 'NOT (city <=> %s AND building <=> %s)' in query
+    assert 'AND update_date = %s' in query
+    assert params == ['A', None, '2024-01-01 00:00:00', 'Dashboard', 5, 'A', None, '2023-12-31 00:00:00']
+    assert 'zip_code' not in query
+
+@pytest.fixture
+def station(monkeypatch):
+    table = FakeTable('location_id', {5: {
+        'station_name': 'old', 'city': 'Tokyo', 'building': 'B1', 'status': 1,
+        'update_date': datetime.datetime(2024, 1, 1, 9, 0, 0),
+    }})
+    monkeypatch.setattr(station_module, 'db', table)
+    monkeypatch.setattr(station_module, 'get_jst_now', lambda: '2024-02-01 10:00:00')
+    app = Flask(__name__)
+    app.register_blueprint(station_module.update_station_router)
+    return table, app.test_client()
+
+def test_missing_fields_are_left_untouched(station):
+    table, client = station
+    response = client.post('/update_station', json={'location_id': 5, 'station_name': 'new'})
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['changed'] is True
+    assert data['updated_fields'] == ['station_name']
+    assert table.rows[5]['city'] == 'Tokyo'
+    assert table.rows[5]['building'] == 'B1'
+    assert table.commits == 1
+
+def test_explicit_null_clears_field(station):
+    table, client = station
+    client.post('/update_station', json={'location_id': 5, 'building': None})
+    assert table.rows[5]['building'] is None
+
+def test_no_op_write_is_skipped(station):
+    table, client = station
+    response = client.post('/update_station', json={'location_id': 5, 'station_name': 'old', 'city': 'Tokyo'})
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['changed'] is False
+    assert data['update_date'] == '2024-01-01 09:00:00'
+    assert table.commits == 0
+
+def test_optimistic_concurrency(station):
+    table, client = station
+    stale = client.post('/update_station', json={
+        'location_id': 5, 'city': 'Osaka', 'update_date': '2023-12-31 00:00:00'})
+    assert stale.status_code == 409
+    assert stale.get_json()['data']['error'] == {'update_date': '2024-01-01 09:00:00'}
+    assert table.rows[5]['city'] == 'Tokyo'
+
+    # レスポンスのISO形式のupdate_dateでも指定できる
+    fresh = client.post('/update_station', json={
+        'location_id': 5, 'city': 'Osaka', 'update_date': '2024-01-01T09:00:00'})
+    assert fresh.status_code == 200
+    assert fresh.get_json()['data']['update_date'] == '2024-02-01 10:00:00'
+    assert table.rows[5]['city'] == 'Osaka'
+
+def test_not_found_and_nothing_to_update(station):
+    _, client = station
+    assert client.post('/update_station', json={'location_id': 99, 'city': 'A'}).status_code == 404
+    assert client.post('/update_station', json={'location_id': 5}).status_code == 400
+
+def test_update_powersupply_price_only(monkeypatch):
+    table = FakeTable('powersupply_id', {1: {
+        'powersupply_name': 'charger', 'price': 100, 'online': 1, 'update_date': '2024-01-01 00:00:00'}})
+    monkeypatch.setattr(powersupply_module, 'db', table)
+    app = Flask(__name__)
+    app.register_blueprint(powersupply_module.update_powersupply_router)
+    response = app.test_client().post('/update_powersupply', json={'powersupply_id': 1, 'price': 120})
+    assert response.status_code == 200
+    assert response.get_json()['data']['updated_fields'] == ['price']
+    assert table.rows[1]['price'] == 120
+    assert table.rows[1]['online'] == 1
+    query, _ = table.statements[0]
+    assert 'online' not in query
@@ -0,0 +1,179 @@
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+for key, value in {'END_POINT': 'localhost', 'USER_NAME': 'test', 'PASSWORD': 'test',
+                   'DB_NAME': 'test', 'PORT': '3306'}.items():
+    os.environ.setdefault(key, value)
+import pytest
+from flask import Flask
+from utils.bulk_import import parse_csv_rows, validate_row
+from route.dashb.agency import powersupply_bulk_register_router as bulk_module
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, query, params=None):
+        assert 'FROM m_location' in query
+        self.rows = [{'location_id': location_id, 'agency_id': self.db.locations[location_id]}
+                     for location_id in params if location_id in self.db.locations]
+
+    def executemany(self, query, params):
+        self.db.executemany_calls.append(list(params))
+        if self.db.fail_insert:
+            raise RuntimeError('insert failed')
+
+    def fetchall(self):
+        return self.rows
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    @contextmanager
+    def cursor(self, cursor_class=None):
+        yield FakeCursor(self.db)
+
+    def commit(self):
+        self.db.commits += 1
+
+    def rollback(self):
+        self.db.rollbacks += 1
+
+class FakeDB:
+    def __init__(self, locations=None, fail_insert=False):
+        self.locations = locations or {10: 1, 11: 1, 20: 2}
+        self.fail_insert = fail_insert
+        self.executemany_calls = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    @contextmanager
+    def get_connection(self):
+        yield FakeConnection(self)
+
+class FakeAllocator:
+    def __init__(self):
+        self.next_value = 0
+
+    def allocate_many(self, cursor, count):
+        numbers = [str(self.next_value + i).zfill(12) for i in range(count)]
+        self.next_value += count
+        return numbers
+
+def powersupply(location_id=10, name='charger'):
+    return {
+        'location_id': location_id, 'powersupply_name': name, 'type': 1, 'wat': 3000, 'price': 100,
+        'quick_power': 0, 'nomal_power': 1, 'maintenance': 0, 'online': 1,
+        'charge_segment': 1, 'permission': 1,
+    }
+
+@pytest.fixture
+def client(monkeypatch):
+    def setup(fake_db):
+        allocator = FakeAllocator()
+        monkeypatch.setattr(bulk_module, 'db', fake_db)
+        monkeypatch.setattr(bulk_module, 'get_id_allocator', lambda table, column, length: allocator)
+        monkeypatch.setattr(bulk_module, 'resolve_user_identity',
+                            lambda cursor, app_user_number: {'has_agency': True, 'agency_id': int(app_user_number)})
+        app = Flask(__name__)
+        app.register_blueprint(bulk_module.powersupply_bulk_register_router)
+        return app.test_client()
+    return setup
+
+def test_parse_csv_rows():
+    rows = parse_csv_rows("location_id,powersupply_name,building\n10, A ,\n")
+    assert rows == [{'location_id': '10', 'powersupply_name': 'A', 'building': None}]
+
+def test_validate_row():
+    assert validate_row({'a': 1, 'b': '2'}, ['a', 'b'], ['b']) == []
+    assert validate_row({'a': '', 'b': 'x'}, ['a', 'b'], ['b']) == ['aは必須です', 'bは整数で指定してください: x']
+
+def test_json_array_is_inserted_in_one_transaction(client):
+    fake_db = FakeDB()
+    response = client(fake_db).post('/powersupply_bulk_register',
+                                    json=[powersupply(name=f'charger-{i}') for i in range(3)])
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['count'] == 3
+    assert [result['row'] for result in data['results']] == [1, 2, 3]
+    assert len({result['app_powersupply_number'] for result in data['results']}) == 3
+    assert len(fake_db.executemany_calls) == 1
+    assert len(fake_db.executemany_calls[0]) == 3
+    assert fake_db.commits == 1
+
+def test_csv_upload(client):
+    fake_db = FakeDB()
+    header = ','.join(powersupply().keys())
+    lines = [','.join(str(value) for value in powersupply(name=f'c{i}').values()) for i in range(5)]
+    response = client(fake_db).post('/powersupply_bulk_register?app_user_number=1',
+                                    data='\n'.join([header] + lines).encode('utf-8-sig'),
+                                    content_type='text/csv')
+    assert response.status_code == 200
+    assert response.get_json()['data']['count'] == 5
+    assert fake_db.executemany_calls[0][0][0] == '10'
+
+def test_invalid_rows_are_reported_and_nothing_is_written(client):
+    fake_db = FakeDB()
+    rows = [powersupply(), {**powersupply(), 'price': None}, powersupply(location_id=99),
+            powersupply(location_id='abc'), powersupply(location_id=20)]
+    response = client(fake_db).post('/powersupply_bulk_register',
+                                    json={'app_user_number': '1', 'powersupplies': rows})
+    assert response.status_code == 400
+    errors = response.get_json()['data']['error']
+    assert [error['row'] for error in errors] == [2, 3, 4, 5]
+    assert all(error['status'] == 'error' and error['errors'] for error in errors)
+    assert fake_db.executemany_calls == []
+    assert fake_db.commits == 0
+
+def test_insert_failure_rolls_back(client):
+    fake_db = FakeDB(fail_insert=True)
+    response = client(fake_db).post('/powersupply_bulk_register', json=[powersupply()])
+    assert response.status_code == 500
+    assert fake_db.rollbacks == 1
+    assert fake_db.commits == 0
+
+def test_rejects_empty_and_oversized_requests(client, monkeypatch):
+    test_client = client(FakeDB())
+    assert test_client.post('/powersupply_bulk_register', json=[]).status_code == 400
+    assert test_client.post('/powersupply_bulk_register', json={'foo': 1}).status_code == 400
+    monkeypatch.setenv('BULK_MAX_ROWS', '2')
+    assert test_client.post('/powersupply_bulk_register', json=[powersupply()] * 3).status_code == 400
+
+def test_thousands_of_rows_per_second(client):
+    fake_db = FakeDB()
+    rows = [powersupply(name=f'charger-{i}') for i in range(5000)]
+    test_client = client(fake_db)
+    start = time.perf_counter()
+    response = test_client.post('/powersupply_bulk_register', json=rows)
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200
+    assert len(fake_db.executemany_calls[0]) == 5000
+    # アプリケーション側の処理（解析・検証・パラメータ作成）が5000件で1秒未満であること
+    assert elapsed < 1.0
+
+def test_validate_row_types_and_ranges():
+    ranges = {'price': (0, 100)}
+    assert validate_row({'price': '100'}, [], ['price'], ranges) == []
+    assert validate_row({'price': 100.0}, [], ['price'], ranges) == []
+    assert validate_row({'price': 1.5}, [], ['price'], ranges) == ['priceは整数で指定してください: 1.5']
+    assert validate_row({'price': True}, [], ['price'], ranges) == ['priceは整数で指定してください: True']
+    assert validate_row({'price': -1}, [], ['price'], ranges) == ['priceは0以上100以下で指定してください: -1']
+    assert validate_row({'n': 2 ** 31}, [], ['n']) == [f'nは{-2 ** 31}以上{2 ** 31 - 1}以下で指定してください: {2 ** 31}']
+    assert validate_row({'name': {'a': 1}}, [], string_fields=['name']) == ["nameは文字列で指定してください: {'a': 1}"]
+
+def test_bad_column_values_are_row_errors(client):
+    fake_db = FakeDB()
+    rows = [powersupply(), {**powersupply(), 'price': 'abc'}, {**powersupply(), 'wat': -5},
+            {**powersupply(), 'permission': 0}, {**powersupply(), 'online': [1]},
+            {**powersupply(), 'powersupply_name': 123}]
+    response = client(fake_db).post('/powersupply_bulk_register',
+                                    json={'app_user_number': '1', 'powersupplies': rows})
+    assert response.status_code == 400
+    errors = response.get_json()['data']['error']
+    assert [error['row'] for error in errors] == [2, 3, 4, 5, 6]
+    assert fake_db.executemany_calls == []
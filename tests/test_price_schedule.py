@@ -0,0 +1,156 @@
+import os
+import sys
+import datetime
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+import pytest
+from utils.charge_fee import (
+    apply_due_price_schedules, build_fee_update, collapse_schedules, parse_effective_from,
+    SCHEDULE_PENDING, SCHEDULE_APPLIED, SCHEDULE_SUPERSEDED
+)
+
+# テスト用の疑似カーソル（t_price_scheduleとm_powersupplyへのクエリを再現する）
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = []
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        query = ' '.join(query.split())
+        self.conn.executed.append((query, params))
+        self.rowcount = 0
+        if 'GET_LOCK' in query:
+            self.result = [{'acquired': 1 if self.conn.lock_available else 0}]
+        elif query.startswith('SELECT schedule_id'):
+            status, now, limit = params
+            due = sorted((s for s in self.conn.schedules.values()
+                          if s['status'] == status and s['effective_from'] <= now),
+                         key=lambda s: (s['effective_from'], s['schedule_id']))
+            self.result = [dict(s) for s in due[:limit]]
+        elif query.startswith('UPDATE m_powersupply'):
+            self.conn.fee_updates.append(params)
+            if self.conn.fail_update:
+                raise RuntimeError('update failed')
+            self.rowcount = (len(params) - 2) // 3
+        elif query.startswith('UPDATE t_price_schedule'):
+            status, now = params[0], params[1]
+            for schedule_id in params[4:]:
+                self.conn.pending_status[schedule_id] = (status, now)
+
+    def fetchone(self):
+        return self.result[0]
+
+    def fetchall(self):
+        return self.result
+
+class FakeConnection:
+    def __init__(self, schedules, lock_available=True, fail_update=False):
+        self.schedules = {s['schedule_id']: s for s in schedules}
+        self.lock_available = lock_available
+        self.fail_update = fail_update
+        self.executed = []
+        self.fee_updates = []
+        self.pending_status = {}
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self, cursor_class=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        for schedule_id, (status, now) in self.pending_status.items():
+            self.schedules[schedule_id].update({'status': status, 'applied_at': now})
+        self.pending_status = {}
+        self.commits += 1
+
+    def rollback(self):
+        self.pending_status = {}
+        self.rollbacks += 1
+
+def schedule(schedule_id, effective_from, price, powersupply_id=None, location_id=None):
+    return {'schedule_id': schedule_id, 'powersupply_id': powersupply_id, 'location_id': location_id,
+            'price': price, 'effective_from': effective_from, 'status': SCHEDULE_PENDING}
+
+NOW = '2024-04-01 00:00:00'
+
+def test_applies_due_schedules_in_batches():
+    conn = FakeConnection([
+        schedule(1, '2024-03-31 23:00:00', 100, location_id=10),
+        schedule(2, '2024-04-01 00:00:00', 120, powersupply_id=1),
+        schedule(3, '2024-03-31 23:30:00', 110, location_id=11),
+        schedule(4, '2024-04-02 00:00:00', 130, location_id=10),
+    ])
+    result = apply_due_price_schedules(conn, now=NOW, batch_size=2)
+    assert result['skipped'] is False
+    assert result['applied'] == [1, 3, 2]
+    assert result['batches'] == 2
+    assert len(conn.fee_updates) == 2
+    assert [conn.schedules[i]['status'] for i in (1, 2, 3, 4)] == \
+        [SCHEDULE_APPLIED, SCHEDULE_APPLIED, SCHEDULE_APPLIED, SCHEDULE_PENDING]
+    assert conn.schedules[1]['applied_at'] == NOW
+    assert conn.executed[-1][0].startswith('SELECT RELEASE_LOCK')
+
+def test_rerun_is_idempotent():
+    conn = FakeConnection([schedule(1, '2024-03-31 23:00:00', 100, location_id=10)])
+    apply_due_price_schedules(conn, now=NOW)
+    result = apply_due_price_schedules(conn, now=NOW)
+    assert result['applied'] == []
+    assert len(conn.fee_updates) == 1
+
+def test_latest_schedule_per_target_wins():
+    conn = FakeConnection([
+        schedule(1, '2024-03-31 22:00:00', 100, location_id=10),
+        schedule(2, '2024-03-31 23:00:00', 150, location_id=10),
+    ])
+    result = apply_due_price_schedules(conn, now=NOW)
+    assert result['applied'] == [2]
+    assert result['superseded'] == [1]
+    assert conn.schedules[1]['status'] == SCHEDULE_SUPERSEDED
+    assert conn.fee_updates[0][:3] == [10, 150, '2024-03-31 23:00:00']
+
+def test_failed_batch_is_rolled_back_and_left_pending():
+    conn = FakeConnection([schedule(1, '2024-03-31 23:00:00', 100, location_id=10)], fail_update=True)
+    with pytest.raises(RuntimeError):
+        apply_due_price_schedules(conn, now=NOW)
+    assert conn.rollbacks == 1
+    assert conn.schedules[1]['status'] == SCHEDULE_PENDING
+    assert conn.executed[-1][0].startswith('SELECT RELEASE_LOCK')
+
+def test_skips_when_another_run_holds_the_lock():
+    conn = FakeConnection([schedule(1, '2024-03-31 23:00:00', 100, location_id=10)], lock_available=False)
+    assert apply_due_price_schedules(conn, now=NOW)['skipped'] is True
+    assert conn.fee_updates == []
+
+def test_newer_location_schedule_overrides_older_powersupply_schedule():
+    query, params = build_fee_update([(1, 120, '2024-03-31 22:00:00')], [(10, 150, '2024-03-31 23:00:00')],
+                                     NOW, 'Scheduler')
+    assert 'ps.effective_from >= lf.effective_from' in query
+    assert 'SELECT %s AS powersupply_id, %s AS price, %s AS effective_from' in query
+    assert params == [1, 120, '2024-03-31 22:00:00', 10, 150, '2024-03-31 23:00:00', NOW, 'Scheduler']
+
+def test_collapse_schedules():
+    latest, superseded = collapse_schedules([
+        schedule(1, 'a', 1, powersupply_id=1), schedule(2, 'a', 1, location_id=1), schedule(3, 'b', 2, powersupply_id=1)])
+    assert [s['schedule_id'] for s in latest] == [3, 2]
+    assert superseded == [1]
+
+def test_parse_effective_from():
+    assert parse_effective_from('2024-04-01T09:00', NOW) == '2024-04-01 09:00:00'
+    with pytest.raises(ValueError):
+        parse_effective_from('2024-03-31 09:00:00', NOW)
+    with pytest.raises(ValueError):
+        parse_effective_from('tomorrow', NOW)
+
+def test_parse_effective_from_converts_offset_to_jst():
+    assert parse_effective_from('2024-04-01T00:30:00Z', NOW) == '2024-04-01 09:30:00'
+    assert parse_effective_from('2024-04-01T09:30:00+09:00', NOW) == '2024-04-01 09:30:00'
+    # 日本時間では現在以前になる
+    with pytest.raises(ValueError):
+        parse_effective_from('2024-04-01T05:00:00+14:00', NOW)
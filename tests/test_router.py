@@ -0,0 +1,53 @@
+import os
+import sys
+import json
+import importlib
+import subprocess
+from flask import Flask
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+for key, value in {'END_POINT': 'localhost', 'USER_NAME': 'test', 'PASSWORD': 'test',
+                   'DB_NAME': 'test', 'PORT': '3306', 'COGNITO_USER_POOL_ID': 'test',
+                   'AWS_DEFAULT_REGION': 'ap-northeast-1'}.items():
+    os.environ.setdefault(key, value)
+from route.router import router
+
+def url_rules(app):
+    return {(rule.rule, tuple(sorted(rule.methods - {'HEAD', 'OPTIONS'}))) for rule in app.url_map.iter_rules()
+            if rule.endpoint != 'static'}
+
+def test_lazy_routes_match_router_blueprints():
+    # 遅延登録したURLルールが、各ルーターモジュールのBlueprintを直接登録した場合と一致すること
+    lazy_app = Flask(__name__)
+    lazy_app.register_blueprint(router)
+
+    eager_app = Flask(__name__)
+    for url_prefix, view in router.lazy_views:
+        module = importlib.import_module(view.module_name)
+        blueprint = getattr(module, view.blueprint_name)
+        if blueprint.name not in eager_app.blueprints:
+            eager_app.register_blueprint(blueprint, url_prefix=url_prefix)
+
+    assert url_rules(lazy_app) == url_rules(eager_app)
+    # すべてのビューが解決できること
+    router.load_all()
+
+def test_hello_world_is_dispatched_through_lazy_view():
+    app = Flask(__name__)
+    app.register_blueprint(router)
+    response = app.test_client().get('/dashb/hello_world')
+    assert response.status_code == 200
+    assert response.get_json()['statusCode'] == 200
+
+def test_importing_app_does_not_load_routers_or_boto3():
+    # 新しいプロセスでapp.pyを読み込み、ルーターモジュールとboto3が読み込まれていないことを確認する
+    probe = (
+        "import sys, json, app; "
+        "print(json.dumps(sorted(m for m in sys.modules "
+        "if m.startswith(('route.dashb.', 'boto3', 'botocore')))))"
+    )
+    env = dict(os.environ)
+    env.pop('ROUTER_EAGER_LOAD', None)
+    output = subprocess.run([sys.executable, '-c', probe], cwd=os.environ["REPOSITORY_HOME"], env=env,
+                            capture_output=True, text=True, check=True).stdout
+    assert json.loads(output.strip().splitlines()[-1]) == []
@@ -0,0 +1,181 @@
+import os
+import sys
+from contextlib import contextmanager
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+for key, value in {'END_POINT': 'localhost', 'USER_NAME': 'test', 'PASSWORD': 'test',
+                   'DB_NAME': 'test', 'PORT': '3306'}.items():
+    os.environ.setdefault(key, value)
+import pymysql
+import pytest
+from flask import Flask
+from utils.db_utils import format_app_location_number
+from route.dashb.agency import station_bulk_register_router as bulk_module
+
+class FakeCursor:
+    """セーブポイントに対応したm_locationへのINSERTの代わり。station_nameが'dup'の行は失敗する"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def _insert(self, params):
+        if params[2] == 'dup':
+            raise pymysql.err.IntegrityError(1062, 'Duplicate entry')
+        if params[2] == 'deadlock':
+            raise pymysql.err.OperationalError(1213, 'Deadlock found when trying to get lock')
+        self.db.pending.append(params)
+
+    def execute(self, query, params=None):
+        if query.startswith('SAVEPOINT'):
+            self.db.savepoints[query.split()[1]] = len(self.db.pending)
+        elif query.startswith('ROLLBACK TO SAVEPOINT'):
+            self.db.savepoint_rollbacks += 1
+            del self.db.pending[self.db.savepoints[query.split()[3]]:]
+        else:
+            self.db.single_inserts += 1
+            self._insert(params)
+
+    def executemany(self, query, params):
+        self.db.batches.append(len(params))
+        for row in params:
+            self._insert(row)
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    @contextmanager
+    def cursor(self, cursor_class=None):
+        yield FakeCursor(self.db)
+
+    def commit(self):
+        self.db.committed.extend(self.db.pending)
+        self.db.pending = []
+
+    def rollback(self):
+        self.db.pending = []
+
+class FakeDB:
+    def __init__(self):
+        self.pending = []
+        self.committed = []
+        self.savepoints = {}
+        self.savepoint_rollbacks = 0
+        self.batches = []
+        self.single_inserts = 0
+        self.sequence_calls = []
+        self.identity_calls = 0
+
+    @contextmanager
+    def get_connection(self):
+        yield FakeConnection(self)
+
+def station(name='station'):
+    return {'station_name': name, 'zip_code': '1000001', 'prefecture': '東京都', 'city': '千代田区',
+            'address': '1-1', 'open_time': '09:00', 'end_time': '18:00', 'open_day': '月火水木金'}
+
+@pytest.fixture
+def setup(monkeypatch):
+    def create(fake_db):
+        def fake_identity(cursor, app_user_number):
+            fake_db.identity_calls += 1
+            return {'has_agency': True, 'agency_id': 7}
+
+        def fake_numbers(cursor, agency_id, count):
+            fake_db.sequence_calls.append(count)
+            return [format_app_location_number(agency_id, n) for n in range(1, count + 1)]
+
+        monkeypatch.setattr(bulk_module, 'db', fake_db)
+        monkeypatch.setattr(bulk_module, 'resolve_user_identity', fake_identity)
+        monkeypatch.setattr(bulk_module, 'generate_app_location_numbers', fake_numbers)
+        app = Flask(__name__)
+        app.register_blueprint(bulk_module.station_bulk_register_router)
+        return app.test_client()
+    return create
+
+def test_registers_in_batches_with_contiguous_numbers(setup, monkeypatch):
+    monkeypatch.setenv('BULK_INSERT_BATCH_SIZE', '4')
+    fake_db = FakeDB()
+    response = setup(fake_db).post('/station_bulk_register', json={
+        'app_user_number': 'U0001',
+        'stations': [station(f's{i}') for i in range(10)],
+    })
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['succeeded'] == 10 and data['failed'] == 0
+    assert [result['app_location_number'] for result in data['results']] == \
+        [format_app_location_number(7, n) for n in range(1, 11)]
+    assert fake_db.identity_calls == 1
+    assert fake_db.sequence_calls == [10]
+    assert fake_db.batches == [4, 4, 2]
+    assert fake_db.single_inserts == 0
+    assert len(fake_db.committed) == 10
+
+def test_invalid_and_failing_rows_do_not_abort_batch(setup, monkeypatch):
+    monkeypatch.setenv('BULK_INSERT_BATCH_SIZE', '3')
+    fake_db = FakeDB()
+    rows = [station('a'), {**station('b'), 'zip_code': None}, station('dup'), station('c'), station('d')]
+    response = setup(fake_db).post('/station_bulk_register', json={'app_user_number': 'U0001', 'stations': rows})
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['succeeded'] == 3 and data['failed'] == 2
+    statuses = [(result['row'], result['status']) for result in data['results']]
+    assert statuses == [(1, 'created'), (2, 'error'), (3, 'error'), (4, 'created'), (5, 'created')]
+    # 入力に誤りがある行は採番しない
+    assert fake_db.sequence_calls == [4]
+    assert sorted(params[2] for params in fake_db.committed) == ['a', 'c', 'd']
+
+def test_types_and_formats_are_validated_before_numbering(setup):
+    fake_db = FakeDB()
+    rows = [
+        station('ok'),
+        {**station('zip'), 'zip_code': '123'},
+        {**station('time'), 'open_time': '25:00'},
+        {**station('day'), 'open_day': '月月'},
+        {**station('x' * 101)},
+        {**station('type'), 'city': 1},
+        {**station('allday'), 'open_time': '00:00', 'end_time': '24:00', 'zip_code': '100-0001'},
+    ]
+    response = setup(fake_db).post('/station_bulk_register', json={'app_user_number': 'U0001', 'stations': rows})
+    assert response.status_code == 200
+    statuses = [result['status'] for result in response.get_json()['data']['results']]
+    assert statuses == ['created', 'error', 'error', 'error', 'error', 'error', 'created']
+    # 無効な行の分は採番しない
+    assert fake_db.sequence_calls == [2]
+
+def test_deadlock_is_raised_instead_of_retried_per_row(setup):
+    fake_db = FakeDB()
+    rows = [station('a'), station('deadlock'), station('c')]
+    response = setup(fake_db).post('/station_bulk_register', json={'app_user_number': 'U0001', 'stations': rows})
+    assert response.status_code == 500
+    # ロールバック済みのトランザクションでセーブポイントに戻さない
+    assert fake_db.savepoint_rollbacks == 0
+    assert fake_db.single_inserts == 0
+    assert fake_db.committed == []
+
+def test_dry_run_validates_without_writing(setup):
+    fake_db = FakeDB()
+    response = setup(fake_db).post('/station_bulk_register', json={
+        'app_user_number': 'U0001', 'dry_run': True,
+        'stations': [station('a'), {**station('b'), 'city': ''}],
+    })
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['dry_run'] is True
+    assert [result['status'] for result in data['results']] == ['valid', 'error']
+    assert fake_db.sequence_calls == []
+    assert fake_db.batches == [] and fake_db.committed == []
+
+def test_csv_with_query_options(setup):
+    fake_db = FakeDB()
+    header = ','.join(station().keys())
+    lines = [','.join(station(f's{i}').values()) for i in range(3)]
+    response = setup(fake_db).post('/station_bulk_register?app_user_number=U0001&dry_run=1',
+                                   data='\n'.join([header] + lines), content_type='text/csv')
+    assert response.status_code == 200
+    assert response.get_json()['data']['succeeded'] == 3
+    assert fake_db.committed == []
+
+def test_requires_app_user_number(setup):
+    response = setup(FakeDB()).post('/station_bulk_register', json=[station()])
+    assert response.status_code == 400
@@ -0,0 +1,136 @@
+import os
+import sys
+import time
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+for key, value in {'END_POINT': 'localhost', 'USER_NAME': 'test', 'PASSWORD': 'test',
+                   'DB_NAME': 'test', 'PORT': '3306', 'AWS_DEFAULT_REGION': 'ap-northeast-1'}.items():
+    os.environ.setdefault(key, value)
+import pytest
+from flask import Flask
+from botocore.exceptions import ClientError
+from utils.app_user_token import issue_app_user_token, read_app_user_token
+from utils.cognito_auth import AccessTokenVerifier, JWKSCache
+from route.dashb.agency import agency_token_refresh_router as refresh_module
+from test_cognito_auth import ISSUER, CLIENT_ID, POOL_KEY, FakeJWKSEndpoint, jwk, make_token
+
+NotAuthorizedException = type('NotAuthorizedException', (ClientError,), {})
+
+class FakeExceptions:
+    NotAuthorizedException = NotAuthorizedException
+
+class FakeCognitoClient:
+    exceptions = FakeExceptions
+
+    def __init__(self, username='user-0001', revoked=False):
+        self.username = username
+        self.revoked = revoked
+        self.calls = []
+
+    def initiate_auth(self, AuthFlow, AuthParameters, ClientId):
+        self.calls.append((AuthFlow, AuthParameters))
+        if self.revoked:
+            raise NotAuthorizedException({'Error': {'Code': 'NotAuthorizedException', 'Message': 'revoked'}},
+                                         'InitiateAuth')
+        return {'AuthenticationResult': {
+            'AccessToken': make_token(username=self.username),
+            'ExpiresIn': 3600,
+        }}
+
+    def admin_get_user(self, **kwargs):
+        raise AssertionError("ユーザー属性は参照しない")
+
+@pytest.fixture(autouse=True)
+def cognito_env(monkeypatch):
+    monkeypatch.setenv('COGNITO_CLIENT_ID', CLIENT_ID)
+    monkeypatch.setenv('COGNITO_CLIENT_SECRET', 'secret')
+    monkeypatch.delenv('APP_USER_TOKEN_SECRET', raising=False)
+    monkeypatch.delenv('APP_USER_TOKEN_TTL', raising=False)
+
+def refresh(cognito, monkeypatch, body):
+    verifier = AccessTokenVerifier(ISSUER, CLIENT_ID, JWKSCache('x', fetch=FakeJWKSEndpoint(jwk(POOL_KEY, 'key-1'))))
+    monkeypatch.setattr(refresh_module, 'get_cognito_client', lambda: cognito)
+    monkeypatch.setattr(refresh_module, 'get_verifier', lambda: verifier)
+    app = Flask(__name__)
+    app.register_blueprint(refresh_module.agency_token_refresh_router)
+    return app.test_client().post('/agency_token_refresh', json=body)
+
+def test_app_user_token_round_trip():
+    token = issue_app_user_token('user-0001', 'U0001', 4)
+    assert read_app_user_token(token, 4) == {
+        'username': 'user-0001', 'app_user_number': 'U0001', 'user_category': 4,
+        'issued_at': read_app_user_token(token, 4)['issued_at'],
+    }
+
+def test_app_user_token_rejects_tampering_and_expiry(monkeypatch):
+    token = issue_app_user_token('user-0001', 'U0001', 4)
+    payload, signature = token.split('.')
+    forged = issue_app_user_token('user-0001', 'U9999', 4).split('.')[0]
+    with pytest.raises(ValueError):
+        read_app_user_token(f"{forged}.{signature}", 4)
+    with pytest.raises(ValueError):
+        read_app_user_token('garbage', 4)
+    with pytest.raises(ValueError):
+        read_app_user_token(token, 2)
+    with pytest.raises(ValueError):
+        read_app_user_token(token, 4, now=time.time() + 31 * 24 * 3600)
+    # 署名鍵が変わった場合は無効になる
+    monkeypatch.setenv('APP_USER_TOKEN_SECRET', 'rotated')
+    with pytest.raises(ValueError):
+        read_app_user_token(token, 4)
+
+def test_refresh_returns_tokens_and_cached_user_number(monkeypatch):
+    cognito = FakeCognitoClient()
+    response = refresh(cognito, monkeypatch, {
+        'refreshToken': 'refresh-token',
+        'appUserToken': issue_app_user_token('user-0001', 'U0001', 4),
+    })
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['app_user_number'] == 'U0001'
+    assert data['accessToken']
+    assert data['refreshToken'] == 'refresh-token'
+    assert data['expiresIn'] == 3600
+    # Cognitoの呼び出しは1回のみ
+    assert len(cognito.calls) == 1
+    auth_flow, parameters = cognito.calls[0]
+    assert auth_flow == 'REFRESH_TOKEN_AUTH'
+    assert parameters['REFRESH_TOKEN'] == 'refresh-token'
+    assert parameters['SECRET_HASH']
+
+def test_refresh_does_not_touch_database(monkeypatch):
+    class NoDB:
+        def get_connection(self):
+            raise AssertionError("データベースは参照しない")
+
+    monkeypatch.setattr('db.db_connection.db', NoDB())
+    response = refresh(FakeCognitoClient(), monkeypatch, {
+        'refreshToken': 'refresh-token',
+        'appUserToken': issue_app_user_token('user-0001', 'U0001', 4),
+    })
+    assert response.status_code == 200
+
+def test_refresh_requires_both_tokens(monkeypatch):
+    response = refresh(FakeCognitoClient(), monkeypatch, {'refreshToken': 'refresh-token'})
+    assert response.status_code == 400
+
+def test_refresh_rejects_invalid_app_user_token(monkeypatch):
+    cognito = FakeCognitoClient()
+    response = refresh(cognito, monkeypatch, {'refreshToken': 'refresh-token', 'appUserToken': 'x.y'})
+    assert response.status_code == 401
+    assert cognito.calls == []
+
+def test_refresh_rejects_revoked_refresh_token(monkeypatch):
+    response = refresh(FakeCognitoClient(revoked=True), monkeypatch, {
+        'refreshToken': 'refresh-token',
+        'appUserToken': issue_app_user_token('user-0001', 'U0001', 4),
+    })
+    assert response.status_code == 401
+
+def test_refresh_rejects_token_of_another_user(monkeypatch):
+    # 他のユーザーのappUserTokenと組み合わせても、そのユーザーのapp_user_numberは返さない
+    response = refresh(FakeCognitoClient(username='user-0002'), monkeypatch, {
+        'refreshToken': 'refresh-token',
+        'appUserToken': issue_app_user_token('user-0001', 'U0001', 4),
+    })
+    assert response.status_code == 401
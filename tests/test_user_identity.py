@@ -0,0 +1,98 @@
+import os
+import sys
+from flask import Flask
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+import pytest
+from utils.user_identity import (
+    IdentityCache, identity_cache, resolve_user_identity, invalidate_user_identity
+)
+
+# テスト用の疑似カーソル
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.executed = []
+        self.result = None
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+        self.result = self.rows.get(params[0])
+
+    def fetchone(self):
+        return self.result
+
+AGENCY_ROW = {
+    'user_id': 10, 'user_category': 4, 'status': 1,
+    'agency_user_id': 10, 'agency_id': 3, 'agency_permission': 5,
+    'corporate_user_id': None, 'corporate_id': None, 'corporate_permission': None,
+}
+
+app = Flask(__name__)
+
+@pytest.fixture(autouse=True)
+def clear_identity_cache():
+    identity_cache.clear()
+    yield
+    identity_cache.clear()
+
+def test_resolve_in_single_query_and_memoize():
+    cursor = FakeCursor({'0000000001': AGENCY_ROW})
+    with app.test_request_context():
+        first = resolve_user_identity(cursor, '0000000001')
+        second = resolve_user_identity(cursor, '0000000001')
+
+    assert len(cursor.executed) == 1
+    assert first is second
+    assert first['user_id'] == 10
+    assert first['has_agency'] is True
+    assert first['agency_id'] == 3
+    assert first['agency_permission'] == 5
+    assert first['has_corporate'] is False
+
+def test_cache_is_shared_across_requests():
+    cursor = FakeCursor({'0000000001': AGENCY_ROW})
+    with app.test_request_context():
+        resolve_user_identity(cursor, '0000000001')
+    with app.test_request_context():
+        resolve_user_identity(cursor, '0000000001')
+
+    assert len(cursor.executed) == 1
+    assert identity_cache.stats()['hits'] == 1
+
+def test_invalidate_forces_reload():
+    cursor = FakeCursor({'0000000001': AGENCY_ROW})
+    with app.test_request_context():
+        resolve_user_identity(cursor, '0000000001')
+        invalidate_user_identity('0000000001')
+        resolve_user_identity(cursor, '0000000001')
+
+    assert len(cursor.executed) == 2
+    assert identity_cache.stats()['invalidations'] == 1
+
+def test_unknown_user_is_not_cached():
+    cursor = FakeCursor({})
+    with app.test_request_context():
+        assert resolve_user_identity(cursor, '9999999999') is None
+    with app.test_request_context():
+        assert resolve_user_identity(cursor, '9999999999') is None
+
+    assert len(cursor.executed) == 2
+
+def test_lru_eviction():
+    cache = IdentityCache(max_size=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats()['evictions'] == 1
+
+def test_ttl_expiration():
+    cache = IdentityCache(max_size=2, ttl=0)
+    cache.set('a', 1)
+
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
@@ -0,0 +1,314 @@
+import os
+import sys
+from contextlib import contextmanager
+
+sys.path.append(os.environ["REPOSITORY_HOME"])
+for key, value in {'END_POINT': 'localhost', 'USER_NAME': 'test', 'PASSWORD': 'test',
+                   'DB_NAME': 'test', 'PORT': '3306', 'COGNITO_USER_POOL_ID': 'pool'}.items():
+    os.environ.setdefault(key, value)
+import pytest
+from flask import Flask
+from botocore.exceptions import ClientError
+from utils import user_registration
+from utils.user_registration import (
+    recover_registrations, USER_STATUS_ACTIVE, USER_STATUS_PENDING,
+    REGISTRATION_PENDING, REGISTRATION_COMPLETED, REGISTRATION_COMPENSATED
+)
+from route.dashb.common import agency_user_register_router as agency_module
+from route.dashb.common import corporate_user_register_router as corporate_module
+from route.dashb.common import corporate_update_user_router as corporate_update_module
+from route.dashb.admin import individual_update_user_router as individual_update_module
+
+class FakeCursor:
+    """m_user、所属テーブル、t_user_registrationへのクエリを再現する"""
+
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+        self.lastrowid = None
+        self.result = []
+
+    def execute(self, query, params=None):
+        query = ' '.join(query.split())
+        self.db.executed.append(query)
+        self.rowcount = 0
+        if 'GET_LOCK' in query:
+            self.result = [{'acquired': 1}]
+        elif query.startswith('INSERT INTO m_user ('):
+            self.lastrowid = len(self.db.users) + 100
+            self.db.users[self.lastrowid] = {'echnavicode': params[0], 'status': params[10]}
+        elif query.startswith('INSERT INTO m_user_'):
+            self.db.memberships[params[0]] = query.split()[2]
+        elif query.startswith('INSERT INTO t_user_registration'):
+            self.lastrowid = len(self.db.registrations) + 1
+            self.db.registrations[self.lastrowid] = {
+                'user_id': params[0], 'user_category': params[1], 'cognito_username': params[2],
+                'status': params[3], 'attempts': 0, 'updated_at': params[4]}
+        elif query.startswith('UPDATE m_user SET status'):
+            status, cognito_username, cognito_sub, _, _, user_id, expected = params
+            user = self.db.users.get(user_id)
+            if user and user['status'] == expected:
+                user.update({'status': status, 'cognito_username': cognito_username, 'cognito_sub': cognito_sub})
+                self.rowcount = 1
+        elif query.startswith('UPDATE t_user_registration SET attempts'):
+            self.db.registrations[params[2]]['attempts'] += 1
+        elif query.startswith('UPDATE t_user_registration'):
+            registration = self.db.registrations[params[-1]]
+            registration['status'] = params[0]
+        elif query.startswith('SELECT status FROM m_user'):
+            user = self.db.users.get(params[0])
+            self.result = [{'status': user['status']}] if user else []
+        elif query.startswith('SELECT status, cognito_username FROM m_user'):
+            user = self.db.users.get(params[0])
+            self.result = [{'status': user['status'], 'cognito_username': user.get('cognito_username')}] if user else []
+        elif query.startswith('DELETE FROM m_user_'):
+            self.db.memberships.pop(params[0], None)
+        elif query.startswith('DELETE FROM m_user'):
+            if self.db.users.get(params[0], {}).get('status') == params[1]:
+                del self.db.users[params[0]]
+        elif query.startswith('SELECT r.registration_id'):
+            status, threshold, limit = params
+            self.result = [
+                {'registration_id': registration_id, **registration,
+                 'echnavicode': self.db.users.get(registration['user_id'], {}).get('echnavicode'),
+                 'user_status': self.db.users.get(registration['user_id'], {}).get('status')}
+                for registration_id, registration in self.db.registrations.items()
+                if registration['status'] == status and registration['updated_at'] < threshold
+            ][:limit]
+
+    def fetchone(self):
+        return self.result[0] if self.result else None
+
+    def fetchall(self):
+        return self.result
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    @contextmanager
+    def cursor(self, cursor_class=None):
+        yield FakeCursor(self.db)
+
+    def commit(self):
+        self.db.commits += 1
+
+    def rollback(self):
+        pass
+
+class FakeDB:
+    def __init__(self):
+        self.users = {}
+        self.memberships = {}
+        self.registrations = {}
+        self.executed = []
+        self.commits = 0
+        self.open_connections = 0
+
+    @contextmanager
+    def get_connection(self):
+        self.open_connections += 1
+        try:
+            yield FakeConnection(self)
+        finally:
+            self.open_connections -= 1
+
+def client_error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'operation')
+
+class FakeCognito:
+    def __init__(self, db=None, create_error=None, mfa_error=None):
+        self.db = db
+        self.create_error = create_error
+        self.mfa_error = mfa_error
+        self.users = {}
+        self.deleted = []
+        self.connections_during_create = None
+
+    def admin_create_user(self, UserPoolId, Username, UserAttributes, DesiredDeliveryMediums):
+        if self.db is not None:
+            self.connections_during_create = self.db.open_connections
+        if self.create_error:
+            raise self.create_error
+        self.users[Username] = {attribute['Name']: attribute['Value'] for attribute in UserAttributes}
+        self.users[Username]['sub'] = f'sub-{Username}'
+        return {'User': {'Username': Username, 'Attributes': [
+            {'Name': name, 'Value': value} for name, value in self.users[Username].items()]}}
+
+    def admin_set_user_settings(self, UserPoolId, Username, MFAOptions):
+        if self.mfa_error:
+            raise self.mfa_error
+
+    def admin_get_user(self, UserPoolId, Username):
+        if Username not in self.users:
+            raise client_error('UserNotFoundException')
+        return {'Username': Username,
+                'UserAttributes': [{'Name': name, 'Value': value} for name, value in self.users[Username].items()]}
+
+    def admin_delete_user(self, UserPoolId, Username):
+        self.deleted.append(Username)
+        self.users.pop(Username, None)
+
+@pytest.fixture
+def setup(monkeypatch):
+    def create(module, fake_db, cognito):
+        monkeypatch.setattr(module, 'db', fake_db)
+        monkeypatch.setattr(module, 'get_cognito_client', lambda: cognito)
+        monkeypatch.setattr(module, 'resolve_user_identity', lambda cursor, app_user_number: {
+            'has_agency': True, 'agency_id': 3, 'has_corporate': True, 'corporate_id': 5})
+        monkeypatch.setattr(module, 'generate_unique_number', lambda cursor, table, column, length: '0000000042')
+        app = Flask(__name__)
+        app.register_blueprint(getattr(module, [name for name in dir(module) if name.endswith('_register_router')][0]))
+        return app.test_client()
+    return create
+
+BODY = {'app_user_number': '0000000001', 'lastName': '山田', 'firstName': '太郎',
+        'email': 'taro@example.com', 'phone': '090-1234-5678', 'permission': 2}
+
+def test_agency_registration_commits_before_cognito(setup):
+    fake_db = FakeDB()
+    cognito = FakeCognito(fake_db)
+    response = setup(agency_module, fake_db, cognito).post('/agency_user_register', json=BODY)
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['ech_nav_code'] == 'EchNaviAGE0000000042'
+    assert data['cognito_username'] == '+819012345678'
+    # Cognitoの呼び出し中はデータベース接続（トランザクション）を保持しない
+    assert cognito.connections_during_create == 0
+    assert fake_db.users[100]['status'] == USER_STATUS_ACTIVE
+    # 以降のCognitoの操作で検索しないよう、ユーザー名とsubを記録する
+    assert fake_db.users[100]['cognito_username'] == '+819012345678'
+    assert fake_db.users[100]['cognito_sub'] == 'sub-+819012345678'
+    assert fake_db.memberships[100] == 'm_user_agency'
+    assert fake_db.registrations[1]['status'] == REGISTRATION_COMPLETED
+    assert fake_db.commits == 2
+
+def test_cognito_failure_compensates(setup):
+    fake_db = FakeDB()
+    cognito = FakeCognito(fake_db, create_error=client_error('UsernameExistsException'))
+    response = setup(corporate_module, fake_db, cognito).post('/corporate_user_register', json=BODY)
+    assert response.status_code == 500
+    assert fake_db.users == {} and fake_db.memberships == {}
+    assert fake_db.registrations[1]['status'] == REGISTRATION_COMPENSATED
+    # 既存のCognitoユーザーは削除しない
+    assert cognito.deleted == []
+
+def test_mfa_failure_deletes_created_cognito_user(setup):
+    fake_db = FakeDB()
+    cognito = FakeCognito(fake_db, mfa_error=client_error('InternalErrorException'))
+    response = setup(agency_module, fake_db, cognito).post('/agency_user_register', json=BODY)
+    assert response.status_code == 500
+    assert cognito.deleted == ['+819012345678']
+    assert fake_db.users == {}
+
+def test_ambiguous_create_failure_removes_own_user(setup):
+    fake_db = FakeDB()
+
+    class TimingOutCognito(FakeCognito):
+        def admin_create_user(self, **kwargs):
+            super().admin_create_user(**kwargs)
+            raise TimeoutError('read timeout')
+
+    cognito = TimingOutCognito(fake_db)
+    response = setup(agency_module, fake_db, cognito).post('/agency_user_register', json=BODY)
+    assert response.status_code == 500
+    assert cognito.deleted == ['+819012345678']
+    assert fake_db.users == {}
+
+def test_registration_compensated_during_cognito_call_deletes_cognito_user(setup):
+    fake_db = FakeDB()
+
+    class SlowCognito(FakeCognito):
+        def admin_create_user(self, **kwargs):
+            # Cognitoの呼び出し中に、復旧処理が仮登録を取り消した場合
+            fake_db.users.clear()
+            return super().admin_create_user(**kwargs)
+
+    cognito = SlowCognito(fake_db)
+    response = setup(agency_module, fake_db, cognito).post('/agency_user_register', json=BODY)
+    assert response.status_code == 500
+    assert cognito.deleted == ['+819012345678']
+
+def test_registration_completed_by_recovery_keeps_cognito_user(setup):
+    fake_db = FakeDB()
+
+    class SlowCognito(FakeCognito):
+        def admin_create_user(self, **kwargs):
+            response = super().admin_create_user(**kwargs)
+            # Cognitoの呼び出し中に、復旧処理が同じCognitoのユーザーで登録を完了した場合
+            fake_db.users[100].update({'status': USER_STATUS_ACTIVE, 'cognito_username': kwargs['Username']})
+            return response
+
+    cognito = SlowCognito(fake_db)
+    response = setup(agency_module, fake_db, cognito).post('/agency_user_register', json=BODY)
+    assert response.status_code == 200
+    assert cognito.deleted == []
+
+@pytest.mark.parametrize('module, path, body', [
+    (corporate_update_module, '/corporate_update_user', {'lastname': '山田', 'firstname': '太郎', 'permission': 1}),
+    (individual_update_module, '/individual_update_user', {})])
+@pytest.mark.parametrize('status', [1, 3])
+def test_pending_user_cannot_be_updated(monkeypatch, module, path, body, status):
+    fake_db = FakeDB()
+    fake_db.users[7] = {'echnavicode': 'EchNaviCOR7', 'status': USER_STATUS_PENDING}
+    monkeypatch.setattr(module, 'db', fake_db)
+    monkeypatch.setattr(module, 'resolve_user_identity', lambda cursor, app_user_number: {'user_id': 7})
+    app = Flask(__name__)
+    app.register_blueprint(getattr(module, path.lstrip('/') + '_router'))
+    response = app.test_client().post(path, json={'app_user_number': '0000000007', 'status': status, **body})
+    assert response.status_code == 409
+    assert fake_db.users[7]['status'] == USER_STATUS_PENDING
+    assert not any(query.startswith('UPDATE') for query in fake_db.executed)
+    assert fake_db.commits == 0
+
+def test_invalid_phone_is_rejected_before_writing(setup):
+    fake_db = FakeDB()
+    response = setup(agency_module, fake_db, FakeCognito()).post('/agency_user_register',
+                                                                 json={**BODY, 'phone': '12'})
+    assert response.status_code == 400
+    assert fake_db.executed == []
+
+def pending_registration(fake_db, user_id, username, echnavicode, updated_at='2024-01-01 00:00:00'):
+    fake_db.users[user_id] = {'echnavicode': echnavicode, 'status': USER_STATUS_PENDING}
+    fake_db.memberships[user_id] = 'm_user_agency'
+    fake_db.registrations[len(fake_db.registrations) + 1] = {
+        'user_id': user_id, 'user_category': 4, 'cognito_username': username,
+        'status': REGISTRATION_PENDING, 'attempts': 0, 'updated_at': updated_at}
+
+def test_recovery_completes_or_rolls_back():
+    fake_db = FakeDB()
+    cognito = FakeCognito()
+    cognito.users['+8190000001'] = {'custom:ech_nav_code': 'EchNaviAGE1', 'sub': 'sub-1'}
+    cognito.users['+8190000003'] = {'custom:ech_nav_code': 'EchNaviAGEother'}
+    pending_registration(fake_db, 1, '+8190000001', 'EchNaviAGE1')
+    pending_registration(fake_db, 2, '+8190000002', 'EchNaviAGE2')
+    pending_registration(fake_db, 3, '+8190000003', 'EchNaviAGE3')
+    # タイムアウト前の登録は対象外
+    pending_registration(fake_db, 4, '+8190000004', 'EchNaviAGE4', updated_at='2024-01-01 00:55:00')
+
+    with fake_db.get_connection() as conn:
+        result = recover_registrations(conn, cognito, 'pool', now='2024-01-01 01:00:00', timeout=900)
+    assert result == {'skipped': False, REGISTRATION_COMPLETED: 1, REGISTRATION_COMPENSATED: 2, 'failed': 0}
+    assert fake_db.users[1]['status'] == USER_STATUS_ACTIVE
+    assert fake_db.users[1]['cognito_sub'] == 'sub-1'
+    assert 2 not in fake_db.users and 3 not in fake_db.users
+    assert fake_db.users[4]['status'] == USER_STATUS_PENDING
+    assert [fake_db.registrations[i]['status'] for i in (1, 2, 3, 4)] == [
+        REGISTRATION_COMPLETED, REGISTRATION_COMPENSATED, REGISTRATION_COMPENSATED, REGISTRATION_PENDING]
+    # 別のユーザーのCognitoアカウントは削除しない
+    assert cognito.deleted == []
+    assert fake_db.executed[-1].startswith('SELECT RELEASE_LOCK')
+
+def test_recovery_failure_is_retried_later():
+    fake_db = FakeDB()
+
+    class FailingCognito(FakeCognito):
+        def admin_get_user(self, UserPoolId, Username):
+            raise client_error('TooManyRequestsException')
+
+    pending_registration(fake_db, 1, '+8190000001', 'EchNaviAGE1')
+    with fake_db.get_connection() as conn:
+        result = recover_registrations(conn, FailingCognito(), 'pool', now='2024-01-01 01:00:00', timeout=900)
+    assert result['failed'] == 1
+    assert fake_db.registrations[1]['status'] == REGISTRATION_PENDING
+    assert fake_db.registrations[1]['attempts'] == 1
@@ -0,0 +1,96 @@
+"""
+Signed, client-held tokens that bind a Cognito username to the dashboard's
+app_user_number, so token refreshes can skip the m_user lookup.
+"""
+import os
+import json
+import hmac
+import time
+import base64
+import hashlib
+import logging
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+# トークンの有効期限（秒）。Cognitoのリフレッシュトークンの既定の有効期限（30日）に合わせる
+DEFAULT_TOKEN_TTL = 30 * 24 * 3600
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def _b64decode(value):
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+def _signing_key():
+    """
+    署名鍵を返します。APP_USER_TOKEN_SECRETが未設定の場合は
+    Cognitoのクライアントシークレットから用途別の鍵を導出します。
+    """
+    secret = os.environ.get('APP_USER_TOKEN_SECRET')
+    if secret:
+        return secret.encode('utf-8')
+    client_secret = os.environ['COGNITO_CLIENT_SECRET']
+    return hashlib.sha256(b'app-user-token:' + client_secret.encode('utf-8')).digest()
+
+def _sign(payload):
+    return _b64encode(hmac.new(_signing_key(), payload.encode('ascii'), hashlib.sha256).digest())
+
+def issue_app_user_token(username, app_user_number, user_category, now=None):
+    """
+    app_user_numberを保持する署名付きトークンを作成します。
+
+    Args:
+        username (str): Cognitoのユーザー名
+        app_user_number (str): app_user_number
+        user_category (int): ユーザー区分
+        now (float): 発行時刻（UNIX時間、テスト用）
+
+    Returns:
+        str: トークン
+    """
+    claims = {
+        'u': username,
+        'n': app_user_number,
+        'c': user_category,
+        'iat': int(now if now is not None else time.time()),
+    }
+    payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+    return f"{payload}.{_sign(payload)}"
+
+def read_app_user_token(token, user_category, now=None):
+    """
+    トークンの署名と有効期限を検証し、内容を返します。
+
+    Args:
+        token (str): issue_app_user_tokenで作成したトークン
+        user_category (int): 期待するユーザー区分
+        now (float): 現在時刻（UNIX時間、テスト用）
+
+    Returns:
+        dict: {'username', 'app_user_number', 'user_category', 'issued_at'}
+
+    Raises:
+        ValueError: トークンが不正または期限切れの場合
+    """
+    try:
+        payload, signature = token.split('.')
+        claims = json.loads(_b64decode(payload))
+    except (AttributeError, ValueError) as e:
+        raise ValueError(f"トークンの形式が不正です: {str(e)}")
+
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise ValueError("トークンの署名が不正です")
+
+    ttl = int(os.environ.get('APP_USER_TOKEN_TTL', DEFAULT_TOKEN_TTL))
+    if (now if now is not None else time.time()) - claims['iat'] > ttl:
+        raise ValueError("トークンの有効期限が切れています")
+    if claims['c'] != user_category:
+        raise ValueError("ユーザー区分が一致しません")
+
+    return {
+        'username': claims['u'],
+        'app_user_number': claims['n'],
+        'user_category': claims['c'],
+        'issued_at': claims['iat'],
+    }
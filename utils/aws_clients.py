@@ -0,0 +1,96 @@
+"""
+Lazily created, process-wide AWS clients with pooled, kept-alive connections.
+"""
+import os
+import logging
+import threading
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+
+def client_config():
+    """
+    AWSクライアントの接続設定を作成します。
+
+    環境変数で以下を変更できます。
+    - AWS_MAX_POOL_CONNECTIONS: 接続プールのサイズ（既定値: 10）
+    - AWS_CONNECT_TIMEOUT: 接続タイムアウト秒（既定値: 2）
+    - AWS_READ_TIMEOUT: 1回の呼び出しの読み込みタイムアウト秒（既定値: 5）
+    - AWS_MAX_ATTEMPTS: 再試行を含む最大試行回数（既定値: 3）
+
+    Returns:
+        botocore.config.Config: クライアントの設定
+    """
+    from botocore.config import Config
+    return Config(
+        max_pool_connections=int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', 10)),
+        connect_timeout=float(os.environ.get('AWS_CONNECT_TIMEOUT', 2)),
+        read_timeout=float(os.environ.get('AWS_READ_TIMEOUT', 5)),
+        retries={
+            'mode': 'adaptive',
+            'total_max_attempts': int(os.environ.get('AWS_MAX_ATTEMPTS', 3))
+        },
+        tcp_keepalive=True
+    )
+
+def get_client(service_name):
+    """
+    AWSクライアントを取得します。
+
+    初回の呼び出し時にboto3を読み込んでクライアントを作成し、以降は同じクライアントを返します。
+    クライアントはスレッドセーフで、接続プールのTLS接続はリクエストやLambdaの
+    ウォーム起動をまたいで再利用されます。
+
+    Args:
+        service_name (str): サービス名（例: 'cognito-idp'）
+
+    Returns:
+        botocore.client.BaseClient: AWSクライアント
+    """
+    global _session
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                import boto3
+                # デフォルトセッションのクライアント作成はスレッドセーフではないため、専用のセッションを使用する
+                if _session is None:
+                    _session = boto3.session.Session()
+                client = _session.client(service_name, config=client_config())
+                _clients[service_name] = client
+                logger.info(f"AWSクライアントを作成しました: {service_name}")
+    return client
+
+def get_cognito_client():
+    """
+    Cognitoクライアントを取得します。
+
+    Returns:
+        botocore.client.BaseClient: cognito-idpクライアント
+    """
+    return get_client('cognito-idp')
+
+def prewarm_clients():
+    """
+    AWS_CLIENT_PREWARMにカンマ区切りで指定されたサービスのクライアントを作成します。
+
+    Lambdaの初期化フェーズで呼び出すことで、サービスモデルの読み込みとエンドポイントの解決を
+    最初のリクエストより前に済ませます。
+    """
+    for service_name in filter(None, os.environ.get('AWS_CLIENT_PREWARM', '').split(',')):
+        try:
+            get_client(service_name.strip())
+        except Exception as e:
+            logger.warning(f"AWSクライアントの事前作成に失敗しました: {service_name} {str(e)}")
+
+def reset_clients():
+    """作成済みのクライアントを破棄します（テスト用）。"""
+    global _session
+    with _lock:
+        _clients.clear()
+        _session = None
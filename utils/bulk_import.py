@@ -0,0 +1,155 @@
+"""
+Request parsing and row validation shared by the bulk registration endpoints.
+"""
+import io
+import os
+import csv
+import logging
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+def max_bulk_rows():
+    """1回のリクエストで受け付ける最大行数を返します（環境変数BULK_MAX_ROWS、既定値: 5000）。"""
+    return int(os.environ.get('BULK_MAX_ROWS', 5000))
+
+def parse_csv_rows(text):
+    """
+    ヘッダー行付きのCSVを行のdictのリストに変換します。
+    空のセルはNoneとして扱います。
+
+    Args:
+        text (str): CSVの内容
+
+    Returns:
+        list: 行のdictのリスト
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    return [{key.strip(): (value.strip() or None) if value is not None else None
+             for key, value in row.items() if key is not None}
+            for row in reader]
+
+def read_bulk_rows(req, key):
+    """
+    リクエストから一括登録する行と、行以外のオプションを取得します。
+
+    次の形式を受け付けます。
+    - JSONの配列
+    - JSONのオブジェクト（keyに行の配列、それ以外のキーにオプション）
+    - CSV（Content-Type: text/csv、またはmultipart/form-dataのfile）。オプションはクエリパラメータ
+
+    Args:
+        req (flask.Request): リクエスト
+        key (str): JSONのオブジェクトで行の配列を格納するキー
+
+    Returns:
+        tuple: (行のdictのリスト, オプションのdict)
+
+    Raises:
+        ValueError: リクエストの形式が不正な場合
+    """
+    if req.mimetype == 'text/csv':
+        rows = parse_csv_rows(req.get_data().decode('utf-8-sig'))
+        options = req.args.to_dict()
+    elif req.mimetype == 'multipart/form-data':
+        upload = req.files.get('file')
+        if upload is None:
+            raise ValueError("CSVファイル（file）が指定されていません")
+        rows = parse_csv_rows(upload.read().decode('utf-8-sig'))
+        options = {**req.args.to_dict(), **req.form.to_dict()}
+    else:
+        body = req.get_json(silent=True)
+        if isinstance(body, list):
+            rows, options = body, req.args.to_dict()
+        elif isinstance(body, dict) and isinstance(body.get(key), list):
+            rows = body[key]
+            options = {name: value for name, value in body.items() if name != key}
+        else:
+            raise ValueError(f"JSONの配列、{key}を含むオブジェクト、またはCSVを指定してください")
+
+    if not rows:
+        raise ValueError("登録するデータがありません")
+    if len(rows) > max_bulk_rows():
+        raise ValueError(f"1回に登録できるのは{max_bulk_rows()}件までです: {len(rows)}件")
+    if not all(isinstance(row, dict) for row in rows):
+        raise ValueError("各行はオブジェクトで指定してください")
+    return rows, options
+
+def is_true(value):
+    """オプションの真偽値（true/1/yes、またはJSONのtrue）を判定します。"""
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes')
+
+# MySQLのINT型の範囲
+INT_MIN = -2 ** 31
+INT_MAX = 2 ** 31 - 1
+
+def parse_integer(value):
+    """
+    整数の入力値（JSONの数値、またはCSVの文字列）を解釈します。
+
+    Returns:
+        int: 整数
+
+    Raises:
+        ValueError: 整数として解釈できない場合（真偽値、小数部のある数値を含む）
+    """
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(value)
+        return int(value)
+    if isinstance(value, (int, str)):
+        return int(value)
+    raise ValueError(value)
+
+def validate_row(row, required_fields, integer_fields=(), ranges=None, string_fields=(),
+                 max_lengths=None, formats=None):
+    """
+    1行分の入力を検証します。
+
+    Args:
+        row (dict): 行
+        required_fields (list): 必須項目
+        integer_fields (list): 整数として解釈できる必要がある項目（未指定の場合は検証しない）
+        ranges (dict): 整数の項目ごとの(最小値, 最大値)。指定しない項目はINT型の範囲で検証する
+        string_fields (list): 文字列で指定する必要がある項目
+        max_lengths (dict): 文字列の項目ごとの最大文字数
+        formats (dict): 文字列の項目ごとの(正規表現, 形式の説明)。値の全体が一致する必要がある
+
+    Returns:
+        list: エラーメッセージのリスト（エラーがない場合は空）
+    """
+    errors = [f"{field}は必須です" for field in required_fields
+              if row.get(field) is None or row.get(field) == '']
+    for field in integer_fields:
+        value = row.get(field)
+        if value is None or value == '':
+            continue
+        try:
+            number = parse_integer(value)
+        except (TypeError, ValueError):
+            errors.append(f"{field}は整数で指定してください: {value}")
+            continue
+        minimum, maximum = (ranges or {}).get(field, (INT_MIN, INT_MAX))
+        if not minimum <= number <= maximum:
+            errors.append(f"{field}は{minimum}以上{maximum}以下で指定してください: {value}")
+    for field in string_fields:
+        value = row.get(field)
+        if value is not None and not isinstance(value, str):
+            errors.append(f"{field}は文字列で指定してください: {value}")
+    for field, maximum in (max_lengths or {}).items():
+        value = row.get(field)
+        if isinstance(value, str) and len(value) > maximum:
+            errors.append(f"{field}は{maximum}文字以内で指定してください")
+    for field, (pattern, description) in (formats or {}).items():
+        value = row.get(field)
+        if isinstance(value, str) and value != '' and not pattern.fullmatch(value):
+            errors.append(f"{field}は{description}で指定してください: {value}")
+    return errors
+
+def row_error(index, errors):
+    """行番号（1から）とエラーメッセージから、行ごとの結果を作成します。"""
+    return {"row": index + 1, "status": "error", "errors": errors}
@@ -0,0 +1,275 @@
+"""
+Set-based charge fee (m_powersupply.price) updates and the future-dated
+price schedules (t_price_schedule) applied by the scheduler job.
+"""
+import os
+import datetime
+import logging
+import pymysql
+import pytz
+from utils.utils import get_jst_now
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+SCHEDULE_LOCK_NAME = 'price_schedule_apply'
+
+# t_price_scheduleのstatus
+SCHEDULE_PENDING = 0
+SCHEDULE_APPLIED = 1
+# 同じ対象に対する、より新しいスケジュールと同時に適用時刻を迎えたため適用しなかったもの
+SCHEDULE_SUPERSEDED = 2
+
+INSERT_SCHEDULE_QUERY = """
+INSERT INTO t_price_schedule (
+    powersupply_id, location_id, price, effective_from, status,
+    create_date, create_user, update_date, update_user
+) VALUES (
+    %s, %s, %s, %s, %s, %s, %s, %s, %s
+)
+"""
+
+DUE_SCHEDULES_QUERY = """
+SELECT schedule_id, powersupply_id, location_id, price, effective_from
+FROM t_price_schedule
+WHERE status = %s
+AND effective_from <= %s
+ORDER BY effective_from, schedule_id
+LIMIT %s
+FOR UPDATE
+"""
+
+def schedule_batch_size():
+    """1回のUPDATEで適用するスケジュールの件数を返します（環境変数PRICE_SCHEDULE_BATCH_SIZE、既定値: 500）。"""
+    return int(os.environ.get('PRICE_SCHEDULE_BATCH_SIZE', 500))
+
+def max_fee_rows():
+    """
+    1回の料金変更で指定できる最大行数を返します（環境変数CHARGE_FEE_MAX_ROWS、既定値: 1000）。
+    build_fee_updateは行数分のUNION ALLを1文に組み立てるため、max_allowed_packetを超えないように制限します。
+    """
+    return int(os.environ.get('CHARGE_FEE_MAX_ROWS', 1000))
+
+def fee_table(fees, column):
+    """
+    (対象のID, 料金)または(対象のID, 料金, 適用日時)のリストから、
+    UNION ALLで組み立てた派生テーブルを作成します。
+
+    Returns:
+        tuple: (派生テーブルのSQL, パラメータ)
+    """
+    names = [column, 'price', 'effective_from'][:len(fees[0])]
+    first = ', '.join(f"%s AS {name}" for name in names)
+    rest = ', '.join(['%s'] * len(names))
+    selects = [f"SELECT {first}"] + [f"SELECT {rest}"] * (len(fees) - 1)
+    params = [value for fee in fees for value in fee]
+    return "(" + " UNION ALL ".join(selects) + ")", params
+
+def build_fee_update(powersupply_fees, location_fees, now, user, agency_id=None):
+    """
+    複数の充電器・ステーションの料金を1回で更新するUPDATE文を作成します。
+
+    充電器の指定はステーションの指定より優先します（同じステーションの充電器を個別に指定した場合は、
+    その充電器には個別の料金を適用します）。ただし、適用日時を含めて指定した場合は、
+    適用日時が新しい方を優先します。料金が変わらない行は更新しません。
+
+    Args:
+        powersupply_fees (list): (powersupply_id, price[, effective_from])のリスト
+        location_fees (list): (location_id, price[, effective_from])のリスト
+        now (str): 更新日時
+        user (str): 更新者
+        agency_id (int): 指定した場合、この代理店のステーションの充電器だけを更新する
+
+    Returns:
+        tuple: (クエリ, パラメータ)
+    """
+    joins = []
+    params = []
+    targets = []
+    if agency_id is not None:
+        joins.append("JOIN m_location l ON l.location_id = p.location_id")
+    if powersupply_fees:
+        table, table_params = fee_table(powersupply_fees, 'powersupply_id')
+        joins.append(f"LEFT JOIN {table} ps ON ps.powersupply_id = p.powersupply_id")
+        params += table_params
+        targets.append("ps.powersupply_id IS NOT NULL")
+    if location_fees:
+        table, table_params = fee_table(location_fees, 'location_id')
+        joins.append(f"LEFT JOIN {table} lf ON lf.location_id = p.location_id")
+        params += table_params
+        targets.append("lf.location_id IS NOT NULL")
+
+    if not location_fees:
+        new_price = "ps.price"
+    elif not powersupply_fees:
+        new_price = "lf.price"
+    elif len(powersupply_fees[0]) > 2:
+        new_price = ("CASE WHEN ps.powersupply_id IS NOT NULL"
+                     " AND (lf.location_id IS NULL OR ps.effective_from >= lf.effective_from)"
+                     " THEN ps.price ELSE lf.price END")
+    else:
+        new_price = "COALESCE(ps.price, lf.price)"
+
+    query = f"""
+    UPDATE m_powersupply p
+    {' '.join(joins)}
+    SET p.price = {new_price},
+        p.update_date = %s,
+        p.update_user = %s
+    WHERE ({' OR '.join(targets)})
+    AND NOT (p.price <=> {new_price})
+    """
+    params += [now, user]
+    if agency_id is not None:
+        query += "AND l.agency_id = %s\n"
+        params.append(agency_id)
+    return query, params
+
+def parse_effective_from(value, now):
+    """
+    料金の適用日時を検証し、YYYY-MM-DD HH:MM:SSの形式に変換します。
+
+    Args:
+        value (str): 適用日時（YYYY-MM-DD HH:MM:SS、またはISO形式）。
+            UTCオフセットを含む場合は日本時間に変換する
+        now (str): 現在日時
+
+    Returns:
+        str: 適用日時
+
+    Raises:
+        ValueError: 日時の形式が不正な場合、または現在日時以前の場合
+    """
+    try:
+        effective_from = datetime.datetime.fromisoformat(str(value).replace('T', ' '))
+    except ValueError:
+        raise ValueError(f"effective_fromは日時（YYYY-MM-DD HH:MM:SS）で指定してください: {value}")
+    if effective_from.tzinfo is not None:
+        effective_from = effective_from.astimezone(pytz.timezone('Asia/Tokyo')).replace(tzinfo=None)
+    effective_from = effective_from.strftime('%Y-%m-%d %H:%M:%S')
+    if effective_from <= now:
+        raise ValueError(f"effective_fromには現在より後の日時を指定してください: {value}")
+    return effective_from
+
+def insert_price_schedules(cursor, schedules, effective_from, now, user='Dashboard'):
+    """
+    料金の変更を予約します。
+
+    Args:
+        cursor: データベースカーソル
+        schedules (list): (powersupply_id, location_id, price)のリスト（対象でない方はNone）
+        effective_from (str): 適用日時（YYYY-MM-DD HH:MM:SS）
+        now (str): 登録日時
+        user (str): 登録者
+    """
+    cursor.executemany(INSERT_SCHEDULE_QUERY, [
+        (powersupply_id, location_id, price, effective_from, SCHEDULE_PENDING, now, user, now, user)
+        for powersupply_id, location_id, price in schedules
+    ])
+
+def collapse_schedules(schedules):
+    """
+    同じ対象のスケジュールのうち、適用日時が最も新しいもの（同時刻の場合は後に登録したもの）だけを残します。
+
+    Args:
+        schedules (list): effective_from, schedule_idの順に並んだスケジュールのdictのリスト
+
+    Returns:
+        tuple: (適用するスケジュールのリスト, 適用しないスケジュールのIDのリスト)
+    """
+    latest = {}
+    for schedule in schedules:
+        if schedule['powersupply_id'] is not None:
+            target = ('powersupply_id', schedule['powersupply_id'])
+        else:
+            target = ('location_id', schedule['location_id'])
+        latest[target] = schedule
+    applied_ids = {schedule['schedule_id'] for schedule in latest.values()}
+    superseded = [schedule['schedule_id'] for schedule in schedules if schedule['schedule_id'] not in applied_ids]
+    return list(latest.values()), superseded
+
+def mark_schedules(cursor, schedule_ids, status, now):
+    """スケジュールの状態を更新します。"""
+    if not schedule_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(schedule_ids))
+    cursor.execute(f"""
+    UPDATE t_price_schedule
+    SET status = %s, applied_at = %s, update_date = %s, update_user = %s
+    WHERE schedule_id IN ({placeholders})
+    """, [status, now, now, 'Scheduler'] + list(schedule_ids))
+
+def apply_due_price_schedules(conn, now=None, batch_size=None):
+    """
+    適用日時を迎えた料金スケジュールを充電器の料金に反映します。
+
+    適用日時の古い順にbatch_size件ずつ取得し、1回のUPDATEでまとめて反映したうえで、
+    スケジュールを適用済みにして、まとまりごとにコミットします。料金の反映とスケジュールの状態の更新は
+    同じトランザクションで行うため、何度実行しても同じスケジュールが二重に適用されることはありません。
+
+    Args:
+        conn: データベース接続
+        now (str): 基準日時（省略時は日本時間の現在日時）
+        batch_size (int): 1回に適用するスケジュールの件数
+
+    Returns:
+        dict: 適用したスケジュールのID、更新した充電器の件数などの結果。他で実行中の場合はskipped=True
+    """
+    now = now or get_jst_now()
+    batch_size = batch_size or schedule_batch_size()
+    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+        # 同時に実行されないようにする
+        cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (SCHEDULE_LOCK_NAME,))
+        if not cursor.fetchone()['acquired']:
+            logger.info("料金スケジュールは他で適用中のためスキップします")
+            return {"skipped": True, "applied": [], "superseded": [], "rows": 0, "batches": 0}
+
+        applied = []
+        superseded = []
+        rows = 0
+        batches = 0
+        try:
+            while True:
+                cursor.execute(DUE_SCHEDULES_QUERY, (SCHEDULE_PENDING, now, batch_size))
+                schedules = cursor.fetchall()
+                if not schedules:
+                    break
+
+                try:
+                    latest, skipped = collapse_schedules(schedules)
+                    powersupply_fees = [
+                        (schedule['powersupply_id'], schedule['price'], schedule['effective_from'])
+                        for schedule in latest if schedule['powersupply_id'] is not None
+                    ]
+                    location_fees = [
+                        (schedule['location_id'], schedule['price'], schedule['effective_from'])
+                        for schedule in latest if schedule['powersupply_id'] is None
+                    ]
+                    query, params = build_fee_update(powersupply_fees, location_fees, now, 'Scheduler')
+                    cursor.execute(query, params)
+                    updated = cursor.rowcount
+
+                    mark_schedules(cursor, [schedule['schedule_id'] for schedule in latest], SCHEDULE_APPLIED, now)
+                    mark_schedules(cursor, skipped, SCHEDULE_SUPERSEDED, now)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+                batches += 1
+                rows += updated
+                applied += [schedule['schedule_id'] for schedule in latest]
+                superseded += skipped
+                logger.info(f"料金スケジュールを適用しました: {len(latest)}件 充電器={updated}件")
+                if len(schedules) < batch_size:
+                    break
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (SCHEDULE_LOCK_NAME,))
+
+        return {
+            "skipped": False,
+            "applied": applied,
+            "superseded": superseded,
+            "rows": rows,
+            "batches": batches
+        }
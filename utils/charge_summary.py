@@ -0,0 +1,256 @@
+"""
+Daily charge rollup (t_charge_daily_summary) refresh and summary queries.
+"""
+import os
+import datetime
+import logging
+import pymysql
+from utils.utils import get_jst_now
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+SUMMARY_NAME = 'charge_daily_summary'
+SUMMARY_LOCK_NAME = 'charge_daily_summary_refresh'
+
+# 差分更新時に常に再集計する直近の日数
+REFRESH_LOOKBACK_DAYS = int(os.environ.get('CHARGE_SUMMARY_LOOKBACK_DAYS', 2))
+
+# 差分更新で、変更日時がこの秒数より新しい履歴は次回に反映する
+# （変更日時は文の実行時刻のため、実行中のトランザクションの変更が後からコミットされる分を待つ）
+REFRESH_SETTLE_SECONDS = int(os.environ.get('CHARGE_SUMMARY_SETTLE_SECONDS', 300))
+
+# 集計を一度も行っていない場合の変更日時の下限
+EPOCH = '1970-01-01 00:00:01'
+
+SUMMARY_GROUPS = ('powersupply', 'station')
+SUMMARY_INTERVALS = ('day', 'month', 'total')
+
+REBUILD_DAY_QUERY = """
+INSERT INTO t_charge_daily_summary
+    (powersupply_id, summary_date, session_count, charged_amount, billing_amount, updated_at)
+SELECT
+    t_charge.powersupply_id,
+    DATE(t_charge_history.charging_start),
+    COUNT(*),
+    COALESCE(SUM(t_charge_history.charged_amount), 0),
+    COALESCE(SUM(t_charge_history.billing_amount), 0),
+    %s
+FROM
+    t_charge_history
+JOIN t_charge ON t_charge.transaction_id = t_charge_history.transaction_id
+WHERE
+    t_charge_history.charging_start >= %s
+AND
+    t_charge_history.charging_start < %s
+GROUP BY
+    t_charge.powersupply_id,
+    DATE(t_charge_history.charging_start)
+"""
+
+def rebuild_summary_day(cursor, summary_date, updated_at):
+    """
+    指定日の集計を作り直します。
+
+    Args:
+        cursor: データベースカーソル
+        summary_date (datetime.date): 集計日
+        updated_at (str): 更新日時
+
+    Returns:
+        int: 作成した集計行数
+    """
+    next_date = summary_date + datetime.timedelta(days=1)
+    cursor.execute("DELETE FROM t_charge_daily_summary WHERE summary_date = %s", (summary_date,))
+    cursor.execute(REBUILD_DAY_QUERY, (updated_at, summary_date, next_date))
+    return cursor.rowcount
+
+def changed_summary_dates(cursor, last_changed_at, high_changed_at):
+    """
+    前回の集計以降に追加・修正された履歴の日付を取得します。
+    t_charge_history.row_updated_atのインデックスで範囲を検索します。
+
+    Returns:
+        set: datetime.dateの集合
+    """
+    cursor.execute("""
+    SELECT DISTINCT DATE(charging_start) AS summary_date
+    FROM t_charge_history
+    WHERE row_updated_at > %s AND row_updated_at <= %s AND charging_start IS NOT NULL
+    """, (last_changed_at, high_changed_at))
+    return {row['summary_date'] for row in cursor.fetchall()}
+
+def refresh_charge_summary(conn, start_date=None, end_date=None, today=None):
+    """
+    日次集計を更新します。
+
+    期間を指定しない場合は差分更新です。前回の更新以降に追加・修正された履歴
+    （t_charge_history.row_updated_atで判定）の日付と、直近REFRESH_LOOKBACK_DAYS日分だけを
+    再集計します。期間を指定した場合は、その期間の全日を再集計します。
+    集計は日単位で作り直してコミットするため、何度実行しても同じ結果になります。
+
+    Args:
+        conn: データベース接続
+        start_date (datetime.date): 再集計する期間の開始日
+        end_date (datetime.date): 再集計する期間の終了日（この日を含む）
+        today (datetime.date): 基準日（省略時は日本時間の今日）
+
+    Returns:
+        dict: 再集計した日付・行数などの結果。他で更新中の場合はskipped=True
+
+    Raises:
+        ValueError: 期間の開始日と終了日の一方だけを指定した場合
+    """
+    if bool(start_date) != bool(end_date):
+        raise ValueError("start_dateとend_dateは両方を指定してください")
+
+    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+        # 同時に実行されないようにする
+        cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (SUMMARY_LOCK_NAME,))
+        if not cursor.fetchone()['acquired']:
+            logger.info("日次集計は他で更新中のためスキップします")
+            return {"skipped": True, "dates": [], "rows": 0}
+
+        try:
+            if start_date and end_date:
+                days = (end_date - start_date).days + 1
+                dates = {start_date + datetime.timedelta(days=i) for i in range(max(days, 0))}
+                high_changed_at = None
+            else:
+                cursor.execute("""
+                SELECT last_changed_at FROM t_charge_summary_state WHERE summary_name = %s
+                """, (SUMMARY_NAME,))
+                state = cursor.fetchone()
+                last_changed_at = (state and state['last_changed_at']) or EPOCH
+
+                # 変更日時と同じくデータベースの時刻で上限を決める
+                cursor.execute("SELECT NOW(6) - INTERVAL %s SECOND AS high", (REFRESH_SETTLE_SECONDS,))
+                high_changed_at = cursor.fetchone()['high']
+
+                dates = changed_summary_dates(cursor, last_changed_at, high_changed_at)
+                if today is None:
+                    today = datetime.datetime.strptime(get_jst_now(), '%Y-%m-%d %H:%M:%S').date()
+                dates |= {today - datetime.timedelta(days=i) for i in range(REFRESH_LOOKBACK_DAYS + 1)}
+
+            updated_at = get_jst_now()
+            rows = 0
+            for summary_date in sorted(dates):
+                rows += rebuild_summary_day(cursor, summary_date, updated_at)
+                conn.commit()
+
+            if high_changed_at is not None:
+                cursor.execute("""
+                INSERT INTO t_charge_summary_state (summary_name, last_changed_at, refreshed_at)
+                VALUES (%s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    last_changed_at = GREATEST(COALESCE(last_changed_at, VALUES(last_changed_at)),
+                                               VALUES(last_changed_at)),
+                    refreshed_at = VALUES(refreshed_at)
+                """, (SUMMARY_NAME, high_changed_at, updated_at))
+                conn.commit()
+
+            logger.info(f"日次集計を更新しました: {len(dates)}日分 {rows}行")
+            return {
+                "skipped": False,
+                "dates": [summary_date.isoformat() for summary_date in sorted(dates)],
+                "rows": rows,
+                "last_changed_at": str(high_changed_at) if high_changed_at is not None else None
+            }
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (SUMMARY_LOCK_NAME,))
+
+def summary_period(year, month=None):
+    """
+    集計対象の期間を求めます。
+
+    Args:
+        year: 年
+        month: 月（省略時は年全体）
+
+    Returns:
+        tuple: (開始日, 終了日の翌日)
+
+    Raises:
+        ValueError: 年・月が不正な場合
+    """
+    try:
+        year = int(year)
+        month = int(month) if month is not None else None
+        if month is None:
+            return datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+        start = datetime.date(year, month, 1)
+    except (TypeError, ValueError):
+        raise ValueError("yearとmonthには正しい年月を指定してください")
+
+    end = datetime.date(year + 1, 1, 1) if month == 12 else datetime.date(year, month + 1, 1)
+    return start, end
+
+def build_charge_summary_query(agency_id, permission, start, end, group_by='powersupply', interval='day'):
+    """
+    日次集計から期間内の合計を取得するクエリを作成します。
+
+    Args:
+        agency_id (int): 企業ID
+        permission (int): ユーザーの権限レベル
+        start (datetime.date): 開始日
+        end (datetime.date): 終了日の翌日
+        group_by (str): 'powersupply' または 'station'
+        interval (str): 'day'、'month' または 'total'
+
+    Returns:
+        tuple: (クエリ, パラメータのリスト)
+
+    Raises:
+        ValueError: group_byまたはintervalが不正な場合
+    """
+    if group_by not in SUMMARY_GROUPS:
+        raise ValueError(f"group_byには{', '.join(SUMMARY_GROUPS)}のいずれかを指定してください")
+    if interval not in SUMMARY_INTERVALS:
+        raise ValueError(f"intervalには{', '.join(SUMMARY_INTERVALS)}のいずれかを指定してください")
+
+    if group_by == 'powersupply':
+        columns = [
+            "m_powersupply.powersupply_id",
+            "m_powersupply.app_powersupply_number",
+            "m_powersupply.powersupply_name",
+            "m_location.location_id",
+            "m_location.station_name",
+        ]
+    else:
+        columns = [
+            "m_location.location_id",
+            "m_location.station_name",
+        ]
+
+    group_columns = list(columns)
+    if interval == 'day':
+        columns.append("s.summary_date AS period")
+        group_columns.append("s.summary_date")
+    elif interval == 'month':
+        columns.append("DATE_FORMAT(s.summary_date, '%%Y-%%m') AS period")
+        group_columns.append("DATE_FORMAT(s.summary_date, '%%Y-%%m')")
+
+    query = f"""
+    SELECT
+        {', '.join(columns)},
+        SUM(s.session_count) AS session_count,
+        SUM(s.charged_amount) AS charged_amount,
+        SUM(s.billing_amount) AS billing_amount
+    FROM
+        t_charge_daily_summary s
+    JOIN m_powersupply ON s.powersupply_id = m_powersupply.powersupply_id
+    JOIN m_location ON m_powersupply.location_id = m_location.location_id
+    WHERE
+        m_location.agency_id = %s
+    AND
+        m_powersupply.permission BETWEEN 1 AND %s
+    AND
+        s.summary_date >= %s
+    AND
+        s.summary_date < %s
+    GROUP BY
+        {', '.join(group_columns)}
+    ORDER BY
+        {', '.join(group_columns)};
+    """
+    return query, [agency_id, permission, start, end]
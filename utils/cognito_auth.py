@@ -0,0 +1,301 @@
+"""
+Local verification of Cognito access tokens against a cached JWKS, and the
+dashboard before_request middleware built on it.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import urllib.request
+from flask import g, request, jsonify
+from response.response_base import create_error_response
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+# 認証モード
+# off: トークンを検証しない（既定値）
+# optional: Authorizationヘッダーがある場合のみ検証する。検証に失敗した場合はログに記録し、未認証として続行する
+# required: 公開エンドポイント以外はトークンを必須とし、検証に失敗した場合は401を返す
+AUTH_MODE_OFF = 'off'
+AUTH_MODE_OPTIONAL = 'optional'
+AUTH_MODE_REQUIRED = 'required'
+AUTH_MODES = (AUTH_MODE_OFF, AUTH_MODE_OPTIONAL, AUTH_MODE_REQUIRED)
+
+# トークンなしで呼び出せるエンドポイント（ログイン前に使用するもの）
+PUBLIC_ENDPOINTS = {
+    'router.hello_world',
+    'router.admin_user_login',
+    'router.agency_user_login',
+    'router.agency_token_refresh',
+    'router.agency_user_sms',
+    'router.corporate_user_login',
+}
+
+class AuthenticationError(Exception):
+    """アクセストークンが無効な場合に送出される例外"""
+
+class AuthConfigurationError(Exception):
+    """トークンの検証に必要な環境変数が設定されていない場合に送出される例外"""
+
+class JWKSCache:
+    """
+    ユーザープールの公開鍵（JWKS）をkidごとに保持するキャッシュ。
+    ウォーム状態のLambdaではモジュール変数として呼び出しをまたいで保持されます。
+
+    TTLが切れた場合と、未知のkidのトークンを受け取った場合（鍵のローテーション）に取得し直します。
+    未知のkidによる再取得は、不正なトークンで取得が繰り返されないよう
+    min_refresh_intervalの間隔を空けて行います。
+
+    Args:
+        url (str): JWKSのURL
+        ttl (float): 鍵の有効秒数
+        min_refresh_interval (float): 未知のkidによる再取得の最小間隔（秒）
+        fetch (callable): URLを受け取りJWKSのdictを返す関数（テスト用）
+    """
+    def __init__(self, url, ttl=3600.0, min_refresh_interval=30.0, fetch=None):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._fetch = fetch or fetch_jwks
+        self._lock = threading.Lock()
+        self._keys = None
+        self._fetched_at = 0.0
+        self._stats = {
+            'hits': 0,
+            'refreshes': 0,
+            'refresh_failures': 0,
+        }
+
+    def get_key(self, kid):
+        """
+        kidに対応する公開鍵を返します。
+
+        Args:
+            kid (str): トークンヘッダーのkid
+
+        Returns:
+            公開鍵
+
+        Raises:
+            AuthenticationError: kidに対応する鍵が存在しない場合
+        """
+        keys = self._keys
+        if keys is not None and kid in keys and time.monotonic() - self._fetched_at < self.ttl:
+            self._stats['hits'] += 1
+            return keys[kid]
+
+        with self._lock:
+            now = time.monotonic()
+            expired = self._keys is None or now - self._fetched_at >= self.ttl
+            if expired or (kid not in self._keys and now - self._fetched_at >= self.min_refresh_interval):
+                self._refresh(now)
+            key = (self._keys or {}).get(kid)
+
+        if key is None:
+            raise AuthenticationError(f"不明な署名鍵です: {kid}")
+        return key
+
+    def _refresh(self, now):
+        from jwt.algorithms import RSAAlgorithm
+        try:
+            jwks = self._fetch(self.url)
+            self._keys = {jwk['kid']: RSAAlgorithm.from_jwk(jwk) for jwk in jwks['keys']}
+            self._stats['refreshes'] += 1
+            logger.info(f"JWKSを取得しました: {len(self._keys)}件")
+        except Exception as e:
+            self._stats['refresh_failures'] += 1
+            if self._keys is None:
+                raise AuthenticationError(f"JWKSの取得に失敗しました: {str(e)}")
+            # 取得に失敗した場合は保持している鍵を使い続ける
+            logger.warning(f"JWKSの取得に失敗したため、保持している鍵を使用します: {str(e)}")
+        self._fetched_at = now
+
+    def stats(self):
+        """キャッシュの利用状況を返す"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['keys'] = len(self._keys or {})
+        return stats
+
+def fetch_jwks(url):
+    """
+    JWKSを取得します。
+
+    Args:
+        url (str): JWKSのURL
+
+    Returns:
+        dict: JWKS
+    """
+    timeout = float(os.environ.get('COGNITO_JWKS_TIMEOUT', 3))
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+class AccessTokenVerifier:
+    """
+    Cognitoのアクセストークンをローカルで検証します。
+    署名（RS256）、有効期限、発行者、client_id、token_useを確認します。
+
+    Args:
+        issuer (str): ユーザープールの発行者URL
+        client_id (str): アプリクライアントID
+        jwks (JWKSCache): 公開鍵のキャッシュ
+        leeway (float): 有効期限の許容誤差（秒）
+    """
+    def __init__(self, issuer, client_id, jwks, leeway=0):
+        self.issuer = issuer
+        self.client_id = client_id
+        self.jwks = jwks
+        self.leeway = leeway
+
+    def verify(self, token):
+        """
+        アクセストークンを検証し、クレームを返します。
+
+        Args:
+            token (str): アクセストークン
+
+        Returns:
+            dict: 検証済みのクレーム
+
+        Raises:
+            AuthenticationError: トークンが無効な場合
+        """
+        import jwt
+        try:
+            header = jwt.get_unverified_header(token)
+            key = self.jwks.get_key(header.get('kid'))
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=['RS256'],
+                issuer=self.issuer,
+                leeway=self.leeway,
+                options={'require': ['exp', 'iss', 'sub', 'token_use', 'client_id'], 'verify_aud': False}
+            )
+        except jwt.PyJWTError as e:
+            raise AuthenticationError(str(e))
+
+        # アクセストークンはaudを持たないため、client_idとtoken_useで確認する
+        if claims['token_use'] != 'access':
+            raise AuthenticationError(f"アクセストークンではありません: {claims['token_use']}")
+        if claims['client_id'] != self.client_id:
+            raise AuthenticationError("client_idが一致しません")
+        return claims
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+def get_verifier():
+    """
+    環境変数の設定からアクセストークンの検証器を取得します。
+    初回の呼び出し時に作成し、以降は同じ検証器（JWKSのキャッシュ）を返します。
+
+    環境変数:
+    - COGNITO_USER_POOL_ID: ユーザープールID（先頭のリージョンから発行者URLを組み立てる）
+    - COGNITO_CLIENT_ID: アプリクライアントID
+    - COGNITO_JWKS_TTL: JWKSの有効秒数（既定値: 3600）
+    - COGNITO_TOKEN_LEEWAY: 有効期限の許容誤差秒（既定値: 0）
+
+    Returns:
+        AccessTokenVerifier: 検証器
+
+    Raises:
+        AuthConfigurationError: COGNITO_USER_POOL_IDまたはCOGNITO_CLIENT_IDが設定されていない場合
+    """
+    global _verifier
+    if _verifier is None:
+        with _verifier_lock:
+            if _verifier is None:
+                missing = [name for name in ('COGNITO_USER_POOL_ID', 'COGNITO_CLIENT_ID')
+                           if not os.environ.get(name)]
+                if missing:
+                    raise AuthConfigurationError(f"{', '.join(missing)}が設定されていません")
+                user_pool_id = os.environ['COGNITO_USER_POOL_ID']
+                region = user_pool_id.split('_', 1)[0]
+                issuer = f"https://cognito-idp.{region}.amazonaws.com/{user_pool_id}"
+                jwks = JWKSCache(
+                    f"{issuer}/.well-known/jwks.json",
+                    ttl=float(os.environ.get('COGNITO_JWKS_TTL', 3600))
+                )
+                _verifier = AccessTokenVerifier(
+                    issuer,
+                    os.environ['COGNITO_CLIENT_ID'],
+                    jwks,
+                    leeway=float(os.environ.get('COGNITO_TOKEN_LEEWAY', 0))
+                )
+    return _verifier
+
+def reset_verifier():
+    """作成済みの検証器を破棄します（テスト用）。"""
+    global _verifier
+    with _verifier_lock:
+        _verifier = None
+
+def bearer_token():
+    """AuthorizationヘッダーからBearerトークンを取り出す。ヘッダーがない場合はNoneを返す"""
+    header = request.headers.get('Authorization')
+    if not header:
+        return None
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        raise AuthenticationError("Authorizationヘッダーの形式が不正です")
+    return token.strip()
+
+def authenticate_request():
+    """
+    リクエストのアクセストークンを検証し、クレームをflask.gに設定します。
+
+    - g.auth_claims: 検証済みのクレーム（未認証の場合はNone）
+    - g.cognito_sub: ユーザーのsub
+    - g.ech_nav_code: custom:ech_nav_code（トークン生成前トリガーで付与されている場合）
+
+    requiredモードで認証エラーの場合は401、設定が不正な場合は500のレスポンスを返し、
+    それ以外はNoneを返してビューの処理を続行します。optionalモードでは、認証エラーや
+    設定の不備があってもログに記録して未認証のまま続行します。
+    """
+    g.auth_claims = None
+    g.cognito_sub = None
+    g.ech_nav_code = None
+
+    mode = os.environ.get('COGNITO_AUTH_MODE', AUTH_MODE_OFF)
+    if mode not in AUTH_MODES:
+        logger.error(f"不正なCOGNITO_AUTH_MODEです: {mode}")
+        return jsonify(create_error_response("認証設定が不正です", mode)), 500
+    if mode == AUTH_MODE_OFF or request.method == 'OPTIONS':
+        return None
+
+    try:
+        token = bearer_token()
+        if token is None:
+            if mode == AUTH_MODE_REQUIRED and request.endpoint not in PUBLIC_ENDPOINTS:
+                raise AuthenticationError("アクセストークンがありません")
+            return None
+        claims = get_verifier().verify(token)
+    except AuthConfigurationError as e:
+        logger.error(f"アクセストークンを検証できません: {str(e)}")
+        if mode == AUTH_MODE_OPTIONAL:
+            return None
+        return jsonify(create_error_response("認証設定が不正です", str(e))), 500
+    except AuthenticationError as e:
+        logger.info(f"アクセストークンの検証に失敗しました: {str(e)}")
+        # ログイン前に使用するエンドポイントは、期限切れのトークンが送られても処理を続行する
+        if mode == AUTH_MODE_OPTIONAL or request.endpoint in PUBLIC_ENDPOINTS:
+            return None
+        return jsonify(create_error_response("認証に失敗しました", str(e))), 401
+
+    g.auth_claims = claims
+    g.cognito_sub = claims['sub']
+    g.ech_nav_code = claims.get('custom:ech_nav_code')
+    return None
+
+def init_auth(app):
+    """
+    アクセストークンを検証するbefore_requestをアプリに登録します。
+
+    Args:
+        app (Flask): Flaskアプリ
+    """
+    app.before_request(authenticate_request)
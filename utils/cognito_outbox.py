@@ -0,0 +1,217 @@
+"""
+Outbox (t_cognito_outbox) for Cognito operations that follow a DB change,
+processed outside the request by jobs.cognito_outbox_worker.
+"""
+import os
+import datetime
+import logging
+import pymysql
+from botocore.exceptions import ClientError
+from utils.utils import get_jst_now
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+OPERATION_DELETE_USER = 'delete_user'
+
+# t_cognito_outbox.status
+OUTBOX_PENDING = 'pending'
+OUTBOX_DONE = 'done'
+# 再試行しても成功しない、または自動では処理できないもの
+OUTBOX_FAILED = 'failed'
+# 処理する前にユーザーが有効に戻されたもの
+OUTBOX_CANCELED = 'canceled'
+
+# 削除済みのユーザーのm_user.status
+USER_STATUS_DELETED = 3
+
+OUTBOX_LOCK_NAME = 'cognito_outbox_worker'
+
+DUE_ENTRIES_QUERY = """
+SELECT o.outbox_id, o.operation, o.user_id, o.email, o.attempts
+FROM t_cognito_outbox o
+WHERE o.status = %s
+AND o.next_attempt_at <= %s
+ORDER BY o.outbox_id
+LIMIT %s
+"""
+
+# Cognitoの処理の直前に、ユーザーのステータスを確認してロックする
+LOCK_USER_QUERY = """
+SELECT status AS user_status, cognito_username
+FROM m_user
+WHERE user_id = %s
+FOR UPDATE
+"""
+
+class PermanentOutboxError(Exception):
+    """再試行しても成功しないため、失敗として記録するエラー"""
+
+def max_attempts():
+    """再試行を含む最大試行回数を返します（環境変数COGNITO_OUTBOX_MAX_ATTEMPTS、既定値: 8）。"""
+    return int(os.environ.get('COGNITO_OUTBOX_MAX_ATTEMPTS', 8))
+
+def retry_delay(attempts):
+    """
+    attempts回目の失敗の後、次に試行するまでの秒数を返します。
+    COGNITO_OUTBOX_RETRY_BASE秒（既定値: 30）から失敗ごとに2倍にし、
+    COGNITO_OUTBOX_RETRY_MAX秒（既定値: 3600）を上限とします。
+    """
+    base = int(os.environ.get('COGNITO_OUTBOX_RETRY_BASE', 30))
+    cap = int(os.environ.get('COGNITO_OUTBOX_RETRY_MAX', 3600))
+    return min(cap, base * 2 ** max(attempts - 1, 0))
+
+def enqueue_cognito_user_deletion(cursor, user_id, email, now):
+    """
+    Cognitoのユーザーの削除をアウトボックスに登録します。
+    ユーザーのステータスの更新と同じトランザクションで呼び出します。
+
+    Args:
+        cursor: データベースカーソル
+        user_id (int): 削除するユーザーのuser_id
+        email (str): ユーザーのメールアドレス
+        now (str): 登録日時
+    """
+    cursor.execute("""
+    INSERT INTO t_cognito_outbox (
+        operation, user_id, email, status, attempts, next_attempt_at, last_error, created_at, updated_at
+    ) VALUES (%s, %s, %s, %s, 0, %s, NULL, %s, %s)
+    """, (OPERATION_DELETE_USER, user_id, email, OUTBOX_PENDING, now, now, now))
+
+def delete_user_by_username(cognito_client, user_pool_id, username):
+    """
+    m_userに記録したユーザー名でCognitoのユーザーを削除します。
+
+    Returns:
+        str: 削除したユーザー名
+    """
+    try:
+        cognito_client.admin_delete_user(UserPoolId=user_pool_id, Username=username)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'UserNotFoundException':
+            raise
+        logger.warning(f"Cognitoにユーザーが見つかりません: {username}")
+    logger.info(f"Cognitoユーザーの削除に成功しました: {username}")
+    return username
+
+def delete_user_by_email(cognito_client, user_pool_id, email):
+    """
+    メールアドレスで検索したCognitoのユーザーを削除します。
+    cognito_usernameが未設定（jobs.cognito_user_backfillで移行前）のユーザーにのみ使用します。
+
+    Returns:
+        str: 削除したユーザー名（ユーザーが存在しない場合はNone）
+
+    Raises:
+        PermanentOutboxError: 同じメールアドレスのユーザーが複数存在する場合
+    """
+    response = cognito_client.list_users(
+        UserPoolId=user_pool_id,
+        Filter=f'email = \"{email}\"'
+    )
+    users = response.get('Users', [])
+    if not users:
+        logger.warning(f"Cognitoにユーザーが見つかりません: {email}")
+        return None
+    if len(users) > 1:
+        raise PermanentOutboxError(f"複数のCognitoユーザーが見つかりました: {email}")
+
+    username = users[0]['Username']
+    try:
+        cognito_client.admin_delete_user(UserPoolId=user_pool_id, Username=username)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'UserNotFoundException':
+            raise
+    logger.info(f"Cognitoユーザーの削除に成功しました: {username}")
+    return username
+
+def finish_entry(conn, cursor, outbox_id, status, now, error=None):
+    """処理結果をアウトボックスに記録してコミットします。"""
+    cursor.execute("""
+    UPDATE t_cognito_outbox
+    SET status = %s, last_error = %s, updated_at = %s
+    WHERE outbox_id = %s
+    """, (status, str(error)[:1000] if error else None, now, outbox_id))
+    conn.commit()
+
+def process_cognito_outbox(conn, cognito_client, user_pool_id, now=None, limit=100):
+    """
+    実行時刻を迎えたアウトボックスのエントリーを処理します。
+
+    エントリーごとに結果を記録してコミットするため、Cognitoの呼び出し中に保持するロックは
+    そのエントリーのユーザーの行だけです。
+    失敗したエントリーは、retry_delayの間隔を空けてmax_attempts回まで再試行します。
+    処理する前にユーザーが有効に戻された場合は、Cognitoのユーザーを削除しません。ユーザーのステータスは
+    エントリーごとにCognitoを呼び出す直前にSELECT ... FOR UPDATEで確認するため、一覧の取得後に
+    有効に戻されたユーザーも削除しません（処理中に有効に戻す更新は、結果を記録するまで待機します）。
+    Cognitoのユーザーはm_user.cognito_usernameで直接削除し、未設定の場合のみメールアドレスで検索します。
+
+    Args:
+        conn: データベース接続
+        cognito_client: Cognitoのクライアント
+        user_pool_id (str): ユーザープールID
+        now (str): 基準日時（省略時は日本時間の現在日時）
+        limit (int): 1回に処理する最大件数
+
+    Returns:
+        dict: 状態ごとの件数。他で実行中の場合はskipped=True
+    """
+    now = now or get_jst_now()
+    result = {"skipped": False, OUTBOX_DONE: 0, OUTBOX_CANCELED: 0, OUTBOX_FAILED: 0, "retry": 0}
+    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+        # 同時に実行されないようにする
+        cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (OUTBOX_LOCK_NAME,))
+        if not cursor.fetchone()['acquired']:
+            logger.info("Cognitoのアウトボックスは他で処理中のためスキップします")
+            return {**result, "skipped": True}
+
+        try:
+            cursor.execute(DUE_ENTRIES_QUERY, (OUTBOX_PENDING, now, limit))
+            entries = cursor.fetchall()
+            conn.commit()
+
+            for entry in entries:
+                cursor.execute(LOCK_USER_QUERY, (entry['user_id'],))
+                user = cursor.fetchone()
+                entry.update(user or {'user_status': None, 'cognito_username': None})
+                if entry['user_status'] is not None and entry['user_status'] != USER_STATUS_DELETED:
+                    finish_entry(conn, cursor, entry['outbox_id'], OUTBOX_CANCELED, now)
+                    result[OUTBOX_CANCELED] += 1
+                    continue
+
+                try:
+                    if entry.get('cognito_username'):
+                        delete_user_by_username(cognito_client, user_pool_id, entry['cognito_username'])
+                    else:
+                        logger.info(f"cognito_usernameが未設定のためメールアドレスで検索します: "
+                                    f"user_id={entry['user_id']}")
+                        delete_user_by_email(cognito_client, user_pool_id, entry['email'])
+                except PermanentOutboxError as e:
+                    logger.error(f"Cognitoの処理に失敗しました: outbox_id={entry['outbox_id']}: {str(e)}")
+                    finish_entry(conn, cursor, entry['outbox_id'], OUTBOX_FAILED, now, e)
+                    result[OUTBOX_FAILED] += 1
+                    continue
+                except Exception as e:
+                    attempts = entry['attempts'] + 1
+                    logger.warning(f"Cognitoの処理に失敗しました: outbox_id={entry['outbox_id']} "
+                                   f"試行回数={attempts}: {str(e)}")
+                    failed = attempts >= max_attempts()
+                    next_attempt_at = (datetime.datetime.strptime(now, '%Y-%m-%d %H:%M:%S')
+                                       + datetime.timedelta(seconds=retry_delay(attempts)))
+                    cursor.execute("""
+                    UPDATE t_cognito_outbox
+                    SET status = %s, attempts = %s, next_attempt_at = %s, last_error = %s, updated_at = %s
+                    WHERE outbox_id = %s
+                    """, (OUTBOX_FAILED if failed else OUTBOX_PENDING, attempts,
+                          next_attempt_at.strftime('%Y-%m-%d %H:%M:%S'), str(e)[:1000], now, entry['outbox_id']))
+                    conn.commit()
+                    result[OUTBOX_FAILED if failed else "retry"] += 1
+                    continue
+
+                finish_entry(conn, cursor, entry['outbox_id'], OUTBOX_DONE, now)
+                result[OUTBOX_DONE] += 1
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (OUTBOX_LOCK_NAME,))
+
+    logger.info(f"Cognitoのアウトボックスを処理しました: {result}")
+    return result
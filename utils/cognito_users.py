@@ -0,0 +1,125 @@
+"""
+Cognito user keys stored on m_user (cognito_username / cognito_sub) and the
+batched backfill that fills them for users registered before they existed.
+"""
+import os
+import logging
+import pymysql
+from botocore.exceptions import ClientError
+from utils.utils import get_jst_now
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+BACKFILL_LOCK_NAME = 'cognito_user_backfill'
+
+def attribute_map(attributes):
+    """Cognitoの属性のリスト（[{'Name', 'Value'}]）をdictに変換します。"""
+    return {attribute['Name']: attribute['Value'] for attribute in attributes or []}
+
+def get_cognito_user(cognito_client, user_pool_id, username):
+    """
+    Cognitoのユーザーをユーザー名（またはエイリアス）で取得します。
+
+    Returns:
+        dict: username、sub、attributes（属性のdict）。ユーザーが存在しない場合はNone
+    """
+    try:
+        response = cognito_client.admin_get_user(UserPoolId=user_pool_id, Username=username)
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'UserNotFoundException':
+            return None
+        raise
+    attributes = attribute_map(response.get('UserAttributes'))
+    return {'username': response['Username'], 'sub': attributes.get('sub'), 'attributes': attributes}
+
+def backfill_page_size():
+    """Cognitoから1回に取得するユーザー数を返します（環境変数COGNITO_BACKFILL_PAGE_SIZE、既定値: 60。Cognitoの上限は60）。"""
+    return min(int(os.environ.get('COGNITO_BACKFILL_PAGE_SIZE', 60)), 60)
+
+def build_cognito_key_update(users, now):
+    """
+    ech_nav_codeごとのCognitoのユーザー名・subをm_userに反映するUPDATE文を作成します。
+    cognito_usernameが未設定の行だけを更新します。
+
+    Args:
+        users (list): (ech_nav_code, cognito_username, cognito_sub)のリスト
+        now (str): 更新日時
+
+    Returns:
+        tuple: (クエリ, パラメータ)
+    """
+    selects = ["SELECT %s AS echnavicode, %s AS cognito_username, %s AS cognito_sub"]
+    selects += ["SELECT %s, %s, %s"] * (len(users) - 1)
+    query = f"""
+    UPDATE m_user u
+    JOIN ({' UNION ALL '.join(selects)}) c ON c.echnavicode = u.echnavicode
+    SET u.cognito_username = c.cognito_username,
+        u.cognito_sub = c.cognito_sub,
+        u.update_date = %s,
+        u.update_user = %s
+    WHERE u.cognito_username IS NULL
+    """
+    params = [value for user in users for value in user] + [now, 'Backfill']
+    return query, params
+
+def backfill_cognito_users(conn, cognito_client, user_pool_id, pagination_token=None, max_pages=None):
+    """
+    Cognitoのユーザーを一覧し、custom:ech_nav_codeが一致するm_userにユーザー名とsubを設定します。
+
+    1ページ（最大60件）ごとに1回のUPDATEで反映してコミットします。cognito_usernameが
+    設定済みの行は変更しないため、何度実行しても同じ結果になります。max_pagesで中断した場合は、
+    戻り値のpagination_tokenを指定して続きから再開できます。
+
+    Args:
+        conn: データベース接続
+        cognito_client: Cognitoのクライアント
+        user_pool_id (str): ユーザープールID
+        pagination_token (str): 再開する位置（前回の戻り値）
+        max_pages (int): 1回に処理する最大ページ数（省略時はすべて）
+
+    Returns:
+        dict: 処理したページ数・ユーザー数・更新した行数、続きがある場合はpagination_token。
+              他で実行中の場合はskipped=True
+    """
+    result = {"skipped": False, "pages": 0, "users": 0, "without_ech_nav_code": 0, "updated": 0,
+              "pagination_token": None}
+    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+        # 同時に実行されないようにする
+        cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (BACKFILL_LOCK_NAME,))
+        if not cursor.fetchone()['acquired']:
+            logger.info("Cognitoのユーザー情報の移行は他で実行中のためスキップします")
+            return {**result, "skipped": True, "pagination_token": pagination_token}
+
+        try:
+            while max_pages is None or result["pages"] < max_pages:
+                params = {'UserPoolId': user_pool_id, 'Limit': backfill_page_size()}
+                if pagination_token:
+                    params['PaginationToken'] = pagination_token
+                response = cognito_client.list_users(**params)
+
+                users = []
+                for user in response.get('Users', []):
+                    attributes = attribute_map(user.get('Attributes'))
+                    if attributes.get('custom:ech_nav_code'):
+                        users.append((attributes['custom:ech_nav_code'], user['Username'], attributes.get('sub')))
+                    else:
+                        result["without_ech_nav_code"] += 1
+
+                if users:
+                    query, query_params = build_cognito_key_update(users, get_jst_now())
+                    cursor.execute(query, query_params)
+                    result["updated"] += cursor.rowcount
+                    conn.commit()
+
+                result["pages"] += 1
+                result["users"] += len(response.get('Users', []))
+                pagination_token = response.get('PaginationToken')
+                if not pagination_token:
+                    break
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (BACKFILL_LOCK_NAME,))
+
+    result["pagination_token"] = pagination_token
+    logger.info(f"Cognitoのユーザー情報を移行しました: {result}")
+    return result
@@ -0,0 +1,71 @@
+"""
+Small bounded thread pool for overlapping independent I/O (Cognito, MySQL)
+within a single request.
+"""
+import os
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor = None
+
+def io_workers():
+    """
+    並行実行に使用するスレッド数を返します（環境変数CONCURRENT_IO_WORKERS、既定値: 8）。
+    0を指定した場合は並行実行せず、呼び出し元のスレッドで順に実行します。
+    """
+    return int(os.environ.get('CONCURRENT_IO_WORKERS', 8))
+
+def get_executor():
+    """
+    プロセス内で共有するスレッドプールを取得します。
+
+    Returns:
+        ThreadPoolExecutor: スレッドプール
+    """
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=io_workers(), thread_name_prefix='io')
+    return _executor
+
+def run_in_background(fn, *args, **kwargs):
+    """
+    関数をスレッドプールで実行します。
+
+    CONCURRENT_IO_WORKERSが0の場合はその場で実行し、完了済みのFutureを返します。
+    例外はFuture.result()の呼び出し時に送出されます。
+
+    Args:
+        fn (callable): 実行する関数
+        *args: 関数の引数
+        **kwargs: 関数のキーワード引数
+
+    Returns:
+        concurrent.futures.Future: 実行結果
+    """
+    if io_workers() <= 0:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+    return get_executor().submit(fn, *args, **kwargs)
+
+def discard(future):
+    """
+    不要になった処理を取り消します。
+    実行中の場合は完了を待たず、結果と例外を破棄します。
+
+    Args:
+        future (concurrent.futures.Future): run_in_backgroundの戻り値
+    """
+    if future is None or future.cancel():
+        return
+    future.add_done_callback(lambda f: f.cancelled() or f.exception())
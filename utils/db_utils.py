@@ -1,12 +1,272 @@
 """
 Database utility functions for generating unique numbers and other common database operations.
+
+Unique numbers are allocated from a per-column counter in m_id_sequence and
+passed through a keyed permutation of the fixed-width decimal range, so they
+look random, keep their digit length, and cannot collide.
 """
-import random
+import os
+import hmac
+import hashlib
 import logging
+import threading
+import pymysql
 
 # ロガー設定
 logger = logging.getLogger(__name__)
 
+# 1回の予約で確保する番号の数（桁数が少ない番号は欠番を避けるため1件ずつ予約する）
+DEFAULT_BLOCK_SIZE = 32
+SMALL_NUMBER_LENGTH = 4
+
+# カウンターを予約分だけ進め、予約した範囲の末尾をLAST_INSERT_ID()に設定する
+RESERVE_QUERY = """
+INSERT INTO m_id_sequence (sequence_name, next_value)
+VALUES (%s, LAST_INSERT_ID(%s))
+ON DUPLICATE KEY UPDATE next_value = LAST_INSERT_ID(next_value + %s)
+"""
+
+class FeistelPermutation:
+    """
+    0以上10**length未満の整数の、鍵付きの一対一の置換（形式保持暗号）。
+
+    2の累乗の範囲でFeistel構造による置換を行い、範囲外の値は
+    範囲内に入るまで置換を繰り返す（サイクルウォーキング）ことで桁数を保ちます。
+
+    Args:
+        length (int): 桁数
+        key (bytes): 置換の鍵
+        rounds (int): Feistelのラウンド数
+    """
+    def __init__(self, length, key, rounds=8):
+        self.length = length
+        self.domain = 10 ** length
+        bits = (self.domain - 1).bit_length()
+        self.half_bits = (bits + 1) // 2
+        self.mask = (1 << self.half_bits) - 1
+        self.key = key
+        self.rounds = rounds
+
+    def _round(self, round_number, value):
+        digest = hmac.new(self.key, bytes([round_number]) + value.to_bytes(8, 'big'), hashlib.sha256).digest()
+        return int.from_bytes(digest[:8], 'big') & self.mask
+
+    def _encrypt(self, value):
+        left, right = value >> self.half_bits, value & self.mask
+        for round_number in range(self.rounds):
+            left, right = right, left ^ self._round(round_number, right)
+        return (left << self.half_bits) | right
+
+    def permute(self, value):
+        """
+        値を置換します。
+
+        Args:
+            value (int): 0以上10**length未満の整数
+
+        Returns:
+            int: 置換後の値（0以上10**length未満）
+        """
+        if not 0 <= value < self.domain:
+            raise ValueError(f"置換の範囲外の値です: {value}")
+        value = self._encrypt(value)
+        while value >= self.domain:
+            value = self._encrypt(value)
+        return value
+
+    def format(self, value):
+        """値を置換し、桁数をそろえた文字列にします。"""
+        return str(self.permute(value)).zfill(self.length)
+
+class SequenceConnection:
+    """
+    m_id_sequenceの予約専用の接続。
+
+    呼び出し元の接続（再利用する接続・接続プール）とは別に、プロセスで1本の接続を
+    autocommitで保持し、予約のたびに接続を作成しません。接続プールから取得しないため、
+    並行する登録で接続プールを使い切ることもありません。予約は1文で完結するため、
+    トランザクションは不要です。
+
+    Args:
+        connect (callable): pymysqlの接続を返す関数（既定値: db.connect）
+    """
+    def __init__(self, connect=None):
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            connect = self._connect
+            if connect is None:
+                from db.db_connection import db
+                connect = db.connect
+            self._conn = connect()
+            self._conn.autocommit(True)
+        return self._conn
+
+    def _close(self):
+        conn, self._conn = self._conn, None
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _execute(self, sequence_name, size):
+        with self._connection().cursor(pymysql.cursors.DictCursor) as cursor:
+            cursor.execute(RESERVE_QUERY, (sequence_name, size, size))
+            cursor.execute("SELECT LAST_INSERT_ID() AS end_value")
+            return cursor.fetchone()['end_value']
+
+    def reserve(self, sequence_name, size):
+        """
+        カウンターをsize進め、予約した範囲の末尾を返します。
+
+        接続が切断されていた場合は1回だけ接続し直します（切断前に予約が完了していた場合、
+        その範囲は欠番になりますが、重複することはありません）。
+        """
+        with self._lock:
+            try:
+                return self._execute(sequence_name, size)
+            except pymysql.err.OperationalError as e:
+                logger.warning(f"採番用の接続が無効のため再接続します: {str(e)}")
+                self._close()
+                return self._execute(sequence_name, size)
+
+_sequence_connection = SequenceConnection()
+
+class IdAllocator:
+    """
+    テーブルのカラムに登録する一意の番号を払い出します。
+
+    m_id_sequenceのカウンターから番号の範囲をまとめて予約し（1文で完結するため
+    並行する予約同士が重なることはない）、範囲内の連番をFeistelPermutationで置換します。
+    予約は呼び出し元のトランザクションとは別の接続（SequenceConnection）でコミットするため、
+    呼び出し元がロールバックしても同じ範囲が再び払い出されることはありません。
+
+    Args:
+        table (str): テーブル名
+        column (str): カラム名
+        length (int): 番号の桁数
+        block_size (int): 1回の予約で確保する番号の数
+        key (bytes): 置換の鍵（省略時は環境変数ID_ALLOCATOR_KEY）
+        sequence (SequenceConnection): 予約に使用する接続（既定値: プロセスで共有する接続）
+
+    Raises:
+        ValueError: 鍵が設定されていない場合
+    """
+    def __init__(self, table, column, length, block_size=DEFAULT_BLOCK_SIZE, key=None, sequence=None):
+        self.table = table
+        self.column = column
+        self.sequence_name = f"{table}.{column}"
+        self.permutation = FeistelPermutation(length, key or default_key())
+        self.block_size = block_size
+        self._sequence = sequence or _sequence_connection
+        self._lock = threading.Lock()
+        self._pending = []
+        self._stats = {
+            'reservations': 0,
+            'allocated': 0,
+            'skipped': 0,
+        }
+
+    def _reserve(self, size):
+        """カウンターを進め、予約した範囲 [start, end) を返す"""
+        end = self._sequence.reserve(self.sequence_name, size)
+        self._stats['reservations'] += 1
+        return end - size, end
+
+    def _fill(self, cursor, count):
+        """未払い出しの番号がcount件以上になるまで範囲を予約する"""
+        while len(self._pending) < count:
+            start, end = self._reserve(max(self.block_size, count - len(self._pending)))
+            if start >= self.permutation.domain:
+                raise ValueError(f"{self.column}の番号を使い切りました")
+            candidates = [self.permutation.format(value)
+                          for value in range(start, min(end, self.permutation.domain))]
+
+            # 置換を導入する前にランダムに採番された番号と重なるものを除外する
+            placeholders = ', '.join(['%s'] * len(candidates))
+            cursor.execute(
+                f"SELECT {self.column} AS number FROM {self.table} WHERE {self.column} IN ({placeholders})",
+                candidates
+            )
+            existing = {row['number'] for row in cursor.fetchall()}
+            self._stats['skipped'] += len(existing)
+            self._pending.extend(number for number in candidates if number not in existing)
+
+    def allocate_many(self, cursor, count):
+        """
+        番号をcount件払い出します。
+
+        Args:
+            cursor: 既存の番号の確認に使用するデータベースカーソル（DictCursor）
+            count (int): 件数
+
+        Returns:
+            list: 番号（桁数をそろえた文字列）のリスト
+
+        Raises:
+            ValueError: 番号を使い切った場合
+        """
+        with self._lock:
+            self._fill(cursor, count)
+            numbers, self._pending = self._pending[:count], self._pending[count:]
+            self._stats['allocated'] += count
+            return numbers
+
+    def allocate(self, cursor):
+        """番号を1件払い出します。"""
+        return self.allocate_many(cursor, 1)[0]
+
+    def stats(self):
+        """予約と払い出しの状況を返す"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        return stats
+
+def default_key():
+    """
+    置換の鍵（環境変数ID_ALLOCATOR_KEY）を返す。
+    鍵が分かると番号から連番を逆算できるため、既定値は設けない
+
+    Raises:
+        ValueError: ID_ALLOCATOR_KEYが設定されていない場合
+    """
+    key = os.environ.get('ID_ALLOCATOR_KEY')
+    if not key:
+        raise ValueError("ID_ALLOCATOR_KEYが設定されていません")
+    return key.encode('utf-8')
+
+_allocators = {}
+_allocators_lock = threading.Lock()
+
+def get_id_allocator(table, column, length):
+    """
+    テーブルのカラムごとの採番器を取得します。
+    ウォーム状態のLambdaではモジュール変数として呼び出しをまたいで保持されます。
+
+    Args:
+        table (str): テーブル名
+        column (str): カラム名
+        length (int): 番号の桁数
+
+    Returns:
+        IdAllocator: 採番器
+    """
+    key = (table, column, length)
+    allocator = _allocators.get(key)
+    if allocator is None:
+        with _allocators_lock:
+            allocator = _allocators.get(key)
+            if allocator is None:
+                block_size = 1 if length <= SMALL_NUMBER_LENGTH else int(
+                    os.environ.get('ID_BLOCK_SIZE', DEFAULT_BLOCK_SIZE))
+                allocator = IdAllocator(table, column, length, block_size=block_size)
+                _allocators[key] = allocator
+    return allocator
+
 def generate_unique_number(cursor, table, column, length):
     """
     指定されたテーブルのカラムに対して、一意の数値を生成します。
@@ -21,14 +281,75 @@ def generate_unique_number(cursor, table, column, length):
         str: 生成された一意の数値
 
     Raises:
-        ValueError: 5回試行しても一意の数値が生成できない場合
-    """
-    for _ in range(5):  # 5回まで試行
-        number = ''.join([str(random.randint(0, 9)) for _ in range(length)])
-        cursor.execute(f"SELECT COUNT(*) as count FROM {table} WHERE {column} = %s", (number,))
-        if cursor.fetchone()['count'] == 0:
-            return number
-    
-    error_msg = f"Failed to generate a unique {column} after 5 attempts"
-    logger.error(error_msg)
-    raise ValueError(error_msg) 
\ No newline at end of file
+        ValueError: 指定された桁数の数値を使い切った場合
+    """
+    return get_id_allocator(table, column, length).allocate(cursor)
+
+# 代理店ごとのapp_location_numberの採番（呼び出し元のトランザクション内で行を更新するため、
+# 同じ代理店の登録はコミットまで直列化され、ロールバックした場合は番号が戻る）
+NEXT_LOCATION_NUMBER_QUERY = """
+UPDATE m_location_sequence
+SET last_number = LAST_INSERT_ID(last_number + %s)
+WHERE agency_id = %s
+"""
+
+# カウンターの行が無い代理店の最初の採番時に、行を作成する。
+# 既存の代理店の行はマイグレーション（0003）で、以降に登録した代理店の行は
+# agency_registerで作成するため、m_locationは参照しない（INSERT ... SELECTはm_locationに共有の
+# ネクストキーロックを取るため、同じ代理店の最初の登録が並行するとデッドロックする）
+SEED_LOCATION_NUMBER_QUERY = """
+INSERT INTO m_location_sequence (agency_id, last_number)
+VALUES (%s, LAST_INSERT_ID(%s))
+ON DUPLICATE KEY UPDATE last_number = LAST_INSERT_ID(last_number + %s)
+"""
+
+def format_app_location_number(agency_id, number):
+    """
+    代理店IDと連番からapp_location_numberを作成します。
+    代理店IDの後ろに、全体が4桁になるようゼロパディングした連番を続けます（例: 5 → 5001）。
+
+    Args:
+        agency_id (int): 代理店ID
+        number (int): 代理店内の連番（1から）
+
+    Returns:
+        str: app_location_number
+    """
+    agency = str(agency_id)
+    return f"{agency}{str(number).zfill(4 - len(agency))}"
+
+def generate_app_location_numbers(cursor, agency_id, count):
+    """
+    代理店のapp_location_numberを連続してcount件採番します。
+
+    m_location_sequenceの代理店の行を1文で進めるため、並行する登録で同じ番号が
+    払い出されることはありません。
+
+    Args:
+        cursor: データベースカーソル（DictCursor）
+        agency_id (int): 代理店ID
+        count (int): 件数
+
+    Returns:
+        list: app_location_numberのリスト（連番順）
+    """
+    cursor.execute(NEXT_LOCATION_NUMBER_QUERY, (count, agency_id))
+    if cursor.rowcount == 0:
+        cursor.execute(SEED_LOCATION_NUMBER_QUERY, (agency_id, count, count))
+    cursor.execute("SELECT LAST_INSERT_ID() AS last_number")
+    last_number = cursor.fetchone()['last_number']
+    return [format_app_location_number(agency_id, number)
+            for number in range(last_number - count + 1, last_number + 1)]
+
+def generate_app_location_number(cursor, agency_id):
+    """
+    代理店のapp_location_numberを1件採番します。
+
+    Args:
+        cursor: データベースカーソル（DictCursor）
+        agency_id (int): 代理店ID
+
+    Returns:
+        str: app_location_number
+    """
+    return generate_app_location_numbers(cursor, agency_id, 1)[0]
@@ -0,0 +1,256 @@
+"""
+Asynchronous export jobs for large charge history downloads.
+
+A job is submitted by an API request, executed by a worker outside the API
+request (a separate Lambda function, or a background thread when running
+locally) and its status document is kept next to the result in object storage.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import datetime
+import logging
+import threading
+import pymysql
+from db.db_connection import db
+from utils.utils import get_jst_now
+from utils.aws_clients import get_client
+from utils.object_storage import get_object_storage
+from utils.history_queries import build_charge_history_query, build_download_history_query, count_query
+from utils.export_utils import EXPORT_FORMATS, cursor_columns, gzip_chunks, iter_export_chunks, iter_rows
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+EXPORT_JOB_TYPES = ('download_history', 'charge_history')
+
+JOB_STATUS_QUEUED = 'queued'
+JOB_STATUS_RUNNING = 'running'
+JOB_STATUS_COMPLETED = 'completed'
+JOB_STATUS_FAILED = 'failed'
+
+# 進捗を書き込む間隔（秒）
+EXPORT_PROGRESS_INTERVAL = float(os.environ.get('EXPORT_PROGRESS_INTERVAL', 2))
+
+JOB_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+def running_timeout():
+    """
+    runningのまま更新されないジョブを失敗とみなすまでの秒数を返します
+    （環境変数EXPORT_RUNNING_TIMEOUT、既定値: 960。ワーカーのタイムアウト900秒より長くする）。
+    """
+    return int(os.environ.get('EXPORT_RUNNING_TIMEOUT', 960))
+
+def is_stale(job, now=None):
+    """runningのジョブがrunning_timeout秒を超えて終了していない（ワーカーが異常終了した）場合はTrue"""
+    if job['status'] != JOB_STATUS_RUNNING or not job.get('started_at'):
+        return False
+    now = datetime.datetime.strptime(now or get_jst_now(), '%Y-%m-%d %H:%M:%S')
+    started_at = datetime.datetime.strptime(job['started_at'], '%Y-%m-%d %H:%M:%S')
+    return (now - started_at).total_seconds() > running_timeout()
+
+def status_key(job_id):
+    return f"export_jobs/{job_id}/status.json"
+
+def result_key(job):
+    suffix = '.gz' if job['gzip'] else ''
+    return f"export_jobs/{job['job_id']}/{job['job_type']}.{job['format']}{suffix}"
+
+def create_export_job(job_type, params, export_format, compress=False, storage=None, agency_id=None):
+    """
+    エクスポートジョブを登録します。
+
+    Args:
+        job_type (str): EXPORT_JOB_TYPESのいずれか
+        params (dict): クエリの作成に使用するパラメータ
+        export_format (str): 'csv' または 'ndjson'
+        compress (bool): gzip圧縮する場合はTrue
+        storage (ObjectStorage): 保存先（省略時は環境変数の設定に従う）
+        agency_id (int): ジョブを登録した企業ID（状態の取得時に照合する）
+
+    Returns:
+        dict: 登録したジョブ
+
+    Raises:
+        ValueError: job_typeまたはexport_formatが不正な場合
+    """
+    if job_type not in EXPORT_JOB_TYPES:
+        raise ValueError(f"未対応のjob_typeです: {job_type}")
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"未対応のformatです: {export_format}")
+
+    storage = storage or get_object_storage()
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "job_type": job_type,
+        "agency_id": agency_id,
+        "format": export_format,
+        "gzip": bool(compress),
+        "params": params,
+        "status": JOB_STATUS_QUEUED,
+        "total_rows": None,
+        "rows_written": 0,
+        "progress": 0,
+        "size_bytes": None,
+        "result_key": None,
+        "error": None,
+        "created_at": get_jst_now(),
+        "started_at": None,
+        "finished_at": None,
+    }
+    storage.put_json(status_key(job['job_id']), job)
+    logger.info(f"エクスポートジョブを登録しました: {job['job_id']}")
+    return job
+
+def dispatch_export_job(job_id):
+    """
+    ジョブの実行を開始します。
+
+    EXPORT_WORKER_FUNCTION_NAMEが設定されている場合はワーカーのLambda関数を非同期で呼び出し、
+    設定されていない場合（ローカル実行）はバックグラウンドのスレッドで実行します。
+
+    Args:
+        job_id (str): ジョブID
+    """
+    function_name = os.environ.get('EXPORT_WORKER_FUNCTION_NAME')
+    if function_name:
+        get_client('lambda').invoke(
+            FunctionName=function_name,
+            InvocationType='Event',
+            Payload=json.dumps({"export_job_id": job_id}).encode('utf-8')
+        )
+        return
+
+    thread = threading.Thread(target=run_export_job, args=(job_id,), daemon=True)
+    thread.start()
+
+def get_export_job(job_id, storage=None, agency_id=None):
+    """
+    ジョブの状態を取得します。
+    running_timeout秒を超えてrunningのままのジョブは、失敗として記録してから返します。
+
+    Args:
+        job_id (str): ジョブID
+        storage (ObjectStorage): 保存先（省略時は環境変数の設定に従う）
+        agency_id (int): 呼び出し元の企業ID。ジョブを登録した企業と一致しない場合は見つからない扱いにする
+
+    Returns:
+        dict: ジョブの状態。完了している場合はdownloadにダウンロード情報を含みます。
+              ジョブが存在しない場合（他の企業のジョブを含む）はNone
+    """
+    if not isinstance(job_id, str) or not JOB_ID_PATTERN.fullmatch(job_id):
+        return None
+
+    storage = storage or get_object_storage()
+    job = storage.get_json(status_key(job_id))
+    if job is None or job.get('agency_id') != agency_id:
+        return None
+
+    if is_stale(job):
+        logger.error(f"エクスポートジョブがタイムアウトしました: {job_id}")
+        job['status'] = JOB_STATUS_FAILED
+        job['error'] = "エクスポートがタイムアウトしました"
+        job['finished_at'] = get_jst_now()
+        storage.put_json(status_key(job_id), job)
+
+    job.pop('params', None)
+    if job['status'] == JOB_STATUS_COMPLETED:
+        job['download'] = storage.download_handle(job['result_key'])
+    return job
+
+def build_export_query(job):
+    """
+    ジョブの種類とパラメータからクエリを作成します。
+
+    Returns:
+        tuple: (クエリ, パラメータ)
+    """
+    params = job['params']
+    if job['job_type'] == 'download_history':
+        return build_download_history_query(
+            params.get('location_id'),
+            params.get('powersupply_id'),
+            agency_id=params.get('agency_id'),
+            permission=params.get('permission')
+        )
+    return build_charge_history_query(
+        params['start_period'],
+        params['end_period'],
+        agency_id=params.get('agency_id'),
+        permission=params.get('permission'),
+        powersupply_ids=params.get('powersupply_ids')
+    )
+
+def _track_progress(rows, job, storage):
+    """行を数えながら、一定間隔でジョブの進捗を書き込む"""
+    last_written = time.monotonic()
+    for row in rows:
+        job['rows_written'] += 1
+        yield row
+        now = time.monotonic()
+        if now - last_written >= EXPORT_PROGRESS_INTERVAL:
+            if job['total_rows']:
+                job['progress'] = min(99, job['rows_written'] * 100 // job['total_rows'])
+            storage.put_json(status_key(job['job_id']), job)
+            last_written = now
+
+def run_export_job(job_id, storage=None):
+    """
+    ジョブを実行し、結果をストレージに書き込みます。
+
+    サーバーサイドカーソルで少しずつ読み込むため、出力件数が多くてもメモリ使用量は一定です。
+    失敗した場合はジョブの状態をfailedにして例外を握りつぶします。
+
+    Args:
+        job_id (str): ジョブID
+        storage (ObjectStorage): 保存先（省略時は環境変数の設定に従う）
+
+    Returns:
+        dict: 実行後のジョブ。ジョブが存在しない場合はNone
+    """
+    storage = storage or get_object_storage()
+    job = storage.get_json(status_key(job_id))
+    if job is None:
+        logger.error(f"エクスポートジョブが見つかりません: {job_id}")
+        return None
+    if job['status'] == JOB_STATUS_COMPLETED or (job['status'] == JOB_STATUS_RUNNING and not is_stale(job)):
+        # 非同期呼び出しの再試行などで重複して起動された場合は何もしない
+        # （ワーカーが異常終了してrunningのまま残ったジョブは再実行する）
+        logger.info(f"エクスポートジョブは実行済みです: {job_id} ({job['status']})")
+        return job
+
+    job['status'] = JOB_STATUS_RUNNING
+    job['started_at'] = get_jst_now()
+    storage.put_json(status_key(job_id), job)
+
+    try:
+        query, params = build_export_query(job)
+        with db.get_connection() as conn:
+            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                cursor.execute(count_query(query), params)
+                job['total_rows'] = cursor.fetchone()['total_count']
+            storage.put_json(status_key(job_id), job)
+
+            with conn.cursor(pymysql.cursors.SSDictCursor) as cursor:
+                cursor.execute(query, params)
+                rows = _track_progress(iter_rows(cursor), job, storage)
+                chunks = iter_export_chunks(rows, cursor_columns(cursor), job['format'])
+                if job['gzip']:
+                    chunks = gzip_chunks(chunks)
+                key = result_key(job)
+                job['size_bytes'] = storage.put_stream(key, chunks, EXPORT_FORMATS[job['format']])
+
+        job['result_key'] = key
+        job['status'] = JOB_STATUS_COMPLETED
+        job['progress'] = 100
+        logger.info(f"エクスポートジョブが完了しました: {job_id} ({job['rows_written']}件)")
+    except Exception as e:
+        logger.error(f"エクスポートジョブでエラーが発生しました: {job_id} {str(e)}")
+        job['status'] = JOB_STATUS_FAILED
+        job['error'] = str(e)
+
+    job['finished_at'] = get_jst_now()
+    storage.put_json(status_key(job_id), job)
+    return job
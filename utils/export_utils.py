@@ -0,0 +1,170 @@
+"""
+Streaming export helpers that turn database cursors into CSV/NDJSON chunks.
+"""
+import io
+import csv
+import json
+import zlib
+import decimal
+import datetime
+import logging
+from utils.json_provider import format_timedelta
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+# fetchmanyで一度に取得する行数
+EXPORT_BATCH_SIZE = 1000
+# 出力チャンクの目安サイズ（バイト）
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+# Lambda（aws-wsgi）でBase64エンコードして返すContent-Type。
+# gzip圧縮した本文はUTF-8の文字列に変換できないため、エクスポートは常にバイナリとして返す。
+# API GatewayのBinaryMediaTypes（template.yml）にも同じ値を登録する
+EXPORT_BINARY_CONTENT_TYPES = {content_type.split(';')[0] for content_type in EXPORT_FORMATS.values()}
+
+def iter_rows(cursor, batch_size=EXPORT_BATCH_SIZE):
+    """
+    カーソルの結果をfetchmanyで少しずつ取得して1行ずつ返します。
+    SSCursorと組み合わせることで、結果全体をメモリに載せずに処理できます。
+
+    Args:
+        cursor: クエリ実行済みのデータベースカーソル
+        batch_size (int): 一度に取得する行数
+
+    Yields:
+        dict: 1行分のデータ
+    """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for row in rows:
+            yield row
+
+def cursor_columns(cursor):
+    """
+    実行済みカーソルの列名を返します。
+
+    Args:
+        cursor: クエリ実行済みのデータベースカーソル
+
+    Returns:
+        list: 列名のリスト
+    """
+    return [column[0] for column in cursor.description]
+
+def export_value(value):
+    """
+    エクスポート用に値を変換します。
+
+    Args:
+        value: データベースから取得した値
+
+    Returns:
+        JSONに変換可能な値
+    """
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return format_timedelta(value)
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+def iter_csv_chunks(rows, columns):
+    """
+    行データをCSVのチャンクに変換します。
+
+    Args:
+        rows (iterable): 行データ（dict）
+        columns (list): 出力する列名
+
+    Yields:
+        bytes: UTF-8エンコードされたCSVのチャンク（先頭はヘッダー行）
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    yield buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+
+    for row in rows:
+        writer.writerow(['' if row[column] is None else export_value(row[column]) for column in columns])
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def iter_ndjson_chunks(rows, columns):
+    """
+    行データをNDJSON（1行1JSON）のチャンクに変換します。
+
+    Args:
+        rows (iterable): 行データ（dict）
+        columns (list): 出力する列名
+
+    Yields:
+        bytes: UTF-8エンコードされたNDJSONのチャンク
+    """
+    lines = []
+    size = 0
+    for row in rows:
+        line = json.dumps({column: export_value(row[column]) for column in columns},
+                          ensure_ascii=False, separators=(',', ':')) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ''.join(lines).encode('utf-8')
+            lines = []
+            size = 0
+
+    if lines:
+        yield ''.join(lines).encode('utf-8')
+
+def iter_export_chunks(rows, columns, export_format):
+    """
+    指定された形式のチャンクを返します。
+
+    Args:
+        rows (iterable): 行データ（dict）
+        columns (list): 出力する列名
+        export_format (str): 'csv' または 'ndjson'
+
+    Returns:
+        iterator: bytesのチャンク
+
+    Raises:
+        ValueError: 未対応の形式が指定された場合
+    """
+    if export_format == 'csv':
+        return iter_csv_chunks(rows, columns)
+    if export_format == 'ndjson':
+        return iter_ndjson_chunks(rows, columns)
+    raise ValueError(f"未対応のformatです: {export_format}")
+
+def gzip_chunks(chunks):
+    """
+    チャンクをgzip形式で逐次圧縮します。
+
+    Args:
+        chunks (iterable): bytesのチャンク
+
+    Yields:
+        bytes: gzip圧縮されたチャンク
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,139 @@
+"""
+Charge history queries shared by the history endpoints and export jobs.
+"""
+import logging
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+CHARGE_HISTORY_SELECT = """
+SELECT
+    t_charge.transaction_id,
+    t_charge.powersupply_id,
+    t_charge_history.charging_start,
+    t_charge_history.charging_end,
+    t_charge_history.charged_amount,
+    t_charge_history.billing_amount,
+    m_user.app_user_number,
+    m_location.station_name,
+    m_powersupply.app_powersupply_number,
+    m_powersupply.powersupply_name
+"""
+
+def charge_history_scope(agency_id=None, permission=None, powersupply_ids=None):
+    """
+    利用履歴の絞り込み条件を作成します。
+
+    Args:
+        agency_id (int): 企業ID（permissionと併せて指定）
+        permission (int): ユーザーの権限レベル
+        powersupply_ids (list): 充電器IDのリスト。agency_idと併せて指定した場合は、
+            その企業の権限の範囲にある充電器だけに絞り込む
+
+    Returns:
+        tuple: (条件式, パラメータのリスト)
+    """
+    agency_condition = """
+    m_location.agency_id = %s
+AND
+    m_powersupply.permission BETWEEN 1 AND %s
+    """
+    if not powersupply_ids:
+        return agency_condition, [agency_id, permission]
+
+    placeholders = ', '.join(['%s'] * len(powersupply_ids))
+    condition = f"t_charge.powersupply_id IN ({placeholders})"
+    if agency_id is None:
+        return condition, list(powersupply_ids)
+    return f"{condition}\nAND\n{agency_condition}", list(powersupply_ids) + [agency_id, permission]
+
+def charge_history_base_query(scope_condition):
+    """
+    利用履歴のFROM句・WHERE句を作成します。
+
+    Args:
+        scope_condition (str): charge_history_scopeで作成した条件式
+
+    Returns:
+        str: FROM句以降のSQL（期間の開始・終了の2つのパラメータを含む）
+    """
+    return f"""
+    FROM
+        t_charge
+    JOIN t_charge_history ON t_charge.transaction_id = t_charge_history.transaction_id
+    JOIN m_user ON t_charge.user_id = m_user.user_id
+    JOIN m_powersupply ON t_charge.powersupply_id = m_powersupply.powersupply_id
+    JOIN m_location ON m_powersupply.location_id = m_location.location_id
+    WHERE
+        {scope_condition}
+    AND
+        t_charge_history.charging_start BETWEEN %s AND %s
+    """
+
+def build_charge_history_query(start_period, end_period, agency_id=None, permission=None,
+                               powersupply_ids=None):
+    """
+    期間内の利用履歴を取得するクエリを作成します。
+
+    Returns:
+        tuple: (クエリ, パラメータのリスト)
+    """
+    scope_condition, scope_params = charge_history_scope(agency_id, permission, powersupply_ids)
+    query = f"""
+    {CHARGE_HISTORY_SELECT}
+    {charge_history_base_query(scope_condition)}
+    ORDER BY
+        t_charge_history.charging_start ASC,
+        t_charge.transaction_id ASC;
+    """
+    return query, scope_params + [start_period, end_period]
+
+def build_download_history_query(location_id, powersupply_id, agency_id=None, permission=None):
+    """
+    location_idまたはpowersupply_idで絞り込む履歴取得クエリを作成します。
+    agency_idを指定した場合は、その企業の権限の範囲にある充電器の履歴だけを取得します。
+
+    Returns:
+        tuple: (クエリ, パラメータのタプル)
+    """
+    scope_condition = ""
+    scope_params = ()
+    if agency_id is not None:
+        scope_condition = "AND m_location.agency_id = %s AND m_powersupply.permission BETWEEN 1 AND %s"
+        scope_params = (agency_id, permission)
+    query = """
+    SELECT
+        t_charge.transaction_id,
+        t_charge_history.charging_start,
+        t_charge_history.charging_end,
+        t_charge_history.charged_amount,
+        t_charge_history.billing_amount,
+        m_user.app_user_number,
+        m_location.station_name,
+        m_powersupply.app_powersupply_number,
+        m_powersupply.powersupply_name
+    FROM
+        t_charge
+    JOIN t_charge_history ON t_charge.transaction_id = t_charge_history.transaction_id
+    JOIN m_user ON t_charge.user_id = m_user.user_id
+    JOIN m_powersupply ON t_charge.powersupply_id = m_powersupply.powersupply_id
+    JOIN m_location ON m_powersupply.location_id = m_location.location_id
+    WHERE {condition} = %s
+    {scope_condition}
+    ORDER BY t_charge_history.charging_start DESC;
+    """.format(condition = 'm_location.location_id' if location_id else 't_charge.powersupply_id',
+               scope_condition = scope_condition)
+    return query, (location_id or powersupply_id,) + scope_params
+
+def count_query(query):
+    """
+    ORDER BYを除いた件数取得クエリを作成します。
+
+    Args:
+        query (str): 元のクエリ（末尾がORDER BY句）
+
+    Returns:
+        str: 件数を返すクエリ
+    """
+    body = query[:query.rindex('ORDER BY')]
+    return f"SELECT COUNT(*) AS total_count FROM ({body}) AS export_rows"
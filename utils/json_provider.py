@@ -0,0 +1,97 @@
+"""
+Flask JSON provider that encodes MySQL result values in a single pass.
+"""
+import json
+import decimal
+import datetime
+import logging
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjsonが無い環境では標準のjsonを使用する
+    orjson = None
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+def format_timedelta(value):
+    """
+    MySQLのTIME型（PyMySQLではtimedeltaとして取得される）を文字列に変換します。
+
+    Args:
+        value (datetime.timedelta): 時間
+
+    Returns:
+        str: HH:MM形式（秒は切り捨て。従来のget_stationsの形式）
+    """
+    total_minutes = int(value.total_seconds() / 60)
+    sign = '-' if total_minutes < 0 else ''
+    hours, minutes = divmod(abs(total_minutes), 60)
+    return f"{sign}{hours:02d}:{minutes:02d}"
+
+def json_default(value):
+    """
+    JSONに直接変換できない値を変換します。
+
+    - datetime / date: ISO 8601形式
+    - time / timedelta（MySQLのTIME型）: HH:MM形式
+    - Decimal: 文字列（精度を保つため）
+
+    Args:
+        value: 変換する値
+
+    Returns:
+        JSONに変換可能な値
+
+    Raises:
+        TypeError: 未対応の型の場合
+    """
+    if isinstance(value, datetime.date):
+        # datetimeを含む（最も多い型のため最初に判定する）
+        return value.isoformat()
+    if isinstance(value, datetime.time):
+        return value.strftime('%H:%M')
+    if isinstance(value, datetime.timedelta):
+        return format_timedelta(value)
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson is not None else None
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    orjsonを使用するJSONプロバイダーです。
+
+    datetime・date・time・timedelta・Decimalはjson_defaultで変換するため、ルーター側での変換は不要です。
+    timeをHH:MM形式にするため、orjsonの日時の変換（HH:MM:SS形式）は使用しません（OPT_PASSTHROUGH_DATETIME）。
+    orjsonがインストールされていない場合は標準のjsonで同じ形式に変換します。
+    """
+
+    def dumps_bytes(self, obj):
+        """objをUTF-8のJSONバイト列に変換します。"""
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj, default=json_default, option=ORJSON_OPTIONS)
+            except TypeError:
+                # 文字列以外のキーを含む場合のみ、低速なOPT_NON_STR_KEYSで変換し直す
+                return orjson.dumps(obj, default=json_default,
+                                    option=ORJSON_OPTIONS | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(obj, default=json_default, ensure_ascii=False, sort_keys=True).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            kwargs.setdefault('default', json_default)
+            kwargs.setdefault('sort_keys', self.sort_keys)
+            return json.dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
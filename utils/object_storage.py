@@ -0,0 +1,205 @@
+"""
+Pluggable object storage for export results and job status documents.
+"""
+import os
+import json
+import logging
+import tempfile
+from utils.aws_clients import get_client
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+# S3のマルチパートアップロードで1パートにまとめるサイズ（最小5MB）
+S3_PART_SIZE = 8 * 1024 * 1024
+# ダウンロードURLの有効期限（秒）
+DOWNLOAD_URL_EXPIRES = 3600
+
+class ObjectStorage:
+    """
+    エクスポート結果を保存するストレージの基底クラスです。
+    """
+
+    def put_stream(self, key, chunks, content_type=None):
+        """
+        チャンクを順に書き込んでオブジェクトを作成します。
+
+        Args:
+            key (str): オブジェクトのキー
+            chunks (iterable): bytesのチャンク
+            content_type (str): Content-Type
+
+        Returns:
+            int: 書き込んだバイト数
+        """
+        raise NotImplementedError
+
+    def put_bytes(self, key, body, content_type=None):
+        """バイト列をそのまま保存します。"""
+        return self.put_stream(key, [body], content_type)
+
+    def get_bytes(self, key):
+        """
+        オブジェクトの内容を取得します。
+
+        Returns:
+            bytes: オブジェクトの内容。存在しない場合はNone
+        """
+        raise NotImplementedError
+
+    def download_handle(self, key):
+        """
+        クライアントに返すダウンロード情報を作成します。
+
+        Returns:
+            dict: ダウンロード方法を表す情報
+        """
+        raise NotImplementedError
+
+    def put_json(self, key, value):
+        """dictをJSONとして保存します。"""
+        body = json.dumps(value, ensure_ascii=False, default=str).encode('utf-8')
+        self.put_bytes(key, body, 'application/json')
+
+    def get_json(self, key):
+        """JSONとして保存されたオブジェクトを取得します。存在しない場合はNoneを返します。"""
+        body = self.get_bytes(key)
+        return json.loads(body) if body is not None else None
+
+class LocalObjectStorage(ObjectStorage):
+    """
+    ローカルファイルシステムに保存するストレージです（ローカル実行・テスト用）。
+    """
+
+    def __init__(self, base_path):
+        self.base_path = os.path.abspath(base_path)
+
+    def _path(self, key):
+        path = os.path.abspath(os.path.join(self.base_path, key))
+        if not path.startswith(self.base_path + os.sep):
+            raise ValueError(f"不正なキーです: {key}")
+        return path
+
+    def put_stream(self, key, chunks, content_type=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = 0
+        # 書き込み途中のファイルが読まれないよう、一時ファイルに書いてから置き換える
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return size
+
+    def get_bytes(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def download_handle(self, key):
+        return {"type": "local", "path": self._path(key)}
+
+class S3ObjectStorage(ObjectStorage):
+    """
+    S3に保存するストレージです。大きなオブジェクトはマルチパートアップロードで書き込みます。
+    """
+
+    def __init__(self, bucket, prefix='', client=None, part_size=S3_PART_SIZE):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.part_size = part_size
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client('s3')
+        return self._client
+
+    def _key(self, key):
+        return f"{self.prefix}{key}"
+
+    def put_stream(self, key, chunks, content_type=None):
+        s3_key = self._key(key)
+        extra = {'ContentType': content_type} if content_type else {}
+        buffer = bytearray()
+        parts = []
+        upload_id = None
+        size = 0
+
+        try:
+            for chunk in chunks:
+                buffer += chunk
+                size += len(chunk)
+                if len(buffer) >= self.part_size:
+                    if upload_id is None:
+                        upload_id = self.client.create_multipart_upload(
+                            Bucket=self.bucket, Key=s3_key, **extra)['UploadId']
+                    parts.append(self._upload_part(s3_key, upload_id, len(parts) + 1, buffer))
+                    buffer = bytearray()
+
+            # 1パートに満たない場合は通常のPUTで保存する
+            if upload_id is None:
+                self.client.put_object(Bucket=self.bucket, Key=s3_key, Body=bytes(buffer), **extra)
+                return size
+
+            if buffer:
+                parts.append(self._upload_part(s3_key, upload_id, len(parts) + 1, buffer))
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=s3_key, UploadId=upload_id,
+                MultipartUpload={'Parts': parts})
+            return size
+        except BaseException:
+            if upload_id is not None:
+                try:
+                    self.client.abort_multipart_upload(Bucket=self.bucket, Key=s3_key, UploadId=upload_id)
+                except Exception as e:
+                    logger.warning(f"マルチパートアップロードの中止に失敗しました: {str(e)}")
+            raise
+
+    def _upload_part(self, s3_key, upload_id, part_number, body):
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=s3_key, UploadId=upload_id,
+            PartNumber=part_number, Body=bytes(body))
+        return {'ETag': response['ETag'], 'PartNumber': part_number}
+
+    def get_bytes(self, key):
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(key))
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return response['Body'].read()
+
+    def download_handle(self, key):
+        url = self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self._key(key)},
+            ExpiresIn=DOWNLOAD_URL_EXPIRES
+        )
+        return {"type": "url", "url": url, "expires_in": DOWNLOAD_URL_EXPIRES}
+
+def get_object_storage():
+    """
+    環境変数の設定に応じたストレージを返します。
+
+    EXPORT_STORAGEが's3'の場合はEXPORT_S3_BUCKETのバケットを、
+    それ以外の場合はEXPORT_STORAGE_PATHのディレクトリを使用します。
+
+    Returns:
+        ObjectStorage: ストレージ
+    """
+    storage_type = os.environ.get('EXPORT_STORAGE', 's3' if os.environ.get('EXPORT_S3_BUCKET') else 'local')
+    if storage_type == 's3':
+        return S3ObjectStorage(os.environ['EXPORT_S3_BUCKET'], os.environ.get('EXPORT_S3_PREFIX', ''))
+    if storage_type == 'local':
+        return LocalObjectStorage(os.environ.get('EXPORT_STORAGE_PATH',
+                                                 os.path.join(tempfile.gettempdir(), 'exports')))
+    raise ValueError(f"未対応のEXPORT_STORAGEです: {storage_type}")
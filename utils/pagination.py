@@ -0,0 +1,111 @@
+"""
+Keyset pagination helpers for list endpoints.
+"""
+import os
+import json
+import base64
+import logging
+import datetime
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+# 1ページあたりの最大件数
+MAX_PAGE_LIMIT = 1000
+
+# カーソルのキー値の型
+CURSOR_DATETIME = 'datetime'
+CURSOR_INT = 'int'
+
+def max_unpaged_rows():
+    """
+    ページングを指定しないリクエストで返す最大件数を返します（環境変数MAX_UNPAGED_ROWS）。
+    未設定の場合は上限を設けず、Noneを返します。
+    """
+    value = os.environ.get('MAX_UNPAGED_ROWS')
+    return int(value) if value else None
+
+def encode_cursor(values):
+    """
+    ページ末尾のキー値を不透明なカーソル文字列に変換します。
+
+    Args:
+        values (list): キー値のリスト（JSONに変換可能な値）
+
+    Returns:
+        str: URLセーフなBase64文字列
+    """
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, size, kinds=None):
+    """
+    カーソル文字列をキー値のリストに戻します。
+
+    Args:
+        cursor (str): encode_cursorで作成したカーソル
+        size (int): キー値の個数
+        kinds (list): キー値ごとの型（CURSOR_DATETIME、CURSOR_INT）。指定した場合は型と値を検証する
+
+    Returns:
+        list: キー値のリスト
+
+    Raises:
+        ValueError: カーソルの形式が不正な場合
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError("cursorの形式が不正です")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("cursorの形式が不正です")
+    if kinds:
+        values = [parse_cursor_value(value, kind) for value, kind in zip(values, kinds)]
+    return values
+
+def parse_cursor_value(value, kind):
+    """
+    カーソルのキー値を検証します。
+
+    Returns:
+        CURSOR_DATETIMEは'YYYY-MM-DD HH:MM:SS'形式の文字列、CURSOR_INTは0以上の整数
+
+    Raises:
+        ValueError: 型または値が不正な場合
+    """
+    if kind == CURSOR_DATETIME and isinstance(value, str):
+        try:
+            parsed = datetime.datetime.fromisoformat(value)
+        except ValueError:
+            parsed = None
+        if parsed is not None and parsed.tzinfo is None:
+            return parsed.isoformat(sep=' ')
+    elif kind == CURSOR_INT and isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+        return value
+    raise ValueError("cursorの形式が不正です")
+
+def parse_limit(value):
+    """
+    リクエストのlimitを検証します。
+
+    Args:
+        value: リクエストで指定されたlimit
+
+    Returns:
+        int: 1以上MAX_PAGE_LIMIT以下の件数
+
+    Raises:
+        ValueError: limitが不正な場合
+    """
+    if isinstance(value, bool):
+        raise ValueError("limitは整数で指定してください")
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("limitは整数で指定してください")
+
+    if limit < 1 or limit > MAX_PAGE_LIMIT:
+        raise ValueError(f"limitは1から{MAX_PAGE_LIMIT}の範囲で指定してください")
+    return limit
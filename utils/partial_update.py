@@ -0,0 +1,96 @@
+"""
+Partial (PATCH-style) row updates: only the supplied columns are written,
+no-op writes are skipped, and update_date can be used for optimistic locking.
+"""
+import logging
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+# 更新結果
+UPDATE_APPLIED = 'updated'
+UPDATE_UNCHANGED = 'unchanged'
+UPDATE_NOT_FOUND = 'not_found'
+UPDATE_CONFLICT = 'conflict'
+
+def build_partial_update(table, key_column, key_value, values, now, user, expected_update_date=None):
+    """
+    指定された項目だけを更新するUPDATE文を作成します。
+
+    すべての項目が現在の値と同じ行は条件で除外するため（NULL同士も等しいとみなす<=>で比較）、
+    値が変わらない場合は行への書き込みが発生しません。
+
+    Args:
+        table (str): テーブル名
+        key_column (str): 主キーのカラム名
+        key_value: 主キーの値
+        values (dict): 更新するカラムと値
+        now (str): 更新日時
+        user (str): 更新者
+        expected_update_date (str): 指定した場合、update_dateがこの値の行だけを更新する
+
+    Returns:
+        tuple: (クエリ, パラメータ)
+    """
+    columns = list(values)
+    assignments = ', '.join(f"{column} = %s" for column in columns)
+    unchanged = ' AND '.join(f"{column} <=> %s" for column in columns)
+    query = f"""
+    UPDATE {table}
+    SET {assignments}, update_date = %s, update_user = %s
+    WHERE {key_column} = %s
+    AND NOT ({unchanged})
+    """
+    params = [values[column] for column in columns] + [now, user, key_value]
+    params += [values[column] for column in columns]
+    if expected_update_date is not None:
+        query += "AND update_date = %s\n"
+        params.append(expected_update_date)
+    return query, params
+
+def apply_partial_update(cursor, table, key_column, key_value, data, updatable_columns, now,
+                         user='Dashboard', expected_update_date=None):
+    """
+    リクエストに含まれる項目だけを更新します。
+
+    リクエストにない項目は変更しません（値にnullを指定した項目はNULLに更新します）。
+    更新されなかった場合は、対象の行が存在しないのか、update_dateが一致しないのか、
+    値が変わらないのかを主キーでの1件の取得で判定します。
+
+    Args:
+        cursor: データベースカーソル（DictCursor）
+        table (str): テーブル名
+        key_column (str): 主キーのカラム名
+        key_value: 主キーの値
+        data (dict): リクエストボディ
+        updatable_columns (list): 更新を許可するカラム
+        now (str): 更新日時
+        user (str): 更新者
+        expected_update_date (str): 楽観的排他制御に使用するupdate_date（任意）
+
+    Returns:
+        dict: status（updated / unchanged / not_found / conflict）、
+              fields（リクエストに含まれていた更新項目）、update_date（現在のupdate_date）
+    """
+    values = {column: data[column] for column in updatable_columns if column in data}
+    if expected_update_date is not None:
+        # レスポンスのISO形式（YYYY-MM-DDTHH:MM:SS）でも指定できるようにする
+        expected_update_date = str(expected_update_date).replace('T', ' ')[:19]
+    if not values:
+        raise ValueError(f"更新する項目がありません。次のいずれかを指定してください: {', '.join(updatable_columns)}")
+
+    query, params = build_partial_update(table, key_column, key_value, values, now, user, expected_update_date)
+    cursor.execute(query, params)
+    if cursor.rowcount > 0:
+        return {'status': UPDATE_APPLIED, 'fields': list(values), 'update_date': now}
+
+    cursor.execute(f"SELECT update_date FROM {table} WHERE {key_column} = %s", (key_value,))
+    row = cursor.fetchone()
+    if row is None:
+        return {'status': UPDATE_NOT_FOUND, 'fields': list(values), 'update_date': None}
+
+    current = row['update_date']
+    current_text = current.strftime('%Y-%m-%d %H:%M:%S') if hasattr(current, 'strftime') else current
+    if expected_update_date is not None and str(current_text) != str(expected_update_date):
+        return {'status': UPDATE_CONFLICT, 'fields': list(values), 'update_date': current_text}
+    return {'status': UPDATE_UNCHANGED, 'fields': list(values), 'update_date': current_text}
@@ -0,0 +1,179 @@
+"""
+Request identity resolution for dashboard users.
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from flask import g, has_app_context
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+IDENTITY_QUERY = """
+SELECT
+    u.user_id,
+    u.user_category,
+    u.status,
+    ua.user_id AS agency_user_id,
+    ua.agency_id,
+    ua.permission AS agency_permission,
+    uc.user_id AS corporate_user_id,
+    uc.corporate_id,
+    uc.permission AS corporate_permission
+FROM m_user u
+LEFT JOIN m_user_agency ua ON u.user_id = ua.user_id
+LEFT JOIN m_user_corporate uc ON u.user_id = uc.user_id
+WHERE u.app_user_number = %s
+LIMIT 1
+"""
+
+class IdentityCache:
+    """
+    app_user_numberをキーとしたLRU+TTLのキャッシュ。
+    ウォーム状態のLambdaではモジュール変数として呼び出しをまたいで保持されます。
+
+    Args:
+        max_size (int): 保持する最大件数
+        ttl (float): エントリの有効秒数
+    """
+    def __init__(self, max_size=1024, ttl=60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+        }
+
+    def get(self, key):
+        """有効なエントリを返す。存在しないか期限切れの場合はNoneを返す"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key, value):
+        """エントリを保存し、上限を超えた場合は最も古く使われたものを削除する"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key):
+        """指定したエントリを削除する"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._stats['invalidations'] += 1
+
+    def clear(self):
+        """全てのエントリを削除する"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """キャッシュの利用状況を返す"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+            })
+            return stats
+
+# プロセス内で共有する識別情報キャッシュ
+identity_cache = IdentityCache(
+    max_size=int(os.environ.get('IDENTITY_CACHE_MAX_SIZE', 1024)),
+    ttl=float(os.environ.get('IDENTITY_CACHE_TTL', 60))
+)
+
+def fetch_user_identity(cursor, app_user_number):
+    """
+    app_user_numberに対応するユーザーの識別情報を1回のクエリで取得します。
+
+    Args:
+        cursor: データベースカーソル（DictCursor）
+        app_user_number (str): アプリユーザー番号
+
+    Returns:
+        dict: user_id, user_category, status, agency_id, agency_permission,
+              corporate_id, corporate_permission, has_agency, has_corporate
+              を含む辞書。ユーザーが存在しない場合はNone
+    """
+    cursor.execute(IDENTITY_QUERY, (app_user_number,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    return {
+        'user_id': row['user_id'],
+        'user_category': row['user_category'],
+        'status': row['status'],
+        'has_agency': row['agency_user_id'] is not None,
+        'agency_id': row['agency_id'],
+        'agency_permission': row['agency_permission'],
+        'has_corporate': row['corporate_user_id'] is not None,
+        'corporate_id': row['corporate_id'],
+        'corporate_permission': row['corporate_permission'],
+    }
+
+def resolve_user_identity(cursor, app_user_number):
+    """
+    リクエスト中のユーザー識別情報を取得します。
+    同一リクエスト内ではflask.gに保持した結果を、リクエストをまたいでは
+    identity_cacheの結果を再利用します。
+
+    Args:
+        cursor: データベースカーソル（DictCursor）
+        app_user_number (str): アプリユーザー番号
+
+    Returns:
+        dict: fetch_user_identityの戻り値。ユーザーが存在しない場合はNone
+    """
+    if app_user_number is None:
+        return None
+
+    identities = g.setdefault('user_identities', {}) if has_app_context() else {}
+    if app_user_number in identities:
+        return identities[app_user_number]
+
+    identity = identity_cache.get(app_user_number)
+    if identity is None:
+        identity = fetch_user_identity(cursor, app_user_number)
+        if identity is not None:
+            identity_cache.set(app_user_number, identity)
+
+    identities[app_user_number] = identity
+    return identity
+
+def invalidate_user_identity(app_user_number):
+    """
+    保持しているユーザー識別情報を破棄します。
+    user_id、企業ID、権限、ステータスを更新した後に呼び出します。
+
+    Args:
+        app_user_number (str): アプリユーザー番号
+    """
+    identity_cache.invalidate(app_user_number)
+    if has_app_context():
+        g.setdefault('user_identities', {}).pop(app_user_number, None)
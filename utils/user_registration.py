@@ -0,0 +1,393 @@
+"""
+Dashboard user registration as a saga of short DB transactions around the
+Cognito call, with compensation and a recovery sweep for stuck registrations.
+"""
+import os
+import datetime
+import logging
+import pymysql
+from botocore.exceptions import ClientError
+from utils.utils import get_jst_now
+from utils.cognito_users import attribute_map, get_cognito_user
+from utils.cognito_outbox import enqueue_cognito_user_deletion
+
+# ロガー設定
+logger = logging.getLogger(__name__)
+
+# m_user.status
+USER_STATUS_ACTIVE = 1
+# Cognitoへの登録が完了するまでの仮登録（一覧・ログインの対象外）
+USER_STATUS_PENDING = 9
+
+# t_user_registration.status
+REGISTRATION_PENDING = 'pending'
+REGISTRATION_COMPLETED = 'completed'
+REGISTRATION_COMPENSATED = 'compensated'
+
+# ユーザー区分ごとの所属テーブル
+MEMBERSHIP_TABLES = {
+    2: 'm_user_corporate',
+    4: 'm_user_agency',
+}
+
+RECOVERY_LOCK_NAME = 'user_registration_recovery'
+
+class RegistrationError(Exception):
+    """仮登録の状態が想定と異なり、登録を完了できない場合の例外"""
+
+def pending_timeout():
+    """仮登録のまま残っている登録を復旧の対象とするまでの秒数を返します（環境変数REGISTRATION_PENDING_TIMEOUT、既定値: 900）。"""
+    return int(os.environ.get('REGISTRATION_PENDING_TIMEOUT', 900))
+
+def insert_pending_user(cursor, ech_nav_code, app_user_number, user_category, lastname, firstname, email, now):
+    """
+    m_userに仮登録のユーザーを登録します。
+
+    Returns:
+        int: 登録したユーザーのuser_id
+    """
+    cursor.execute("""
+    INSERT INTO m_user (
+        echnavicode, app_user_number, user_category, lastname, firstname,
+        mail, create_date, create_user, update_date, update_user, status
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
+    """, (
+        ech_nav_code, app_user_number, user_category, lastname, firstname,
+        email, now, 'Dashboard', now, 'Dashboard', USER_STATUS_PENDING
+    ))
+    return cursor.lastrowid
+
+def start_registration(cursor, user_id, user_category, cognito_username, now):
+    """
+    登録の進捗を記録します。仮登録と同じトランザクションで呼び出します。
+
+    Returns:
+        int: registration_id
+    """
+    cursor.execute("""
+    INSERT INTO t_user_registration (
+        user_id, user_category, cognito_username, status, attempts, error, created_at, updated_at
+    ) VALUES (%s, %s, %s, %s, 0, NULL, %s, %s)
+    """, (user_id, user_category, cognito_username, REGISTRATION_PENDING, now, now))
+    return cursor.lastrowid
+
+def complete_registration(cursor, registration_id, user_id, cognito_username, cognito_sub, now):
+    """
+    仮登録のユーザーを有効にし、Cognitoのユーザー名とsubを記録して登録を完了します。
+
+    Raises:
+        RegistrationError: 仮登録のユーザーが見つからない場合（復旧処理で取り消し済みなど）
+    """
+    cursor.execute("""
+    UPDATE m_user
+    SET status = %s, cognito_username = %s, cognito_sub = %s, update_date = %s, update_user = %s
+    WHERE user_id = %s AND status = %s
+    """, (USER_STATUS_ACTIVE, cognito_username, cognito_sub, now, 'Dashboard', user_id, USER_STATUS_PENDING))
+    if cursor.rowcount == 0:
+        raise RegistrationError(f"仮登録のユーザーが見つかりません: user_id={user_id}")
+    cursor.execute("""
+    UPDATE t_user_registration
+    SET status = %s, cognito_username = %s, updated_at = %s
+    WHERE registration_id = %s
+    """, (REGISTRATION_COMPLETED, cognito_username, now, registration_id))
+
+def compensate_registration(cursor, registration_id, user_id, user_category, now, reason):
+    """
+    仮登録のユーザーと所属を削除し、登録を取り消します。有効になったユーザーは削除しません。
+
+    Returns:
+        bool: 取り消した場合はTrue
+    """
+    cursor.execute("SELECT status FROM m_user WHERE user_id = %s FOR UPDATE", (user_id,))
+    row = cursor.fetchone()
+    if row and row['status'] != USER_STATUS_PENDING:
+        logger.warning(f"仮登録ではないユーザーのため取り消しません: user_id={user_id}")
+        return False
+
+    cursor.execute(f"DELETE FROM {MEMBERSHIP_TABLES[user_category]} WHERE user_id = %s", (user_id,))
+    cursor.execute("DELETE FROM m_user WHERE user_id = %s AND status = %s", (user_id, USER_STATUS_PENDING))
+    cursor.execute("""
+    UPDATE t_user_registration
+    SET status = %s, error = %s, updated_at = %s
+    WHERE registration_id = %s
+    """, (REGISTRATION_COMPENSATED, str(reason)[:1000], now, registration_id))
+    return True
+
+def lock_user_status(cursor, user_id):
+    """
+    ユーザーの行をロックし、ステータスを返します。
+    仮登録のユーザーはcomplete_registrationだけが有効にするため、更新する前に確認します。
+
+    Returns:
+        int: m_user.status（ユーザーが存在しない場合はNone）
+    """
+    cursor.execute("SELECT status FROM m_user WHERE user_id = %s FOR UPDATE", (user_id,))
+    row = cursor.fetchone()
+    return row['status'] if row else None
+
+def create_cognito_user(cognito_client, user_pool_id, username, attributes):
+    """
+    Cognitoにユーザーを作成し、SMSによるMFAを設定します。
+    MFAの設定に失敗した場合は、作成したユーザーを削除してから例外を送出します。
+    タイムアウトなどで作成できたか分からない場合は、custom:ech_nav_codeが一致するユーザーが
+    作成されていれば削除します（既存の別のユーザーは削除しません）。
+
+    Returns:
+        dict: username（Cognitoのユーザー名）、sub
+    """
+    try:
+        response = cognito_client.admin_create_user(
+            UserPoolId=user_pool_id,
+            Username=username,
+            UserAttributes=attributes,
+            DesiredDeliveryMediums=['EMAIL']
+        )
+    except ClientError:
+        raise
+    except Exception:
+        ech_nav_code = next((attribute['Value'] for attribute in attributes
+                             if attribute['Name'] == 'custom:ech_nav_code'), None)
+        try:
+            created = get_cognito_user(cognito_client, user_pool_id, username)
+            if ech_nav_code and created and created['attributes'].get('custom:ech_nav_code') == ech_nav_code:
+                delete_cognito_user(cognito_client, user_pool_id, username)
+        except Exception as e:
+            logger.error(f"Cognitoのユーザーの作成結果を確認できませんでした: {username}: {str(e)}")
+        raise
+    try:
+        set_sms_mfa(cognito_client, user_pool_id, username)
+    except Exception:
+        delete_cognito_user(cognito_client, user_pool_id, username)
+        raise
+    return {
+        'username': response['User']['Username'],
+        'sub': attribute_map(response['User'].get('Attributes')).get('sub')
+    }
+
+def set_sms_mfa(cognito_client, user_pool_id, username):
+    """SMSによるMFAを設定します。"""
+    cognito_client.admin_set_user_settings(
+        UserPoolId=user_pool_id,
+        Username=username,
+        MFAOptions=[
+            {
+                'DeliveryMedium': 'SMS',
+                'AttributeName': 'phone_number'
+            }
+        ]
+    )
+
+def delete_cognito_user(cognito_client, user_pool_id, username):
+    """
+    Cognitoのユーザーを削除します。削除できなかった場合はログに記録し、例外は送出しません。
+
+    Returns:
+        bool: 削除した（または存在しなかった）場合はTrue
+    """
+    try:
+        cognito_client.admin_delete_user(UserPoolId=user_pool_id, Username=username)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'UserNotFoundException':
+            return True
+        logger.error(f"Cognitoのユーザーの削除に失敗しました: {username}: {str(e)}")
+        return False
+    except Exception as e:
+        logger.error(f"Cognitoのユーザーの削除に失敗しました: {username}: {str(e)}")
+        return False
+
+def discard_cognito_user(database, cognito_client, user_pool_id, registration, email):
+    """
+    有効にできなかった登録のCognitoのユーザーを削除します。
+    削除できなかった場合は、アウトボックスに登録してjobs.cognito_outbox_workerで削除します。
+
+    Args:
+        database: db.db_connection.DBConnection
+        cognito_client: Cognitoのクライアント
+        user_pool_id (str): ユーザープールID
+        registration (dict): register_userの登録内容（user_id、cognito_username）
+        email (str): ユーザーのメールアドレス
+    """
+    if delete_cognito_user(cognito_client, user_pool_id, registration['cognito_username']):
+        return
+    with database.get_connection() as conn:
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+            enqueue_cognito_user_deletion(cursor, registration['user_id'], email, get_jst_now())
+            conn.commit()
+
+def register_user(database, prepare, cognito_step, cognito_cleanup=None):
+    """
+    ユーザーを登録します。
+
+    1. 仮登録（prepare）を短いトランザクションでコミットする
+    2. トランザクションの外でCognitoに登録する（cognito_step）
+    3. 成功した場合はユーザーを有効にし、失敗した場合は仮登録を取り消す
+
+    データベースのロックはCognitoの呼び出しの間は保持しません。
+    3の処理に失敗した場合は、recover_registrationsが後で完了または取り消します。
+    3の時点で仮登録が取り消されていた場合は、作成したCognitoのユーザーをcognito_cleanupで削除します。
+
+    Args:
+        database: db.db_connection.DBConnection
+        prepare (callable): cursorを受け取り、仮登録して
+            {'user_id', 'user_category', 'cognito_username', ...}を返す関数。
+            レスポンスとして返す場合はdictの代わりにtupleを返す
+        cognito_step (callable): prepareの結果を受け取り、Cognitoに登録して
+            {'username', 'sub'}（create_cognito_userの戻り値）を返す関数
+        cognito_cleanup (callable): 仮登録が取り消されていて有効にできなかった場合に、
+            登録内容を受け取り、作成したCognitoのユーザーを削除する関数
+
+    Returns:
+        dict or tuple: prepareの結果にCognitoの登録結果（cognito_username、cognito_sub）を加えたもの、
+            またはprepareが返したtuple
+
+    Raises:
+        RegistrationError: 仮登録が取り消されていて、ユーザーを有効にできなかった場合
+    """
+    with database.get_connection() as conn:
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+            registration = prepare(cursor)
+            if isinstance(registration, tuple):
+                return registration
+            registration['registration_id'] = start_registration(
+                cursor, registration['user_id'], registration['user_category'],
+                registration['cognito_username'], get_jst_now()
+            )
+            conn.commit()
+
+    try:
+        cognito_user = cognito_step(registration)
+        registration['cognito_username'] = cognito_user['username']
+        registration['cognito_sub'] = cognito_user['sub']
+    except Exception as e:
+        logger.error(f"Cognitoへの登録に失敗したため仮登録を取り消します: {str(e)}")
+        try:
+            with database.get_connection() as conn:
+                with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                    compensate_registration(cursor, registration['registration_id'], registration['user_id'],
+                                            registration['user_category'], get_jst_now(), e)
+                    conn.commit()
+        except Exception as compensation_error:
+            # 仮登録は復旧処理で取り消す
+            logger.error(f"仮登録の取り消しに失敗しました: {str(compensation_error)}")
+        raise
+
+    try:
+        with database.get_connection() as conn:
+            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                complete_registration(cursor, registration['registration_id'], registration['user_id'],
+                                      registration['cognito_username'], registration['cognito_sub'], get_jst_now())
+                conn.commit()
+    except RegistrationError:
+        with database.get_connection() as conn:
+            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                cursor.execute("SELECT status, cognito_username FROM m_user WHERE user_id = %s",
+                               (registration['user_id'],))
+                user = cursor.fetchone()
+        if user and user['status'] == USER_STATUS_ACTIVE \
+                and user['cognito_username'] == registration['cognito_username']:
+            # 復旧処理が先に同じCognitoのユーザーで登録を完了していた場合
+            return registration
+        logger.error(f"仮登録が取り消されていたため、Cognitoのユーザーを削除します: "
+                     f"user_id={registration['user_id']}")
+        if cognito_cleanup:
+            cognito_cleanup(registration)
+        raise
+    return registration
+
+STUCK_REGISTRATIONS_QUERY = """
+SELECT r.registration_id, r.user_id, r.user_category, r.cognito_username, r.attempts,
+       u.echnavicode, u.status AS user_status
+FROM t_user_registration r
+LEFT JOIN m_user u ON u.user_id = r.user_id
+WHERE r.status = %s
+AND r.updated_at < %s
+ORDER BY r.registration_id
+LIMIT %s
+"""
+
+def recover_registration(conn, cursor, registration, cognito_client, user_pool_id, now):
+    """
+    仮登録のまま残っている登録を1件、Cognitoの状態に合わせて完了または取り消します。
+
+    Returns:
+        str: 'completed'、'compensated'
+    """
+    username = registration['cognito_username']
+    if registration['user_status'] is None or registration['user_status'] != USER_STATUS_PENDING:
+        # ユーザーは既に有効、または削除済み
+        with_user = registration['user_status'] is not None
+        cursor.execute("""
+        UPDATE t_user_registration SET status = %s, updated_at = %s WHERE registration_id = %s
+        """, (REGISTRATION_COMPLETED if with_user else REGISTRATION_COMPENSATED, now, registration['registration_id']))
+        conn.commit()
+        return REGISTRATION_COMPLETED if with_user else REGISTRATION_COMPENSATED
+
+    cognito_user = get_cognito_user(cognito_client, user_pool_id, username)
+    if cognito_user and cognito_user['attributes'].get('custom:ech_nav_code') == registration['echnavicode']:
+        # Cognitoへの登録は完了しているため、MFAを設定し直してユーザーを有効にする
+        set_sms_mfa(cognito_client, user_pool_id, username)
+        complete_registration(cursor, registration['registration_id'], registration['user_id'],
+                              cognito_user['username'], cognito_user['sub'], now)
+        conn.commit()
+        return REGISTRATION_COMPLETED
+
+    reason = "Cognitoにユーザーが登録されていません" if cognito_user is None \
+        else "Cognitoのユーザーは別のユーザーのものです"
+    compensate_registration(cursor, registration['registration_id'], registration['user_id'],
+                            registration['user_category'], now, f"復旧処理: {reason}")
+    conn.commit()
+    return REGISTRATION_COMPENSATED
+
+def recover_registrations(conn, cognito_client, user_pool_id, now=None, timeout=None, limit=100):
+    """
+    仮登録のままtimeout秒以上経過した登録を完了または取り消します。
+
+    Cognitoに同じech_nav_codeのユーザーが存在する場合は登録を完了し、存在しない場合
+    （または別のユーザーのものである場合）は仮登録を取り消します。処理できなかった登録は
+    attemptsを加算して次回に再実行します。
+
+    Args:
+        conn: データベース接続
+        cognito_client: Cognitoのクライアント
+        user_pool_id (str): ユーザープールID
+        now (str): 基準日時（省略時は日本時間の現在日時）
+        timeout (int): 復旧の対象とするまでの秒数
+        limit (int): 1回に処理する最大件数
+
+    Returns:
+        dict: 完了・取り消し・失敗した件数。他で実行中の場合はskipped=True
+    """
+    now = now or get_jst_now()
+    timeout = pending_timeout() if timeout is None else timeout
+    threshold = (datetime.datetime.strptime(now, '%Y-%m-%d %H:%M:%S')
+                 - datetime.timedelta(seconds=timeout)).strftime('%Y-%m-%d %H:%M:%S')
+
+    result = {"skipped": False, REGISTRATION_COMPLETED: 0, REGISTRATION_COMPENSATED: 0, "failed": 0}
+    with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+        # 同時に実行されないようにする
+        cursor.execute("SELECT GET_LOCK(%s, 0) AS acquired", (RECOVERY_LOCK_NAME,))
+        if not cursor.fetchone()['acquired']:
+            logger.info("ユーザー登録の復旧処理は他で実行中のためスキップします")
+            return {**result, "skipped": True}
+
+        try:
+            cursor.execute(STUCK_REGISTRATIONS_QUERY, (REGISTRATION_PENDING, threshold, limit))
+            for registration in cursor.fetchall():
+                try:
+                    result[recover_registration(conn, cursor, registration, cognito_client, user_pool_id, now)] += 1
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"ユーザー登録の復旧に失敗しました: registration_id={registration['registration_id']}: {str(e)}")
+                    cursor.execute("""
+                    UPDATE t_user_registration
+                    SET attempts = attempts + 1, error = %s, updated_at = %s
+                    WHERE registration_id = %s
+                    """, (str(e)[:1000], now, registration['registration_id']))
+                    conn.commit()
+                    result["failed"] += 1
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (RECOVERY_LOCK_NAME,))
+
+    logger.info(f"ユーザー登録の復旧処理: {result}")
+    return result